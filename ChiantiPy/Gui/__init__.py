@@ -1,38 +1,59 @@
 """
 Select GUI package
+
+The selection is made the first time `gui` is used, so that importing this
+package neither reads the chiantirc file nor probes for PyQt5.
 """
 
 #
 import os
+import logging
 import configparser
 
-#check chiantirc for gui selection
-rcfile=os.path.join(os.environ['HOME'],'.chianti/chiantirc')
-rcparse=configparser.ConfigParser()
-rcparse.read(rcfile)
-try:
-    if rcparse.get('chianti','gui').lower() == 'true':
+log = logging.getLogger(__name__)
+
+
+def _selectGui():
+    """
+    Import the PyQt5 or the command line dialogs, depending on the chiantirc file and on PyQt5.
+    """
+    global use_gui, hasPyQt5
+    #check chiantirc for gui selection
+    rcfile=os.path.join(os.environ['HOME'],'.chianti/chiantirc')
+    rcparse=configparser.ConfigParser()
+    rcparse.read(rcfile)
+    try:
+        if rcparse.get('chianti','gui').lower() == 'true':
+            use_gui=True
+        else:
+            use_gui=False
+    except (KeyError,configparser.NoSectionError,configparser.NoOptionError) as e:
+        #default to true if section/field don't exist
         use_gui=True
+
+    #check for available gui
+    hasPyQt5=False
+    if use_gui:
+        try:
+            import PyQt5
+            hasPyQt5 = True
+            log.info(' found PyQt5 widgets')
+            del PyQt5
+        except ImportError:
+            log.info(' using cli')
+
+    #set gui
+    if hasPyQt5 and use_gui:
+        from .gui_qt5 import gui
+        log.info(' using PyQt5 widgets')
     else:
-        use_gui=False
-except (KeyError,configparser.NoSectionError) as e:
-    #default to true if section/field don't exist
-    use_gui=True
-
-#check for available gui
-hasPyQt5=False
-try:
-    import PyQt5
-    hasPyQt5 = True
-    print(' found PyQt5 widgets')
-    del PyQt5
-except ImportError:
-    print(' using cli')
-
-#set gui
-if hasPyQt5 and use_gui:
-    from .gui_qt5 import gui
-    print(' using PyQt5 widgets')
-else:
-    from .gui_cl import gui
-    print(' using CLI for selections')
+        from .gui_cl import gui
+        log.info(' using CLI for selections')
+    return gui
+
+
+def __getattr__(name):
+    if name in ('gui', 'use_gui', 'hasPyQt5'):
+        globals()['gui'] = _selectGui()
+        return globals()[name]
+    raise AttributeError('module %s has no attribute %s'%(__name__, name))
@@ -3,7 +3,12 @@ ChiantiPy - CHIANTI Python package Calculates various aspects of emission lines
 and continua from the CHIANTI atomic database for astrophysical spectroscopy.
 """
 
+import logging
+
 from . import  version
 __version_info__ = version.__version_info__
 __version__ = version.__version__
-print(' ChiantiPy version %s '%(__version__))
+
+# messages of ChiantiPy are only shown if the application configures logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+logging.getLogger(__name__).info(' ChiantiPy version %s '%(__version__))
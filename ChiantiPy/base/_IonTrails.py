@@ -7,7 +7,6 @@ import time
 import sys
 import numpy as np
 
-import matplotlib.pyplot as plt
 import ChiantiPy.tools.util as util
 import ChiantiPy.Gui as chGui
 import ChiantiPy.tools.data as chdata
@@ -60,8 +59,10 @@ class ionTrails(object):
         if pDensity is not None:
             if pDensity is 'default' and eDensity is not None:
                 self.PDensity = self.ProtonDensityRatio*self.EDensity
+                self.PDensityDefault = True
             else:
                 self.PDensity = np.atleast_1d(pDensity)
+                self.PDensityDefault = False
                 if self.PDensity.size < self.Ndens:
                     np.tile(self.PDensity, self.Ndens)
                     self.NpDens = self.NpDens.size
@@ -315,6 +316,7 @@ class ionTrails(object):
         em:  emission measure
             if an Intensity attribute needs be created, then the emission measure is applied
         """
+        import matplotlib.pyplot as plt
         if hasattr(self, 'Spectroscopic'):
             title = self.Spectroscopic
         else:
@@ -435,6 +437,7 @@ class ionTrails(object):
         top : `int`
             specifies to plot only the top strongest lines, default = 10
         """
+        import matplotlib.pyplot as plt
 
         if not hasattr(self, 'Intensity'):
             try:
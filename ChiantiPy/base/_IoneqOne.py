@@ -1,11 +1,12 @@
 import numpy as np
 import ChiantiPy.tools.io as io
-from scipy.interpolate import splev, splrep
+from ._UniqueTemperature import uniqueTemperature
 
 class ioneqOne(object):
     """
     Base class for `ChiantiPy.core.ion` and `ChiantiPy.core.continuum`
     """
+    @uniqueTemperature({'IoneqOne':None})
     def ioneqOne(self):
         '''
         Provide the ionization equilibrium for the selected ion as a function of temperature.
@@ -35,14 +36,13 @@ class ioneqOne(object):
         goodt1 = self.Temperature >= ioneqTemperature[gioneq].min()
         goodt2 = self.Temperature <= ioneqTemperature[gioneq].max()
         goodt = np.logical_and(goodt1,goodt2)
-        y2 = splrep(np.log(ioneqTemperature[gioneq]),np.log(thisIoneq[gioneq]),s=0)
         #
         if goodt.sum() > 0:
             if self.Temperature.size > 1:
-                gIoneq = splev(np.log(self.Temperature[goodt]),y2)   #,der=0)
+                gIoneq = io.ioneqInterp(ioneqAll, Z, stage + Dielectronic, self.Temperature[goodt])
                 ioneqOne[goodt] = np.exp(gIoneq)
             else:
-                gIoneq = splev(np.log(self.Temperature),y2)
+                gIoneq = io.ioneqInterp(ioneqAll, Z, stage + Dielectronic, self.Temperature)
                 ioneqOne = np.exp(gIoneq)*np.ones(self.NTempDens, np.float64)
             self.IoneqOne = ioneqOne
         else:
@@ -5,7 +5,6 @@ Base class used in several ChiantiPy objects
 from datetime import datetime
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 import ChiantiPy.tools.filters as chfilters
 import ChiantiPy.tools.util as util
@@ -266,6 +265,7 @@ class specTrails(object):
         '''
         to plot the spectrum as a function of wavelength
         '''
+        import matplotlib.pyplot as plt
         plt.figure()
         mask = self.Em > 1.
         if mask.sum() == 0:
@@ -316,6 +316,7 @@ class specTrails(object):
         '''
         to plot the line spectrum as a function of wavelength
         '''
+        import matplotlib.pyplot as plt
         #
         #
         plt.figure()
@@ -0,0 +1,84 @@
+import functools
+
+import numpy as np
+
+
+def _expand(value, nunique, inverse, axis):
+    """
+    Expand the temperature axis of an array of results from the unique temperatures back to all
+    of them, other values are returned as they are.
+    """
+    if isinstance(value, np.ndarray) and value.ndim and value.shape[axis] == nunique:
+        return np.take(value, inverse, axis=axis)
+    return value
+
+
+def uniqueTemperature(results=None, axis=-1):
+    """
+    Decorator for the methods of `ChiantiPy.core.ion` and `ChiantiPy.core.continuum` that depend
+    only on the temperature.
+
+    When self.Temperature repeats values, as after `ionTrails.argCheck` has tiled a single
+    temperature to the size of the densities, the method is run on the unique temperatures only
+    and the arrays of its results are expanded back to all of the temperatures with the inverse
+    index of `numpy.unique`.
+
+    Parameters
+    ----------
+    results : `dict`
+        the attributes set by the method, the value of each is None for an array or the keys of the
+        arrays to expand for a dict.  Only the attributes and keys that the method has set are
+        expanded, as well as the array returned by the method
+    axis : `int`
+        the temperature axis of the arrays
+    """
+    if results is None:
+        results = {}
+
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            temperature = getattr(self, 'Temperature', None)
+            if temperature is None or np.size(temperature) < 2:
+                return method(self, *args, **kwargs)
+            unique, inverse = np.unique(temperature, return_inverse=True)
+            if unique.size == np.size(temperature):
+                return method(self, *args, **kwargs)
+            if unique.size == 1:
+                # several methods return results of another shape for a single temperature
+                unique = np.tile(unique, 2)
+            inverse = inverse.ravel()
+            before = {}
+            for name in results:
+                value = getattr(self, name, None)
+                before[name] = (value, dict(value) if isinstance(value, dict) else None)
+            saved = {}
+            for akey in ['Temperature', 'Ntemp', 'NTempDens']:
+                if akey in self.__dict__:
+                    saved[akey] = self.__dict__[akey]
+            self.Temperature = unique
+            self.Ntemp = unique.size
+            self.NTempDens = unique.size
+            try:
+                value = method(self, *args, **kwargs)
+            finally:
+                for akey in ['Temperature', 'Ntemp', 'NTempDens']:
+                    if akey in saved:
+                        setattr(self, akey, saved[akey])
+                    else:
+                        delattr(self, akey)
+            for name, keys in results.items():
+                result = getattr(self, name, None)
+                old, oldItems = before[name]
+                if isinstance(result, dict):
+                    for akey in keys:
+                        if akey not in result:
+                            continue
+                        if result is old and akey in oldItems and result[akey] is oldItems[akey]:
+                            continue
+                        result[akey] = _expand(result[akey], unique.size, inverse, axis)
+                elif result is not old:
+                    setattr(self, name, _expand(result, unique.size, inverse, axis))
+            return _expand(value, unique.size, inverse, axis)
+        return wrapper
+    return decorate
@@ -2,6 +2,7 @@
 Base classes for ion- and spectrum-related objects.
 """
 
+from ._UniqueTemperature import uniqueTemperature
 from ._IonTrails import ionTrails
 from ._SpecTrails import specTrails
 from ._IoneqOne import ioneqOne
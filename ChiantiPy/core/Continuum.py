@@ -1,17 +1,17 @@
 """
 Continuum module
 """
-import os
-
 import numpy as np
 from scipy.interpolate import splev, splrep
 from scipy.ndimage import map_coordinates
 
 from .Ioneq import ioneq
 from ChiantiPy.base import ionTrails
+from ChiantiPy.base import uniqueTemperature
 import ChiantiPy.tools.data as chdata
 import ChiantiPy.tools.util as util
 import ChiantiPy.tools.io as io
+import ChiantiPy.tools.store as chstore
 import ChiantiPy.tools.constants as const
 import ChiantiPy.Gui as chGui
 
@@ -120,12 +120,10 @@ class continuum(ionTrails):
 
         """
         # interpolate wavelength-averaged K&L gaunt factors
-        gf_kl_info = io.gffintRead()
         gamma_squared = self.ionization_potential/const.boltzmann/self.Temperature
         for i, atemp in enumerate(self.Temperature):
             print('%s T:  %10.2e gamma_squared  %10.2e'%(self.IonStr, atemp, gamma_squared[i]))
-        gaunt_factor = splev(np.log(gamma_squared),
-                             splrep(gf_kl_info['g2'],gf_kl_info['gffint']), ext=3)
+        gaunt_factor = splev(np.log(gamma_squared), chdata.GffIntSpline, ext=3)
         # calculate numerical constant
         prefactor = (4.*(const.fine**3)*(const.planck**2)/3./(np.pi**2)/const.emass
                      * np.sqrt(2.*np.pi*const.boltzmann/3./const.emass))
@@ -214,12 +212,10 @@ class continuum(ionTrails):
 
         """
         # interpolate wavelength-averaged K&L gaunt factors
-        gf_kl_info = io.gffintRead()
         gamma_squared = self.IprErg/const.boltzmann/self.Temperature
 #        for i, atemp in enumerate(self.Temperature):
 #            print('%s T:  %10.2e gamma_squared  %10.2e'%(self.IonStr, atemp, gamma_squared[i]))
-        gaunt_factor = splev(np.log(gamma_squared),
-                             splrep(gf_kl_info['g2'],gf_kl_info['gffint']), ext=3)
+        gaunt_factor = splev(np.log(gamma_squared), chdata.GffIntSpline, ext=3)
         # calculate numerical constant
         prefactor = (4.*(const.fine**3)*(const.planck**2)/3./(np.pi**2)/const.emass
                      * np.sqrt(2.*np.pi*const.boltzmann/3./const.emass))
@@ -229,6 +225,7 @@ class continuum(ionTrails):
         self.FreeFreeLoss = {'rate':prefactor*(self.Z**2)*np.sqrt(self.Temperature)*gaunt_factor}
 
 
+    @uniqueTemperature({}, axis=0)
     def itoh_gaunt_factor(self, wavelength):
         """
         Calculates the free-free gaunt factors of [104]_.
@@ -258,7 +255,7 @@ class continuum(ionTrails):
         upper_u = 1./2.5*(np.log10(lower_u) + 1.5)
         t = 1./1.25*(np.log10(self.Temperature) - 7.25)
         # read in Itoh coefficients
-        itoh_coefficients = io.itohRead()['itohCoef'][self.Z - 1].reshape(11,11)
+        itoh_coefficients = chdata.Itoh['itohCoef'][self.Z - 1].reshape(11,11)
         # calculate Gaunt factor
         gf = np.zeros(upper_u.shape)
         for j in range(11):
@@ -271,6 +268,7 @@ class continuum(ionTrails):
 
         return gf
 
+    @uniqueTemperature({}, axis=0)
     def sutherland_gaunt_factor(self, wavelength):
         """
         Calculates the free-free gaunt factor calculations of [101]_.
@@ -288,7 +286,7 @@ class continuum(ionTrails):
         i_lower_u = (np.log10(lower_u) + 4.)*10.
         i_gamma_squared = (np.log10(gamma_squared) + 4.)*5.
         # read in sutherland data
-        gf_sutherland_data = io.gffRead()
+        gf_sutherland_data = chdata.Gff
         # interpolate data to scaled quantities
         gf_sutherland = map_coordinates(gf_sutherland_data['gff'],
                                         [i_gamma_squared.flatten(), i_lower_u.flatten()]).reshape(lower_u.shape)
@@ -433,7 +431,7 @@ class continuum(ionTrails):
             fblvl = self.Fblvl
         else:
             fblvlname = nameDict['filename']+'.fblvl'
-            if os.path.isfile(fblvlname):
+            if chstore.isfile(fblvlname):
                 self.Fblvl = io.fblvlRead(self.IonStr)
                 fblvl = self.Fblvl
             elif self.Stage == self.Z+1:
@@ -447,7 +445,7 @@ class continuum(ionTrails):
             rFblvl = self.rFblvl
         else:
             rfblvlname = lowerDict['filename']+'.fblvl'
-            if os.path.isfile(rfblvlname):
+            if chstore.isfile(rfblvlname):
                 self.rFblvl = io.fblvlRead(nameDict['lower'])
                 rFblvl = self.rFblvl
             else:
@@ -479,7 +477,7 @@ class continuum(ionTrails):
         if hasattr(self, 'Klgfb'):
             klgfb = self.Klgfb
         else:
-            self.Klgfb = io.klgfbRead()
+            self.Klgfb = chdata.Klgfb
             klgfb = self.Klgfb
         #
         nTemp = temperature.size
@@ -499,8 +497,7 @@ class continuum(ionTrails):
                 hnuEv = 1.5*const.boltzmann*temperature/const.ev2Erg
                 iprLvlEv = self.Ipr - const.invCm2Ev*ecm[ilvl]
                 scaledE = np.log(hnuEv/iprLvlEv)
-                thisGf = klgfb['klgfb'][pqn[ilvl]-1, l[ilvl]]
-                spl = splrep(klgfb['pe'], thisGf)
+                spl = chdata.KlgfbSpline[pqn[ilvl], l[ilvl]]
                 gf = np.exp(splev(scaledE, spl))
                 ratg[ilvl] = float(multr[ilvl])/float(mult[0]) # ratio of statistical weights
                 iprLvlErg = const.ev2Erg*iprLvlEv
@@ -687,7 +684,7 @@ class continuum(ionTrails):
             fblvl = self.Fblvl
         else:
             fblvlname = self.nameDict['filename']+'.fblvl'
-            if os.path.isfile(fblvlname):
+            if chstore.isfile(fblvlname):
                 self.Fblvl = io.fblvlRead(self.IonStr)
                 fblvl = self.Fblvl
             # in case there is no fblvl file
@@ -703,7 +700,7 @@ class continuum(ionTrails):
             lower = self.nameDict['lower']
             lowerDict = util.convertName(lower)
             fblvlname = lowerDict['filename'] +'.fblvl'
-            if os.path.isfile(fblvlname):
+            if chstore.isfile(fblvlname):
                 self.rFblvl = io.fblvlRead(lower)
                 rfblvl = self.rFblvl
             else:
@@ -734,7 +731,7 @@ class continuum(ionTrails):
         if hasattr(self,'Klgfb'):
             klgfb = self.Klgfb
         else:
-            self.Klgfb = io.klgfbRead()
+            self.Klgfb = chdata.Klgfb
             klgfb = self.Klgfb
         #
         nWvl = wvl.size
@@ -769,8 +766,7 @@ class continuum(ionTrails):
             iprLvlEv = self.Ipr - const.invCm2Ev*ecm[ilvl]
             iprLvlErg = const.ev2Erg*iprLvlEv
             scaledE = np.log(const.ev2Ang/(iprLvlEv*wvl))
-            thisGf = klgfb['klgfb'][pqn[ilvl]-1, l[ilvl]]
-            spl = splrep(klgfb['pe'], thisGf)
+            spl = chdata.KlgfbSpline[pqn[ilvl], l[ilvl]]
             gf = np.exp(splev(scaledE, spl))
             ratg[ilvl] = float(multr[ilvl])/float(mult[0]) # ratio of statistical weights
         #
@@ -824,7 +820,7 @@ class continuum(ionTrails):
             fblvl = self.Fblvl
         else:
             fblvlname = self.nameDict['filename']+'.fblvl'
-            if os.path.isfile(fblvlname):
+            if chstore.isfile(fblvlname):
                 self.Fblvl = io.fblvlRead(self.IonStr)
                 fblvl = self.Fblvl
             # in case there is no fblvl file
@@ -840,7 +836,7 @@ class continuum(ionTrails):
             lower = self.nameDict['lower']
             lowerDict = util.convertName(lower)
             fblvlname = lowerDict['filename'] +'.fblvl'
-            if os.path.isfile(fblvlname):
+            if chstore.isfile(fblvlname):
                 self.rFblvl = io.fblvlRead(lower)
                 rfblvl = self.rFblvl
             else:
@@ -868,7 +864,7 @@ class continuum(ionTrails):
         if hasattr(self,'Klgfb'):
             klgfb = self.Klgfb
         else:
-            self.Klgfb = io.klgfbRead()
+            self.Klgfb = chdata.Klgfb
             klgfb = self.Klgfb
         #
         nWvl = wvl.size
@@ -904,8 +900,7 @@ class continuum(ionTrails):
                 iprLvlEv = self.Ipr - const.invCm2Ev*ecm[ilvl]
                 iprLvlErg = const.ev2Erg*iprLvlEv
                 scaledE = np.log(const.ev2Ang/(iprLvlEv*wvl))
-                thisGf = klgfb['klgfb'][pqn[ilvl]-1, l[ilvl]]
-                spl = splrep(klgfb['pe'], thisGf)
+                spl = chdata.KlgfbSpline[pqn[ilvl], l[ilvl]]
                 gf = np.exp(splev(scaledE, spl))
                 ratg[ilvl] = float(multr[ilvl])/float(mult[0]) # ratio of statistical weights
             #
@@ -948,8 +943,7 @@ class continuum(ionTrails):
                 iprLvlCm = (iprcm - ecm[ilvl])
                 # scaled energy is relative to the ionization potential of each individual level
                 scaledE = np.log(const.ev2Ang/(iprLvlEv*wvl))
-                thisGf = klgfb['klgfb'][pqn[ilvl]-1, l[ilvl]]
-                spl = splrep(klgfb['pe'], thisGf)
+                spl = chdata.KlgfbSpline[pqn[ilvl], l[ilvl]]
                 gf = np.exp(splev(scaledE, spl))
                 mask[ilvl] = 1.e+8/wvl < iprLvlCm
                 ratg[ilvl] = float(multr[ilvl])/float(mult[0]) # ratio of statistical weights
@@ -984,7 +978,7 @@ class continuum(ionTrails):
 
         """
         # read verner data
-        verner_info = io.vernerRead()
+        verner_info = chdata.Verner
         eth = verner_info['eth'][self.Z,self.Stage-1]   #*const.ev2Erg
         yw = verner_info['yw'][self.Z,self.Stage-1]
         ya = verner_info['ya'][self.Z,self.Stage-1]
@@ -1033,10 +1027,10 @@ class continuum(ionTrails):
         # numerical constant, in Mbarn
         kl_constant = 1.077294e-1*8065.54e3
         # read in KL gaunt factor data
-        karzas_info = io.klgfbRead()
+        karzas_info = chdata.Klgfb
         if n <= karzas_info['klgfb'].shape[0]:
             scaled_energy = np.log10(photon_energy/ionization_potential)
-            f_gf = splrep(karzas_info['pe'], karzas_info['klgfb'][n-1,l,:])
+            f_gf = chdata.KlgfbSpline[n, l]
             gaunt_factor = np.exp(splev(scaled_energy, f_gf))
         else:
             gaunt_factor = 1.
@@ -1056,18 +1050,15 @@ class continuum(ionTrails):
 
         Interpolates free-bound gaunt factor of Karzas and Latter, (1961, Astrophysical Journal
         Supplement Series, 6, 167) as a function of wavelength (wvl).'''
-        try:
-            klgfb = self.Klgfb
-        except:
-            self.Klgfb = util.klgfbRead()
-            klgfb = self.Klgfb
+        if not hasattr(self, 'Klgfb'):
+            self.Klgfb = chdata.Klgfb
         # get log of photon energy relative to the ionization potential
         sclE = np.log(self.Ip/(wvl*const.ev2ang))
-        thisGf = klgfb['klgfb'][n-1, l]
-        spl = splrep(klgfb['pe'], thisGf)
+        spl = chdata.KlgfbSpline[n, l]
         gf = splev(sclE, spl)
         return gf
 
+    @uniqueTemperature({'IoneqOne':None})
     def ioneqOne(self):
         '''
         Provide the ionization equilibrium for the selected ion as a function of temperature.
@@ -1097,14 +1088,13 @@ class continuum(ionTrails):
         goodt1 = self.Temperature >= ioneqTemperature[gioneq].min()
         goodt2 = self.Temperature <= ioneqTemperature[gioneq].max()
         goodt = np.logical_and(goodt1,goodt2)
-        y2 = splrep(np.log(ioneqTemperature[gioneq]),np.log(thisIoneq[gioneq]),s=0)
         #
         if goodt.sum() > 0:
             if self.Temperature.size > 1:
-                gIoneq = splev(np.log(self.Temperature[goodt]),y2)   #,der=0)
+                gIoneq = io.ioneqInterp(ioneqAll, Z, stage, self.Temperature[goodt])
                 ioneqOne[goodt] = np.exp(gIoneq)
             else:
-                gIoneq = splev(np.log(self.Temperature),y2)
+                gIoneq = io.ioneqInterp(ioneqAll, Z, stage, self.Temperature)
                 ioneqOne = np.exp(gIoneq)
                 ioneqOne = np.atleast_1d(ioneqOne)
             self.IoneqOne = ioneqOne
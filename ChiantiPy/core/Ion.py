@@ -8,17 +8,19 @@ import time
 import numpy as np
 from scipy.interpolate import splev, splrep
 
-import matplotlib.pyplot as plt
 
 import ChiantiPy.tools.filters as chfilters
 import ChiantiPy.tools.util as util
 import ChiantiPy.tools.io as io
+import ChiantiPy.tools.store as chstore
 import ChiantiPy.tools.constants as const
 import ChiantiPy.tools.data as chdata
 import ChiantiPy.Gui as chGui
 from ChiantiPy.base import ionTrails
 from ChiantiPy.base import specTrails
 from ChiantiPy.base import ioneqOne
+from ChiantiPy.base import uniqueTemperature
+from .RateOperator import rateOperator
 
 heseqLvl2 = [-1,3,-1,-1,-1,5,6,6,-1,6,6,6,5,5,3,5,3,5,3,5,-1,-1,-1,-1,-1,4,-1,4,-1,4]
 # for populate and drPopulate to include populated lower levels for ionization
@@ -54,6 +56,12 @@ class ion(ioneqOne, ionTrails, specTrails):
         (:math:`\mathrm{\int \, n_e \, n_H \, dl}`)
         (:math:`\mathrm{cm}^{-5}`.), for the volumetric emission measure
         :math:`\mathrm{\int \, n_e \, n_H \, dV}` (:math:`\mathrm{cm^{-3}}`).
+    meanIntensity : callable or `dict`, optional
+        Mean intensity of a radiation field (:math:`\mathrm{erg\,cm^{-2}\,s^{-1}\,str^{-1}\,\AA^{-1}}`)
+        for photoexcitation and stimulated emission, used instead of radTemperature and rStar.
+        A function of the wavelength in Angstroms, e.g. the meanIntensity of a
+        `ChiantiPy.tools.sources.blackStar`, or a dict of 'wvl' and 'intensity', see
+        `ChiantiPy.tools.util.pumpingFactors`
 
     Attributes
     ----------
@@ -104,7 +112,7 @@ class ion(ioneqOne, ionTrails, specTrails):
 
     def __init__(self, ionStr, temperature=None, eDensity=None,
                 pDensity='default', radTemperature=None, rStar=None,
-                abundance=None, setup=True, em=None, verbose=0, hdf5=False):
+                abundance=None, setup=True, em=None, verbose=0, hdf5=False, meanIntensity=None):
 
         self.IonStr = ionStr
         _tmp_convert_name = util.convertName(ionStr)
@@ -136,6 +144,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         self.IoneqName = self.Defaults['ioneqfile']
         self.RadTemperature = radTemperature
         self.RStar = rStar
+        self.MeanIntensity = meanIntensity
 
         #  ip in eV, but don't read for bare ions
         if self.Ion <= self.Z:
@@ -179,6 +188,9 @@ class ion(ioneqOne, ionTrails, specTrails):
             directory cotaining the necessary files for a ChiantiPy ion; use to
             setup an ion with files not in the current CHIANTI directory
         verbose : `bool`
+        hdf5 : `bool`
+            take the data from the consolidated HDF5 store of the database,
+            see `ChiantiPy.tools.store`
 
         Notes
         -----
@@ -186,93 +198,101 @@ class ion(ioneqOne, ionTrails, specTrails):
         If ion is initiated with `setup=False`, call this method to do the
         setup at a later point.
         """
-        if alternate_dir is not None:
-            fileName = os.path.join(alternate_dir, self.IonStr)
-            elvlcFileName = fileName+'.elvlc'
-            wgfaFileName = fileName+'.wgfa'
-        else:
-            fileName = util.ion2filename(self.IonStr)
-            elvlcFileName = None
-            wgfaFileName = None
-        if alternate_dir:
-            self.Elvlc = io.elvlcRead('',filename=elvlcFileName)
-            if not hdf5:
-                self.Wgfa = io.wgfaRead('',filename=wgfaFileName, elvlcname = elvlcFileName, total=True)
+        # with hdf5, the files are taken from the consolidated store of the database if there is one
+        with chstore.activeStore(active=hdf5):
+            if alternate_dir is not None:
+                fileName = os.path.join(alternate_dir, self.IonStr)
+                elvlcFileName = fileName+'.elvlc'
+                wgfaFileName = fileName+'.wgfa'
             else:
-                self.Wgfa = io.hdf5Read('',filename=wgfaFileName.replace('.wgfa','.h5'), elvlcname = elvlcFileName, total=True)
-        else:
-            self.Elvlc = io.elvlcRead(self.IonStr)
-            if not hdf5:
-                self.Wgfa = io.wgfaRead(self.IonStr, total=True)
+                fileName = util.ion2filename(self.IonStr)
+                elvlcFileName = None
+                wgfaFileName = None
+            if alternate_dir:
+                self.Elvlc = io.elvlcRead('',filename=elvlcFileName)
+                if not hdf5:
+                    self.Wgfa = io.wgfaRead('',filename=wgfaFileName, elvlcname = elvlcFileName, total=True)
+                else:
+                    self.Wgfa = io.hdf5Read('',filename=wgfaFileName.replace('.wgfa','.h5'), elvlcname = elvlcFileName, total=True)
             else:
-                self.Wgfa = io.hdf5Read(self.IonStr, total=True)
-                #'',filename=wgfaFileName.replace('.wgfa','.h5'), elvlcname = elvlcFileName, total=True)
+                self.Elvlc = io.elvlcRead(self.IonStr)
+                if not hdf5:
+                    self.Wgfa = io.wgfaRead(self.IonStr, total=True)
+                else:
+                    self.Wgfa = io.hdf5Read(self.IonStr, total=True)
+                    #'',filename=wgfaFileName.replace('.wgfa','.h5'), elvlcname = elvlcFileName, total=True)
                 
-        self.Nlvls = len(self.Elvlc['lvl'])
-        self.Nwgfa = len(self.Wgfa['lvl1'])
-        nlvlWgfa = max(self.Wgfa['lvl2'])
-        nlvlList = [nlvlWgfa]
-        scupsfile = fileName + '.scups'
-#        cilvlfile = fileName + '.cilvl'
-#        reclvlfile = fileName + '.reclvl'
-        rrlvlfile = fileName + '.rrlvl'
-        autofile = fileName + '.auto'
-        drParamsFile = fileName + '.drparams'
-        rrParamsFile = fileName + '.rrparams'
-        # read the scups/splups file
-        if os.path.isfile(scupsfile):
-            # happens the case of fe_3 and prob. a few others
-            self.Scups = io.scupsRead(self.IonStr)
-            self.Nscups = len(self.Scups['lvl1'])
-            nlvlScups = max(self.Scups['lvl2'])
-            nlvlList.append(nlvlScups)
-        else:
-            self.Nscups = 0
-            nlvlScups = 0
-        # ignoring these files for now, will just use rrlvl and auto for
-        # calculation level resolved recombination rates
-        # read cilvl file
-        self.Ncilvl = 0
-        #  .reclvl file may not exist
-        self.Nreclvl = 0
-#        if os.path.isfile(reclvlfile):
-#            self.Reclvl = io.cireclvlRead(self.IonStr, filetype='reclvl')
-#            self.Nreclvl = len(self.Reclvl['lvl1'])
-#            nReclvl = max(self.Reclvl['lvl2'])
-#            nlvlList.append(nReclvl)
-#        else:
-#            self.Nreclvl = 0
-        if os.path.isfile(rrlvlfile):
-            self.Rrlvl = io.cireclvlRead(self.IonStr, filetype='rrlvl')
-            self.Nrrlvl = len(self.Rrlvl['lvl1'])
-            nRrlvl = max(self.Rrlvl['lvl2'])
-            self.Nrrlvl = nRrlvl
-            nlvlList.append(nRrlvl)
-        else:
-            self.Nrrlvl = 0
-        #  psplups file may not exist
-        psplupsfile = fileName +'.psplups'
-        if os.path.isfile(psplupsfile):
-            self.Psplups = io.splupsRead(self.IonStr, filetype='psplups')
-            self.Npsplups = len(self.Psplups["lvl1"])
-        else:
-            self.Npsplups = 0
-        # drparams file may not exist
-        if os.path.isfile(drParamsFile):
-            self.DrParams = io.drRead(self.IonStr)
-        if os.path.isfile(rrParamsFile):
-            self.RrParams = io.rrRead(self.IonStr)
-
-        #  .auto file may not exist
-        if os.path.isfile(autofile):
-            self.Auto = io.autoRead(self.IonStr, total=True)
-            self.Nauto = len(self.Auto['lvl1'])
-        else:
-            self.Nauto = 0
-        # need to determine the number of levels that can be populated
-        nlvlElvlc = len(self.Elvlc['lvl'])
-        #  elvlc file can have more levels than the rate level files
-        self.Nlvls = min([nlvlElvlc, max(nlvlList)])
+            self.Nlvls = len(self.Elvlc['lvl'])
+            self.Nwgfa = len(self.Wgfa['lvl1'])
+            nlvlWgfa = max(self.Wgfa['lvl2'])
+            nlvlList = [nlvlWgfa]
+            scupsfile = fileName + '.scups'
+    #        cilvlfile = fileName + '.cilvl'
+    #        reclvlfile = fileName + '.reclvl'
+            rrlvlfile = fileName + '.rrlvl'
+            autofile = fileName + '.auto'
+            drParamsFile = fileName + '.drparams'
+            rrParamsFile = fileName + '.rrparams'
+            # read the scups/splups file
+            if chstore.isfile(scupsfile):
+                # happens the case of fe_3 and prob. a few others
+                self.Scups = io.scupsRead(self.IonStr)
+                self.Nscups = len(self.Scups['lvl1'])
+                nlvlScups = max(self.Scups['lvl2'])
+                nlvlList.append(nlvlScups)
+            else:
+                self.Nscups = 0
+                nlvlScups = 0
+            # ignoring these files for now, will just use rrlvl and auto for
+            # calculation level resolved recombination rates
+            # read cilvl file
+            self.Ncilvl = 0
+            #  .reclvl file may not exist
+            self.Nreclvl = 0
+    #        if os.path.isfile(reclvlfile):
+    #            self.Reclvl = io.cireclvlRead(self.IonStr, filetype='reclvl')
+    #            self.Nreclvl = len(self.Reclvl['lvl1'])
+    #            nReclvl = max(self.Reclvl['lvl2'])
+    #            nlvlList.append(nReclvl)
+    #        else:
+    #            self.Nreclvl = 0
+            if chstore.isfile(rrlvlfile):
+                self.Rrlvl = io.cireclvlRead(self.IonStr, filetype='rrlvl')
+                self.Nrrlvl = len(self.Rrlvl['lvl1'])
+                nRrlvl = max(self.Rrlvl['lvl2'])
+                self.Nrrlvl = nRrlvl
+                nlvlList.append(nRrlvl)
+            else:
+                self.Nrrlvl = 0
+            #  psplups file may not exist
+            psplupsfile = fileName +'.psplups'
+            if chstore.isfile(psplupsfile):
+                self.Psplups = io.splupsRead(self.IonStr, filetype='psplups')
+                self.Npsplups = len(self.Psplups["lvl1"])
+            else:
+                self.Npsplups = 0
+            # drparams file may not exist
+            if chstore.isfile(drParamsFile):
+                self.DrParams = io.drRead(self.IonStr)
+            if chstore.isfile(rrParamsFile):
+                self.RrParams = io.rrRead(self.IonStr)
+
+            #  .auto file may not exist
+            if chstore.isfile(autofile):
+                self.Auto = io.autoRead(self.IonStr, total=True)
+                self.Nauto = len(self.Auto['lvl1'])
+            else:
+                self.Nauto = 0
+            # need to determine the number of levels that can be populated
+            nlvlElvlc = len(self.Elvlc['lvl'])
+            #  elvlc file can have more levels than the rate level files
+            self.Nlvls = min([nlvlElvlc, max(nlvlList)])
+            # the level indices, counting from 0, of the transitions, for assembling the rate matrix
+            self.LevelIdx = {}
+            for akey, info in [('wgfa', self.Wgfa), ('scups', getattr(self, 'Scups', None)), ('psplups', getattr(self, 'Psplups', None)),
+                    ('auto', getattr(self, 'Auto', None)), ('rrlvl', getattr(self, 'Rrlvl', None))]:
+                if info is not None:
+                    self.LevelIdx[akey] = (np.asarray(info['lvl1'], np.int64) - 1, np.asarray(info['lvl2'], np.int64) - 1)
 
     def setupIonrec(self, alternate_dir=None, verbose=False):
         """
@@ -290,7 +310,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         else:
             fileName = util.ion2filename(self.IonStr)
         elvlcname = fileName+'.elvlc'
-        if os.path.isfile(elvlcname):
+        if chstore.isfile(elvlcname):
             self.Elvlc = io.elvlcRead('',elvlcname)
         else:
             zstuff = util.convertName(self.IonStr)
@@ -300,7 +320,7 @@ class ion(ioneqOne, ionTrails, specTrails):
                     print(' Elvlc file missing for '+self.IonStr)
             return
         cilvlFile = fileName +'.cilvl'
-        if os.path.isfile(cilvlFile):
+        if chstore.isfile(cilvlFile):
             self.Cilvl = io.cireclvlRead('',filename = fileName,
                                             filetype = 'cilvl')
             self.Ncilvl = len(self.Cilvl['lvl1'])
@@ -308,18 +328,18 @@ class ion(ioneqOne, ionTrails, specTrails):
             self.Ncilvl = 0
         #  .reclvl file may not exist
         reclvlfile = fileName +'.reclvl'
-        if os.path.isfile(reclvlfile):
+        if chstore.isfile(reclvlfile):
             self.Reclvl = io.cireclvlRead('',filename=fileName, filetype='reclvl')
             self.Nreclvl = len(self.Reclvl['lvl1'])
         else:
             self.Nreclvl = 0
 
         drparamsFile = fileName +'.drparams'
-        if os.path.isfile(drparamsFile):
+        if chstore.isfile(drparamsFile):
             self.DrParams = io.drRead(self.IonStr)
 
         rrparamsFile = fileName +'.rrparams'
-        if os.path.isfile(rrparamsFile):
+        if chstore.isfile(rrparamsFile):
             self.RrParams = io.rrRead(self.IonStr)
 
     def diCross(self, energy=None, verbose=False):
@@ -331,7 +351,8 @@ class ion(ioneqOne, ionTrails, specTrails):
         ----------
 
         energy:  array-like
-            incident electron energy in eV
+            incident electron energy in eV, of any shape, such as the (ntemp, ngl) energies
+            of the Gauss-Laguerre quadrature of `diRate`
 
         verbose:  bool, int
             with verbose set to True, printing is enabled
@@ -341,7 +362,7 @@ class ion(ioneqOne, ionTrails, specTrails):
 
             DiCross:  dict
 
-                keys:  energy, cross
+                keys:  energy, cross, cross has the shape of energy
         """
         iso = self.Z - self.Ion + 1
         if energy is None:
@@ -386,33 +407,36 @@ class ion(ioneqOne, ionTrails, specTrails):
         else:
             if not hasattr(self, 'DiParams'):
                 self.DiParams = io.diRead(self.IonStr)
-            cross = np.zeros(len(energy), np.float64)
-            for ifac in range(self.DiParams['info']['nfac']):
-                # prob. better to do this with masked arrays
-                goode = energy > self.DiParams['ev1'][ifac]
-                if goode.sum() > 0:
-                    dum = np.ones(len(energy))
-                    btenergy, btdum = util.scale_bti(energy[goode],dum[goode],
-                        self.DiParams['btf'][ifac], self.DiParams['ev1'][ifac])
-                    # these interpolations were made with the scipy routine
-                    # used here
-                    y2 = splrep(self.DiParams['xsplom'][ifac],
-                        self.DiParams['ysplom'][ifac], s=0)
-                    btcross = splev(btenergy, y2, der=0)
-                    energy1, cross1 = util.descale_bti(btenergy,
-                                        btcross,self.DiParams['btf'][ifac],
-                                        self.DiParams['ev1'][ifac] )
-                    offset = len(energy)-goode.sum()
-                    if verbose:
-                        plt.plot(self.DiParams['xsplom'][ifac],
-                                    self.DiParams['ysplom'][ifac])
-                        plt.plot(btenergy, btcross)
-                    if offset > 0:
-                        seq = [np.zeros(offset, np.float64), cross1]
-                        cross1 = np.hstack(seq)
-                    cross += cross1*1.e-14
+            nfac = self.DiParams['info']['nfac']
+            # the splines are fitted by diRead
+            if 'ysplomSecond' in self.DiParams:
+                second = self.DiParams['ysplomSecond']
+            else:
+                second = util.cubicSplineSecondRows(self.DiParams['xsplom'], self.DiParams['ysplom'],
+                    np.full(nfac, np.shape(self.DiParams['xsplom'])[1]))
+            xsplom = np.asarray(self.DiParams['xsplom'], np.float64)[:nfac]
+            ysplom = np.asarray(self.DiParams['ysplom'], np.float64)[:nfac]
+            second = np.asarray(second, np.float64)[:nfac]
+            btf = np.asarray(self.DiParams['btf'], np.float64)[:nfac, np.newaxis]
+            ev1 = np.asarray(self.DiParams['ev1'], np.float64)[:nfac, np.newaxis]
+            # all of the energies, of any shape, for all of the facs at once
+            flatEnergy = energy.ravel()[np.newaxis]
+            goode = flatEnergy > ev1
+            # the energies below the threshold of a fac are given a placeholder above it
+            btenergy, btdum = util.scale_bti(np.where(goode, flatEnergy, 2.*ev1), 1., btf, ev1)
+            # these interpolations were made with the scipy routine
+            # used here
+            btcross = util.cubicSplineEval(xsplom, ysplom, second, btenergy)
+            energy1, cross1 = util.descale_bti(btenergy, btcross, btf, ev1)
+            if verbose:
+                import matplotlib.pyplot as plt
+                for ifac in range(nfac):
+                    plt.plot(xsplom[ifac], ysplom[ifac])
+                    plt.plot(btenergy[ifac, goode[ifac]], btcross[ifac, goode[ifac]])
+            cross = (np.where(goode, cross1, 0.)*1.e-14).sum(axis=0).reshape(energy.shape)
             self.DiCross = {'energy':energy, 'cross':cross}
 
+    @uniqueTemperature({'DiRate':('rate', 'temperature')})
     def diRate(self):
         """
         Calculate the direct ionization rate coefficient as a function of temperature (K)
@@ -429,38 +453,18 @@ class ion(ioneqOne, ionTrails, specTrails):
 
         alpha = 5.287e+13
         tev = const.boltzmannEv*temperature
-
-        nTempDens = self.NTempDens
-
-        rate = np.zeros(nTempDens, np.float64)
-        tset = set(temperature)
-        if len(tset) == 1:
-            t1 = temperature[0]
-            tev1 = const.boltzmannEv*t1
-            x0 = self.Ip/tev1 # Ip in eV
-            beta = np.sqrt(const.boltzmann*t1)
-            egl = self.Ip+xgl*tev1
-            self.diCross(energy=egl)
-            crossgl = self.DiCross['cross']
-            term1 = wgl*xgl*crossgl
-            term2 = wgl*crossgl
-            newcross = alpha*beta*np.exp(-x0)*(term1.sum()+x0*term2.sum())
-            rate1 = newcross
-            for itemp in range(nTempDens):
-                rate[itemp] = rate1
-        else:
-            for itemp in range(nTempDens):
-                x0 = self.Ip/tev[itemp]  # Ip in eV
-                beta = np.sqrt(const.boltzmann*temperature[itemp])
-                egl = self.Ip+xgl*tev[itemp]
-                self.diCross(energy=egl)
-                crossgl = self.DiCross['cross']
-                term1 = wgl*xgl*crossgl
-                term2 = wgl*crossgl
-                newcross = alpha*beta*np.exp(-x0)*(term1.sum()+x0*term2.sum())
-                rate[itemp] = newcross
+        x0 = self.Ip/tev  # Ip in eV
+        beta = np.sqrt(const.boltzmann*temperature)
+        # the cross sections at the quadrature energies of all of the temperatures at once
+        egl = self.Ip + xgl[np.newaxis]*tev[:, np.newaxis]
+        self.diCross(energy=egl)
+        crossgl = np.ma.filled(self.DiCross['cross'], 0.)
+        term1 = (wgl*xgl*crossgl).sum(axis=1)
+        term2 = (wgl*crossgl).sum(axis=1)
+        rate = alpha*beta*np.exp(-x0)*(term1 + x0*term2)
         self.DiRate = {'temperature':temperature, 'rate':rate}
 
+    @uniqueTemperature({'EaParams':('ups',)})
     def eaDescale(self):
         """
         Calculates the effective collision strengths (upsilon)
@@ -481,54 +485,35 @@ class ion(ioneqOne, ionTrails, specTrails):
             return
         ntemp = temperature.size
         nsplups = len(eaparams['de'])
-        if ntemp > 1:
-            ups = np.zeros((nsplups,ntemp),np.float64)
-        else:
-            ups = np.zeros(nsplups,np.float64)
-
-        for isplups in range(0,nsplups):
-            l1 = self.EaParams["lvl1"][isplups]-1
-            l2 = self.EaParams["lvl2"][isplups]-1
-            ttype = self.EaParams["ttype"][isplups]
-            cups = self.EaParams["cups"][isplups]
-            nspl = self.EaParams["nspl"][isplups]
-            de = self.EaParams["de"][isplups]
-            dx = 1./(float(nspl)-1.)
-            splups = self.EaParams["splups"][isplups,0:nspl]
-            kte = const.boltzmannEv*temperature/(const.ryd2Ev*de)
-            if ttype == 1:
-                st = 1.-np.log(cups)/np.log(kte+cups)
-                xs = dx*np.arange(nspl)
-                y2 = splrep(xs,splups,s=0)  #allow smoothing,s=0)
-                sups = splev(st,y2,der=0)
-                ups[isplups] = sups*np.log(kte+np.exp(1.))
-            if ttype == 2:
-                st = kte/(kte+cups)
-                xs = dx*np.arange(nspl)
-                y2 = splrep(xs,splups,s=0)
-                sups = splev(st,y2,der=0)
-                ups[isplups] = sups
-            if ttype == 3:
-                st = kte/(kte+cups)
-                xs = dx*np.arange(nspl)
-                y2 = splrep(xs,splups,s = 0)
-                sups = splev(st,y2,der=0)
-                ups[isplups] = sups/(kte+1.)
-            if ttype == 4:
-                st = 1.-np.log(cups)/np.log(kte+cups)
-                xs = dx*np.arange(nspl)
-                y2 = splrep(xs,splups,s=0)
-                sups = splev(st,y2,der=0)
-                ups[isplups] = sups*np.log(kte+cups)
-            if ttype == 5:
-                st = kte/(kte+cups)
-                xs = dx*np.arange(nspl)
-                y2 = splrep(xs,splups,s=0)  #allow smoothing,s=0)
-                sups = splev(st,y2,der=0)
-                ups[isplups] = sups/(kte+0.)
-            elif ttype > 5:  print(' t_type ne 1,2,3,4,5 = %5i %5i %5i'%(ttype,l1,l2))
+        # the splines are fitted by eaRead
+        knots = io.eaKnots(eaparams)
+        if 'splupsSecond' in eaparams:
+            second = eaparams['splupsSecond']
+        else:
+            second = io.eaSecond(eaparams)
+        ttype = np.asarray(eaparams['ttype'], np.int64)
+        nspl = np.asarray(eaparams['nspl'], np.int64)
+        cups = np.asarray(eaparams['cups'], np.float64)[:, np.newaxis]
+        de = np.asarray(eaparams['de'], np.float64)[:, np.newaxis]
+        splups = np.asarray(eaparams['splups'], np.float64)
+        for isplups in np.nonzero(ttype > 5)[0]:
+            print(' t_type ne 1,2,3,4,5 = %5i %5i %5i'%(ttype[isplups], eaparams['lvl1'][isplups]-1, eaparams['lvl2'][isplups]-1))
+        # all of the transitions and temperatures at once, (nsplups, ntemp)
+        kte = const.boltzmannEv*temperature[np.newaxis]/(const.ryd2Ev*de)
+        ttype = ttype[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            st = np.where((ttype == 1) | (ttype == 4), 1.-np.log(cups)/np.log(kte+cups), kte/(kte+cups))
+            # the transitions with the same number of spline points are evaluated together
+            sups = np.zeros_like(kte)
+            for m in np.unique(nspl):
+                group = np.nonzero(nspl == m)[0]
+                sups[group] = util.cubicSplineEval(knots[group, :m], splups[group, :m], second[group, :m], st[group])
+            ups = np.select([ttype == 1, ttype == 2, ttype == 3, ttype == 4, ttype == 5],
+                [sups*np.log(kte+np.exp(1.)), sups, sups/(kte+1.), sups*np.log(kte+cups), sups/(kte+0.)], 0.)
 
         ups = np.where(ups > 0.,ups,0.)
+        if ntemp == 1:
+            ups = ups[:, 0]
         self.EaParams['ups'] = ups
         return ups
 
@@ -569,28 +554,25 @@ class ion(ioneqOne, ionTrails, specTrails):
                 easplom = self.Easplom
             if energy is None:
                 energy = self.Easplom['deryd'][0]*const.ryd2Ev*1.01*10.**(0.025*np.arange(101))
+            else:
+                energy = np.asarray(energy, np.float64)
             # multiplicity of ground level already included
             #  splomDescale takes care of when energy < threshold
             omega = util.splomDescale(easplom, energy)
             #  need to replicate neaev
             ntrans = len(easplom['deryd'])
-            eaev = self.DiParams['eaev']
-            if len(eaev) == 1:
-                for itrans in range(ntrans):
-                    eaev.append(eaev[0])
-
-            totalCross = np.zeros_like(energy)
-            ntrans = omega.shape[0]
-            partialCross = np.zeros((ntrans, energy.size), np.float64)
-            for itrans in range(ntrans):
-                #  the collision strengths have already by divided by the
-                #  statistical weight of the ground level 2j+1
-                cross = eaev[itrans]*const.bohrCross*omega[itrans]/(energy/const.ryd2Ev)
-                totalCross += cross
-                partialCross[itrans] = cross
+            eaev = np.asarray(self.DiParams['eaev'], np.float64)
+            if eaev.size == 1:
+                eaev = np.repeat(eaev, ntrans)
+            #  the collision strengths have already by divided by the
+            #  statistical weight of the ground level 2j+1
+            partialCross = eaev[:ntrans, np.newaxis]*const.bohrCross*np.reshape(omega, (ntrans, -1))/(energy.ravel()/const.ryd2Ev)
+            partialCross = partialCross.reshape((ntrans,) + energy.shape)
+            totalCross = partialCross.sum(axis=0)
             self.EaCross = {'energy':energy, 'cross':totalCross,
                             'partial':partialCross}
 
+    @uniqueTemperature({'EaRate':('rate', 'temperature', 'partial'), 'EaParams':('ups',)})
     def eaRate(self):
         """
         Calculate the excitation-autoionization rate coefficient.
@@ -614,27 +596,26 @@ class ion(ioneqOne, ionTrails, specTrails):
             if hasattr(self, 'EaParams'):
                 eaparams = self.EaParams
             else:
-                self.eaParams = io.eaRead(self.IonStr)
+                self.EaParams = io.eaRead(self.IonStr)
                 self.eaDescale()
                 eaparams = self.EaParams
             #  need to replicate neaev
             nups = len(eaparams['de'])
+            if np.size(eaparams.get('ups', [])) != nups*temperature.size:
+                # the upsilons were descaled at other temperatures
+                self.eaDescale()
             tev = const.boltzmannEv*temperature
             ntemp = temperature.size
-            partial = np.zeros((nups, ntemp), np.float64)
-            earate = np.zeros(temperature.size, np.float64)
-            eaev = self.DiParams['eaev']
-            if len(eaev) == 1:
-                for iups in range(nups):
-                    eaev.append(eaev[0])
-
-            for iups in range(nups):
-                x0 = const.ryd2Ev*eaparams['de'][iups]/tev
-                #  upsilon has already been divided by the statistical weight
-                # of the ground level 2j+1
-                earate1 = eaev[iups]*const.collision*eaparams['ups'][iups]*np.exp(-x0)/(np.sqrt(temperature))
-                partial[iups] = earate1
-                earate += earate1
+            ups = np.reshape(eaparams['ups'], (nups, ntemp))
+            eaev = np.asarray(self.DiParams['eaev'], np.float64)
+            if eaev.size == 1:
+                eaev = np.repeat(eaev, nups)
+            # all of the transitions and temperatures at once
+            x0 = const.ryd2Ev*np.asarray(eaparams['de'], np.float64)[:, np.newaxis]/tev
+            #  upsilon has already been divided by the statistical weight
+            # of the ground level 2j+1
+            partial = eaev[:nups, np.newaxis]*const.collision*ups*np.exp(-x0)/(np.sqrt(temperature))
+            earate = partial.sum(axis=0)
             self.EaRate = {'rate':earate, 'temperature':temperature, 'partial':partial}
 
     def ionizCross(self, energy=None):
@@ -663,6 +644,8 @@ class ion(ioneqOne, ionTrails, specTrails):
             ionizCross = self.DiCross['cross'] + self.EaCross['cross']
         self.IonizCross = {'cross':ionizCross, 'energy':energy}
 
+    @uniqueTemperature({'IonizRate':('rate', 'temperature'), 'DiRate':('rate', 'temperature'),
+        'EaRate':('rate', 'temperature', 'partial'), 'EaParams':('ups',)})
     def ionizRate(self):
         """
         Provides the total ionization rate.
@@ -681,6 +664,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         self.IonizRate = {'rate':ionizrate,
                         'temperature':self.DiRate['temperature']}
 
+    @uniqueTemperature({'RrRate':('rate', 'temperature')})
     def rrRate(self):
         """
         Provide the radiative recombination rate coefficient as a function of temperature (K).
@@ -694,7 +678,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         rrparamsfile = util.ion2filename(self.IonStr) + '.rrparams'
         if hasattr(self, 'RrParams'):
             rrparams = self.RrParams
-        elif os.path.isfile(rrparamsfile):
+        elif chstore.isfile(rrparamsfile):
             self.RrParams = io.rrRead(self.IonStr)
             rrparams = self.RrParams
         else:
@@ -726,6 +710,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         else:
             self.RrRate = {'temperature':temperature, 'rate':np.zeros_like(temperature)}
 
+    @uniqueTemperature({'RrlvlRate':('rate', 'temperature')})
     def rrlvlDescale(self,  verbose=1):
         """
         Interpolate and extrapolate rrlvl rates.
@@ -739,7 +724,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         lvlfile = util.ion2filename(self.IonStr)+'.rrlvl'
         if hasattr(self, 'Rrlvl'):
             lvl = self.Rrlvl
-        elif os.path.isfile(lvlfile):
+        elif chstore.isfile(lvlfile):
             self.Rrlvl = io.cireclvlRead(self.IonStr, '.'+ 'rrlvl')
             lvl = self.Rrlvl
         else:
@@ -749,19 +734,25 @@ class ion(ioneqOne, ionTrails, specTrails):
         #  the rates and temperatures in rrlvl are not necessarily all the same
         nlvl = len(lvl['lvl1'])
 
-#        rate = np.zeros(( nlvl, self.Ntemp), np.float64)
-        rate = []
-        for itrans in range(nlvl):
-#            lvl2 = lvl['lvl2'][itrans]
-            nTemp = lvl['ntemp'][itrans]
-            y2 = splrep(np.log(lvl['temperature'][itrans, :nTemp-1]), np.log(lvl['rate'][itrans, :nTemp-1]))
-            rr = np.exp(splev(np.log(self.Temperature),y2))
-            rate.append(rr)
-        rate = np.asarray(rate, np.float64)
+        # the splines, of all but the last temperature, are fitted by cireclvlRead
+        if 'rateSecond' in lvl:
+            second = lvl['rateSecond']
+        else:
+            second = io.rrlvlSecond(lvl)
+        logT = np.log(np.atleast_1d(self.Temperature))
+        ntemps = np.asarray(lvl['ntemp'])
+        rate = np.zeros((nlvl, logT.size), np.float64)
+        # the transitions with the same number of temperatures are evaluated together
+        for nTemp in np.unique(ntemps):
+            rows = np.nonzero(ntemps == nTemp)[0]
+            x = np.broadcast_to(logT, (rows.size, logT.size))
+            rate[rows] = np.exp(util.cubicSplineEval(np.log(lvl['temperature'][rows, :nTemp-1]),
+                np.log(lvl['rate'][rows, :nTemp-1]), second[rows, :nTemp-1], x))
 
 
         self.RrlvlRate = {'rate':rate, 'lvl1':lvl['lvl1'], 'lvl2':lvl['lvl2'], 'temperature':temperature, 'type':'rrlvl'}
 
+    @uniqueTemperature({'DrRate':('rate', 'temperature')})
     def drRate(self):
         """
         Provide the dielectronic recombination rate coefficient as a function of temperature (K).
@@ -775,7 +766,7 @@ class ion(ioneqOne, ionTrails, specTrails):
 
         if hasattr(self, 'DrParams'):
             drparams = self.DrParams
-        elif os.path.isfile(drparamsfile):
+        elif chstore.isfile(drparamsfile):
             self.DrParams = io.drRead(self.IonStr)
             drparams = self.DrParams
         else:
@@ -859,6 +850,8 @@ class ion(ioneqOne, ionTrails, specTrails):
                 totalRate += rate*branch1
         self.DrRateLvl = {'rate':allRate, 'effRate':effRate, 'totalRate':totalRate,  'de':de, 'avalue':self.Auto['avalue'], 'lvl':lvl, 'branch':branch, 'dekt':dekt, 'erg':erg, 'ipErg':ipErg}
 
+    @uniqueTemperature({'RecombRate':('rate', 'temperature'), 'DrRate':('rate', 'temperature'),
+        'RrRate':('rate', 'temperature')})
     def recombRate(self):
         """
         Provides the total recombination rate coefficient.
@@ -883,6 +876,8 @@ class ion(ioneqOne, ionTrails, specTrails):
             rate += self.RrRate['rate']
         self.RecombRate = {'rate':rate, 'temperature':temperature}
 
+    @uniqueTemperature({'Upsilon':('upsilon', 'temperature', 'exRate', 'dexRate'),
+        'PUpsilon':('upsilon', 'temperature', 'exRate', 'dexRate')})
     def upsilonDescale(self, prot=0):
         """
         Provides the temperatures and effective collision strengths (upsilons)
@@ -926,101 +921,81 @@ class ion(ioneqOne, ionTrails, specTrails):
         eryd = np.asarray(self.Elvlc["eryd"])
         erydth = np.asarray(self.Elvlc["erydth"])
         elvlc = np.where(eryd >= 0.,eryd,erydth)
-        temp = np.asarray(temperature)
+        temp = np.asarray(temperature, np.float64)
         ntemp = temp.size
-        if ntemp > 1:
-            ups = np.zeros((nscups,ntemp),np.float64)
-            exRate = np.zeros((nscups,ntemp),np.float64)
-            dexRate = np.zeros((nscups,ntemp),np.float64)
-        else:
-            ups = np.zeros(nscups,np.float64)
-            exRate = np.zeros((nscups,ntemp),np.float64)
-            dexRate = np.zeros((nscups,ntemp),np.float64)
-        deAll = []
-        for iscups in range(nscups):
-            if prot:
-                # for proton rates
-                l1 = self.Psplups["lvl1"][iscups]-1
-                l1idx = self.Elvlc['lvl'].index(self.Psplups['lvl1'][iscups])
-                l2 = self.Psplups["lvl2"][iscups]-1
-                l2idx = self.Elvlc['lvl'].index(self.Psplups['lvl2'][iscups])
-                ttype = self.Psplups["ttype"][iscups]
-                cups = self.Psplups["cups"][iscups]
-                nspl = self.Psplups["nspl"][iscups]
-                dx = 1./(float(nspl)-1.)
-                xs = dx*np.arange(nspl)
-                scups = self.Psplups["splups"][iscups]
-                de = elvlc[l2idx]-elvlc[l1idx]
-                kte = const.boltzmann*temp/(de*const.ryd2erg)
+        temp2 = temp.reshape(1, ntemp)
+        if prot:
+            # for proton rates
+            table = io.splineTable(self.Psplups)
+        else:
+            # electron collisional excitation or dielectronic excitation
+            table = io.splineTable(self.Scups)
+        nscups = table['lvl1'].size
+        # the index in Elvlc of each level
+        lvl = np.asarray(self.Elvlc['lvl'], np.int64)
+        lvlIdx = np.zeros(max(lvl.max(), table['lvl1'].max(), table['lvl2'].max()) + 1, np.int64)
+        lvlIdx[lvl[::-1]] = np.arange(lvl.size)[::-1]
+        l1idx = lvlIdx[table['lvl1']]
+        l2idx = lvlIdx[table['lvl2']]
+        if prot:
+            de = elvlc[l2idx] - elvlc[l1idx]
+        else:
+            de = table['de']
+        kte = const.boltzmann*temp2/(de[:, np.newaxis]*const.ryd2erg)
+        cups = table['cups'][:, np.newaxis]
+        ttype = table['ttype']
+        ups = np.zeros((nscups, ntemp), np.float64)
+        # the transitions of each type and number of spline points are descaled together
+        for onetype, nspl in sorted(set(zip(ttype.tolist(), table['ntemp'].tolist()))):
+            if onetype > 6:
+                continue
+            group = np.nonzero((ttype == onetype) & (table['ntemp'] == nspl))[0]
+            position = table['offsets'][group][:, np.newaxis] + np.arange(nspl)
+            xs = table['knots'][position]
+            scups = table['values'][position]
+            gkte = kte[group]
+            gcups = cups[group]
+            if onetype in (1, 4):
+                st = 1.-np.log(gcups)/np.log(gkte+gcups)
             else:
-                # electron collisional excitation or dielectronic excitation
-                l1 = self.Scups["lvl1"][iscups]-1
-                l1idx = self.Elvlc['lvl'].index(self.Scups['lvl1'][iscups])
-                l2 = self.Scups["lvl2"][iscups]-1
-                l2idx = self.Elvlc['lvl'].index(self.Scups['lvl2'][iscups])
-                ttype = self.Scups["ttype"][iscups]
-                cups = self.Scups["cups"][iscups]
-                nspl = self.Scups["ntemp"][iscups]
-                xs = self.Scups['btemp'][iscups]
-                scups = self.Scups["bscups"][iscups]
-                de = self.Scups['de'][iscups]
-                kte = const.boltzmann*temp/(de*const.ryd2erg)
-            der=0
-            if ttype == 1:
-                st = 1.-np.log(cups)/np.log(kte+cups)
-                y2 = splrep(xs,scups,s=0)
-                sups = splev(st,y2,der=der)
-                ups[iscups] = sups*np.log(kte+np.exp(1.))
-            if ttype == 2:
-                st = kte/(kte+cups)
-                y2 = splrep(xs,scups,s = 0)
-                sups = splev(st,y2,der = der)
-                ups[iscups] = sups
-            if ttype == 3:
-                st = kte/(kte+cups)
-                y2 = splrep(xs,scups,s = 0)
-                sups = splev(st,y2,der=der)
-                ups[iscups] = sups/(kte+1.)
-            if ttype == 4:
-                st = 1.-np.log(cups)/np.log(kte+cups)
-                y2 = splrep(xs,scups,s = 0)
-                sups = splev(st,y2,der=der)
-                ups[iscups] = sups*np.log(kte+cups)
-            if ttype == 5:
+                st = gkte/(gkte+gcups)
+            sups = util.cubicSplineEval(xs, scups, table['second'][position], st)
+            if onetype == 1:
+                ups[group] = sups*np.log(gkte+np.exp(1.))
+            elif onetype == 2:
+                ups[group] = sups
+            elif onetype == 3:
+                ups[group] = sups/(gkte+1.)
+            elif onetype == 4:
+                ups[group] = sups*np.log(gkte+gcups)
+            elif onetype == 5:
                 # dielectronic rates
-                st = kte/(kte+cups)
-                y2 = splrep(xs,scups,s=0)
-                sups = splev(st,y2,der=der)
-                ups[iscups] = sups/(kte+0.)
-            #  descale proton values
-            if ttype == 6:
-                st = kte/(kte+cups)
-                y2 = splrep(xs,scups,s=0)
-                sups = splev(st,y2,der=der)
-                ups[iscups] = 10.**sups
-            elif ttype > 6:  print(' t_type ne 1,2,3,4,5 = %5i %5i %5i '%(ttype,l1,l2))
-
-            if ce:
-                if self.Dielectronic:
-                    # the dielectronic ions will eventually be discontinued
-                    de = np.abs((elvlc[l2idx] - self.UpperIp/const.ryd2Ev) - elvlc[l1idx])
-                else:
-                    de = np.abs(elvlc[l2idx] - elvlc[l1idx])
-                deAll.append(de)
-                ekt = (de*const.ryd2erg)/(const.boltzmann*temp)
-                fmult1 = float(self.Elvlc["mult"][l1idx])
-                fmult2 = float(self.Elvlc["mult"][l2idx])
-                dexRate[iscups] = const.collision*ups[iscups]/(fmult2*np.sqrt(temp))
-                exRate[iscups] = const.collision*ups[iscups]*np.exp(-ekt)/(fmult1*np.sqrt(temp))
-            elif prot:
-                de = np.abs(elvlc[l2idx]- elvlc[l1idx])
-                ekt = (de*1.57888e+5)/temp
-                fmult1 = float(self.Elvlc["mult"][l1idx])
-                fmult2 = float(self.Elvlc["mult"][l2idx])
-                dexRate[iscups] = const.collision*ups[iscups]/(fmult2*np.sqrt(temp))
-                exRate[iscups] = const.collision*ups[iscups]*np.exp(-ekt)/(fmult1*np.sqrt(temp))
+                ups[group] = sups/(gkte+0.)
+            elif onetype == 6:
+                #  descale proton values
+                ups[group] = 10.**sups
+        for itrans in np.nonzero(ttype > 6)[0]:
+            print(' t_type ne 1,2,3,4,5 = %5i %5i %5i '%(ttype[itrans],table['lvl1'][itrans]-1,table['lvl2'][itrans]-1))
+
+        fmult1 = np.asarray(self.Elvlc["mult"], np.float64)[l1idx][:, np.newaxis]
+        fmult2 = np.asarray(self.Elvlc["mult"], np.float64)[l2idx][:, np.newaxis]
+        if ce:
+            if self.Dielectronic:
+                # the dielectronic ions will eventually be discontinued
+                de = np.abs((elvlc[l2idx] - self.UpperIp/const.ryd2Ev) - elvlc[l1idx])
+            else:
+                de = np.abs(elvlc[l2idx] - elvlc[l1idx])
+            deAll = de.tolist()
+            ekt = (de[:, np.newaxis]*const.ryd2erg)/(const.boltzmann*temp2)
+        else:
+            de = np.abs(elvlc[l2idx]- elvlc[l1idx])
+            ekt = (de[:, np.newaxis]*1.57888e+5)/temp2
+        dexRate = const.collision*ups/(fmult2*np.sqrt(temp2))
+        exRate = const.collision*ups*np.exp(-ekt)/(fmult1*np.sqrt(temp2))
 
         ups=np.where(ups > 0.,ups,0.)
+        if ntemp == 1:
+            ups = ups[:, 0]
         if prot == 1:
             self.PUpsilon = {'upsilon':ups, 'temperature':temperature,
                                 'exRate':exRate, 'dexRate':dexRate}
@@ -1108,7 +1083,52 @@ class ion(ioneqOne, ionTrails, specTrails):
 
 
 
-    def populate(self, popCorrect=1, verbose=0):
+    def setConditions(self, temperature=None, eDensity=None, pDensity='default', em=None, solver='auto', verbose=0):
+        """
+        Set new temperatures and densities and calculate the level populations there.
+
+        The atomic data are not read again.  The level populations are solved with the
+        `ChiantiPy.core.rateOperator` of the last populate, which keeps the collision,
+        ionization and recombination rates of every temperature it has seen, so that an
+        ion can be reused for many conditions.  After `drPopulate`, they are solved as
+        by `drPopulate`.
+
+        Parameters
+        ----------
+        temperature, eDensity : array-like
+            the new temperatures and electron densities, the current ones if None
+        pDensity : array-like or 'default'
+            the new proton densities, by default from the proton to electron density ratio
+        em : array-like
+            the new emission measure
+        solver : `str`
+            the solver of the rate equations, see `populate`
+
+        Notes
+        -----
+        The results of the previous conditions, such as Population, Emiss, Intensity and
+        the rates of upsilonDescale, ionizRate and recombRate, are removed.
+        """
+        if temperature is None:
+            temperature = self.Temperature
+        if eDensity is None:
+            eDensity = self.EDensity
+        method = getattr(self, 'Population', {}).get('method', 'populate')
+        self.argCheck(temperature, eDensity, pDensity, em)
+        self.ioneqOne()
+        for akey in ['Population', 'Upsilon', 'PUpsilon', 'IonizRate', 'RecombRate', 'RrlvlRate', 'DiRate', 'EaRate',
+                'RrRate', 'DrRate', 'DrRateLvl', 'Higher', 'Emiss', 'Intensity', 'Spectrum', 'BoundBoundLoss']:
+            if hasattr(self, akey):
+                delattr(self, akey)
+        if not hasattr(self, 'RateOperator'):
+            self.RateOperator = rateOperator(self)
+        if method == 'drPopulate':
+            self.Population = self.RateOperator.solve(self.Temperature, self.EDensity, self.PDensity, solver=solver, method=method, verbose=verbose)
+            self.drTotals()
+        else:
+            self.Population = self.RateOperator.solve(self.Temperature, self.EDensity, self.PDensity, solver=solver, verbose=verbose)
+
+    def populate(self, popCorrect=1, verbose=0, solver='auto', popTable=None):
         """
         Calculate level populations for specified ion.
         possible keyword arguments include temperature, eDensity, pDensity, radTemperature and rStar
@@ -1116,696 +1136,143 @@ class ion(ioneqOne, ionTrails, specTrails):
         in the ground level
         use drPopulate() for cases where the population of various levels in the higher ionization stage
         figure into the calculation
-        """
-        nlvls = self.Nlvls
-
-        nwgfa = self.Nwgfa
-        nscups = self.Nscups
-        npsplups = self.Npsplups
-        nauto = self.Nauto
-        # the following is the number of lower levels to ionize the current ion  from
-        #  fixes the problem that the ionization rates are really just strictly for the ground leve
-        # which can become depopulated with increased density
-
 
+        Parameters
+        ----------
+        solver : `str`
+            'dense' solves the rate equations with dense matrices, 'sparse' with a sparse LU
+            factorization at each point, 'iterative' refines the solution with the factorization
+            of the previous point and 'auto' chooses 'sparse' for large ions with sparse rate
+            matrices and 'dense' otherwise, see `ChiantiPy.tools.util.popSolver`.  The solver
+            used is kept in Population['solver']
+        popTable : `ChiantiPy.tools.poptable.popTable`
+            if given, the populations are interpolated in this table of the populations of the
+            ion instead of being solved.  A ValueError is raised if the ion, the CHIANTI version,
+            the abundance and ioneq files, the radiation field or the proton density differ from
+            those of the table
+        """
+        if popTable is not None:
+            differ = popTable.check(self)
+            if differ:
+                raise ValueError(' %s was made for a different %s'%(popTable.TableName, ', '.join(differ)))
+            pop = popTable.population(self.Temperature, self.EDensity)
+            self.Population = {"temperature":self.Temperature, "eDensity":self.EDensity, "population":pop,
+                "protonDensity":getattr(self, 'PDensity', None), 'method':'popTable', 'table':popTable.TableName}
+            return
         if hasattr(self, 'PDensity'):
             protonDensity = self.PDensity
         else:
             self.p2eRatio()
             self.PDensity = self.ProtonDensityRatio*self.EDensity
+            self.PDensityDefault = True
             protonDensity = self.PDensity
             print(' proton density not specified, set to \"default\" ')
         #
-        if hasattr(self, 'RadTemperature') and hasattr(self, 'RStar'):
-            radTemperature = self.RadTemperature
-            rStar = self.RStar
-        rec = 0
-        ci = 0
-        if self.Nrrlvl or self.Nauto:
-            rec = 1
-        else:
-            rec = 0
+        # the radiative terms and the level indices of the rate matrix, and the data of the
+        # higher ionization stage, are kept between calls
+        operator = getattr(self, 'RateOperator', None)
+        if operator is None or operator.Ion is not self:
+            operator = rateOperator(self)
+            self.RateOperator = operator
         if self.Nrrlvl:
-            rrlvl = self.Rrlvl
-            if hasattr(self, 'RrlvlRate'):
-                rrlvlRate = self.RrlvlRate
-            else:
+            if not hasattr(self, 'RrlvlRate'):
                 self.rrlvlDescale('rrlvl')
-                rrlvlRate = self.RrlvlRate
-            rrLvlIdx =[i for i,lvl1 in enumerate(self.Rrlvl['lvl1']) if lvl1 == 1]
-            self.RrLvlIdx = rrLvlIdx
-        temperature = self.Temperature
-        eDensity = self.EDensity
-        if rec:
-            # get ionization rate of this current ion
-            self.ionizRate()
+            self.RrLvlIdx = operator.RrLvlIdx
+        if operator.Rec:
             self.recombRate()
-            #  get the higher ionization stage and its recombination rates to this ion
-            highers = util.zion2name(self.Z, self.Ion+1)
-            higher = ion(highers, temperature, setup=0)
-            higher.setupIonrec()
-            higher.recombRate()
-        #  the populating matrix for radiative transitions and autoionization transitions
-        rad = np.zeros((nlvls+ci+rec,nlvls+ci+rec),np.float64)
-
-        for iwgfa in range(nwgfa):
-            l1 = self.Wgfa["lvl1"][iwgfa]-1
-            l2 = self.Wgfa["lvl2"][iwgfa]-1
-            rad[l1+ci,l2+ci] += self.Wgfa["avalue"][iwgfa]
-            rad[l2+ci,l2+ci] -= self.Wgfa["avalue"][iwgfa]
-            # photo-excitation and stimulated emission
-            if self.RadTemperature:
-                if not self.RStar:
-                    dilute = 0.5
-                else:
-                    dilute = util.dilute(self.RStar)
-                # next - don't include autoionization lines
-                if abs(self.Wgfa['wvl'][iwgfa]) > 0.:
-                    de = const.invCm2Erg*(self.Elvlc['ecm'][l2] - self.Elvlc['ecm'][l1])
-                    dekt = de/(const.boltzmann*self.RadTemperature)
-                    # photoexcitation
-                    phexFactor = dilute*(float(self.Elvlc['mult'][l2])/float(self.Elvlc['mult'][l1]))/(np.exp(dekt) -1.)
-                    rad[l2+ci,l1+ci] += self.Wgfa["avalue"][iwgfa]*phexFactor
-                    rad[l1+ci,l1+ci] -= self.Wgfa["avalue"][iwgfa]*phexFactor
-                    # stimulated emission
-                    stemFactor = dilute/(np.exp(-dekt) -1.)
-                    rad[l1+ci,l2+ci] += self.Wgfa["avalue"][iwgfa]*stemFactor
-                    rad[l2+ci,l2+ci] -= self.Wgfa["avalue"][iwgfa]*stemFactor
-
-        # autoionization rates
-        for iauto in range(nauto):
-            l1 = self.Auto["lvl1"][iauto] - 1
-            l2 = self.Auto["lvl2"][iauto] - 1
-            # all autoionization eventually goes to the ground level of the higher ion
-            rad[l1+ci+rec,l2+ci] += self.Auto["avalue"][iauto]
-            rad[l2+ci,l2+ci] -= self.Auto["avalue"][iauto]
-
-
-        if self.Nscups:
-            self.upsilonDescale()
-            #ups = self.Upsilon['upsilon']
-            exRate = self.Upsilon['exRate']
-            dexRate = self.Upsilon['dexRate']
-
-        if self.Npsplups:
-            self.upsilonDescale(prot=1)
-            pexRate = self.PUpsilon['exRate']
-            pdexRate = self.PUpsilon['dexRate']
+        # the rates at the temperatures of this ion, from those kept by the operator when it has
+        # seen all of them, Upsilon, PUpsilon, IonizRate and RrlvlRate are kept
+        rates = operator.rates(self.Temperature, anIon=self)
 
         if self.Nauto:
-            branch = np.zeros_like(self.Auto['avalueLvl'])
-            # first get branching ratio
-            for i, lvl in enumerate(self.Elvlc['lvl'][1:]):
-                if self.Wgfa['avalueLvl'][lvl-1] > 0.:
-                    branch[lvl-1] = self.Wgfa['avalueLvl'][lvl-1]/(self.Wgfa['avalueLvl'][lvl-1] + self.Auto['avalueLvl'][lvl-1])
-                else:
-                   branch[lvl-1] = 0.
-            self.Branch = branch
-
-        temp = self.Temperature
-        ntemp = self.Ntemp
-        eDensity = self.EDensity
-        ndens = self.Ndens
-        nscups = self.Nscups
-#        cc = const.collision*self.EDensity
-        #
-        # (4 pi a0^2)^(3/2) = 6.6011e-24 (Badnell et al, 2003, A&A 406, 1151
-        coef1 = 6.6011e-24*(const.hartree/(2.*const.boltzmann*self.Temperature))**1.5
-        coef2 = (const.planck)**3/(2.*const.pi*const.emass*const.boltzmann*self.Temperature)**1.5
-
-        #
-#        if npsplups:
-#            cp = const.collision*protonDensity
-        #
-        # get corrections for recombination and excitation
-        #
-        #
-        # the way temperature and density are now (9/2015) handled as arrays of the same size
-        # one the ndens == ntemp =1 case and the ndens >1 and ntemp>1 case are really needed
-        #
-        errorMessage = []
-        # ---------------------------------------------------------------------------------
-        #  --------------now for all values of ntemp and ndens -------------------------------
-        # --------------------------------------------------------------------------------
+            self.Branch = operator.Branch
 
         if verbose:
-            print(' doing both ntemp: %5i  ndens:  %5i'%(ntemp, ndens))
-        pop = np.zeros((self.NTempDens,nlvls),np.float64)
-#            drPop = np.zeros((ntemp,nlvls),np.float64)
-        fullPop = np.zeros((self.NTempDens, ci + nlvls + rec), np.float64)
-        drTot = np.zeros(self.NTempDens, np.float64)
-        if self.Nrrlvl:
-            rrTot = np.zeros(self.NTempDens, np.float64)
-#            recRate = np.zeros((ntemp,nlvls),np.float64)
-        #drEffRateTot = np.zeros(ntemp, np.float64)
-        rrTot = np.zeros(self.NTempDens, np.float64)
-        recTot = np.zeros(self.NTempDens, np.float64)
-#
-#
-        for itemp in range(self.NTempDens):
-            popmat = np.copy(rad)
-            temp = self.Temperature[itemp]
-            dens = self.EDensity[itemp]
-
-            for iscups in range(nscups):
-                l1 = self.Scups["lvl1"][iscups]-1
-                l2 = self.Scups["lvl2"][iscups]-1
-                popmat[l1+ci,l2+ci] += self.EDensity[itemp]*dexRate[iscups, itemp]
-                popmat[l2+ci,l1+ci] += self.EDensity[itemp]*exRate[iscups, itemp]
-                popmat[l1+ci,l1+ci] -= self.EDensity[itemp]*exRate[iscups, itemp]
-                popmat[l2+ci,l2+ci] -= self.EDensity[itemp]*dexRate[iscups, itemp]
-
-            # proton rates
-            for ipslups in range(npsplups):
-                l1 = self.Psplups["lvl1"][ipslups]-1
-                l2 = self.Psplups["lvl2"][ipslups]-1
-                popmat[l1+ci,l2+ci] += self.PDensity[itemp]*pdexRate[ipslups, itemp]
-                popmat[l2+ci,l1+ci] += self.PDensity[itemp]*pexRate[ipslups, itemp]
-                popmat[l1+ci,l1+ci] -= self.PDensity[itemp]*pexRate[ipslups, itemp]
-                popmat[l2+ci,l2+ci] -= self.PDensity[itemp]*pdexRate[ipslups, itemp]
-
-            if rec:
-                for ilvl in range(0, self.GrndLevels):
-                    popmat[-1,  ci + ilvl] += self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-                    popmat[ci + ilvl, ci + ilvl] -= self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-
-                if self.Nrrlvl:
-#                    rrlvl = self.Rrlvl
-#                    if hasattr(self, 'RrlvlRate'):
-#                        rrlvl = self.Rrlvl
-                    if hasattr(self, 'RrlvlRate'):
-                        rrlvlRate = self.RrlvlRate
-                    else:
-                        self.rrlvlDescale()
-                        rrlvlRate = self.RrlvlRate
-                        # only include rr from ground level
-                    for itrans in rrLvlIdx:
-                        lvl1 = rrlvl['lvl1'][itrans]-1
-                        lvl2 = rrlvl['lvl2'][itrans]-1
-                        popmat[lvl2+ci, -1] += self.EDensity[itemp]*self.RrlvlRate['rate'][itrans, itemp]
-                        popmat[-1, -1] -= self.EDensity[itemp]*self.RrlvlRate['rate'][itrans,itemp]
-                        rrTot[itemp] += self.RrlvlRate['rate'][itrans, itemp]
-                else:
-                    rrTot[itemp] = 0.
-                if self.Nauto:
-                    autoLvl2 = []
-                    for i, avalue in enumerate(self.Auto['avalue']):
-                        l1 = self.Auto['lvl1'][i] - 1
-                        l2 = self.Auto['lvl2'][i] - 1
-                        autoLvl2.append(l2)
-                        upperIdx = higher.Elvlc['lvl'].index(self.Auto['lvl1'][i])
-                        gUpper = float(higher.Elvlc['mult'][l1])
-                        gLower = float(self.Elvlc['mult'][l2])
-
-                        ecm2 = self.Elvlc['ecm'][l2]
-                        if ecm2 < 0.:
-                            ecm2 = self.Elvlc['ecmth'][l2]
-                        de1 = ecm2*const.invCm2Erg - self.Ip*const.ev2Erg
-                        dekt1 = de1/(const.boltzmann*self.Temperature[itemp])
-                        expkt = np.exp(-dekt1)
-
-                        # only including dielectronic recombination from the lowest level
-                        if l1 == 0:
-                            dielRate = coef2[itemp]*gLower*expkt*avalue/(2.*gUpper)
-                            popmat[ci + l2, -1] += self.EDensity[itemp]*dielRate
-                            popmat[-1, -1] -= self.EDensity[itemp]*dielRate
-
-                            # already included
-                            #popmat[-1, ci + l2] += avalue
-
-                            #popmat[ci + l2, ci + l2] -= avalue
-    #                            drTot += dielRate*branch[elvl2idx]
-                            # seems to give the correct DR Rate
-                            drTot[itemp] += dielRate*branch[l2]
-                        if verbose:
-                            print('itemp rrTot dielRateTot %5i %10.2e %10.2e'%(itemp, rrTot[itemp], drTot[itemp]))
-                            print('itemp, recTot RecombRate %5i %10.2e %10.2e'%(itemp, recTot[itemp], higher.RecombRate['rate'][itemp]))
-                    else:
-                        drTot[itemp] = 0.
-
-
-                recTot[itemp] = rrTot[itemp] + drTot[itemp]
-                if recTot[itemp] < higher.RecombRate['rate'][itemp]:
-                    popmat[ci, -1] += self.EDensity[itemp]*(higher.RecombRate['rate'][itemp] - recTot[itemp])
-                    popmat[-1, -1] -= self.EDensity[itemp]*(higher.RecombRate['rate'][itemp] - recTot[itemp])
-                if verbose:
-                    print('itemp rrTot dielRateTot %5i %10.2e %10.2e'%(itemp, rrTot[itemp], drTot[itemp]))
-                    print('itemp, recTot RecombRate %5i %10.2e %10.2e'%(itemp, recTot[itemp], higher.RecombRate['rate'][itemp]))
-            else:
-                recTot[itemp] = 0.
+            print(' doing both ntemp: %5i  ndens:  %5i'%(self.Ntemp, self.Ndens))
+        self.Population = operator.population(self.Temperature, self.EDensity, protonDensity, rates, solver=solver, verbose=verbose)
 
-            # in this case, haven't completely accounted for recombination
 
-
-#                    if verbose:
-#                        print(' T recombRate, rrTot, rrTot %10.2e %10.2e %10.2e %10.2e'%(temp, higher.RrRate['rate'][itemp], rrTot[itemp], higher.DrRate['rate'][itemp]))
-
-            norm = np.ones(nlvls+ci+rec,np.float64)
-            self.popmat = np.copy(popmat)
-            if ci:
-                norm[0] = 0.
-            if rec:
-                norm[-1] = 0.
-            popmat[nlvls+ci+rec-1] = norm
-            b = np.zeros(nlvls+ci+rec,np.float64)
-            b[nlvls+ci+rec-1] = 1.
-            try:
-                thispop = np.linalg.solve(popmat,b)
-                pop[itemp] = thispop[ci:ci+nlvls]
-                fullPop[itemp] = thispop
-            except np.linalg.LinAlgError:
-                pop[itemp] = np.zeros(nlvls, np.float64)
-                errorMessage.append('linealgError for T index %5i'%(itemp))
-        #
-            pop = np.where(pop > 0., pop, 0.)
-        self.Population = {"temperature":temperature,"eDensity":eDensity,"population":pop, "protonDensity":protonDensity, "ci":ci, "rec":rec, 'popmat':popmat, 'fullPop':fullPop, 'method':'populate'}
-        if len(errorMessage) > 0:
-            self.Population['errorMessage'] = errorMessage
-
-
-    def drPopulate(self, popCorrect=1, verbose=0):
+    def drPopulate(self, popCorrect=1, verbose=0, solver='auto'):
         """
         Calculate level populations for specified ion.
         possible keyword arguments include temperature, eDensity, pDensity, radTemperature and rStar
         different from method populate() in that it includes the dielectronic recombination from all
         levels specified by the .auto file - consequently, it also calculates the populations of the
         higher ionization stage
-        """
-
-        if hasattr(self, 'Auto'):
-            tst1 = 1
-            maxAutoLvl1 = max(self.Auto['lvl1'])
-        else:
-            tst1 = 0
-            maxAutoLvl1 = 0
-
-        if tst1:
-            maxRrLvl1 = max(self.Auto['lvl1'])
 
-        if self.HigherName in chdata.MasterList:
-            tst2 = 1
-        else:
-            tst2 = 0
+        Parameters
+        ----------
+        solver : `str`
+            the solver of the rate equations, see `populate`
 
-        if self.Nrrlvl  :
-            maxRrlvlLvl1 = max(self.Rrlvl['lvl1'])
-        else:
-            maxRrlvlLvl1 = 0
+        Notes
+        -----
+        The rate operator of the ion, kept in self.RateOperator, keeps the recombination data and
+        the level indices of the autoionization transitions, as well as the rate operator of the
+        higher ionization stage, so that later calls, as by `setConditions`, do not set them up
+        again.  The dielectronic capture rates, with the branching ratios in self.Branch, are
+        calculated for all of the autoionizing levels and temperatures at once.  The total
+        radiative and dielectronic recombination rates are kept in self.RrTot and self.DrTot and
+        the dielectronic capture rates of each pair of levels in self.DielLvlTot.
+        """
         if verbose:
             if self.HigherName in chdata.MasterList:
                 print('higher ionization stage in MasterList')
             else:
                 print('higher ionization stage not in MasterList')
-        if verbose:
-            if hasattr(self, 'Auto'):
+            if self.Nauto:
                 print(' %s has autoionization rates'%(self.IonStr))
             else:
                 print(' %s does not have autoionization rates'%(self.IonStr))
 
-
-        nlvls = self.Nlvls
-        nwgfa = self.Nwgfa
-        nscups = self.Nscups
-        npsplups = self.Npsplups
-        nauto = self.Nauto
-
-
         if hasattr(self, 'PDensity'):
             protonDensity = self.PDensity
         else:
             self.p2eRatio()
             self.PDensity = self.ProtonDensityRatio*self.EDensity
+            self.PDensityDefault = True
             protonDensity = self.PDensity
             print(' proton density not specified, set to \"default\" ')
         #
-
-        rec = 0
-        ci = 0
-        # the Dielectronic test should eventually go away
-        # the current method is drPopulate which requires autoionization valelus
-        # since this ion has autoionization values, it is not a dielectronic (d) ion
-        # and  and (not self.Dielectronic) test has gone away
-        if popCorrect:
-
-            if self.Nrrlvl or self.Nauto:
-#                rec = max([max(self.Reclvl['lvl1']), max(self.Auto['lvl1'])])
-                rec = 1
-                if verbose:
-                    if self.Nrrlvl:
-                        print('max rrrlvl lvl1 = %5i '%(max(self.Rrlvl['lvl1'])))
-                    else:
-                        print('Nrrlvl = 0')
-                    if self.Nauto:
-                        print('max auto lvl1 = %5i'%(max(max(self.Auto['lvl1']))))
-                    else:
-                        print('Nauto = 0')
-                    print(' rec = %5i'%(rec))
-            else:
-                rec = 0
-
-
-            if self.Nrrlvl:
-                rrlvl = self.Rrlvl
-                if hasattr(self, 'RrlvlRate'):
-                    rrlvlRate = self.RrlvlRate
-                else:
-                    self.rrlvlDescale('rrlvl')
-                    rrlvlRate = self.RrlvlRate
-
-            if rec:
-                # get ionization rate of this current ion
-                self.ionizRate()
-                #  get the higher ionization stage and its recombination rates
-                highers = util.zion2name(self.Z, self.Ion+1)
-                higher = ion(highers, temperature=self.Temperature, eDensity=self.EDensity)
-        #            higher = ion(highers, temperature=self.Temperature, eDensity=self.EDensity, setup=0)
-                higher.setupIonrec()
-                higher.recombRate()
-
-                if self.Nauto:
-                    maxAutoLvl1 = max(self.Auto['lvl1'])
-                else:
-                    maxAutoLvl1 = 0
-
-                if self.Nrrlvl:
-                    maxRrlvlLvl1 = max(self.Rrlvl['lvl1'])
-                else:
-                    maxRrlvlLvl1 = 0
-
-                    maxRrlvlLvl1 = 0
-                maxLvl1 = max([maxAutoLvl1, maxRrlvlLvl1])
-
-                if maxLvl1 == 1:
-                    if self.NTempDens > 1:
-                        hPop = np.ones((self.NTempDens, 1), np.float64)
-                    else:
-                        hPop = [1.]
-                else:
-                    higher.populate(popCorrect=0)
-                    hPop = higher.Population['population']
-
-        #  the populating matrix for radiative transitions
-        rad = np.zeros((nlvls+ci+rec,nlvls+ci+rec),np.float64)
-
-        for iwgfa in range(nwgfa):
-            l1 = self.Wgfa["lvl1"][iwgfa] - 1
-            l2 = self.Wgfa["lvl2"][iwgfa] - 1
-
-            rad[l1+ci,l2+ci] += self.Wgfa["avalue"][iwgfa]
-            rad[l2+ci,l2+ci] -= self.Wgfa["avalue"][iwgfa]
-            # photo-excitation and stimulated emission
-            if self.RadTemperature:
-                if not self.RStar:
-                    dilute = 0.5
-                else:
-                    dilute = util.dilute(self.RStar)
-                # next - don't include autoionization lines
-                if abs(self.Wgfa['wvl'][iwgfa]) > 0.:
-                    de = const.invCm2Erg*(self.Elvlc['ecm'][l2] - self.Elvlc['ecm'][l1])
-                    dekt = de/(const.boltzmann*self.RadTemperature)
-                    # photoexcitation
-                    phexFactor = dilute*(float(self.Elvlc['mult'][l2])/float(self.Elvlc['mult'][l1]))/(np.exp(dekt) -1.)
-                    rad[l2+ci,l1+ci] += self.Wgfa["avalue"][iwgfa]*phexFactor
-                    rad[l1+ci,l1+ci] -= self.Wgfa["avalue"][iwgfa]*phexFactor
-                    # stimulated emission
-                    stemFactor = dilute/(np.exp(-dekt) -1.)
-                    rad[l1+ci,l2+ci] += self.Wgfa["avalue"][iwgfa]*stemFactor
-                    rad[l2+ci,l2+ci] -= self.Wgfa["avalue"][iwgfa]*stemFactor
-
-        # autoionization rates if available
-        if self.Nauto:
-            for iauto in range(nauto):
-                l1 = self.Auto["lvl1"][iauto] - 1
-                l2 = self.Auto["lvl2"][iauto] - 1
-                # all autoionization eventually goes to the ground level of the higher ion
-                rad[l1+ci+rec,l2+ci] += self.Auto["avalue"][iauto]
-                rad[l2+ci,l2+ci] -= self.Auto["avalue"][iauto]
-
-
-        if self.Nscups:
-            self.upsilonDescale()
-            #ups = self.Upsilon['upsilon']
-            exRate = self.Upsilon['exRate']
-            dexRate = self.Upsilon['dexRate']
-
-        if npsplups:
-            self.upsilonDescale(prot=1)
-            pexRate = self.PUpsilon['exRate']
-            pdexRate = self.PUpsilon['dexRate']
-
+        # the rate operator keeps the data of the higher ionization stage between calls
+        operator = getattr(self, 'RateOperator', None)
+        if operator is None or operator.Ion is not self:
+            operator = rateOperator(self)
+            self.RateOperator = operator
+        if self.Nrrlvl:
+            if not hasattr(self, 'RrlvlRate'):
+                self.rrlvlDescale('rrlvl')
+            self.RrLvlIdx = operator.RrLvlIdx
+        # the rates at the temperatures of this ion, Upsilon, PUpsilon, IonizRate and RrlvlRate are kept
+        rates = operator.ionRates(self)
         if self.Nauto:
-            branch = np.zeros_like(self.Auto['avalueLvl'])
-            # first get branching ratio
-            for i, lvl in enumerate(self.Elvlc['lvl'][1:]):
-                if self.Wgfa['avalueLvl'][lvl-1] > 0.:
-                    branch[lvl-1] = self.Wgfa['avalueLvl'][lvl-1]/(self.Wgfa['avalueLvl'][lvl-1] + self.Auto['avalueLvl'][lvl-1])
-                else:
-                   branch[lvl-1] = 0.
-            self.Branch = branch
-
-            maxAutoLvl1 = max(self.Auto['lvl1'])
-            minAutoLvl2 = min(self.Auto['lvl2'])
-            maxAutoLvl2 = max(self.Auto['lvl2'])
-            if verbose:
-                print('NTempDens: %5i maxAutoLvl1: %5i  minAutoLvl2:  %5i  maxAutoLvl2: %5i'%(self.NTempDens, maxAutoLvl1, minAutoLvl2, maxAutoLvl2))
-            dielLvlTot = np.zeros((self.NTempDens, maxAutoLvl1, maxAutoLvl2), np.float64)
-
-        temp = temperature
-        ntemp = temp.size
-        dens = self.EDensity
-        ndens = dens.size
-#        cc = const.collision*self.EDensity
-        #
-        # (4 pi a0^2)^(3/2) = 6.6011e-24 (Badnell et al, 2003, A&A 406, 1151
-        coef1 = 6.6011e-24*(const.hartree/(2.*const.boltzmann*self.Temperature))**1.5
-        coef2 = (const.planck)**3/(2.*const.pi*const.emass*const.boltzmann*self.Temperature)**1.5
-
-        #
-#        if npsplups:
-#            cp = const.collision*protonDensity
-        #
-        # get corrections for recombination and excitation
-        nscups = self.Nscups
-        #
-        #
-        # the way temperature and density are now (9/2015) handled as arrays of the same size
-        # one the ndens == ntemp =1 case and the ndens >1 and ntemp>1 case are really needed
-        #
-        errorMessage = []
-        # --------------------------------------------------------------
-        # ------------------  ntemp > 1 ------------------------------
-        # ------------------------------------------------------------
+            self.Branch = operator.Branch
 
         if verbose:
-            print(' doing both ntemp: %5i  ndens:  %5i'%(ntemp, ndens))
-        drTot = np.zeros(ntemp, np.float64)
-        rrTot = np.zeros(ntemp, np.float64)
-        pop = np.zeros((ntemp,nlvls),np.float64)
-        for itemp in range(ntemp):
-            temp = self.Temperature[itemp]
-            popmat = np.copy(rad)
-            for iscups in range(nscups):
-                l1 = self.Scups["lvl1"][iscups]-1
-                l2 = self.Scups["lvl2"][iscups]-1
-                popmat[l1+ci,l2+ci] += self.EDensity[itemp]*dexRate[iscups, itemp]
-                popmat[l2+ci,l1+ci] += self.EDensity[itemp]*exRate[iscups, itemp]
-                popmat[l1+ci,l1+ci] -= self.EDensity[itemp]*exRate[iscups, itemp]
-                popmat[l2+ci,l2+ci] -= self.EDensity[itemp]*dexRate[iscups, itemp]
-            # proton rates
-            for ipslups in range(npsplups):
-                l1 = self.Psplups["lvl1"][ipslups]-1
-                l2 = self.Psplups["lvl2"][ipslups]-1
-                popmat[l1+ci,l2+ci] += self.PDensity[itemp]*pdexRate[ipslups, itemp]
-                popmat[l2+ci,l1+ci] += self.PDensity[itemp]*pexRate[ipslups, itemp]
-                popmat[l1+ci,l1+ci] -= self.PDensity[itemp]*pexRate[ipslups, itemp]
-                popmat[l2+ci,l2+ci] -= self.PDensity[itemp]*pdexRate[ipslups, itemp]
-            # now include ionization rate from the lower ionization stage
-            # the cilvl file is no longer picked up
-
-            if rec:
-
-                for ilvl in range(0, self.GrndLevels):
-                    popmat[-1,  ci + ilvl] += self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-                    popmat[ci + ilvl, ci + ilvl] -= self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-#                    popmat[-1,  ci] += self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-#                    popmat[ci, ci] -= self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-
-
-                if self.Nrrlvl:
-                    for itrans in range(self.Nrrlvl):
-                        l1 = rrlvl['lvl1'][itrans] - 1
-                        l2 = rrlvl['lvl2'][itrans] - 1
-                        popmat[l2+ci, -1] += self.EDensity[itemp]*hPop[itemp, l1]*self.RrlvlRate['rate'][itrans, itemp]
-                        popmat[-1, -1] -= self.EDensity[itemp]*hPop[itemp, l1]*self.RrlvlRate['rate'][itrans,itemp]
-                        rrTot[itemp] += hPop[itemp, l1]*self.RrlvlRate['rate'][itrans, itemp]
-#                    else:
-#                        rrTot[itemp] = 0.
-
-            #
-                if self.Nauto:
-                    autoLvl2 = []
-                    for i, avalue in enumerate(self.Auto['avalue']):
-                        l1 = self.Auto['lvl1'][i] - 1
-                        l2 = self.Auto['lvl2'][i] - 1
-                        autoLvl2.append(l2)
-                        gUpper = float(higher.Elvlc['mult'][l1])
-                        gLower = float(self.Elvlc['mult'][l2])
-
-                        ecm2 = self.Elvlc['ecm'][l2]
-                        if ecm2 < 0.:
-                            ecm2 = self.Elvlc['ecmth'][l2]
-                        de1 = ecm2*const.invCm2Erg - self.Ip*const.ev2Erg
-                        dekt1 = de1/(const.boltzmann*self.Temperature[itemp])
-                        expkt = np.exp(-dekt1)
-
-
-                    #if verbose:
-                        #print(' %5i itemp  %5i lvl2 %5i  upperIdx %5i  hPop  %12.2e avalue %12.2e'%(i, itemp, l2, l1, hPop[itemp, l1], avalue))
-                        dielRate = coef2[itemp]*gLower*expkt*avalue*hPop[itemp, l1]/(2.*gUpper)
-                        popmat[ci + l2, -1] += self.EDensity[itemp]*dielRate
-                        popmat[-1, -1] -= self.EDensity[itemp]*dielRate
-                        drTot[itemp] += dielRate*branch[l2]
-
-                        dielLvlTot[itemp, l1, l2] += dielRate
-
-
-
-            if higher.RecombRate['rate'][itemp] > (rrTot[itemp] + drTot[itemp]):
-                popmat[ci, -1] += self.EDensity[itemp]*(higher.RecombRate['rate'][itemp] - rrTot[itemp] - drTot[itemp])
-                popmat[-1, -1] -= self.EDensity[itemp]*(higher.RecombRate['rate'][itemp] - rrTot[itemp] - drTot[itemp])
-
-            norm = np.ones(nlvls+ci+rec,np.float64)
-            self.popmat = copy.copy(popmat)
-            if ci:
-                norm[0] = 0.
-            if rec:
-                norm[-1] = 0.
-            popmat[nlvls+ci+rec-1] = norm
-            b = np.zeros(nlvls+ci+rec,np.float64)
-            b[nlvls+ci+rec-1] = 1.
-        if verbose:
-            print(' doing both ntemp: %5i  ndens:  %5i'%(ntemp, ndens))
-        drTot = np.zeros(ntemp, np.float64)
-        rrTot = np.zeros(ntemp, np.float64)
-        pop = np.zeros((ntemp,nlvls),np.float64)
-        for itemp in range(ntemp):
-            temp = self.Temperature[itemp]
-            popmat = np.copy(rad)
-            for iscups in range(nscups):
-                l1 = self.Scups["lvl1"][iscups]-1
-                l2 = self.Scups["lvl2"][iscups]-1
-                popmat[l1+ci,l2+ci] += self.EDensity[itemp]*dexRate[iscups, itemp]
-                popmat[l2+ci,l1+ci] += self.EDensity[itemp]*exRate[iscups, itemp]
-                popmat[l1+ci,l1+ci] -= self.EDensity[itemp]*exRate[iscups, itemp]
-                popmat[l2+ci,l2+ci] -= self.EDensity[itemp]*dexRate[iscups, itemp]
-            # proton rates
-            for ipslups in range(npsplups):
-                l1 = self.Psplups["lvl1"][ipslups]-1
-                l2 = self.Psplups["lvl2"][ipslups]-1
-                popmat[l1+ci,l2+ci] += self.PDensity[itemp]*pdexRate[ipslups, itemp]
-                popmat[l2+ci,l1+ci] += self.PDensity[itemp]*pexRate[ipslups, itemp]
-                popmat[l1+ci,l1+ci] -= self.PDensity[itemp]*pexRate[ipslups, itemp]
-                popmat[l2+ci,l2+ci] -= self.PDensity[itemp]*pdexRate[ipslups, itemp]
-            # now include ionization rate from the lower ionization stage
-            # the cilvl file is no longer picked up
-
-            if rec:
-
-                for ilvl in range(0, self.GrndLevels):
-                    popmat[-1,  ci + ilvl] += self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-                    popmat[ci + ilvl, ci + ilvl] -= self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-#                    popmat[-1,  ci] += self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-#                    popmat[ci, ci] -= self.EDensity[itemp]*self.IonizRate['rate'][itemp]
-
-
-                if self.Nrrlvl:
-                    for itrans in range(self.Nrrlvl):
-                        l1 = rrlvl['lvl1'][itrans] - 1
-                        l2 = rrlvl['lvl2'][itrans] - 1
-                        popmat[l2+ci, -1] += self.EDensity[itemp]*hPop[itemp, l1]*self.RrlvlRate['rate'][itrans, itemp]
-                        popmat[-1, -1] -= self.EDensity[itemp]*hPop[itemp, l1]*self.RrlvlRate['rate'][itrans,itemp]
-                        rrTot[itemp] += hPop[itemp, l1]*self.RrlvlRate['rate'][itrans, itemp]
-#                    else:
-#                        rrTot[itemp] = 0.
-
-            #
-                if self.Nauto:
-                    autoLvl2 = []
-#                    hPop = higher.Population['population']
-#                    if verbose:
-#                        print(' total pop for itemp %5i %12.2e '%(itemp, hPop[itemp].sum()))
-                    for i, avalue in enumerate(self.Auto['avalue']):
-                        l1 = self.Auto['lvl1'][i] - 1
-                        l2 = self.Auto['lvl2'][i] - 1
-                        autoLvl2.append(l2)
-                        gUpper = float(higher.Elvlc['mult'][l1])
-                        gLower = float(self.Elvlc['mult'][l2])
-
-                        ecm2 = self.Elvlc['ecm'][l2]
-                        if ecm2 < 0.:
-                            ecm2 = self.Elvlc['ecmth'][l2]
-                        de1 = ecm2*const.invCm2Erg - self.Ip*const.ev2Erg
-                        dekt1 = de1/(const.boltzmann*self.Temperature[itemp])
-                        expkt = np.exp(-dekt1)
-
-
-                    #if verbose:
-                        #print(' %5i itemp  %5i lvl2 %5i  upperIdx %5i  hPop  %12.2e avalue %12.2e'%(i, itemp, l2, l1, hPop[itemp, l1], avalue))
-                        dielRate = coef2[itemp]*gLower*expkt*avalue*hPop[itemp, l1]/(2.*gUpper)
-                        popmat[ci + l2, -1] += self.EDensity[itemp]*dielRate
-                        popmat[-1, -1] -= self.EDensity[itemp]*dielRate
-                        drTot[itemp] += dielRate*branch[l2]
-
-                        dielLvlTot[itemp, l1, l2] += dielRate
-
-
-
-            if higher.RecombRate['rate'][itemp] > (rrTot[itemp] + drTot[itemp]):
-                popmat[ci, -1] += self.EDensity[itemp]*(higher.RecombRate['rate'][itemp] - rrTot[itemp] - drTot[itemp])
-                popmat[-1, -1] -= self.EDensity[itemp]*(higher.RecombRate['rate'][itemp] - rrTot[itemp] - drTot[itemp])
-
-            norm = np.ones(nlvls+ci+rec,np.float64)
-            self.popmat = copy.copy(popmat)
-            if ci:
-                norm[0] = 0.
-            if rec:
-                norm[-1] = 0.
-            popmat[nlvls+ci+rec-1] = norm
-            b = np.zeros(nlvls+ci+rec,np.float64)
-            b[nlvls+ci+rec-1] = 1.
-            try:
-                thispop = np.linalg.solve(popmat,b)
-                pop[itemp] = thispop[ci:ci+nlvls]
-            except np.linalg.LinAlgError:
-                pop[itemp] = np.zeros(nlvls, np.float64)
-                errorMessage.append('linealgError for T index %5i'%(itemp))
-        #
-            pop = np.where(pop > 0., pop, 0.)
-
-            try:
-                thispop = np.linalg.solve(popmat,b)
-                pop[itemp] = thispop[ci:ci+nlvls]
-            except np.linalg.LinAlgError:
-                pop[itemp] = np.zeros(nlvls, np.float64)
-                errorMessage.append('linealgError for T index %5i'%(itemp))
-        #
-            pop = np.where(pop > 0., pop, 0.)
-        self.RrTot = rrTot
-        self.DrTot = drTot
-        if self.Nauto:
-            self.DielLvlTot = dielLvlTot
+            print(' doing both ntemp: %5i  ndens:  %5i'%(self.Ntemp, self.Ndens))
+        self.Population = operator.drPopulation(self.Temperature, self.EDensity, protonDensity, rates, solver=solver, verbose=verbose)
+        self.drTotals()
 
-        self.Population = {"temperature":temperature,"eDensity":eDensity,"population":pop, "protonDensity":protonDensity, "ci":ci, "rec":rec, 'popmat':popmat, 'method':'drPopulate'}
-        if len(errorMessage) > 0:
-            self.Population['errorMessage'] = errorMessage
+    def drTotals(self):
+        """
+        Keep the recombination rates of the last `drPopulate` in self.RrTot, self.DrTot and
+        self.DielLvlTot.
+        """
+        self.RrTot = self.Population['rrTot']
+        self.DrTot = self.Population['drTot']
+        if 'dielLvlTot' in self.Population:
+            self.DielLvlTot = self.Population['dielLvlTot']
 
+    @uniqueTemperature({'ProtonDensityRatio':None})
     def p2eRatio(self):
         """
         Calculates the proton density to electron density ratio using Eq. 7 of [1]_.
 
         Notes
         ------
-        Uses the abundance and ionization equilibrium.
+        Uses the abundance and ionization equilibrium.  The ratio of each pair of
+        abundance and ioneq files is calculated once per process by
+        `ChiantiPy.tools.io.p2eRatio`.
 
         References
         ----------
@@ -1819,17 +1286,7 @@ class ion(ioneqOne, ionTrails, specTrails):
             AbundanceName = self.Defaults['abundfile']
         else:
             AbundanceName = self.AbundanceName
-
-        tmp_abundance = io.abundanceRead(abundancename=AbundanceName)
-        abundance = tmp_abundance['abundance'][tmp_abundance['abundance']>0]
-        denominator = np.zeros(len(self.IoneqAll['ioneqTemperature']))
-        for i in range(len(abundance)):
-            for z in range(1,i+2):
-                denominator += z*self.IoneqAll['ioneqAll'][i,z,:]*abundance[i]
-
-        p2eratio = abundance[0]*self.IoneqAll['ioneqAll'][0,1,:]/denominator
-        nots = splrep(np.log10(self.IoneqAll['ioneqTemperature']),p2eratio,s=0)
-        self.ProtonDensityRatio = splev(np.log10(temperature),nots,der=0,ext=1)
+        self.ProtonDensityRatio = io.p2eRatio(AbundanceName, self.IoneqAll, temperature)
 
 
 
@@ -1846,6 +1303,7 @@ class ion(ioneqOne, ionTrails, specTrails):
 
         if pub is set, the want publication plots (bw, lw=2).
         """
+        import matplotlib.pyplot as plt
 
         if pub:
             fontsize = 16
@@ -2126,11 +1584,8 @@ class ion(ioneqOne, ionTrails, specTrails):
             factor = np.ones((nwvl),np.float64)/(4.*const.pi)
             plotLabels["yLabel"] = "photons cm^-3 s^-1"
 
-#        if ntempden > 1:
-        for itempden in range(ntempden):
-            for iwvl in range(nwvl):
-                p = pop[itempden,l2[iwvl]-1]
-                em[iwvl, itempden] = factor[iwvl]*p*avalue[iwvl]
+        # the populations of the upper levels of all lines at all points
+        em[...] = (factor[:, np.newaxis]*np.reshape(pop, (ntempden, -1))[:, l2-1].T*avalue[:, np.newaxis]).reshape(em.shape)
         if self.Defaults['wavelength'] == 'kev':
             wvl = const.ev2Ang/np.asarray(wvl)
         elif self.Defaults['wavelength'] == 'nm':
@@ -2304,6 +1759,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         linLog specifies a linear or log plot, want either lin or log, default = lin
 
         normalize = 1 specifies whether to normalize to strongest line, default = 0'''
+        import matplotlib.pyplot as plt
         #
         title = self.Spectroscopic
         #
@@ -2417,6 +1873,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         A plot of relative emissivities is shown and then a dialog appears for the user to
         choose a set of lines.
         """
+        import matplotlib.pyplot as plt
 
         if hasattr(self, 'Emiss'):
             doEmiss = False
@@ -2747,6 +2204,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         to take a set of date and interpolate against the IntensityRatio
         the scale can be one of 'lin'/'linear' [default], 'loglog', 'logx', 'logy',
         '''
+        import matplotlib.pyplot as plt
         # first, what variable to use
         if self.IntensityRatio['temperature'].max() > self.IntensityRatio['temperature'].min():
             x = self.IntensityRatio['ratio']
@@ -2806,6 +2264,7 @@ class ion(ioneqOne, ionTrails, specTrails):
         Only the top( set by 'top') brightest lines are plotted.
         the G(T) function is returned in a dictionary self.Gofnt
         """
+        import matplotlib.pyplot as plt
 
         if hasattr(self, 'Emiss'):
             em = copy.copy(self.Emiss)
@@ -3020,10 +2479,10 @@ class ion(ioneqOne, ionTrails, specTrails):
                 wvl0 = 1.e+8/(self.Elvlc['ecm'][l2] - self.Elvlc['ecm'][l1])
                 goodWvl = wvl > wvl0
                 y = wvl0/wvl[goodWvl]
-                dist = io.twophotonHRead()
+                dist = chdata.TwoPhotonH
                 avalue = dist['avalue'][self.Z-1]
                 asum = dist['asum'][self.Z-1]
-                distr1 = splrep(dist['y0'], dist['psi0'][self.Z-1], s=0)
+                distr1 = chdata.TwoPhotonHSpline[self.Z-1]
                 distr = avalue*y*splev(y, distr1)/(asum*wvl[goodWvl])
                 if self.Defaults['flux'] == 'energy':
                     f = (const.light*const.planck*1.e+8)/wvl[goodWvl]
@@ -3042,9 +2501,9 @@ class ion(ioneqOne, ionTrails, specTrails):
                 wvl0 = 1.e+8/(self.Elvlc['ecm'][l2] - self.Elvlc['ecm'][l1])
                 goodWvl = wvl > wvl0
                 y = wvl0/wvl[goodWvl]
-                dist = io.twophotonHeRead()
+                dist = chdata.TwoPhotonHe
                 avalue = dist['avalue'][self.Z-1]
-                distr1 = splrep(dist['y0'], dist['psi0'][self.Z-1], s=0)
+                distr1 = chdata.TwoPhotonHeSpline[self.Z-1]
                 distr = avalue*y*splev(y, distr1)/wvl[goodWvl]
                 if self.Defaults['flux'] == 'energy':
                     f = (const.light*const.planck*1.e+8)/wvl[goodWvl]
@@ -3114,10 +2573,10 @@ class ion(ioneqOne, ionTrails, specTrails):
                 goodWvl = wvl > wvl0
                 if goodWvl.sum() > 0:
                     y = wvl0/wvl[goodWvl]
-                    dist = io.twophotonHRead()
+                    dist = chdata.TwoPhotonH
                     avalue = dist['avalue'][self.Z-1]
                     asum = dist['asum'][self.Z-1]
-                    distr1 = splrep(dist['y0'], dist['psi0'][self.Z-1], s=0)
+                    distr1 = chdata.TwoPhotonHSpline[self.Z-1]
                     distr = avalue*y*splev(y, distr1)/(asum*wvl[goodWvl])
                     if self.Defaults['flux'] == 'energy':
                         f = (const.light*const.planck*1.e+8)/(4.*const.pi*wvl[goodWvl])
@@ -3138,9 +2597,9 @@ class ion(ioneqOne, ionTrails, specTrails):
                 goodWvl = wvl > wvl0
                 if goodWvl.sum() > 0:
                     y = wvl0/wvl[goodWvl]
-                    dist = io.twophotonHeRead()
+                    dist = chdata.TwoPhotonHe
                     avalue = dist['avalue'][self.Z-1]
-                    distr1 = splrep(dist['y0'], dist['psi0'][self.Z-1], s=0)
+                    distr1 = chdata.TwoPhotonHeSpline[self.Z-1]
                     distr = avalue*y*splev(y, distr1)/wvl[goodWvl]
                     if self.Defaults['flux'] == 'energy':
                         f = (const.light*const.planck*1.e+8)/(4.*const.pi*wvl[goodWvl])
@@ -3195,7 +2654,7 @@ class ion(ioneqOne, ionTrails, specTrails):
                 l1 = 1 - 1
                 l2 = 2 - 1
                 wvl0 = 1.e+8/(self.Elvlc['ecm'][l2] - self.Elvlc['ecm'][l1])
-                dist = io.twophotonHRead()
+                dist = chdata.TwoPhotonH
                 avalue = dist['avalue'][self.Z-1]
                 f = (avalue*const.light*const.planck*1.e+8)/wvl0
 #                if nTempDens == 1:
@@ -3209,7 +2668,7 @@ class ion(ioneqOne, ionTrails, specTrails):
                 l1 = 1 - 1
                 l2 = heseqLvl2[self.Z -1] -1
                 wvl0 = 1.e+8/(self.Elvlc['ecm'][l2] - self.Elvlc['ecm'][l1])
-                dist = io.twophotonHeRead()
+                dist = chdata.TwoPhotonHe
                 avalue = dist['avalue'][self.Z-1]
                 f = (avalue*const.light*const.planck*1.e+8)/wvl0
 #                if nTempDens == 1:
@@ -1,13 +1,15 @@
 """
 Ionization equilibrium class
 """
+import os
+
 import numpy as np
-import matplotlib.pyplot as plt
 
 import ChiantiPy.tools.util as util
 import ChiantiPy.tools.io as io
 import ChiantiPy.tools.constants as const
 import ChiantiPy.tools.data as chdata
+import ChiantiPy.tools.ratetable as ratetable
 
 from .Ion import ion
 
@@ -45,95 +47,87 @@ class ioneq(object):
         self.Ioneq = ioneqAll['ioneqAll'][self.Z - 1]
         self.IoneqName = ioneqAll['ioneqname']
 
-    def calculate(self, temperature):
+    def calculate(self, temperature, table=False):
         """
         Calculate ion fractions for given temperature array using the total
         ionization and recombination rates.
+
+        The ionization and recombination rates of all of the stages are kept in
+        self.Rates and the steady state of all of the temperatures is solved at once
+        by `ioneqSolve`.  If table is True, the rates are interpolated in the tables
+        of `ChiantiPy.tools.ratetable`.
         """
-        self.Temperature = np.array(temperature, np.float64)
-        if self.Temperature.size == 1:
-            print(' temperature must be an array')
-            return
-        ionList = []
-        chIons = []
-        z = self.Z
-        for stage in range(1, z+2):
-            ionStr = util.zion2name(z, stage)
-            ionList.append(ionStr)
-            atom = ion(ionStr, temperature = self.Temperature, setup=0)
-            atom.setupIonrec()
-            atom.ionizRate()
-            atom.recombRate()
-            chIons.append(atom)
-
-        ntemp = chIons[0].IonizRate['temperature'].size
-        if ntemp == 1:
-            ioneq = np.zeros((z+1), np.float64)
-            factor = []
-            for anIon in chIons:
-                if hasattr(anIon, 'RecombRate') and hasattr(anIon, 'IonizRate'):
-                    rat = anIon.IonizRate['rate']/anIon.RecombRate['rate']
-                    factor.append(rat**2 + rat**(-2))
-                else:
-                    factor.append(0.)
-            factor[0] = max(factor)
-            factor[-1] = max(factor)
-            ionmax = factor.index(min(factor))
-            ioneq[ionmax] = 1.
-
-            for iz in range(ionmax+1, z+1):
-                ionrate = chIons[iz-1].IonizRate['rate']
-                recrate = chIons[iz].RecombRate['rate']
-                ioneq[iz] = ionrate*ioneq[iz-1]/recrate
-
-            for iz in range(ionmax-1, -1, -1):
-                ionrate = chIons[iz].IonizRate['rate']
-                recrate = chIons[iz+1].RecombRate['rate']
-                ioneq[iz] = recrate*ioneq[iz+1]/ionrate
-            ionsum = ioneq.sum()
-            ioneq = ioneq/ionsum
-            self.Ioneq = ioneq
+        self.Temperature = np.atleast_1d(np.array(temperature, np.float64))
+        self.Rates = stageRates(self.Z, self.Temperature, table=table)
+        self.Ioneq = ioneqSolve(self.Rates['ioniz'], self.Rates['recomb'])
+
+    @staticmethod
+    def calculateAll(elements, temperature, outFile=None, reference=None, proc=None, table=False, verbose=False):
+        """
+        Calculate the ion fractions of several elements, in parallel.
+
+        Parameters
+        ----------
+        elements : `list`
+            the atomic numbers or symbols of the elements
+        temperature : array-like
+            the temperatures, in K
+        outFile : `str`
+            if given, the ion fractions are written to this .ioneq file.  A file
+            written into $XUVTOP/ioneq can be read by `ChiantiPy.tools.io.ioneqRead`
+            with the root name of the file
+        reference : `list`
+            the lines of the reference of the .ioneq file
+        proc : `int`
+            the number of processes, the number of CPUs if None
+        table : `bool`
+            interpolate the rates in the tables of `ChiantiPy.tools.ratetable`
+
+        Returns
+        -------
+        info : `dict`
+            {'ioneqname', 'ioneqAll', 'ioneqTemperature', 'ioneqRef'} as returned by
+            `ChiantiPy.tools.io.ioneqRead`, ioneqAll has the shape (nele, nele+1, ntemp)
+            where nele is the largest atomic number of the elements, the ion fractions
+            of the other elements are zero
+        """
+        import multiprocessing as mp
+        temperature = np.atleast_1d(np.array(temperature, np.float64))
+        zList = []
+        for one in elements:
+            if type(one) is str:
+                zList.append(util.el2z(one))
+            else:
+                zList.append(int(one))
+        if not zList:
+            raise ValueError(' no elements given')
+        if proc is None:
+            proc = mp.cpu_count()
+        proc = min([proc, len(zList)])
+        jobs = [(z, temperature, table) for z in zList]
+        if proc > 1:
+            with mp.Pool(proc, initializer=io._resetWorker) as pool:
+                results = pool.map(_elementIoneq, jobs)
+        else:
+            results = [_elementIoneq(one) for one in jobs]
+        nele = max(zList)
+        ioneqAll = np.zeros((nele, nele+1, temperature.size), np.float64)
+        for z, ioneqEl in results:
+            ioneqAll[z-1, :z+1] = ioneqEl
+            if verbose:
+                print(' %s done'%(const.El[z-1]))
+        if reference is None:
+            reference = [' calculated with ChiantiPy from the CHIANTI ionization and recombination rates',
+                ' CHIANTI version %s'%(io.versionRead())]
+        if outFile:
+            ioneqName = os.path.splitext(os.path.basename(outFile))[0]
         else:
-            ioneq = np.zeros((z+1,ntemp ), np.float64)
-            for it in range(ntemp):
-                factor = []
-                for anIon in chIons:
-                    if anIon.IonizRate is not None and anIon.RecombRate is not None:
-                        ioniz = anIon.IonizRate['rate'][it]
-                        recomb = anIon.RecombRate['rate'][it]
-                        if ioniz == 0. or recomb == 0.:
-                            rat = 1.e-100
-                        else:
-                            rat = anIon.IonizRate['rate'][it]/anIon.RecombRate['rate'][it]
-                        try:
-                            factor.append(rat**2 + rat**(-2))
-                        except:
-                            factor.append(0.)
-                    else:
-                        factor.append(0.)
-                factor[0] = max(factor)
-                factor[-1] = max(factor)
-                ionmax = factor.index(min(factor))
-                ioneq[ionmax, it] = 1.
-
-                for iz in range(ionmax+1, z+1):
-                    ionrate = chIons[iz-1].IonizRate['rate'][it]
-                    recrate = chIons[iz].RecombRate['rate'][it]
-                    if recrate != 0.:
-                        ioneq[iz, it] = ionrate*ioneq[iz-1, it]/recrate
-                    else:
-                        ioneq[iz, it] = 0.
-
-                for iz in range(ionmax-1, -1, -1):
-                    ionrate = chIons[iz].IonizRate['rate'][it]
-                    recrate = chIons[iz+1].RecombRate['rate'][it]
-                    if ionrate != 0.:
-                        ioneq[iz, it] = recrate*ioneq[iz+1, it]/ionrate
-                    else:
-                        ioneq[iz, it] = 0.
-                ionsum = ioneq[:, it].sum()
-                ioneq[:, it] = ioneq[:, it]/ionsum
-            self.Ioneq = ioneq
+            ioneqName = ''
+        info = {'ioneqname':ioneqName, 'ioneqAll':ioneqAll, 'ioneqTemperature':temperature,
+            'ioneqRef':list(reference)}
+        if outFile:
+            io.ioneqWrite(info, outFile)
+        return info
 
     def plot(self, stages=0, tRange=0, yr=0, oplot=False, label=1, title=1,  bw=False, semilogx = 0, verbose=0):
         '''
@@ -148,6 +142,7 @@ class ioneq(object):
         or if oplot=True or oplot=1 and a widget will come up so that a file can be selected.
         bw, if True, the plot is made in black and white
         '''
+        import matplotlib.pyplot as plt
         if hasattr(self, 'Ioneq'):
             ioneq = getattr(self, 'Ioneq')
         else:
@@ -243,6 +238,7 @@ class ioneq(object):
         tRange = temperature range, yr = ion fraction range
 
         '''
+        import matplotlib.pyplot as plt
         ionN = util.zion2name(self.Z, stageN)
         ionD = util.zion2name(self.Z, stageD)
         ionNS = util.zion2spectroscopic(self.Z, stageN)
@@ -288,3 +284,100 @@ class ioneq(object):
         plt.legend(loc='lower right')
         plt.tight_layout()
         self.Ratio={'Temperature':goodT, 'Ratio':goodR, 'label':alabel}
+
+
+def stageRates(z, temperature, table=False):
+    """
+    Return the total ionization and recombination rate coefficients of all of the stages
+    of an element.
+
+    Parameters
+    ----------
+    z : `int`
+        the atomic number
+    temperature : `numpy.ndarray`
+        the temperatures, in K
+    table : `bool`
+        interpolate the rates in the tables of `ChiantiPy.tools.ratetable` instead of
+        calculating them
+
+    Returns
+    -------
+    rates : `dict`
+        {'temperature', 'ioniz', 'recomb'}, the rates have the shape (z+1, ntemp), with the
+        neutral stage first
+    """
+    temperature = np.atleast_1d(np.asarray(temperature, np.float64))
+    ioniz = np.zeros((z+1, temperature.size), np.float64)
+    recomb = np.zeros_like(ioniz)
+    for stage in range(1, z+2):
+        ionStr = util.zion2name(z, stage)
+        if table:
+            rates = ratetable.rates(ionStr, temperature)
+            ioniz[stage-1] = rates['ioniz']
+            recomb[stage-1] = rates['recomb']
+            continue
+        atom = ion(ionStr, temperature=temperature, setup=0)
+        atom.setupIonrec()
+        atom.ionizRate()
+        atom.recombRate()
+        ioniz[stage-1] = atom.IonizRate['rate']
+        recomb[stage-1] = atom.RecombRate['rate']
+    return {'temperature':temperature, 'ioniz':ioniz, 'recomb':recomb}
+
+
+def ioneqSolve(ioniz, recomb):
+    """
+    Solve the ionization equilibrium of an element for all of the temperatures at once.
+
+    Parameters
+    ----------
+    ioniz, recomb : `numpy.ndarray`
+        the (z+1, ntemp) total ionization and recombination rate coefficients of the stages,
+        with the neutral stage first
+
+    Returns
+    -------
+    ioneq : `numpy.ndarray`
+        the (z+1, ntemp) ion fractions
+
+    Notes
+    -----
+    The steady state of the tridiagonal rate equations is the chain
+    n[i+1]/n[i] = ioniz[i]/recomb[i+1].  The chain is summed in log space from the stage
+    whose own ionization and recombination rates are closest, so that neither the ratios
+    nor their products overflow.  A zero rate cuts the chain and the stages beyond it,
+    away from that stage, have no population.
+    """
+    ioniz = np.asarray(ioniz, np.float64)
+    recomb = np.asarray(recomb, np.float64)
+    nstage, ntemp = ioniz.shape
+    with np.errstate(divide='ignore'):
+        logI = np.log(ioniz)
+        logR = np.log(recomb)
+    # the stage whose ionization and recombination rates are closest
+    good = (ioniz > 0.) & (recomb > 0.)
+    factor = np.where(good, np.abs(logI - logR), 100.*np.log(10.))
+    factor[0] = factor.max(axis=0)
+    factor[-1] = factor[0]
+    start = np.argmin(factor, axis=0)
+    # the steps of the log population up and down the chain, -inf where a rate is zero
+    link = (ioniz[:-1] > 0.) & (recomb[1:] > 0.)
+    up = np.where(link, logI[:-1] - np.where(link, logR[1:], 0.), -np.inf)
+    down = np.where(link, -up, -np.inf)
+    stageIdx = np.arange(nstage - 1)[:, np.newaxis]
+    logPop = np.zeros((nstage, ntemp), np.float64)
+    logPop[1:] = np.cumsum(np.where(stageIdx >= start, up, 0.), axis=0)
+    logPop[:-1] += np.cumsum(np.where(stageIdx < start, down, 0.)[::-1], axis=0)[::-1]
+    logPop -= logPop.max(axis=0)
+    ioneq = np.exp(logPop)
+    return ioneq/ioneq.sum(axis=0)
+
+
+def _elementIoneq(job):
+    """
+    Return the atomic number and the ion fractions of a job of `ioneq.calculateAll`.
+    """
+    z, temperature, table = job
+    rates = stageRates(z, temperature, table=table)
+    return z, ioneqSolve(rates['ioniz'], rates['recomb'])
@@ -3,16 +3,13 @@ import copy
 import warnings
 
 import numpy as np
-try:
-    from ipyparallel import Client
-except ImportError:
-    warnings.warn("ipyparallel not found. You won't be able to use the ipymspectrum module")
 
 import ChiantiPy
 import ChiantiPy.tools.data as chdata
 import ChiantiPy.tools.constants as const
 import ChiantiPy.tools.filters as chfilters
 import ChiantiPy.tools.util as util
+import ChiantiPy.tools.store as chstore
 import ChiantiPy.Gui as chGui
 from ChiantiPy.base import ionTrails
 from ChiantiPy.base import specTrails
@@ -73,6 +70,11 @@ class ipymspectrum(ionTrails, specTrails):
             print(' wavelength must have at least two values, current length %3i'%(wavelength.size))
             return
 
+        try:
+            from ipyparallel import Client
+        except ImportError:
+            warnings.warn("ipyparallel not found. You won't be able to use the ipymspectrum module")
+            return
         t1 = datetime.now()
         #
         rcAll = Client()
@@ -161,7 +163,14 @@ class ipymspectrum(ionTrails, specTrails):
             if 'line' in self.Todo[akey]:
                 allInpt.append([akey, 'line', temperature, eDensity, wavelength, filter, allLines, abundance, em, doContinuum])
         #
-        result = lbvAll.map_sync(doAll, allInpt)
+        # the engines share the atomic data read once by this process, engines on
+        # other hosts that can not open the store read the database files
+        with chstore.sharedStore(sorted(self.Todo.keys()), verbose=verbose) as storeName:
+            rcAll[:].apply_sync(chstore.useStore, storeName)
+            try:
+                result = lbvAll.map_sync(doAll, allInpt)
+            finally:
+                rcAll[:].apply_sync(chstore.reset)
         if verbose:
             print(' got all ff, fb, line results')
         ionsCalculated = []
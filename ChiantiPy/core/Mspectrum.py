@@ -8,6 +8,7 @@ import ChiantiPy.tools.data as chdata
 import ChiantiPy.tools.constants as const
 import ChiantiPy.tools.filters as chfilters
 import ChiantiPy.tools.util as util
+import ChiantiPy.tools.store as chstore
 import ChiantiPy.Gui as chGui
 from ChiantiPy.base import ionTrails
 from ChiantiPy.base import specTrails
@@ -160,91 +161,93 @@ class mspectrum(ionTrails, specTrails):
             if 'line' in self.Todo[akey]:
                 ionWorkerQ.put((akey, temperature, eDensity, wavelength, filter, allLines, abundance, em, doContinuum))
         #
-        ffWorkerQSize = ffWorkerQ.qsize()
-        fbWorkerQSize = fbWorkerQ.qsize()
-        ionWorkerQSize = ionWorkerQ.qsize()
-        if doContinuum:
-            ffProcesses = []
-            for i in range(proc):
-                p = mp.Process(target=mputil.doFfQ, args=(ffWorkerQ, ffDoneQ))
-                p.start()
-                ffProcesses.append(p)
-    #       timeout is not necessary
-            for p in ffProcesses:
-                if p.is_alive():
-                    p.join(timeout=timeout)
-            #
-            for iff in range(ffWorkerQSize):
-                thisFreeFree = ffDoneQ.get()
-                freeFree += thisFreeFree['intensity']
-            for p in ffProcesses:
-                if not isinstance(p, str):
-                    p.terminate()
-        #
-            fbProcesses = []
-            for i in range(proc):
-                p = mp.Process(target=mputil.doFbQ, args=(fbWorkerQ, fbDoneQ))
-                p.start()
-                fbProcesses.append(p)
-    #       timeout is not necessary
-            for p in fbProcesses:
-                if p.is_alive():
-                    p.join(timeout=timeout)
+        # the workers share the atomic data read once by this process
+        with chstore.sharedStore(sorted(self.Todo.keys()), verbose=verbose) as storeName:
+            ffWorkerQSize = ffWorkerQ.qsize()
+            fbWorkerQSize = fbWorkerQ.qsize()
+            ionWorkerQSize = ionWorkerQ.qsize()
+            if doContinuum:
+                ffProcesses = []
+                for i in range(proc):
+                    p = mp.Process(target=mputil.doFfQ, args=(ffWorkerQ, ffDoneQ, storeName))
+                    p.start()
+                    ffProcesses.append(p)
+        #       timeout is not necessary
+                for p in ffProcesses:
+                    if p.is_alive():
+                        p.join(timeout=timeout)
+                #
+                for iff in range(ffWorkerQSize):
+                    thisFreeFree = ffDoneQ.get()
+                    freeFree += thisFreeFree['intensity']
+                for p in ffProcesses:
+                    if not isinstance(p, str):
+                        p.terminate()
             #
-            for ifb in range(fbWorkerQSize):
-                thisFreeBound = fbDoneQ.get()
-                if 'errorMessage' not in thisFreeBound.keys():
-                    freeBound += thisFreeBound['intensity'].squeeze()
-
-            for p in fbProcesses:
-                if not isinstance(p, str):
-                    p.terminate()
-        #
-        if doLines:
-            ionProcesses = []
-            if ionWorkerQSize < proc:
-                proc = ionWorkerQSize
-            for i in range(proc):
-                p = mp.Process(target=mputil.doIonQ, args=(ionWorkerQ, ionDoneQ))
-                p.start()
-                ionProcesses.append(p)
+                fbProcesses = []
+                for i in range(proc):
+                    p = mp.Process(target=mputil.doFbQ, args=(fbWorkerQ, fbDoneQ, storeName))
+                    p.start()
+                    fbProcesses.append(p)
         #       timeout is not necessary
-            for p in ionProcesses:
-        #            if p.is_alive():
-        #                p.join()
-                    p.join(timeout=timeout)
+                for p in fbProcesses:
+                    if p.is_alive():
+                        p.join(timeout=timeout)
+                #
+                for ifb in range(fbWorkerQSize):
+                    thisFreeBound = fbDoneQ.get()
+                    if 'errorMessage' not in thisFreeBound.keys():
+                        freeBound += thisFreeBound['intensity'].squeeze()
+
+                for p in fbProcesses:
+                    if not isinstance(p, str):
+                        p.terminate()
             #
-            for ijk in range(ionWorkerQSize):
-                out = ionDoneQ.get()
-                ionS = out[0]
-                if verbose:
-                    print(' collecting ion calculation for %s'%(ionS))
-                thisIon = out[1]
-                thisIntensity = thisIon.Intensity
-                if not 'errorMessage' in sorted(thisIntensity.keys()):
-                    self.Finished.append(ionS)
-                    if keepIons:
-                        self.IonInstances[ionS] = copy.deepcopy(thisIon)
-                    if setupIntensity:
-                        for akey in sorted(self.Intensity.keys()):
-                            self.Intensity[akey] = np.hstack((copy.copy(self.Intensity[akey]), thisIntensity[akey]))
+            if doLines:
+                ionProcesses = []
+                if ionWorkerQSize < proc:
+                    proc = ionWorkerQSize
+                for i in range(proc):
+                    p = mp.Process(target=mputil.doIonQ, args=(ionWorkerQ, ionDoneQ, storeName))
+                    p.start()
+                    ionProcesses.append(p)
+            #       timeout is not necessary
+                for p in ionProcesses:
+            #            if p.is_alive():
+            #                p.join()
+                        p.join(timeout=timeout)
+                #
+                for ijk in range(ionWorkerQSize):
+                    out = ionDoneQ.get()
+                    ionS = out[0]
+                    if verbose:
+                        print(' collecting ion calculation for %s'%(ionS))
+                    thisIon = out[1]
+                    thisIntensity = thisIon.Intensity
+                    if not 'errorMessage' in sorted(thisIntensity.keys()):
+                        self.Finished.append(ionS)
+                        if keepIons:
+                            self.IonInstances[ionS] = copy.deepcopy(thisIon)
+                        if setupIntensity:
+                            for akey in sorted(self.Intensity.keys()):
+                                self.Intensity[akey] = np.hstack((copy.copy(self.Intensity[akey]), thisIntensity[akey]))
+                        else:
+                            setupIntensity = 1
+                            self.Intensity  = thisIntensity
+                        #
+                        if not 'errorMessage' in sorted(thisIon.Spectrum.keys()):
+                            lineSpectrum += thisIon.Spectrum['intensity']
+                       # check for two-photon emission
+                        if len(out) == 3:
+                            tp = out[2]
+                            twoPhoton += tp['intensity'].squeeze()
                     else:
-                        setupIntensity = 1
-                        self.Intensity  = thisIntensity
+                        if 'errorMessage' in sorted(thisIntensity.keys()):
+                            print(thisIntensity['errorMessage'])
                     #
-                    if not 'errorMessage' in sorted(thisIon.Spectrum.keys()):
-                        lineSpectrum += thisIon.Spectrum['intensity']
-                   # check for two-photon emission
-                    if len(out) == 3:
-                        tp = out[2]
-                        twoPhoton += tp['intensity'].squeeze()
-                else:
-                    if 'errorMessage' in sorted(thisIntensity.keys()):
-                        print(thisIntensity['errorMessage'])
-                #
-            for p in ionProcesses:
-                if not isinstance(p, str):
-                    p.terminate()
+                for p in ionProcesses:
+                    if not isinstance(p, str):
+                        p.terminate()
         #
         #
         #
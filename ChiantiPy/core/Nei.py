@@ -0,0 +1,341 @@
+"""
+Non-equilibrium ionization class
+"""
+import numpy as np
+from scipy.linalg import expm
+
+import ChiantiPy.tools.util as util
+
+from .Ioneq import stageRates, ioneqSolve
+
+
+class nei(object):
+    """
+    Calculate the time-dependent ion fractions of an element in plasma parcels whose
+    temperature and electron density change with time.
+
+    Parameters
+    ----------
+    el_or_z : `int` or `str`
+        Atomic number or symbol
+    temperature : array-like
+        the increasing temperatures, in K, of the grid on which the rates are tabulated,
+        10.**np.arange(4., 9.001, 0.01) if None
+    table : `bool`
+        interpolate the rates in the tables of `ChiantiPy.tools.ratetable`, which are kept in
+        the atomic-data cache, instead of calculating them.  The default grid lies on the
+        knots of these tables
+
+    Attributes
+    ----------
+    Rates : `dict`
+        {'temperature', 'ioniz', 'recomb'} the (Z+1, ngrid) rates of the grid, see
+        `ChiantiPy.core.Ioneq.stageRates`
+    Equilibrium : `numpy.ndarray`
+        the (Z+1, ngrid) equilibrium ion fractions of the grid
+    Eigenvalues, Eigenvectors, EigenInverse : `numpy.ndarray`
+        the (ngrid, Z+1) eigenvalues of the rate matrix of each grid temperature, the
+        (ngrid, Z+1, Z+1) matrices of its eigenvectors and their inverses, NaN at the
+        degenerate grid temperatures
+    Degenerate : `numpy.ndarray`
+        the (ngrid,) grid temperatures whose rate matrix has no well conditioned
+        eigenvectors, see `eigenSystem`.  Their steps are taken with scipy.linalg.expm
+
+    Notes
+    -----
+    The ion fractions n follow dn/dt = ne A(T) n, where the tridiagonal matrix A holds
+    the ionization and recombination rate coefficients of temperature T.  With
+    A = V diag(lambda) V^-1, a step of length dt at a constant temperature and density
+    is exactly
+
+    n(t + dt) = V exp(lambda ne dt) V^-1 n(t)
+
+    so that, with the eigenvectors of the grid temperatures calculated once, a step of
+    any length is two small matrix products.  The eigenvectors are those of
+    `eigenSystem`, real and with an inverse that is well conditioned by construction.
+    `solve` takes each step at the grid temperature nearest to its log temperature and
+    divides the steps in which the temperature crosses more than one grid cell.
+    """
+
+    def __init__(self, el_or_z, temperature=None, table=True):
+        if type(el_or_z) is str:
+            self.Z = util.el2z(el_or_z)
+        else:
+            self.Z = el_or_z
+        if temperature is None:
+            temperature = 10.**np.arange(4., 9.001, 0.01)
+        temperature = np.atleast_1d(np.asarray(temperature, np.float64))
+        if temperature.size < 2 or np.any(np.diff(temperature) <= 0.):
+            raise ValueError(' the temperature grid needs at least two increasing values')
+        self.LogGrid = np.log10(temperature)
+        self.Rates = stageRates(self.Z, temperature, table=table)
+        ioniz = self.Rates['ioniz']
+        recomb = self.Rates['recomb']
+        self.Equilibrium = ioneqSolve(ioniz, recomb)
+        nstage = self.Z + 1
+        self.Eigenvalues = np.zeros((temperature.size, nstage), np.float64)
+        self.Eigenvectors = np.zeros((temperature.size, nstage, nstage), np.float64)
+        self.EigenInverse = np.zeros_like(self.Eigenvectors)
+        self.Degenerate = np.zeros(temperature.size, np.bool_)
+        for itemp in range(temperature.size):
+            system = eigenSystem(ioniz[:, itemp], recomb[:, itemp])
+            if system is None:
+                self.Degenerate[itemp] = True
+                self.Eigenvalues[itemp] = np.nan
+                self.Eigenvectors[itemp] = np.nan
+                self.EigenInverse[itemp] = np.nan
+            else:
+                self.Eigenvalues[itemp], self.Eigenvectors[itemp], self.EigenInverse[itemp] = system
+
+    def gridIndex(self, temperature):
+        """
+        Return the index of the grid temperature nearest in log to each temperature.
+
+        Raises a ValueError for temperatures outside of the grid.
+        """
+        logT = np.log10(np.asarray(temperature, np.float64))
+        grid = self.LogGrid
+        # a small tolerance for temperatures on the ends of the grid
+        tol = 1.e-9*(grid[-1] - grid[0])
+        if np.any(logT < grid[0] - tol) or np.any(logT > grid[-1] + tol):
+            raise ValueError(' the temperature is outside of the grid, log10 from %10.3f to %10.3f'%(grid[0], grid[-1]))
+        edges = 0.5*(grid[1:] + grid[:-1])
+        return np.searchsorted(edges, logT)
+
+    def solve(self, time, temperature, eDensity, initial=None):
+        """
+        Calculate the ion fractions along the temperature and density histories of the parcels.
+
+        Parameters
+        ----------
+        time : array-like
+            the (ntime,) or (ntime, nparcel) increasing times, in s
+        temperature, eDensity : array-like
+            the (ntime,) or (ntime, nparcel) temperatures, in K, and electron densities,
+            in cm^-3, of the parcels at these times
+        initial : array-like
+            the (Z+1,) or (Z+1, nparcel) ion fractions at the first time, the equilibrium
+            at the first temperature if None
+
+        Notes
+        -----
+        The time, Temperature and EDensity of the (ntime, nparcel) histories are kept and
+        the (Z+1, ntime, nparcel) ion fractions are returned to self.Ioneq.  The temperature
+        and density of a step are those halfway through it, its log temperature and linear
+        density.
+        """
+        time = np.asarray(time, np.float64)
+        temperature = np.asarray(temperature, np.float64)
+        eDensity = np.asarray(eDensity, np.float64)
+        shapes = [np.shape(one) for one in [time, temperature, eDensity]]
+        if max(len(one) for one in shapes) > 2 or min(len(one) for one in shapes) < 1:
+            raise ValueError(' time, temperature and eDensity must have the shape (ntime,) or (ntime, nparcel)')
+        time, temperature, eDensity = np.broadcast_arrays(*[one.reshape(one.shape[0], -1) for one in [time, temperature, eDensity]])
+        ntime, nparcel = time.shape
+        if np.any(np.diff(time, axis=0) < 0.):
+            raise ValueError(' the times must increase')
+        nstage = self.Z + 1
+        logT = np.log10(temperature)
+        index = self.gridIndex(temperature)
+        if initial is None:
+            fractions = self.Equilibrium[:, index[0]].copy()
+        else:
+            initial = np.asarray(initial, np.float64)
+            if initial.shape[0] != nstage or initial.ndim > 2:
+                raise ValueError(' initial must have the shape (Z+1,) or (Z+1, nparcel)')
+            fractions = np.broadcast_to(initial.reshape(nstage, -1), (nstage, nparcel)).copy()
+        ioneq = np.zeros((nstage, ntime, nparcel), np.float64)
+        ioneq[:, 0] = fractions
+        for it in range(1, ntime):
+            # divide the step of each parcel whose temperature crosses more than one cell
+            # of the grid
+            nsub = np.maximum(np.abs(index[it] - index[it-1]), 1)
+            dt = (time[it] - time[it-1])/nsub
+            for isub in range(nsub.max()):
+                active = np.flatnonzero(nsub > isub)
+                weight = (isub + 0.5)/nsub[active]
+                ib = self.gridIndex(10.**((1. - weight)*logT[it-1, active] + weight*logT[it, active]))
+                ne = (1. - weight)*eDensity[it-1, active] + weight*eDensity[it, active]
+                step = np.zeros((nstage, active.size), np.float64)
+                eigen = ~self.Degenerate[ib]
+                ie = active[eigen]
+                coef = np.einsum('pij,jp->ip', self.EigenInverse[ib[eigen]], fractions[:, ie])
+                coef *= np.exp(self.Eigenvalues[ib[eigen]].T*ne[eigen]*dt[ie])
+                step[:, eigen] = np.einsum('pij,jp->ip', self.Eigenvectors[ib[eigen]], coef)
+                for ip in np.flatnonzero(~eigen):
+                    matrix = rateMatrix(self.Rates['ioniz'][:, ib[ip]], self.Rates['recomb'][:, ib[ip]])
+                    step[:, ip] = expm(matrix*ne[ip]*dt[active[ip]]).dot(fractions[:, active[ip]])
+                # the round-off of the eigenvectors can leave small negative fractions
+                step = np.maximum(step, 0.)
+                fractions[:, active] = step/step.sum(axis=0)
+            ioneq[:, it] = fractions
+        self.Time = time
+        self.Temperature = temperature
+        self.EDensity = eDensity
+        self.Ioneq = ioneq
+
+    def ioneqOne(self, stage, parcel=0):
+        """
+        Return the ion fractions of a stage along the history of a parcel.
+
+        Parameters
+        ----------
+        stage : `int`
+            the spectroscopic number of the ion, 1 for the neutral stage
+        parcel : `int`
+            the index of the parcel
+
+        Returns
+        -------
+        ioneqOne : `numpy.ndarray`
+            the (ntime,) ion fractions, in the form of the IoneqOne attribute of
+            `ChiantiPy.core.ion`
+        """
+        if not hasattr(self, 'Ioneq'):
+            raise ValueError(' the ion fractions have not been calculated, run solve first')
+        if stage < 1 or stage > self.Z + 1:
+            raise ValueError(' the stage must be from 1 to %i'%(self.Z + 1))
+        return self.Ioneq[stage - 1, :, parcel].copy()
+
+    def setIoneqOne(self, anIon, parcel=0):
+        """
+        Replace the equilibrium ion fractions of an ion or continuum with those of a parcel.
+
+        Parameters
+        ----------
+        anIon : `ChiantiPy.core.ion` or `ChiantiPy.core.continuum`
+            made with the temperatures of the history of the parcel, one for each time
+        parcel : `int`
+            the index of the parcel
+
+        Notes
+        -----
+        The emissivities, intensities and continua of anIon are then calculated with the
+        time-dependent ion fractions.  setConditions of anIon sets the equilibrium ion
+        fractions again.
+        """
+        stage = anIon.Ion + getattr(anIon, 'Dielectronic', 0)
+        fractions = self.ioneqOne(stage, parcel)
+        if anIon.Z != self.Z:
+            raise ValueError(' %s is not an ion of element %i'%(anIon.IonStr, self.Z))
+        temperature = np.atleast_1d(anIon.Temperature)
+        if temperature.shape != (self.Time.shape[0],) or not np.allclose(temperature, self.Temperature[:, parcel], rtol=1.e-10, atol=0.):
+            raise ValueError(' the temperatures of %s are not those of parcel %i'%(anIon.IonStr, parcel))
+        anIon.IoneqOne = fractions
+
+
+def rateMatrix(ioniz, recomb):
+    """
+    Return the tridiagonal rate matrix of the stages of an element at one temperature.
+
+    Parameters
+    ----------
+    ioniz, recomb : `numpy.ndarray`
+        the (Z+1,) total ionization and recombination rate coefficients of the stages, with
+        the neutral stage first
+    """
+    ioniz = np.asarray(ioniz, np.float64)
+    recomb = np.asarray(recomb, np.float64)
+    return np.diag(-(ioniz + recomb)) + np.diag(ioniz[:-1], -1) + np.diag(recomb[1:], 1)
+
+
+def eigenSystem(ioniz, recomb, tol=1.e-6):
+    """
+    Return the eigenvalues, the eigenvectors and their inverse of the tridiagonal rate matrix
+    of the stages of an element at one temperature.
+
+    Parameters
+    ----------
+    ioniz, recomb : `numpy.ndarray`
+        the (Z+1,) total ionization and recombination rate coefficients of the stages, with
+        the neutral stage first
+
+    tol : `float`
+        the relative difference below which the eigenvalues of two blocks are the same
+
+    Returns
+    -------
+    eigenvalues : `numpy.ndarray`
+        the (Z+1,) eigenvalues
+    eigenvectors, eigenInverse : `numpy.ndarray`
+        the (Z+1, Z+1) matrix V of the eigenvectors, as columns, and its inverse
+
+    None is returned if a block feeds another block with the same eigenvalue, to within
+    `tol`, such as two high stages with no ionization and the same recombination rate.
+    The matrix may then have no complete set of eigenvectors.
+
+    Notes
+    -----
+    The off-diagonal products ioniz[i]*recomb[i+1] of the matrix are not negative.  The
+    chain of stages is cut into blocks at the links where one of them is zero, where the
+    tables zero the ionization rates of the high stages at low temperatures.  In a block the
+    diagonal similarity D with d[i+1]/d[i] = sqrt(ioniz[i]/recomb[i+1]) makes the matrix
+    symmetric, with the off-diagonal elements sqrt(ioniz[i]*recomb[i+1]), so that its
+    eigenvalues are real and, with its orthogonal eigenvectors Q from `numpy.linalg.eigh`,
+    the eigenvectors of the block are D Q and their inverse Q^T D^-1.
+
+    A block only feeds the blocks next to it along the links with a positive rate.  The
+    eigenvectors of a block carry on into the blocks downstream of it, and the rows of the
+    inverse into the blocks upstream of it, through the eigensystems of those blocks.
+    """
+    ioniz = np.asarray(ioniz, np.float64)
+    recomb = np.asarray(recomb, np.float64)
+    nstage = ioniz.size
+    link = (ioniz[:-1] > 0.) & (recomb[1:] > 0.)
+    starts = np.concatenate([[0], np.flatnonzero(~link) + 1])
+    ends = np.append(starts[1:], nstage)
+    blocks = []
+    for lo, hi in zip(starts, ends):
+        offDiag = np.sqrt(ioniz[lo:hi-1]*recomb[lo+1:hi])
+        sym = np.diag(-(ioniz[lo:hi] + recomb[lo:hi])) + np.diag(offDiag, 1) + np.diag(offDiag, -1)
+        mu, q = np.linalg.eigh(sym)
+        with np.errstate(divide='ignore'):
+            steps = 0.5*(np.log(ioniz[lo:hi-1]) - np.log(recomb[lo+1:hi]))
+        logD = np.concatenate([[0.], np.cumsum(steps)])
+        # keep d within the range of the floats
+        logD = np.maximum(logD - logD.max(), -690.)
+        d = np.exp(logD)
+        blocks.append((lo, hi, mu, d[:, np.newaxis]*q, q.T/d[np.newaxis, :]))
+    eigenvalues = np.zeros(nstage, np.float64)
+    eigenvectors = np.zeros((nstage, nstage), np.float64)
+    eigenInverse = np.zeros((nstage, nstage), np.float64)
+    nblock = len(blocks)
+    for ib, (lo, hi, lam, vec, inv) in enumerate(blocks):
+        modes = slice(lo, hi)
+        eigenvalues[modes] = lam
+        eigenvectors[lo:hi, modes] = vec
+        eigenInverse[modes, lo:hi] = inv
+        # the eigenvectors solve (lam - A_c) x_c = A[c, b] x_b in the blocks c downstream,
+        # the rows of the inverse w_c^T (lam - A_c) = w_b^T A[b, c] in the blocks upstream
+        for step in [1, -1]:
+            x = vec
+            w = inv
+            ic = ib + step
+            while 0 <= ic < nblock:
+                clo, chi, cmu, cvec, cinv = blocks[ic]
+                if step == 1:
+                    fed, feeds = ioniz[clo-1], recomb[clo]
+                    inRow, outRow = 0, -1
+                else:
+                    fed, feeds = recomb[chi], ioniz[chi-1]
+                    inRow, outRow = -1, 0
+                if (x is not None and fed > 0.) or (w is not None and feeds > 0.):
+                    scale = np.maximum(np.abs(lam)[np.newaxis, :], np.abs(cmu)[:, np.newaxis])
+                    if np.any(np.abs(lam[np.newaxis, :] - cmu[:, np.newaxis]) <= tol*scale):
+                        return None
+                if x is not None and fed > 0.:
+                    coef = cinv[:, inRow][:, np.newaxis]*fed*x[outRow][np.newaxis, :]
+                    x = cvec.dot(coef/(lam[np.newaxis, :] - cmu[:, np.newaxis]))
+                    eigenvectors[clo:chi, modes] = x
+                else:
+                    x = None
+                if w is not None and feeds > 0.:
+                    coef = cvec[inRow][:, np.newaxis]*feeds*w[:, outRow][np.newaxis, :]
+                    w = (coef/(lam[np.newaxis, :] - cmu[:, np.newaxis])).T.dot(cinv)
+                    eigenInverse[modes, clo:chi] = w
+                else:
+                    w = None
+                if x is None and w is None:
+                    break
+                ic += step
+    return eigenvalues, eigenvectors, eigenInverse
@@ -1,7 +1,6 @@
 from datetime import datetime
 
 import numpy as np
-import matplotlib.pyplot as plt
 np.seterr(over='ignore')
 
 from .Continuum import continuum
@@ -178,6 +177,7 @@ class radLoss(ionTrails, specTrails):
         '''
         to plot the radiative losses vs temperature
         '''
+        import matplotlib.pyplot as plt
         fontsize = 16
         temp = self.RadLoss['temperature']
         rate = self.RadLoss['rate']
@@ -0,0 +1,590 @@
+"""
+Rate operator class
+"""
+import copy
+
+import numpy as np
+
+import ChiantiPy.tools.util as util
+import ChiantiPy.tools.constants as const
+import ChiantiPy.tools.data as chdata
+
+
+class rateOperator(object):
+    """
+    The collisional-radiative rate matrix of an ion, for solving its level populations
+    at any temperature and density without reading or descaling the data again.
+
+    The rate matrix is the sum of the radiative terms A, which do not depend on the
+    conditions, ne*C(T) for electron collisions, np*P(T) for proton collisions and the
+    columns for ionization to and recombination from the higher ionization stage.  The
+    level indices and A are set up once, C(T), P(T) and the ionization and recombination
+    rates are kept for every temperature at which they have been calculated.
+
+    Parameters
+    ----------
+    anIon : `ChiantiPy.core.ion`
+        an ion that has been set up with the atomic data, its radTemperature and rStar,
+        or its meanIntensity, are used for photoexcitation and stimulated emission
+
+    Notes
+    -----
+    As in `ChiantiPy.core.ion.populate`, all of the population of the higher ionization stage
+    is assumed to be in its ground level, except by `drTerms`, which weights the recombination
+    from each of its levels by its populations, as in `ChiantiPy.core.ion.drPopulate`.
+    """
+    def __init__(self, anIon):
+        self.Ion = anIon
+        nlvls = anIon.Nlvls
+        ci = 0
+        if anIon.Nrrlvl or anIon.Nauto:
+            rec = 1
+        else:
+            rec = 0
+        self.Ci = ci
+        self.Rec = rec
+        self.Nlvls = nlvls
+        self.Nmat = nlvls + ci + rec
+        if anIon.Nrrlvl:
+            # only include rr from ground level
+            self.RrLvlIdx = [i for i,lvl1 in enumerate(anIon.Rrlvl['lvl1']) if lvl1 == 1]
+        else:
+            self.RrLvlIdx = []
+        if rec:
+            #  the higher ionization stage for its recombination rates to this ion
+            highers = util.zion2name(anIon.Z, anIon.Ion+1)
+            self.Higher = type(anIon)(highers, anIon.Temperature, setup=0)
+            self.Higher.setupIonrec()
+        #  the radiative transitions and autoionization transitions
+        l1, l2 = anIon.LevelIdx['wgfa']
+        avalue = np.asarray(anIon.Wgfa['avalue'], np.float64)
+        rows = [l1+ci, l2+ci]
+        cols = [l2+ci, l2+ci]
+        values = [avalue, -avalue]
+        # photo-excitation and stimulated emission
+        meanIntensity = getattr(anIon, 'MeanIntensity', None)
+        if anIon.RadTemperature or meanIntensity is not None:
+            ecm = np.asarray(anIon.Elvlc['ecm'], np.float64)
+            mult = np.asarray(anIon.Elvlc['mult'], np.float64)
+            de = const.invCm2Erg*(ecm[l2] - ecm[l1])
+            phexFactor, stemFactor = util.pumpingFactors(anIon.Wgfa['wvl'], de, mult[l1], mult[l2],
+                radTemperature=anIon.RadTemperature, rStar=anIon.RStar, meanIntensity=meanIntensity)
+            rows += [l2+ci, l1+ci, l1+ci, l2+ci]
+            cols += [l1+ci, l1+ci, l2+ci, l2+ci]
+            values += [avalue*phexFactor, -avalue*phexFactor, avalue*stemFactor, -avalue*stemFactor]
+        # the terms of each transition are added in turn
+        radRows = [np.stack(rows, 1).ravel()]
+        radCols = [np.stack(cols, 1).ravel()]
+        radValues = [np.stack(values, 1).ravel()]
+        # autoionization rates
+        if anIon.Nauto:
+            l1, l2 = anIon.LevelIdx['auto']
+            avalue = np.asarray(anIon.Auto['avalue'], np.float64)
+            # all autoionization eventually goes to the ground level of the higher ion
+            radRows.append(np.stack([l1+ci+rec, l2+ci], 1).ravel())
+            radCols.append(np.stack([l2+ci, l2+ci], 1).ravel())
+            radValues.append(np.stack([avalue, -avalue], 1).ravel())
+        self.RadRows = np.concatenate(radRows)
+        self.RadCols = np.concatenate(radCols)
+        self.RadValues = np.concatenate(radValues)
+        self.Rad = None
+        norm = np.ones(self.Nmat, np.float64)
+        if ci:
+            norm[0] = 0.
+        if rec:
+            norm[-1] = 0.
+        self.Norm = norm
+        if anIon.Nauto:
+            # the branching ratio of the radiative decays of each autoionizing level
+            wgfaLvl = np.asarray(anIon.Wgfa['avalueLvl'], np.float64)
+            autoLvl = np.asarray(anIon.Auto['avalueLvl'], np.float64)
+            branch = np.zeros_like(autoLvl)
+            lvl = np.asarray(anIon.Elvlc['lvl'][1:], np.int64) - 1
+            lvl = lvl[wgfaLvl[lvl] > 0.]
+            branch[lvl] = wgfaLvl[lvl]/(wgfaLvl[lvl] + autoLvl[lvl])
+            self.Branch = branch
+        # the recombination data of drPopulate, set up on first use by drSetup
+        self.DrIdx = None
+        self.DrHigher = None
+        # the rates at the temperatures calculated so far, with temperature as the last axis
+        self.CacheTemperature = np.zeros(0, np.float64)
+        self.CacheRates = None
+
+    def ionRates(self, anIon, higher=None):
+        """
+        Calculate the rates that depend on temperature at the temperatures of `anIon`.
+
+        Parameters
+        ----------
+        anIon : `ChiantiPy.core.ion`
+            the ion of the operator, or a copy of it with other temperatures, it keeps
+            the Upsilon, PUpsilon, IonizRate and RrlvlRate that are calculated
+        higher : `ChiantiPy.core.ion`
+            the higher ionization stage at the same temperatures, if None, the one of the
+            operator is used
+
+        Returns
+        -------
+        rates : `dict`
+            exRate, dexRate, pexRate and pdexRate, the (ntrans, ntemp) collision rates, ioniz,
+            the ionization rate, recomb, the recombination rate of the higher stage, rr, the
+            (nrr, ntemp) radiative recombination rates from its ground level and rrAll, those
+            from all of its levels
+        """
+        rates = {}
+        if anIon.Nscups:
+            anIon.upsilonDescale()
+            rates['exRate'] = anIon.Upsilon['exRate']
+            rates['dexRate'] = anIon.Upsilon['dexRate']
+        if anIon.Npsplups:
+            anIon.upsilonDescale(prot=1)
+            rates['pexRate'] = anIon.PUpsilon['exRate']
+            rates['pdexRate'] = anIon.PUpsilon['dexRate']
+        if self.Rec:
+            anIon.ionizRate()
+            rates['ioniz'] = anIon.IonizRate['rate']
+            if anIon.Nrrlvl:
+                if not hasattr(anIon, 'RrlvlRate'):
+                    anIon.rrlvlDescale()
+                rates['rr'] = anIon.RrlvlRate['rate'][self.RrLvlIdx]
+                rates['rrAll'] = anIon.RrlvlRate['rate']
+            if higher is None:
+                higher = copy.copy(self.Higher)
+                higher.Temperature = anIon.Temperature
+                higher.NTempDens = anIon.Temperature.size
+            higher.recombRate()
+            rates['recomb'] = higher.RecombRate['rate']
+        return rates
+
+    def rates(self, temperature, anIon=None):
+        """
+        Return the rates of `ionRates` at `temperature`, calculating them only at the
+        temperatures that have not been seen before.
+
+        The proton to electron density ratio is returned as p2eRatio.
+
+        Parameters
+        ----------
+        temperature : array-like
+            the temperatures
+        anIon : `ChiantiPy.core.ion`
+            the ion of the operator at these temperatures.  If given and some of the
+            temperatures are new, or its Upsilon, PUpsilon, IonizRate or RrlvlRate are
+            missing, the rates are calculated by `ionRates` with the ion itself, which keeps
+            them, as `ChiantiPy.core.ion.populate` does
+        """
+        temperature = np.atleast_1d(np.asarray(temperature, np.float64))
+        unique = np.unique(temperature)
+        new = unique[~np.isin(unique, self.CacheTemperature)]
+        if anIon is not None and (new.size or not self.hasRates(anIon)):
+            newRates = self.ionRates(anIon)
+            anIon.p2eRatio()
+            newRates['p2eRatio'] = anIon.ProtonDensityRatio
+            # the first point of each of the new temperatures
+            allUnique, first = np.unique(anIon.Temperature, return_index=True)
+            first = first[np.isin(allUnique, new)]
+            newRates = {akey:np.asarray(value)[..., first] for akey, value in newRates.items()}
+            self.addRates(new, newRates)
+        elif new.size:
+            # a shallow copy keeps the atomic data but not the results for other temperatures
+            worker = copy.copy(self.Ion)
+            worker.Temperature = new
+            worker.Ntemp = worker.Temperature.size
+            worker.NTempDens = worker.Temperature.size
+            for akey in ['Upsilon', 'PUpsilon', 'IonizRate', 'RrlvlRate']:
+                if hasattr(worker, akey):
+                    delattr(worker, akey)
+            if hasattr(worker, 'EaParams'):
+                # eaRate uses the upsilons of the last eaDescale
+                worker.EaParams = dict(worker.EaParams)
+                worker.eaDescale()
+            newRates = self.ionRates(worker)
+            worker.p2eRatio()
+            newRates['p2eRatio'] = worker.ProtonDensityRatio
+            self.addRates(new, newRates)
+        index = np.searchsorted(self.CacheTemperature, temperature)
+        return {akey:value[..., index] for akey, value in self.CacheRates.items()}
+
+    def addRates(self, temperature, newRates):
+        """
+        Add the rates of `ionRates` at the new unique `temperature` to the kept rates.
+        """
+        if not temperature.size:
+            return
+        if self.CacheRates is None:
+            allTemperature = temperature
+            self.CacheRates = newRates
+        else:
+            allTemperature = np.concatenate([self.CacheTemperature, temperature])
+            for akey in newRates:
+                self.CacheRates[akey] = np.concatenate([self.CacheRates[akey], newRates[akey]], axis=-1)
+        order = np.argsort(allTemperature)
+        self.CacheTemperature = allTemperature[order]
+        for akey in self.CacheRates:
+            self.CacheRates[akey] = self.CacheRates[akey][..., order]
+
+    def hasRates(self, anIon):
+        """
+        Whether `anIon` keeps the Upsilon, PUpsilon, IonizRate and RrlvlRate of `ionRates` at
+        its temperatures.
+        """
+        names = []
+        if anIon.Nscups:
+            names.append('Upsilon')
+        if anIon.Npsplups:
+            names.append('PUpsilon')
+        if self.Rec:
+            names.append('IonizRate')
+            if anIon.Nrrlvl:
+                names.append('RrlvlRate')
+        for name in names:
+            value = getattr(anIon, name, None)
+            if value is None or 'temperature' not in value:
+                return False
+            if not np.array_equal(np.atleast_1d(value['temperature']), anIon.Temperature):
+                return False
+        return True
+
+    def collisionTerms(self, eDensity, pDensity, rates):
+        """
+        Return the electron and proton collision terms and the ionization terms of the rate
+        matrix, as lists of the rows, columns and values of each group of terms.
+
+        Parameters
+        ----------
+        eDensity, pDensity : `numpy.ndarray`
+            the densities, of the same size as the temperatures of `rates`
+        rates : `dict`
+            the rates of `ionRates`
+        """
+        anIon = self.Ion
+        ci = self.Ci
+        nmat = self.Nmat
+        rows = []
+        cols = []
+        values = []
+        if anIon.Nscups:
+            l1, l2 = anIon.LevelIdx['scups']
+            rows.append(np.stack([l1+ci, l2+ci, l1+ci, l2+ci], 1))
+            cols.append(np.stack([l2+ci, l1+ci, l1+ci, l2+ci], 1))
+            dex = eDensity*rates['dexRate']
+            ex = eDensity*rates['exRate']
+            values.append(np.stack([dex, ex, -ex, -dex], 1))
+        # proton rates
+        if anIon.Npsplups:
+            l1, l2 = anIon.LevelIdx['psplups']
+            rows.append(np.stack([l1+ci, l2+ci, l1+ci, l2+ci], 1))
+            cols.append(np.stack([l2+ci, l1+ci, l1+ci, l2+ci], 1))
+            pdex = pDensity*rates['pdexRate']
+            pex = pDensity*rates['pexRate']
+            values.append(np.stack([pdex, pex, -pex, -pdex], 1))
+        if self.Rec:
+            grnd = np.arange(anIon.GrndLevels) + ci
+            ioniz = np.tile(eDensity*rates['ioniz'], (anIon.GrndLevels, 1))
+            rows.append(np.stack([np.full_like(grnd, nmat - 1), grnd], 1))
+            cols.append(np.stack([grnd, grnd], 1))
+            values.append(np.stack([ioniz, -ioniz], 1))
+        return rows, cols, values
+
+    def missingTerms(self, eDensity, rates, recTot, rows, cols, values):
+        """
+        Append the terms of the recombination rate of the higher stage in excess of the
+        level-resolved rates recTot, which go into the ground level, and return all of the
+        terms as the rows, columns and (nterms, npoints) values of `terms`.
+        """
+        ci = self.Ci
+        nmat = self.Nmat
+        npoints = eDensity.size
+        if self.Rec:
+            # in this case, haven't completely accounted for recombination
+            recomb = rates['recomb']
+            missing = np.where(recTot < recomb, eDensity*(recomb - recTot), 0.)
+            rows.append(np.array([[ci, nmat - 1]]))
+            cols.append(np.array([[nmat - 1, nmat - 1]]))
+            values.append(np.stack([missing, -missing])[np.newaxis])
+        if not rows:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros((0, npoints), np.float64)
+        # the terms of each transition are added in turn
+        rows = np.concatenate([one.ravel() for one in rows])
+        cols = np.concatenate([one.ravel() for one in cols])
+        values = np.concatenate([one.reshape(-1, npoints) for one in values])
+        return rows, cols, values
+
+    def terms(self, temperature, eDensity, pDensity, rates, verbose=0):
+        """
+        Return the collision, ionization and recombination terms of the rate matrix.
+
+        Parameters
+        ----------
+        temperature, eDensity, pDensity : `numpy.ndarray`
+            the temperatures and densities, all of the same size
+        rates : `dict`
+            the rates of `ionRates` at these temperatures
+
+        Returns
+        -------
+        rows, cols : `numpy.ndarray`
+            the row and column of each term
+        values : `numpy.ndarray`
+            the (nterms, npoints) values of the terms at each point
+        """
+        anIon = self.Ion
+        ci = self.Ci
+        rec = self.Rec
+        nmat = self.Nmat
+        npoints = temperature.size
+        # (4 pi a0^2)^(3/2) = 6.6011e-24 (Badnell et al, 2003, A&A 406, 1151
+        coef2 = (const.planck)**3/(2.*const.pi*const.emass*const.boltzmann*temperature)**1.5
+        drTot = np.zeros(npoints, np.float64)
+        rrTot = np.zeros(npoints, np.float64)
+        rows, cols, values = self.collisionTerms(eDensity, pDensity, rates)
+        if rec:
+            if anIon.Nrrlvl:
+                # only include rr from ground level
+                lvl2 = anIon.LevelIdx['rrlvl'][1][self.RrLvlIdx]
+                rrRate = rates['rr']
+                rows.append(np.stack([lvl2+ci, np.full_like(lvl2, nmat - 1)], 1))
+                cols.append(np.full((lvl2.size, 2), nmat - 1))
+                values.append(np.stack([eDensity*rrRate, -eDensity*rrRate], 1))
+                rrTot = rrRate.sum(axis=0)
+            if anIon.Nauto:
+                l1, l2 = anIon.LevelIdx['auto']
+                # only including dielectronic recombination from the lowest level
+                lowest = l1 == 0
+                l2 = l2[lowest]
+                gUpper = float(self.Higher.Elvlc['mult'][0])
+                gLower = np.asarray(anIon.Elvlc['mult'], np.float64)[l2]
+                ecm2 = np.asarray(anIon.Elvlc['ecm'], np.float64)[l2]
+                ecm2 = np.where(ecm2 < 0., np.asarray(anIon.Elvlc['ecmth'], np.float64)[l2], ecm2)
+                de1 = ecm2*const.invCm2Erg - anIon.Ip*const.ev2Erg
+                expkt = np.exp(-(de1[:, np.newaxis]/(const.boltzmann*temperature)))
+                avalue = np.asarray(anIon.Auto['avalue'], np.float64)[lowest]
+                dielRate = coef2*gLower[:, np.newaxis]*expkt*avalue[:, np.newaxis]/(2.*gUpper)
+                rows.append(np.stack([l2+ci, np.full_like(l2, nmat - 1)], 1))
+                cols.append(np.full((l2.size, 2), nmat - 1))
+                values.append(np.stack([eDensity*dielRate, -eDensity*dielRate], 1))
+                # as before, the dielectronic rates are not subtracted from the total
+                # recombination rate, drTot stays zero
+            recTot = rrTot + drTot
+            if verbose:
+                for itemp in range(npoints):
+                    print('itemp rrTot dielRateTot %5i %10.2e %10.2e'%(itemp, rrTot[itemp], drTot[itemp]))
+                    print('itemp, recTot RecombRate %5i %10.2e %10.2e'%(itemp, recTot[itemp], rates['recomb'][itemp]))
+        else:
+            recTot = None
+        return self.missingTerms(eDensity, rates, recTot, rows, cols, values)
+
+    def solveTerms(self, rows, cols, values, solver='auto'):
+        """
+        Solve the rate equations with the radiative terms and the terms returned by `terms`.
+
+        Returns
+        -------
+        fullPop : `numpy.ndarray`
+            the (npoints, nmat) populations, including that of the higher ionization stage
+        failed : `list`
+            the indices of the points where the matrix is singular
+        popmat : `numpy.ndarray` or `scipy.sparse.csc_matrix`
+            the matrix of the last point
+        solver : `str`
+            the solver used, see `ChiantiPy.core.ion.populate`
+        """
+        nmat = self.Nmat
+        if solver == 'auto':
+            solver = util.popSolver(nmat, np.concatenate([self.RadRows, rows]), np.concatenate([self.RadCols, cols]))
+        if solver == 'dense':
+            if self.Rad is None:
+                self.Rad = np.zeros((nmat, nmat), np.float64)
+                np.add.at(self.Rad, (self.RadRows, self.RadCols), self.RadValues)
+            # the points are solved together, in chunks of at most popmemory megabytes
+            fullPop, failed, popmat = util.popSolve(self.Rad, rows, cols, values, self.Norm, maxMemory=self.Ion.Defaults['popmemory'])
+        elif solver in ('sparse', 'iterative'):
+            fullPop, failed, popmat = util.popSolveSparse(self.RadRows, self.RadCols, self.RadValues, rows, cols, values, self.Norm, iterative=solver == 'iterative')
+        else:
+            raise ValueError('solver must be one of auto, dense, sparse or iterative, not %s'%(solver))
+        return fullPop, failed, popmat, solver
+
+    def population(self, temperature, eDensity, pDensity, rates, solver='auto', verbose=0):
+        """
+        Return the level populations as the Population dict of `ChiantiPy.core.ion.populate`
+        for the given temperatures, densities and rates.
+        """
+        ci = self.Ci
+        rows, cols, values = self.terms(temperature, eDensity, pDensity, rates, verbose=verbose)
+        fullPop, failed, popmat, solver = self.solveTerms(rows, cols, values, solver=solver)
+        pop = fullPop[:, ci:ci+self.Nlvls]
+        pop = np.where(pop > 0., pop, 0.)
+        population = {"temperature":temperature,"eDensity":eDensity,"population":pop, "protonDensity":pDensity, "ci":ci, "rec":self.Rec, 'popmat':popmat, 'fullPop':fullPop, 'method':'populate', 'solver':solver}
+        if len(failed) > 0:
+            population['errorMessage'] = ['linealgError for T index %5i'%(itemp) for itemp in failed]
+        return population
+
+    def drSetup(self):
+        """
+        Set up the index arrays of the dielectronic capture into all of the autoionizing levels
+        and of the radiative recombination from all of the levels of the higher ionization
+        stage, for `drTerms`.
+
+        They are kept in DrIdx.  When this ion recombines from excited levels of the higher
+        stage, the higher stage is set up with all of its atomic data and a rate operator
+        of its own, kept in DrHigher, solves its level populations.
+        """
+        if self.DrIdx is not None:
+            return self.DrIdx
+        anIon = self.Ion
+        drIdx = {}
+        maxLvl1 = 1
+        if anIon.Nauto:
+            l1, l2 = anIon.LevelIdx['auto']
+            gUpper = np.asarray(self.Higher.Elvlc['mult'], np.float64)[l1]
+            gLower = np.asarray(anIon.Elvlc['mult'], np.float64)[l2]
+            ecm2 = np.asarray(anIon.Elvlc['ecm'], np.float64)[l2]
+            ecm2 = np.where(ecm2 < 0., np.asarray(anIon.Elvlc['ecmth'], np.float64)[l2], ecm2)
+            avalue = np.asarray(anIon.Auto['avalue'], np.float64)
+            drIdx['auto'] = {'lvl1':l1, 'lvl2':l2, 'de':ecm2*const.invCm2Erg - anIon.Ip*const.ev2Erg,
+                'factor':gLower*avalue/(2.*gUpper), 'branch':self.Branch[l2]}
+            maxLvl1 = max(maxLvl1, l1.max() + 1)
+        if anIon.Nrrlvl:
+            drIdx['rrlvl'] = anIon.LevelIdx['rrlvl']
+            maxLvl1 = max(maxLvl1, drIdx['rrlvl'][0].max() + 1)
+        drIdx['maxLvl1'] = maxLvl1
+        if maxLvl1 > 1:
+            highers = self.Higher.IonStr
+            if highers in chdata.MasterList:
+                higher = type(anIon)(highers, temperature=anIon.Temperature, eDensity=anIon.EDensity)
+                self.DrHigher = rateOperator(higher)
+            else:
+                print(' %s is not in the masterlist, all of its population is taken to be in its ground level'%(highers))
+        self.DrIdx = drIdx
+        return drIdx
+
+    def higherPopulation(self, temperature, eDensity):
+        """
+        Return the (npoints, nlvls) level populations of the higher ionization stage for
+        `drTerms`, all in its ground level if this ion only recombines from that level.
+        """
+        drIdx = self.drSetup()
+        if self.DrHigher is None:
+            hPop = np.zeros((temperature.size, drIdx['maxLvl1']), np.float64)
+            hPop[:, 0] = 1.
+            return hPop
+        return self.DrHigher.solve(temperature, eDensity)['population']
+
+    def drTerms(self, temperature, eDensity, pDensity, rates, hPop, verbose=0):
+        """
+        Return the terms of the rate matrix of `ChiantiPy.core.ion.drPopulate`.
+
+        The dielectronic capture into all of the autoionizing levels and the radiative
+        recombination from all of the levels of the higher ionization stage are weighted by
+        the populations hPop of its levels.
+
+        Returns
+        -------
+        rows, cols, values : `numpy.ndarray`
+            as for `terms`
+        recomb : `dict`
+            rrTot and drTot, the radiative and the stabilized dielectronic recombination rates of
+            each point, and dielLvlTot, the (npoints, maxAutoLvl1, maxAutoLvl2) dielectronic
+            capture rates from each level of the higher stage into each autoionizing level
+        """
+        ci = self.Ci
+        nmat = self.Nmat
+        npoints = temperature.size
+        drIdx = self.drSetup()
+        rows, cols, values = self.collisionTerms(eDensity, pDensity, rates)
+        recomb = {'rrTot':np.zeros(npoints, np.float64), 'drTot':np.zeros(npoints, np.float64)}
+        if 'rrlvl' in drIdx:
+            l1, l2 = drIdx['rrlvl']
+            rrRate = hPop[:, l1].T*rates['rrAll']
+            rows.append(np.stack([l2+ci, np.full_like(l2, nmat - 1)], 1))
+            cols.append(np.full((l2.size, 2), nmat - 1))
+            values.append(np.stack([eDensity*rrRate, -eDensity*rrRate], 1))
+            recomb['rrTot'] = rrRate.sum(axis=0)
+        if 'auto' in drIdx:
+            auto = drIdx['auto']
+            l1, l2 = auto['lvl1'], auto['lvl2']
+            coef2 = (const.planck)**3/(2.*const.pi*const.emass*const.boltzmann*temperature)**1.5
+            expkt = np.exp(-(auto['de'][:, np.newaxis]/(const.boltzmann*temperature)))
+            dielRate = coef2*auto['factor'][:, np.newaxis]*expkt*hPop[:, l1].T
+            rows.append(np.stack([l2+ci, np.full_like(l2, nmat - 1)], 1))
+            cols.append(np.full((l2.size, 2), nmat - 1))
+            values.append(np.stack([eDensity*dielRate, -eDensity*dielRate], 1))
+            recomb['drTot'] = (auto['branch'][:, np.newaxis]*dielRate).sum(axis=0)
+            dielLvlTot = np.zeros((npoints, l1.max() + 1, l2.max() + 1), np.float64)
+            np.add.at(dielLvlTot, (slice(None), l1, l2), dielRate.T)
+            recomb['dielLvlTot'] = dielLvlTot
+        recTot = recomb['rrTot'] + recomb['drTot']
+        if verbose and self.Rec:
+            for itemp in range(npoints):
+                print('itemp rrTot dielRateTot %5i %10.2e %10.2e'%(itemp, recomb['rrTot'][itemp], recomb['drTot'][itemp]))
+                print('itemp, recTot RecombRate %5i %10.2e %10.2e'%(itemp, recTot[itemp], rates['recomb'][itemp]))
+        rows, cols, values = self.missingTerms(eDensity, rates, recTot, rows, cols, values)
+        return rows, cols, values, recomb
+
+    def drPopulation(self, temperature, eDensity, pDensity, rates, solver='auto', verbose=0):
+        """
+        Return the level populations as the Population dict of `ChiantiPy.core.ion.drPopulate`
+        for the given temperatures, densities and rates.
+
+        The dict also holds the populations of the higher ionization stage, higherPopulation,
+        and the recombination rates of `drTerms`, rrTot, drTot and dielLvlTot.
+        """
+        ci = self.Ci
+        if self.Rec:
+            hPop = self.higherPopulation(temperature, eDensity)
+        else:
+            hPop = None
+        rows, cols, values, recomb = self.drTerms(temperature, eDensity, pDensity, rates, hPop, verbose=verbose)
+        fullPop, failed, popmat, solver = self.solveTerms(rows, cols, values, solver=solver)
+        pop = fullPop[:, ci:ci+self.Nlvls]
+        pop = np.where(pop > 0., pop, 0.)
+        population = {"temperature":temperature,"eDensity":eDensity,"population":pop, "protonDensity":pDensity, "ci":ci, "rec":self.Rec, 'popmat':popmat, 'fullPop':fullPop, 'higherPopulation':hPop, 'method':'drPopulate', 'solver':solver}
+        if len(failed) > 0:
+            population['errorMessage'] = ['linealgError for T index %5i'%(itemp) for itemp in failed]
+        population.update(recomb)
+        return population
+
+    def solve(self, temperature, eDensity, pDensity=None, solver='auto', method='populate', verbose=0):
+        """
+        Calculate the level populations at new temperatures and densities.
+
+        Parameters
+        ----------
+        temperature, eDensity : array-like
+            the temperatures and electron densities, either of the same size or one of
+            them with a single value
+        pDensity : array-like
+            the proton densities, if None, the electron densities times the proton to
+            electron density ratio of the abundances and ionization equilibrium of the ion
+        solver : `str`
+            the solver of the rate equations, see `ChiantiPy.core.ion.populate`
+        method : `str`
+            'populate' or 'drPopulate', the rate equations of `ChiantiPy.core.ion.populate` or
+            those of `ChiantiPy.core.ion.drPopulate`
+
+        Returns
+        -------
+        population : `dict`
+            as the Population attribute set by `ChiantiPy.core.ion.populate` or
+            `ChiantiPy.core.ion.drPopulate`
+        """
+        temperature = np.atleast_1d(np.asarray(temperature, np.float64))
+        eDensity = np.atleast_1d(np.asarray(eDensity, np.float64))
+        if temperature.size == 1 and eDensity.size > 1:
+            temperature = np.tile(temperature, eDensity.size)
+        elif eDensity.size == 1 and temperature.size > 1:
+            eDensity = np.tile(eDensity, temperature.size)
+        if temperature.size != eDensity.size:
+            raise ValueError('Temperature and density must be the same size.')
+        rates = self.rates(temperature)
+        if pDensity is None:
+            pDensity = rates['p2eRatio']*eDensity
+        else:
+            pDensity = np.atleast_1d(np.asarray(pDensity, np.float64))
+            if pDensity.size == 1:
+                pDensity = np.tile(pDensity, eDensity.size)
+        if method == 'drPopulate':
+            return self.drPopulation(temperature, eDensity, pDensity, rates, solver=solver, verbose=verbose)
+        elif method != 'populate':
+            raise ValueError('method must be populate or drPopulate, not %s'%(method))
+        return self.population(temperature, eDensity, pDensity, rates, solver=solver, verbose=verbose)
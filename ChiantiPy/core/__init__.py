@@ -11,4 +11,6 @@ from .IpyMspectrum import ipymspectrum
 from .Continuum import continuum
 from .RadLoss import radLoss
 from .Ion import ion
+from .RateOperator import rateOperator
 from .Ioneq import ioneq
+from .Nei import nei
@@ -79,3 +79,13 @@ def test_free_bound_no_info():
     # raise error if no free-bound information is available
     tmp_cont_no_fb.freeBound(wavelength_array)
     assert 'errorMessage' in tmp_cont_no_fb.FreeBound.keys()
+
+
+def test_gaunt_factor_tables_shared():
+    # the gaunt factor tables are read once and shared read-only by all ions
+    tmp_cont_array.freeBound(wavelength_array)
+    _tmp_cont = Continuum.continuum('fe_14', temperature_array)
+    _tmp_cont.freeBound(wavelength_array)
+    assert _tmp_cont.Klgfb is tmp_cont_array.Klgfb
+    with pytest.raises(ValueError):
+        _tmp_cont.Klgfb['klgfb'][0, 0, 0] = 0.
@@ -76,3 +76,328 @@ def test_chianti_files():
         assert hasattr(tmp_ion, 'Reclvl')
     if tmp_ion.Npsplups > 0:
         assert hasattr(tmp_ion, 'Psplups')
+
+
+# Check the stacked solve of the level populations
+def test_populate_chunks():
+    tmp_ion.populate()
+    population = tmp_ion.Population['population']
+    assert population.shape == (temperature_2.size, tmp_ion.Nlvls)
+    assert np.allclose(population.sum(axis=1), 1., rtol=1.e-3)
+    # one point at a time gives the same populations
+    tmp_ion.Defaults = dict(tmp_ion.Defaults, popmemory=0.)
+    tmp_ion.populate()
+    tmp_ion.Defaults = ch_tools.data.Defaults
+    assert np.array_equal(tmp_ion.Population['population'], population)
+    # a singular matrix is reported and its point is solved apart from the others
+    rad = np.array([[-1., 1.], [1., -1.]])
+    values = np.array([[0., 2., 0.]])
+    fullPop, failed, popmat = ch_tools.util.popSolve(rad, np.array([0]), np.array([0]), values, np.array([1., 1.]))
+    assert failed == [1]
+    assert np.allclose(fullPop[[0, 2]], 0.5)
+    assert np.all(fullPop[1] == 0.)
+
+
+# Check the sparse solvers against the dense one
+def test_populate_sparse():
+    tmp_ion.populate(solver='dense')
+    assert tmp_ion.Population['solver'] == 'dense'
+    population = tmp_ion.Population['population']
+    for solver in ['sparse', 'iterative']:
+        tmp_ion.populate(solver=solver)
+        assert tmp_ion.Population['solver'] == solver
+        assert np.allclose(tmp_ion.Population['population'], population, rtol=1.e-6, atol=1.e-12)
+    with pytest.raises(ValueError):
+        tmp_ion.populate(solver='cholesky')
+
+
+# Check that new conditions give the populations of a new ion
+def test_set_conditions():
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2)
+    _tmp_ion.populate()
+    _tmp_ion.setConditions(temperature=temperature_1, eDensity=density_2)
+    _new_ion = ion(test_ion, temperature=temperature_1, eDensity=density_2)
+    _new_ion.populate()
+    assert np.all(_tmp_ion.Temperature == _new_ion.Temperature)
+    assert np.allclose(_tmp_ion.Population['population'], _new_ion.Population['population'], rtol=1.e-12, atol=0.)
+    population = _tmp_ion.RateOperator.solve(temperature_1, density_2)
+    assert np.allclose(population['population'], _new_ion.Population['population'], rtol=1.e-12, atol=0.)
+
+
+# Check that populate keeps its rate operator and the higher ionization stage
+def test_populate_reuses_operator():
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2)
+    _tmp_ion.populate()
+    operator = _tmp_ion.RateOperator
+    higher = operator.Higher
+    population = _tmp_ion.Population['population']
+    _tmp_ion.populate()
+    assert _tmp_ion.RateOperator is operator
+    assert _tmp_ion.RateOperator.Higher is higher
+    assert np.allclose(_tmp_ion.Population['population'], population, rtol=1.e-12, atol=0.)
+
+
+# Check that populate takes the rates of the temperatures it has seen from its operator
+def test_populate_kept_rates(monkeypatch):
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2)
+    _tmp_ion.populate()
+    operator = _tmp_ion.RateOperator
+    population = _tmp_ion.Population['population']
+    upsilon = _tmp_ion.Upsilon['exRate']
+    ionizRate = _tmp_ion.IonizRate['rate']
+
+    def calculated(*args, **kwargs):
+        raise AssertionError(' the rates were calculated again')
+    monkeypatch.setattr(operator, 'ionRates', calculated)
+    _tmp_ion.populate()
+    assert np.allclose(_tmp_ion.Population['population'], population, rtol=1.e-12, atol=0.)
+    monkeypatch.undo()
+    # new conditions remove the rates of the ion, populate calculates them again
+    _tmp_ion.setConditions(temperature=temperature_2[::-1], eDensity=density_2[::-1])
+    assert not hasattr(_tmp_ion, 'Upsilon')
+    _tmp_ion.populate()
+    assert np.allclose(_tmp_ion.Upsilon['exRate'], upsilon[:, ::-1], rtol=1.e-12, atol=0.)
+    assert np.allclose(_tmp_ion.IonizRate['rate'], ionizRate[::-1], rtol=1.e-12, atol=0.)
+    assert np.allclose(_tmp_ion.Population['population'], population[::-1], rtol=1.e-10, atol=1.e-300)
+
+
+# Check the batched spline evaluation of upsilonDescale against splrep and splev
+def test_upsilon_descale():
+    from scipy.interpolate import splrep, splev
+    tmp_ion.upsilonDescale()
+    assert tmp_ion.Upsilon['exRate'].shape == (tmp_ion.Nscups, temperature_2.size)
+    scups = tmp_ion.Scups
+    st = np.linspace(-0.1, 1.1, 25)
+    for i in range(min(10, tmp_ion.Nscups)):
+        knots = scups['btemp'][i][np.newaxis]
+        values = scups['bscups'][i][np.newaxis]
+        spline = ch_tools.util.cubicSpline(knots, values, st[np.newaxis])[0]
+        expected = splev(st, splrep(scups['btemp'][i], scups['bscups'][i], s=0))
+        assert np.allclose(spline, expected, rtol=1.e-10, atol=1.e-12*np.abs(expected).max())
+
+
+def test_rrlvl_descale():
+    from scipy.interpolate import splrep, splev
+    tmp_ion.rrlvlDescale()
+    rrlvl = tmp_ion.Rrlvl
+    assert 'rateSecond' in rrlvl
+    for i in range(min(10, len(rrlvl['lvl1']))):
+        ntemp = rrlvl['ntemp'][i]
+        y2 = splrep(np.log(rrlvl['temperature'][i, :ntemp-1]), np.log(rrlvl['rate'][i, :ntemp-1]))
+        expected = np.exp(splev(np.log(temperature_2), y2))
+        assert np.allclose(tmp_ion.RrlvlRate['rate'][i], expected, rtol=1.e-10)
+
+
+def test_unique_temperature():
+    # a single temperature is tiled to the size of the densities
+    _tmp_ion = ion(test_ion, temperature=temperature_1, eDensity=density_2)
+    _tmp_ion.upsilonDescale()
+    _tmp_ion.ionizRate()
+    assert _tmp_ion.Upsilon['exRate'].shape == (_tmp_ion.Nscups, density_2.size)
+    assert np.all(_tmp_ion.Upsilon['temperature'] == _tmp_ion.Temperature)
+    assert _tmp_ion.IonizRate['rate'].shape == (density_2.size,)
+    _ref_ion = ion(test_ion, temperature=[temperature_1, 2.*temperature_1], eDensity=density_1)
+    _ref_ion.upsilonDescale()
+    _ref_ion.ionizRate()
+    assert np.all(_tmp_ion.Upsilon['exRate'] == _ref_ion.Upsilon['exRate'][:, :1])
+    assert np.allclose(_tmp_ion.IonizRate['rate'], _ref_ion.IonizRate['rate'][0], rtol=1.e-12)
+
+
+def test_population_table(tmp_path):
+    from ChiantiPy.tools.poptable import makePopTable
+    logT = np.linspace(5.5, 6.5, 6)
+    logN = np.linspace(8., 11., 7)
+    table = makePopTable(test_ion, logT, logN, tableName=str(tmp_path/'table'))
+    assert table.Population.shape == (logT.size, logN.size, table.Meta['nlvls'])
+    # at the grid points the table returns the solved populations
+    _tmp_ion = ion(test_ion, temperature=10.**logT[2], eDensity=10.**logN)
+    _tmp_ion.populate(popTable=table)
+    assert np.allclose(_tmp_ion.Population['population'], table.Population[2], rtol=1.e-10)
+    _tmp_ion.populate()
+    assert np.allclose(table.Population[2], _tmp_ion.Population['population'], rtol=1.e-10, atol=1.e-20)
+    # between them the populations are interpolated
+    _tmp_ion = ion(test_ion, temperature=10.**5.75, eDensity=10.**9.2)
+    _tmp_ion.populate(popTable=table)
+    _tmp_ion.emiss()
+    assert _tmp_ion.Emiss['emiss'].shape[1] == 1
+    with pytest.raises(ValueError):
+        _tmp_ion = ion(test_ion, temperature=1.e7, eDensity=1.e9)
+        _tmp_ion.populate(popTable=table)
+    # the table is made with the default proton density
+    _tmp_ion = ion(test_ion, temperature=10.**5.75, eDensity=10.**9.2, pDensity=10.**9.)
+    assert _tmp_ion.PDensityDefault is False
+    assert table.check(_tmp_ion)
+    with pytest.raises(ValueError):
+        _tmp_ion.populate(popTable=table)
+
+
+def test_mean_intensity():
+    import ChiantiPy.tools.constants as const
+    from ChiantiPy.tools.sources import blackStar
+    star = blackStar(6000., 7.e10)
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2, radTemperature=6000.)
+    l1, l2 = _tmp_ion.LevelIdx['wgfa']
+    ecm = np.asarray(_tmp_ion.Elvlc['ecm'])
+    mult = np.asarray(_tmp_ion.Elvlc['mult'])
+    de = const.invCm2Erg*(ecm[l2] - ecm[l1])
+    phex, stem = ch_tools.util.pumpingFactors(_tmp_ion.Wgfa['wvl'], de, mult[l1], mult[l2], radTemperature=6000.)
+    # the mean intensity of the star at its surface is the diluted black body of radTemperature
+    phexJ, stemJ = ch_tools.util.pumpingFactors(_tmp_ion.Wgfa['wvl'], de, mult[l1], mult[l2],
+        meanIntensity=star.meanIntensity)
+    assert np.allclose(phexJ, phex, rtol=1.e-10, atol=0.)
+    assert np.allclose(stemJ, stem, rtol=1.e-10, atol=0.)
+    _tmp_ion.populate()
+    pop = _tmp_ion.Population['population']
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2, meanIntensity=star.meanIntensity)
+    _tmp_ion.populate()
+    assert np.all(_tmp_ion.Population['population'] >= 0.)
+    assert np.allclose(_tmp_ion.Population['population'], pop, rtol=1.e-8, atol=1.e-20)
+
+
+def test_dr_populate():
+    import ChiantiPy.tools.constants as const
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2)
+    _tmp_ion.drPopulate()
+    pop = _tmp_ion.Population['population']
+    assert _tmp_ion.Population['method'] == 'drPopulate'
+    assert pop.shape == (temperature_2.size, _tmp_ion.Nlvls)
+    assert np.all(pop >= 0.)
+    # the capture rate into one autoionizing level
+    l1 = _tmp_ion.Auto['lvl1'][0] - 1
+    l2 = _tmp_ion.Auto['lvl2'][0] - 1
+    hPop = _tmp_ion.Population['higherPopulation'][:, l1]
+    gUpper = _tmp_ion.RateOperator.Higher.Elvlc['mult'][l1]
+    de = _tmp_ion.Elvlc['ecm'][l2]*const.invCm2Erg - _tmp_ion.Ip*const.ev2Erg
+    coef2 = const.planck**3/(2.*const.pi*const.emass*const.boltzmann*temperature_2)**1.5
+    dielRate = coef2*_tmp_ion.Elvlc['mult'][l2]*np.exp(-de/(const.boltzmann*temperature_2))*_tmp_ion.Auto['avalue'][0]*hPop/(2.*gUpper)
+    assert np.allclose(_tmp_ion.DielLvlTot[:, l1, l2], dielRate, rtol=1.e-10, atol=0.)
+    # the higher ionization stage is kept for new conditions
+    _tmp_ion.setConditions(temperature_2[::-1], density_2[::-1])
+    assert _tmp_ion.Population['method'] == 'drPopulate'
+    assert np.allclose(_tmp_ion.Population['population'], pop[::-1], rtol=1.e-10, atol=1.e-300)
+
+
+def test_ionization_rate():
+    import ChiantiPy.tools.constants as const
+    _tmp_ion = ion(test_ion, temperature=temperature_2, setup=False)
+    _tmp_ion.ionizRate()
+    rate = _tmp_ion.IonizRate['rate']
+    assert rate.shape == temperature_2.shape
+    # one temperature at a time on its own Gauss-Laguerre energies
+    tev = const.boltzmannEv*temperature_2[3]
+    _tmp_ion.diCross(energy=_tmp_ion.Ip + const.xgl*tev)
+    x0 = _tmp_ion.Ip/tev
+    cross = _tmp_ion.DiCross['cross']
+    diRate = 5.287e+13*np.sqrt(const.boltzmann*temperature_2[3])*np.exp(-x0)*((const.wgl*const.xgl*cross).sum() + x0*(const.wgl*cross).sum())
+    assert np.allclose(_tmp_ion.DiRate['rate'][3], diRate, rtol=1.e-12, atol=0.)
+    # a single temperature gives the same rates
+    _tmp_ion = ion(test_ion, temperature=temperature_2[3], setup=False)
+    _tmp_ion.ionizRate()
+    assert np.allclose(_tmp_ion.IonizRate['rate'], rate[3], rtol=1.e-12, atol=0.)
+
+
+def test_p2e_ratio():
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2)
+    ratio = _tmp_ion.ProtonDensityRatio
+    assert ratio.shape == temperature_2.shape
+    assert np.allclose(_tmp_ion.PDensity, ratio*density_2, rtol=1.e-12, atol=0.)
+    # the ratio of the abundances and ion fractions at the temperatures of the ioneq file
+    ioneqAll = _tmp_ion.IoneqAll
+    abundance = ch_tools.io.abundanceRead(abundancename=_tmp_ion.AbundanceName)['abundance']
+    denominator = np.zeros_like(ioneqAll['ioneqTemperature'])
+    for iz in range(ioneqAll['ioneqAll'].shape[0]):
+        for charge in range(1, iz+2):
+            denominator += charge*abundance[iz]*ioneqAll['ioneqAll'][iz, charge]
+    expected = abundance[0]*ioneqAll['ioneqAll'][0, 1]/denominator
+    knots = ioneqAll['ioneqTemperature'][::10]
+    assert np.allclose(ch_tools.io.p2eRatio(_tmp_ion.AbundanceName, ioneqAll, knots), expected[::10], rtol=1.e-12, atol=0.)
+    # the ratio is zero outside of the temperatures of the ioneq file
+    outside = [0.5*ioneqAll['ioneqTemperature'][0], 2.*ioneqAll['ioneqTemperature'][-1]]
+    assert np.all(ch_tools.io.p2eRatio(_tmp_ion.AbundanceName, ioneqAll, outside) == 0.)
+
+
+# Check the scattered rate matrix against the matrix added up one transition at a time
+def test_rate_matrix_loop():
+    import ChiantiPy.tools.constants as const
+    _tmp_ion = ion(test_ion, temperature=temperature_2, eDensity=density_2)
+    assert _tmp_ion.Nwgfa and _tmp_ion.Nscups and _tmp_ion.Npsplups and _tmp_ion.Nauto
+    _tmp_ion.populate(solver='dense')
+    operator = _tmp_ion.RateOperator
+    ci = operator.Ci
+    nmat = operator.Nmat
+    temperature = _tmp_ion.Temperature
+    eDensity = _tmp_ion.EDensity
+    pDensity = _tmp_ion.PDensity
+    rates = operator.rates(temperature)
+    rows, cols, values = operator.terms(temperature, eDensity, pDensity, rates)
+    # the loops of populate before the rate matrix was scattered
+    rad = np.zeros((nmat, nmat), np.float64)
+    for iwgfa in range(_tmp_ion.Nwgfa):
+        l1 = _tmp_ion.Wgfa['lvl1'][iwgfa] - 1
+        l2 = _tmp_ion.Wgfa['lvl2'][iwgfa] - 1
+        rad[l1+ci, l2+ci] += _tmp_ion.Wgfa['avalue'][iwgfa]
+        rad[l2+ci, l2+ci] -= _tmp_ion.Wgfa['avalue'][iwgfa]
+    for iauto in range(_tmp_ion.Nauto):
+        l1 = _tmp_ion.Auto['lvl1'][iauto] - 1
+        l2 = _tmp_ion.Auto['lvl2'][iauto] - 1
+        rad[l1+ci+operator.Rec, l2+ci] += _tmp_ion.Auto['avalue'][iauto]
+        rad[l2+ci, l2+ci] -= _tmp_ion.Auto['avalue'][iauto]
+    coef2 = const.planck**3/(2.*const.pi*const.emass*const.boltzmann*temperature)**1.5
+    for itemp in range(temperature.size):
+        ne = eDensity[itemp]
+        popmat = np.copy(rad)
+        for iscups in range(_tmp_ion.Nscups):
+            l1 = _tmp_ion.Scups['lvl1'][iscups] - 1
+            l2 = _tmp_ion.Scups['lvl2'][iscups] - 1
+            popmat[l1+ci, l2+ci] += ne*rates['dexRate'][iscups, itemp]
+            popmat[l2+ci, l1+ci] += ne*rates['exRate'][iscups, itemp]
+            popmat[l1+ci, l1+ci] -= ne*rates['exRate'][iscups, itemp]
+            popmat[l2+ci, l2+ci] -= ne*rates['dexRate'][iscups, itemp]
+        for ipsplups in range(_tmp_ion.Npsplups):
+            l1 = _tmp_ion.Psplups['lvl1'][ipsplups] - 1
+            l2 = _tmp_ion.Psplups['lvl2'][ipsplups] - 1
+            popmat[l1+ci, l2+ci] += pDensity[itemp]*rates['pdexRate'][ipsplups, itemp]
+            popmat[l2+ci, l1+ci] += pDensity[itemp]*rates['pexRate'][ipsplups, itemp]
+            popmat[l1+ci, l1+ci] -= pDensity[itemp]*rates['pexRate'][ipsplups, itemp]
+            popmat[l2+ci, l2+ci] -= pDensity[itemp]*rates['pdexRate'][ipsplups, itemp]
+        for ilvl in range(_tmp_ion.GrndLevels):
+            popmat[-1, ci+ilvl] += ne*rates['ioniz'][itemp]
+            popmat[ci+ilvl, ci+ilvl] -= ne*rates['ioniz'][itemp]
+        rrTot = 0.
+        if _tmp_ion.Nrrlvl:
+            for irr, idx in enumerate(operator.RrLvlIdx):
+                l2 = _tmp_ion.Rrlvl['lvl2'][idx] - 1
+                popmat[l2+ci, -1] += ne*rates['rr'][irr, itemp]
+                popmat[-1, -1] -= ne*rates['rr'][irr, itemp]
+                rrTot += rates['rr'][irr, itemp]
+        for iauto in range(_tmp_ion.Nauto):
+            l1 = _tmp_ion.Auto['lvl1'][iauto] - 1
+            l2 = _tmp_ion.Auto['lvl2'][iauto] - 1
+            if l1 == 0:
+                gUpper = float(operator.Higher.Elvlc['mult'][l1])
+                gLower = float(_tmp_ion.Elvlc['mult'][l2])
+                ecm2 = _tmp_ion.Elvlc['ecm'][l2]
+                if ecm2 < 0.:
+                    ecm2 = _tmp_ion.Elvlc['ecmth'][l2]
+                de1 = ecm2*const.invCm2Erg - _tmp_ion.Ip*const.ev2Erg
+                expkt = np.exp(-de1/(const.boltzmann*temperature[itemp]))
+                dielRate = coef2[itemp]*gLower*expkt*_tmp_ion.Auto['avalue'][iauto]/(2.*gUpper)
+                popmat[ci+l2, -1] += ne*dielRate
+                popmat[-1, -1] -= ne*dielRate
+        if rrTot < rates['recomb'][itemp]:
+            popmat[ci, -1] += ne*(rates['recomb'][itemp] - rrTot)
+            popmat[-1, -1] -= ne*(rates['recomb'][itemp] - rrTot)
+        # the scattered matrix of this point
+        scattered = np.zeros((nmat, nmat), np.float64)
+        np.add.at(scattered, (operator.RadRows, operator.RadCols), operator.RadValues)
+        np.add.at(scattered, (rows, cols), values[:, itemp])
+        scale = np.abs(popmat).max(axis=1, keepdims=True)
+        assert np.allclose(scattered/scale, popmat/scale, rtol=1.e-12, atol=1.e-14)
+        popmat[-1] = operator.Norm
+        b = np.zeros(nmat, np.float64)
+        b[-1] = 1.
+        pop = np.linalg.solve(popmat, b)[ci:ci+operator.Nlvls]
+        pop = np.where(pop > 0., pop, 0.)
+        population = _tmp_ion.Population['population'][itemp]
+        above = pop > 1.e-12*pop.max()
+        assert np.allclose(population[above], pop[above], rtol=1.e-9, atol=0.)
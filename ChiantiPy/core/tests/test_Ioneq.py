@@ -54,3 +54,25 @@ def test_load_ioneq_alternate_file():
     load_ioneq.load(ioneqName='chianti')
     assert hasattr(load_ioneq, 'Temperature')
     assert hasattr(load_ioneq, 'Ioneq')
+
+
+def test_calculate_balance(tmpdir):
+    from ChiantiPy.core.Ioneq import stageRates
+    rates = stageRates(z, temperature)
+    calc_ioneq = ioneq(z)
+    calc_ioneq.calculate(temperature)
+    fractions = calc_ioneq.Ioneq
+    assert fractions.shape == (z+1, temperature.size)
+    assert np.allclose(fractions.sum(axis=0), 1., rtol=1.e-12, atol=0.)
+    # the net rates between neighbouring stages balance
+    flow = rates['ioniz'][:-1]*fractions[:-1] - rates['recomb'][1:]*fractions[1:]
+    scale = rates['ioniz'][:-1]*fractions[:-1] + rates['recomb'][1:]*fractions[1:]
+    assert np.all(np.abs(flow) <= 1.e-10*scale + 1.e-300)
+    # calculateAll writes a .ioneq file in the format of ioneqRead
+    outFile = str(tmpdir.join('test.ioneq'))
+    info = ioneq.calculateAll([el], temperature, outFile=outFile, proc=1)
+    assert np.allclose(info['ioneqAll'][z-1], fractions, rtol=1.e-12, atol=0.)
+    with open(outFile) as inpt:
+        lines = inpt.readlines()
+    assert lines[0].split() == [str(temperature.size), str(z)]
+    assert lines[-1].strip() == '-1'
@@ -0,0 +1,99 @@
+"""
+Tests for the nei class
+"""
+
+import numpy as np
+import pytest
+
+from ChiantiPy.core import nei, ion
+
+el = 'O'
+z = 8
+test_ion = 'o_6'
+# a coarse grid keeps the setup short
+grid = 10.**np.arange(4., 8.001, 0.02)
+time = np.linspace(0., 100., 51)
+eDensity = 1.e9*np.ones_like(time)
+tmp_nei = nei(el, temperature=grid)
+
+
+def test_equilibrium():
+    # a parcel at a constant temperature stays in equilibrium
+    temperature = 1.e6*np.ones_like(time)
+    tmp_nei.solve(time, temperature, eDensity)
+    assert tmp_nei.Ioneq.shape == (z+1, time.size, 1)
+    equilibrium = tmp_nei.Equilibrium[:, tmp_nei.gridIndex(1.e6)]
+    assert np.allclose(tmp_nei.Ioneq[:, -1, 0], equilibrium, rtol=0., atol=1.e-10)
+    # and a parcel heated from another equilibrium relaxes to it
+    tmp_nei.solve([0., 1.e6], [1.e6, 1.e6], [1.e9, 1.e9], initial=tmp_nei.Equilibrium[:, tmp_nei.gridIndex(1.e5)])
+    assert np.allclose(tmp_nei.Ioneq[:, -1, 0], equilibrium, rtol=0., atol=1.e-10)
+
+
+def test_step():
+    from scipy.linalg import expm
+    ib = tmp_nei.gridIndex(3.e5)
+    ioniz = tmp_nei.Rates['ioniz'][:, ib]
+    recomb = tmp_nei.Rates['recomb'][:, ib]
+    matrix = np.diag(-(ioniz + recomb)) + np.diag(ioniz[:-1], -1) + np.diag(recomb[1:], 1)
+    initial = np.zeros(z+1)
+    initial[2] = 1.
+    tmp_nei.solve([0., 0.1], [grid[ib], grid[ib]], [1.e9, 1.e9], initial=initial)
+    assert np.allclose(tmp_nei.Ioneq[:, 1, 0], expm(matrix*1.e8).dot(initial), rtol=0., atol=1.e-10)
+
+
+def test_low_temperature():
+    # the table zeroes the ionization rates of the high stages at the low temperatures
+    ib = 0
+    assert np.any(tmp_nei.Rates['ioniz'][:-1, ib] == 0.)
+    if not tmp_nei.Degenerate[ib]:
+        assert np.allclose(tmp_nei.EigenInverse[ib].dot(tmp_nei.Eigenvectors[ib]), np.eye(z+1), rtol=0., atol=1.e-10)
+    # a long step relaxes a parcel to the equilibrium of the grid temperature
+    equilibrium = tmp_nei.Equilibrium[:, ib]
+    initial = np.zeros(z+1)
+    initial[0] = 1.
+    for start in [initial, tmp_nei.Equilibrium[:, tmp_nei.gridIndex(1.e6)]]:
+        tmp_nei.solve([0., 1.e8], [grid[ib], grid[ib]], [1.e9, 1.e9], initial=start)
+        assert np.allclose(tmp_nei.Ioneq[:, -1, 0], equilibrium, rtol=0., atol=1.e-10)
+
+
+def test_degenerate_blocks():
+    from scipy.linalg import expm
+    from ChiantiPy.core.Nei import eigenSystem, rateMatrix
+    # two stages with no ionization and the same recombination rate
+    assert eigenSystem([0., 0., 0.], [0., 1.e-9, 1.e-9]) is None
+    ioniz = np.array([0., 0., 0.])
+    recomb = np.array([0., 1.e-9, 2.e-9])
+    eigenvalues, eigenvectors, eigenInverse = eigenSystem(ioniz, recomb)
+    assert np.all(np.isfinite(eigenvectors)) and np.all(np.isfinite(eigenInverse))
+    matrix = rateMatrix(ioniz, recomb)
+    assert np.allclose(eigenvectors.dot(np.diag(eigenvalues)).dot(eigenInverse), matrix, rtol=0., atol=1.e-20)
+    # a degenerate grid temperature is stepped with expm
+    degenerate = nei(el, temperature=grid[:3])
+    degenerate.Rates['ioniz'][:, 0] = 0.
+    degenerate.Rates['recomb'][:, 0] = 1.e-9
+    degenerate.Rates['recomb'][0, 0] = 0.
+    degenerate.Degenerate[0] = True
+    initial = np.zeros(z+1)
+    initial[-1] = 1.
+    degenerate.solve([0., 0.5], [grid[0], grid[0]], [1.e9, 1.e9], initial=initial)
+    expected = expm(rateMatrix(degenerate.Rates['ioniz'][:, 0], degenerate.Rates['recomb'][:, 0])*0.5e9).dot(initial)
+    assert np.all(np.isfinite(degenerate.Ioneq))
+    assert np.allclose(degenerate.Ioneq[:, 1, 0], expected, rtol=0., atol=1.e-12)
+
+
+def test_parcels():
+    peak = np.array([5.5, 6., 6.5])
+    temperature = 10.**(5. + (peak - 5.)*np.exp(-((time[:, np.newaxis] - 30.)/15.)**2))
+    tmp_nei.solve(time, temperature, eDensity)
+    fractions = tmp_nei.Ioneq.copy()
+    assert fractions.shape == (z+1, time.size, peak.size)
+    assert np.allclose(fractions.sum(axis=0), 1., rtol=1.e-12, atol=0.)
+    # the ion fractions of a parcel replace those of an ion
+    tmp_ion = ion(test_ion, temperature=temperature[:, 1], eDensity=eDensity)
+    tmp_nei.setIoneqOne(tmp_ion, parcel=1)
+    assert np.all(tmp_ion.IoneqOne == fractions[5, :, 1])
+    with pytest.raises(ValueError):
+        tmp_nei.setIoneqOne(tmp_ion, parcel=0)
+    # the parcels are independent of each other
+    tmp_nei.solve(time, temperature[:, 1], eDensity)
+    assert np.allclose(tmp_nei.Ioneq[:, :, 0], fractions[:, :, 1], rtol=1.e-12, atol=0.)
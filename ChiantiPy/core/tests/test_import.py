@@ -0,0 +1,24 @@
+"""
+Tests for the import of ChiantiPy.core
+"""
+
+import os
+import subprocess
+import sys
+
+
+def test_import_is_quiet_and_light():
+    code = ('import sys; import ChiantiPy.core; '
+            'print(sorted(m for m in sys.modules if m.split(".")[0] in ("matplotlib", "PyQt5", "ipyparallel")))')
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    # nothing but the list of deferred modules is printed, and that list is empty
+    assert out.stdout.strip() == '[]'
+
+
+def test_import_with_chiantirc_is_quiet(tmpdir):
+    # the chiantirc is read by several modules, none of them prints about it
+    tmpdir.mkdir('.chianti').join('chiantirc').write('[chianti]\nabundfile = sun_photospheric_2015_scott\n')
+    env = dict(os.environ, HOME=str(tmpdir))
+    code = 'import ChiantiPy.core; import ChiantiPy.tools.io as io; io.defaultsRead()'
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True, check=True, env=env)
+    assert out.stdout.strip() == ''
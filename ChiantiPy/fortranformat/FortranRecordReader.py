@@ -1,14 +1,20 @@
 import sys
 IS_PYTHON3 = sys.version_info[0] >= 3
 
+import numpy as np
+
 if IS_PYTHON3:
     exec('from ._input import input as _input')
     exec('from ._parser import parser as _parser')
     exec('from ._lexer import lexer as _lexer')
+    exec('from ._edit_descriptors import A, I, F, E, D, EN, ES, X, OUTPUT_EDS')
+    exec('from ._misc import expand_edit_descriptors')
 else:
     exec('from _input import input as _input')
     exec('from _parser import parser as _parser')
     exec('from _lexer import lexer as _lexer')
+    exec('from _edit_descriptors import A, I, F, E, D, EN, ES, X, OUTPUT_EDS')
+    exec('from _misc import expand_edit_descriptors')
 
 class FortranRecordReader(object):
     '''
@@ -25,16 +31,24 @@ class FortranRecordReader(object):
     >>> line.read('          1.100          0.100          0.600')
     [1.1, 0.1, 0.6]
 
+    Many records with the same format can be read at once, one array per value ...
+
+    >>> x, y = FortranRecordReader('(I5, F10.3)').read_many(['    1     1.500', '    2    -2.250'])
+    >>> x
+    array([1, 2])
+    >>> y
+    array([ 1.5 , -2.25])
+
     Note: it is best to create a new object for each format, changing the format
     causes the parser to reevalute the format string which is costly in terms of
     performance
     '''
     
     def __init__(self, format):
-        self.format = format
         self._eds = []
         self._rev_eds = []
-        self._parse_format()
+        self._fields = None
+        self.format = format
 
     def __eq__(self, other):
         if isinstance(other, FortranRecordReader):
@@ -57,6 +71,118 @@ class FortranRecordReader(object):
         '''
         return _input(self._eds, self._rev_eds, record)
 
+    def read_many(self, records):
+        '''
+        Read an iterable of records with this format and return a list with
+        one array of values for each value in the format
+
+        Integer fields give int64 arrays, real fields float64 arrays and
+        character fields arrays of strings.  The values are the same as those
+        of read applied to each record.  A format made only of I, F, E, D, EN,
+        ES, A and X edit descriptors with explicit widths is compiled once
+        into the positions of its fields, then the fields of all records are
+        sliced out of a character array and converted by numpy as a whole.
+        Other formats, and sets of records a slice can not reproduce exactly
+        (short records, blanks inside numbers, implied decimal points, D
+        exponents, ...), are read one record at a time with read; a column
+        with missing values is then an array of objects that holds None.
+        '''
+        records = [record.rstrip('\r\n') for record in records]
+        columns = None
+        if self._fields is not None and len(records) > 0:
+            columns = self._read_compiled(records)
+        if columns is None:
+            columns = self._read_generic(records)
+        return columns
+
+    def _compile(self):
+        '''
+        Return (start, width, kind, decimal_places) for each value of the
+        format, kind is 'a', 'i' or 'f', or None if the format can not be
+        compiled
+        '''
+        fields = []
+        position = 0
+        for ed in expand_edit_descriptors(self._eds):
+            if isinstance(ed, X):
+                position += ed.num_chars
+            elif isinstance(ed, (A, I, F, E, D, EN, ES)) and ed.width is not None:
+                if isinstance(ed, A):
+                    fields.append((position, ed.width, 'a', None))
+                elif isinstance(ed, I):
+                    fields.append((position, ed.width, 'i', None))
+                else:
+                    fields.append((position, ed.width, 'f', ed.decimal_places))
+                position += ed.width
+            else:
+                return None
+        if len(fields) == 0:
+            return None
+        return fields
+
+    def _read_compiled(self, records):
+        '''
+        Slice the fields of all records out of a character array, returns
+        None if this does not give the same values as read
+        '''
+        nrec = len(records)
+        recl = max([start + width for start, width, kind, dp in self._fields])
+        # read gives None for numbers past the end of a short record
+        num_end = max([start + width for start, width, kind, dp in self._fields if kind != 'a'] + [0])
+        try:
+            # numpy converts byte strings faster than unicode strings
+            text = np.array(records, dtype='S%d' % recl)
+            code, point = 'S', b'.'
+        except UnicodeEncodeError:
+            text = np.array(records, dtype='U%d' % recl)
+            code, point = 'U', '.'
+        if np.char.str_len(text).min() < num_end:
+            return None
+        chars = text.view(code + '1').reshape(nrec, recl)
+        columns = []
+        try:
+            for start, width, kind, decimal_places in self._fields:
+                col = np.ascontiguousarray(chars[:, start:start + width]).view('%s%d' % (code, width)).ravel()
+                if kind == 'a':
+                    # short records are padded with blanks
+                    columns.append(np.char.ljust(col, width).astype('U%d' % width))
+                elif kind == 'i':
+                    columns.append(col.astype(np.int64))
+                elif decimal_places and (np.char.find(col, point) < 0).any():
+                    # implied decimal point
+                    return None
+                else:
+                    columns.append(col.astype(np.float64))
+        except ValueError:
+            return None
+        return columns
+
+    def _read_generic(self, records):
+        '''
+        Read one record at a time with read and collect the values in columns
+        '''
+        values = [self.read(record) for record in records]
+        if len(values) == 0 and self._fields is not None:
+            dtypes = {'a':'U1', 'i':np.int64, 'f':np.float64}
+            return [np.zeros(0, dtypes[kind]) for start, width, kind, dp in self._fields]
+        if len(values) > 0:
+            nval = len(values[0])
+        else:
+            nval = len([ed for ed in expand_edit_descriptors(self._eds) if isinstance(ed, OUTPUT_EDS)])
+        columns = []
+        for ival in range(nval):
+            column = [value[ival] for value in values]
+            kinds = set([type(one) for one in column])
+            if kinds == set([int]):
+                columns.append(np.asarray(column, np.int64))
+            elif kinds == set([float]):
+                columns.append(np.asarray(column, np.float64))
+            elif kinds == set([str]):
+                columns.append(np.asarray(column))
+            else:
+                columns.append(np.asarray(column, dtype=object))
+        return columns
+
     def get_format(self):
         return self._format
     def set_format(self, format):
@@ -66,6 +192,7 @@ class FortranRecordReader(object):
 
     def _parse_format(self):
         self._eds, self._rev_eds = _parser(_lexer(self.format))
+        self._fields = self._compile()
 
 
 if __name__ == '__main__':
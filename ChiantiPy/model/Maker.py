@@ -12,20 +12,22 @@ except:
 #
 import numpy as np
 import scipy.optimize as optimize
-import matplotlib.pyplot as plt
 import ChiantiPy.core as ch
 import ChiantiPy.tools.io as io
 import ChiantiPy.tools.util as util
+import ChiantiPy.tools.store as chstore
 import ChiantiPy.tools.constants as const
 import ChiantiPy.tools.data as chdata
 import ChiantiPy.Gui as chGui
 from ChiantiPy.base import ionTrails    #
     # --------------------------------------------------------------------------
     #
-def doDemGofntQ(inQueue, outQueue):
+def doDemGofntQ(inQueue, outQueue, storeName=None):
     '''
     helper for multiprocessing with maker.mgofnt()
+    the atomic data are taken from the store storeName of chstore.sharedStore
     '''
+    chstore.useStore(storeName)
     for inputs in iter(inQueue.get, 'STOP'):
         ionS = inputs[0]
 #        print(' helper doing '+ionS)
@@ -442,51 +444,53 @@ class maker(ionTrails):
             ionWorkerQ.put((someIon, temperature, density, self.AllLines))
             self.Todo.append(someIon)
         #
-        ionWorkerQSize = ionWorkerQ.qsize()
-        ionProcesses = []
-        if ionWorkerQSize < proc:
-            nproc = ionWorkerQSize
-        for i in range(proc):
-            p = mp.Process(target=doDemGofntQ, args=(ionWorkerQ, ionDoneQ))
-            p.start()
-            ionProcesses.append(p)
-#            ionWorkerQ.put('STOP')
-#       timeout is not necessary
-        for p in ionProcesses:
-#            print' process is alive:  ', p.is_alive()
-            if p.is_alive():
-#                p.join()
-                p.join(timeout=timeout)
-#        for i in range(proc):
-#            ionProcesses.append('STOP')
-        self.Finished = []
-        #
-        for ijk in range(ionWorkerQSize):
-            out = ionDoneQ.get()
-            someIon = out[0]
-            print('processing ion = %s'%(someIon))
-            self.Finished.append(someIon)
-            intensity = out[1]['intensity']
+        # the workers share the atomic data read once by this process
+        with chstore.sharedStore(ionList, verbose=verbose) as storeName:
+            ionWorkerQSize = ionWorkerQ.qsize()
+            ionProcesses = []
+            if ionWorkerQSize < proc:
+                nproc = ionWorkerQSize
+            for i in range(proc):
+                p = mp.Process(target=doDemGofntQ, args=(ionWorkerQ, ionDoneQ, storeName))
+                p.start()
+                ionProcesses.append(p)
+    #            ionWorkerQ.put('STOP')
+    #       timeout is not necessary
+            for p in ionProcesses:
+    #            print' process is alive:  ', p.is_alive()
+                if p.is_alive():
+    #                p.join()
+                    p.join(timeout=timeout)
+    #        for i in range(proc):
+    #            ionProcesses.append('STOP')
+            self.Finished = []
+            #
+            for ijk in range(ionWorkerQSize):
+                out = ionDoneQ.get()
+                someIon = out[0]
+                print('processing ion = %s'%(someIon))
+                self.Finished.append(someIon)
+                intensity = out[1]['intensity']
 
-            for iwvl, amatch in enumerate(self.match):
-#                self.match[iwvl]['intensitySum'] = np.zeros(nTempDens, 'float64')
-                #  this is data for each line
-                if someIon in amatch['ion']:
-                    kon = amatch['ion'].index(someIon)
-#                    if verbose:
-#                        print('kon: %5i using %s'%(kon, someIon))
-#                        if 'errorMessage' in out[1].keys():
-#                            print(' in mgofnt %s'%(out[1]['errorMessage']))
+                for iwvl, amatch in enumerate(self.match):
+    #                self.match[iwvl]['intensitySum'] = np.zeros(nTempDens, 'float64')
+                    #  this is data for each line
+                    if someIon in amatch['ion']:
+                        kon = amatch['ion'].index(someIon)
+    #                    if verbose:
+    #                        print('kon: %5i using %s'%(kon, someIon))
+    #                        if 'errorMessage' in out[1].keys():
+    #                            print(' in mgofnt %s'%(out[1]['errorMessage']))
 
-                    predictedLine = []
-                    for aline in amatch['lineIdx'][kon]:
-    #                    print ' ion, lineIdx = ', anIon, aline
-                        self.match[iwvl]['intensitySum'] += intensity[:, aline]
-                        iPredictedLine = self.match[iwvl]['iPredictedLine']
-                        predictedLine.append(iPredictedLine)
-                        self.match[iwvl]['intensity'][iPredictedLine] = intensity[:, aline]
-                        self.match[iwvl]['iPredictedLine'] += 1
-                    self.match[iwvl]['predictedLine'][kon]=predictedLine
+                        predictedLine = []
+                        for aline in amatch['lineIdx'][kon]:
+        #                    print ' ion, lineIdx = ', anIon, aline
+                            self.match[iwvl]['intensitySum'] += intensity[:, aline]
+                            iPredictedLine = self.match[iwvl]['iPredictedLine']
+                            predictedLine.append(iPredictedLine)
+                            self.match[iwvl]['intensity'][iPredictedLine] = intensity[:, aline]
+                            self.match[iwvl]['iPredictedLine'] += 1
+                        self.match[iwvl]['predictedLine'][kon]=predictedLine
         #
         self.Tmax = np.zeros_like(self.Wvl)
         nT = self.Temperature.size
@@ -577,6 +581,7 @@ class maker(ionTrails):
         '''
         to plot the emission measures derived from search over temperature
         '''
+        import matplotlib.pyplot as plt
         if not hasattr(self, 'SearchData'):
             print(' must run search*t... first')
             return
@@ -594,6 +599,7 @@ class maker(ionTrails):
         '''
         to plot line intensities divided by gofnt
         '''
+        import matplotlib.pyplot as plt
         nInt = len(self.Intensity)
 #        print(' nInt = %5i'%(nInt))
         if not hasattr(self, 'Temperature'):
@@ -0,0 +1,400 @@
+"""
+A persistent, on-disk cache for parsed CHIANTI database files.
+
+The readers in `ChiantiPy.tools.io` parse the ASCII files of the CHIANTI
+database line by line.  For the larger ions this is the dominant cost of
+setting up an `ChiantiPy.core.ion`, and it is paid again in every
+`mspectrum` worker, every `radLoss` ion and every `maker.gofnt` call.  The
+readers therefore store what they have parsed in this cache, as NumPy arrays
+in an uncompressed .npz file, and return the stored copy on later calls.
+
+An entry is keyed on the name of the reader, the absolute path, modification
+time and size of every file the reader used, the options passed to the
+reader and the versions of ChiantiPy and of the CHIANTI database, so that an
+edited or replaced file is never served from a stale entry.  The cache is capped in size; when a
+new entry pushes it over the cap, the least recently used entries are removed.  The size of
+the cache is found from the entries on disk once per process, when the first entry is saved,
+and then kept up to date with the sizes of the entries saved since, so that the directory is
+only walked again when the cap is passed.
+
+The following keys in the chiantirc file control the cache:
+
+- `usecache` : use the cache, default True
+- `cachedir` : the cache directory, default $HOME/.chianti/cache
+- `cachesize` : the size cap of the cache in megabytes, default 1000.
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+from ChiantiPy.version import __version__
+
+# bump this when the layout of the stored entries changes
+cacheFormat = 3
+
+
+class atomicCache(object):
+    """
+    A directory of .npz files holding the parsed contents of CHIANTI files.
+
+    Parameters
+    ----------
+    cacheDir : `str`
+        the directory that holds the cache entries, created if needed
+    maxSize : `float`
+        the size cap of the cache, in megabytes
+    version : `str`
+        the version of the CHIANTI database, part of every key
+    """
+    def __init__(self, cacheDir, maxSize=1000., version=''):
+        self.CacheDir = cacheDir
+        self.MaxSize = float(maxSize)
+        self.Version = version
+        # the size of the entries in bytes, found on the first save
+        self.Size = None
+
+    def key(self, reader, filenames, options=None):
+        """
+        Return the key of an entry or None if any of `filenames` does not exist.
+
+        Parameters
+        ----------
+        reader : `str`
+            the name of the reader, e.g. 'elvlcRead'
+        filenames : `list`
+            all of the files whose contents determine the parsed result
+        options : `dict`
+            the keyword arguments of the reader that change the parsed result
+        """
+        stats = []
+        for fname in filenames:
+            try:
+                st = os.stat(fname)
+            except OSError:
+                return None
+            stats.append([os.path.abspath(fname), st.st_mtime_ns, st.st_size])
+        if options is None:
+            options = {}
+        keyStr = json.dumps([cacheFormat, __version__, self.Version, reader, stats, options],
+                            sort_keys=True, default=str)
+        return hashlib.sha1(keyStr.encode('utf-8')).hexdigest()
+
+    def entryName(self, key):
+        """
+        Return the name of the .npz file that holds the entry for `key`.
+        """
+        return os.path.join(self.CacheDir, key[:2], key + '.npz')
+
+    def load(self, reader, filenames, options=None):
+        """
+        Return the stored result of `reader` for `filenames`, or None if there is none.
+        """
+        key = self.key(reader, filenames, options)
+        if key is None:
+            return None
+        entry = self.entryName(key)
+        try:
+            with np.load(entry, allow_pickle=False) as npz:
+                info = decode(npz)
+        except Exception:
+            # missing, partially written by a killed process or from an older format
+            return None
+        try:
+            # mark the entry as recently used
+            os.utime(entry)
+        except OSError:
+            pass
+        return info
+
+    def save(self, reader, filenames, info, options=None):
+        """
+        Store the parsed result `info` of `reader` for `filenames`.
+
+        Results that can not be stored exactly as arrays, or that are not a dict,
+        are silently not cached.
+        """
+        if not isinstance(info, dict):
+            return
+        key = self.key(reader, filenames, options)
+        if key is None:
+            return
+        arrays = encode(info)
+        if arrays is None:
+            return
+        entry = self.entryName(key)
+        if self.Size is None:
+            self.Size = sum([one[1] for one in self.entries()])
+        try:
+            # an entry that is replaced no longer counts
+            oldSize = os.stat(entry).st_size
+        except OSError:
+            oldSize = 0
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            # write to a temporary file and rename it so that concurrent
+            # processes never see a partially written entry
+            fd, tmpName = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(entry))
+            with os.fdopen(fd, 'wb') as out:
+                np.savez(out, **arrays)
+            os.replace(tmpName, entry)
+            self.Size += os.stat(entry).st_size - oldSize
+        except OSError:
+            return
+        if self.Size > self.MaxSize*1.e+6:
+            self.evict()
+
+    def entries(self):
+        """
+        Return a list of (last use, size, name) for all entries in the cache.
+        """
+        found = []
+        if not os.path.isdir(self.CacheDir):
+            return found
+        for dirpath, dirnames, filenames in os.walk(self.CacheDir):
+            for fname in filenames:
+                if fname.endswith('.npz'):
+                    full = os.path.join(dirpath, fname)
+                    try:
+                        st = os.stat(full)
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, st.st_size, full))
+        return found
+
+    def size(self):
+        """
+        Return the total size of the cache in megabytes.
+        """
+        return sum([one[1] for one in self.entries()])/1.e+6
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is below its size cap.
+
+        The entries are found on disk, so that the entries saved by other processes are
+        counted too.
+        """
+        found = self.entries()
+        total = sum([one[1] for one in found])
+        maxBytes = self.MaxSize*1.e+6
+        self.Size = total
+        if total <= maxBytes:
+            return
+        for mtime, size, full in sorted(found):
+            try:
+                os.remove(full)
+            except OSError:
+                continue
+            total -= size
+            self.Size = total
+            if total <= maxBytes:
+                break
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        for mtime, size, full in self.entries():
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+        self.Size = None
+
+
+def encode(info):
+    """
+    Convert a dict returned by one of the readers into a dict of arrays for np.savez.
+
+    Returns None if some value can not be stored so that `decode` returns it unchanged.
+
+    Notes
+    -----
+    ndarrays are stored as they are, lists of Python ints or floats are stored as arrays and
+    returned as lists, lists of 1D ndarrays are stored as a concatenated array and the offsets
+    into it.  A list of 1D ndarrays that are consecutive slices of another array in `info`,
+    such as the 'btemp' and 'btempFlat' of `ChiantiPy.tools.io.scupsRead`, is stored as the
+    offsets only and returned as slices of that array.  Everything else must survive a round
+    trip through JSON.
+    """
+    arrays = {}
+    kinds = {}
+    values = {}
+    parents = {}
+    for akey, value in info.items():
+        if isinstance(value, np.ndarray):
+            if value.dtype.kind not in 'biufcSU':
+                return None
+            arrays['a_' + akey] = value
+            kinds[akey] = 'array'
+        elif isinstance(value, list) and len(value) and all(isinstance(x, np.ndarray) and x.ndim == 1 and x.dtype.kind in 'biuf' for x in value):
+            parent = _parentOf(value, info)
+            if parent is not None:
+                parents[akey] = parent
+                arrays['o_' + akey] = np.cumsum([0] + [x.size for x in value])
+                kinds[akey] = 'split'
+            else:
+                arrays['a_' + akey] = np.concatenate(value)
+                arrays['o_' + akey] = np.cumsum([0] + [x.size for x in value])
+                kinds[akey] = 'ragged'
+        elif isinstance(value, list) and len(value) and all(type(x) is int for x in value):
+            arrays['a_' + akey] = np.asarray(value, np.int64)
+            kinds[akey] = 'list'
+        elif isinstance(value, list) and len(value) and all(type(x) in (float, np.float64) for x in value):
+            arrays['a_' + akey] = np.asarray(value, np.float64)
+            kinds[akey] = 'list'
+        else:
+            values[akey] = value
+            kinds[akey] = 'json'
+    try:
+        meta = json.dumps({'format':cacheFormat, 'kinds':kinds, 'values':values, 'parents':parents})
+    except (TypeError, ValueError):
+        return None
+    arrays['meta'] = np.asarray(meta)
+    return arrays
+
+
+def _parentOf(value, info):
+    """
+    Return the key of the 1D array in `info` that the arrays in `value` tile as consecutive slices, or None.
+    """
+    total = sum([x.size for x in value])
+    for akey, parent in info.items():
+        if not isinstance(parent, np.ndarray) or parent.ndim != 1 or parent.size != total or parent.dtype != value[0].dtype:
+            continue
+        if parent.strides != (parent.itemsize,):
+            continue
+        position = parent.__array_interface__['data'][0]
+        for x in value:
+            if x.size and (x.__array_interface__['data'][0] != position or x.strides != parent.strides):
+                break
+            position += x.nbytes
+        else:
+            return akey
+    return None
+
+
+def decode(npz):
+    """
+    Rebuild the dict of a reader from the arrays written by `encode`.
+    """
+    meta = json.loads(str(npz['meta']))
+    if meta['format'] != cacheFormat:
+        raise ValueError('cache entry has an old format')
+    info = {}
+    for akey, kind in meta['kinds'].items():
+        if kind == 'array':
+            info[akey] = npz['a_' + akey]
+        elif kind == 'list':
+            info[akey] = npz['a_' + akey].tolist()
+        elif kind == 'ragged':
+            flat = npz['a_' + akey]
+            offsets = npz['o_' + akey]
+            info[akey] = [flat[offsets[i]:offsets[i+1]] for i in range(offsets.size - 1)]
+        elif kind != 'split':
+            info[akey] = meta['values'][akey]
+    # the slices share the memory of their parent array
+    for akey, parent in meta['parents'].items():
+        flat = info[parent]
+        offsets = npz['o_' + akey]
+        info[akey] = [flat[offsets[i]:offsets[i+1]] for i in range(offsets.size - 1)]
+    return info
+
+
+_theCache = None
+_recorder = None
+
+
+def getCache():
+    """
+    Return the process-wide `atomicCache`, or None if the cache is switched off.
+
+    The cache is created on first use from the chiantirc defaults.
+    """
+    global _theCache
+    if _theCache is None:
+        import ChiantiPy.tools.io as chio
+        try:
+            defaults = chio.defaultsRead()
+            version = chio.versionRead()
+        except (KeyError, IOError):
+            # XUVTOP not set or no database, nothing to cache
+            _theCache = False
+            return None
+        if not defaults['usecache']:
+            _theCache = False
+        else:
+            _theCache = atomicCache(defaults['cachedir'], maxSize=defaults['cachesize'], version=version)
+    if _theCache is False:
+        return None
+    return _theCache
+
+
+def setCache(cacheDir=None, maxSize=None, useCache=True):
+    """
+    Replace the process-wide cache, e.g. to use a different directory or to switch it off.
+
+    Parameters
+    ----------
+    cacheDir : `str`
+        the cache directory, the chiantirc value if None
+    maxSize : `float`
+        the size cap in megabytes, the chiantirc value if None
+    useCache : `bool`
+        if False, the readers always parse the database files
+    """
+    global _theCache
+    if not useCache:
+        _theCache = False
+        return
+    import ChiantiPy.tools.io as chio
+    defaults = chio.defaultsRead()
+    if cacheDir is None:
+        cacheDir = defaults['cachedir']
+    if maxSize is None:
+        maxSize = defaults['cachesize']
+    _theCache = atomicCache(cacheDir, maxSize=maxSize, version=chio.versionRead())
+
+
+def setRecorder(recorder):
+    """
+    Pass every result given to `save` or found in the cache to `recorder` as well, or stop doing so if None.
+
+    `recorder` is called as recorder(reader, filenames, info, options);  this is how
+    `ChiantiPy.tools.store.makeStore` collects the results of the readers.
+    """
+    global _recorder
+    _recorder = recorder
+
+
+def load(reader, filenames, options=None):
+    """
+    Return the result of `reader` for `filenames` from the store or the cache, or None.
+    """
+    # imported here, the store module imports this one
+    import ChiantiPy.tools.store as chstore
+    info = chstore.load(reader, filenames, options)
+    if info is not None:
+        return info
+    cache = getCache()
+    if cache is None:
+        return None
+    info = cache.load(reader, filenames, options)
+    if info is not None and _recorder is not None:
+        _recorder(reader, filenames, info, options)
+    return info
+
+
+def save(reader, filenames, info, options=None):
+    """
+    Store the result `info` of `reader` for `filenames` in the cache.
+    """
+    if _recorder is not None:
+        _recorder(reader, filenames, info, options)
+    cache = getCache()
+    if cache is None:
+        return
+    cache.save(reader, filenames, info, options)
@@ -32,36 +32,166 @@ AbundanceList : list
     the names of all abundance files included in the CHIANTI database
 GrndLevels : list
     the number of levels that should be considered in an ionization calculation
+Gff : dict
+    the free-free gaunt factors of Sutherland, from `ChiantiPy.tools.io.gffRead`
+GffInt : dict
+    the integrated free-free gaunt factors, from `ChiantiPy.tools.io.gffintRead`
+GffIntSpline : tuple
+    the spline representation of GffInt['gffint'] as a function of GffInt['g2']
+Itoh : dict
+    the free-free gaunt factor coefficients of Itoh, from `ChiantiPy.tools.io.itohRead`
+Klgfb : dict
+    the free-bound gaunt factors of Karzas and Latter, from `ChiantiPy.tools.io.klgfbRead`
+KlgfbSpline : dict
+    the spline representation of the log of the Karzas and Latter gaunt factors as a
+    function of the log of the scaled photon energy, keyed by the quantum numbers (n, l)
+Verner : dict
+    the photoionization cross section parameters of Verner, from `ChiantiPy.tools.io.vernerRead`
+TwoPhotonH, TwoPhotonHe : dict
+    the two-photon A values and distributions for the H and He sequences
+TwoPhotonHSpline, TwoPhotonHeSpline : list
+    the spline representations of the two-photon distributions, one for each Z
+
+Notes
+-----
+Each of these is read from the database the first time it is used and then kept,
+so that importing this module costs nothing.  `Abundance` is a mapping of the
+names in `AbundanceList` to the contents of the abundance files, each of which
+is read the first time it is looked up.  The arrays of the gaunt factor and
+cross section tables are shared by all of the ions and are read-only.
 '''
 import os
-import glob
-import traceback
 import warnings
+from collections.abc import Mapping
+
+import numpy as np
 
 import ChiantiPy.tools.io as chio
+import ChiantiPy.tools.store as chstore
 
-try:
-    Xuvtop = os.environ['XUVTOP']
-    Defaults = chio.defaultsRead()
-    Ip = chio.ipRead()
-    MasterList = chio.masterListRead()
-    IoneqAll = chio.ioneqRead(ioneqName=Defaults['ioneqfile'])
-    ChiantiVersion = chio.versionRead()
-    keywordArgs = ['temperature', 'eDensity', 'hDensity', 'pDensity', 'radTemperature',
-                   'rStar', 'distance']
-    AbundanceDefault = chio.abundanceRead(abundancename=Defaults['abundfile'])
-
-    AbundanceList = []
-    for fname in glob.glob(os.path.join(Xuvtop, 'abundance', '*.abund')):
-        AbundanceList.append(os.path.splitext(os.path.basename(fname))[0])
-    Abundance = {abundance: chio.abundanceRead(abundancename=abundance)
-                 for abundance in AbundanceList}
-    GrndLevels = chio.grndLevelsRead()
-except (KeyError, IOError) as e:
-    print(traceback.format_exc())
-    if isinstance(e, KeyError):
-        warnings.warn(
-            'XUVTOP environment variable not set. You will not be able to access any data from the CHIANTI database.')
-    else:
+keywordArgs = ['temperature', 'eDensity', 'hDensity', 'pDensity', 'radTemperature',
+               'rStar', 'distance']
+
+
+class abundanceMapping(Mapping):
+    """
+    The abundance files in $XUVTOP/abundance, keyed by name and read on first use.
+    """
+    def __init__(self, names):
+        self.Names = list(names)
+        self._loaded = {}
+
+    def __getitem__(self, abundancename):
+        if abundancename not in self._loaded:
+            if abundancename not in self.Names:
+                raise KeyError(abundancename)
+            self._loaded[abundancename] = chio.abundanceRead(abundancename=abundancename)
+        return self._loaded[abundancename]
+
+    def __iter__(self):
+        return iter(self.Names)
+
+    def __len__(self):
+        return len(self.Names)
+
+
+def _abundanceList():
+    abundanceList = []
+    for fname in chstore.listdir(os.path.join(_get('Xuvtop'), 'abundance')):
+        if fname.endswith('.abund'):
+            abundanceList.append(os.path.splitext(fname)[0])
+    return abundanceList
+
+
+def _readOnly(info):
+    """
+    Make the arrays of the table `info` read-only and return it.
+    """
+    for value in info.values():
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+    return info
+
+
+def _klgfbSpline():
+    from scipy.interpolate import splrep
+    klgfb = _get('Klgfb')
+    ngfb = klgfb['klgfb'].shape[0]
+    splines = {}
+    for n in range(1, ngfb + 1):
+        for l in range(ngfb):
+            splines[n, l] = splrep(klgfb['pe'], klgfb['klgfb'][n-1, l])
+    return splines
+
+
+def _twoPhotonSpline(name):
+    from scipy.interpolate import splrep
+    dist = _get(name)
+    y0 = dist['y0'].astype(np.float64)
+    return [splrep(y0, psi, s=0) for psi in dist['psi0']]
+
+
+def _gffIntSpline():
+    from scipy.interpolate import splrep
+    gffint = _get('GffInt')
+    return splrep(gffint['g2'], gffint['gffint'])
+
+
+_loaders = {
+    'Xuvtop':lambda: os.environ['XUVTOP'],
+    'Defaults':lambda: chio.defaultsRead(),
+    'Ip':lambda: chio.ipRead(),
+    'MasterList':lambda: chio.masterListRead(),
+    'IoneqAll':lambda: chio.ioneqRead(ioneqName=_get('Defaults')['ioneqfile']),
+    'ChiantiVersion':lambda: chio.versionRead(),
+    'AbundanceDefault':lambda: chio.abundanceRead(abundancename=_get('Defaults')['abundfile']),
+    'AbundanceList':_abundanceList,
+    'Abundance':lambda: abundanceMapping(_get('AbundanceList')),
+    'GrndLevels':lambda: chio.grndLevelsRead(),
+    'Gff':lambda: _readOnly(chio.gffRead()),
+    'GffInt':lambda: _readOnly(chio.gffintRead()),
+    'GffIntSpline':_gffIntSpline,
+    'Itoh':lambda: _readOnly(chio.itohRead()),
+    'Klgfb':lambda: _readOnly(chio.klgfbRead()),
+    'KlgfbSpline':_klgfbSpline,
+    'Verner':lambda: _readOnly(chio.vernerRead()),
+    'TwoPhotonH':lambda: _readOnly(chio.twophotonHRead()),
+    'TwoPhotonHSpline':lambda: _twoPhotonSpline('TwoPhotonH'),
+    'TwoPhotonHe':lambda: _readOnly(chio.twophotonHeRead()),
+    'TwoPhotonHeSpline':lambda: _twoPhotonSpline('TwoPhotonHe'),
+    }
+
+
+def __getattr__(name):
+    """
+    Read one of the module level tables on its first use and keep it.
+    """
+    if name not in _loaders:
+        raise AttributeError('module %s has no attribute %s'%(__name__, name))
+    # a failed read raises an AttributeError so that hasattr and getattr with a default work
+    try:
+        value = _loaders[name]()
+    except KeyError as err:
+        if 'XUVTOP' not in os.environ:
+            warnings.warn(
+                'XUVTOP environment variable not set. You will not be able to access any data from the CHIANTI database.')
+        raise AttributeError('module %s can not read %s'%(__name__, name)) from err
+    except IOError as err:
         warnings.warn(
-            'Cannot find the CHIANTI atomic database at {}. You will not be able to access any data from the CHIANTI database.'.format(Xuvtop))
+            'Cannot find the CHIANTI atomic database at {}. You will not be able to access any data from the CHIANTI database.'.format(os.environ['XUVTOP']))
+        raise AttributeError('module %s can not read %s'%(__name__, name)) from err
+    globals()[name] = value
+    return value
+
+
+def _get(name):
+    """
+    Return the table `name`, reading it if this is its first use.
+    """
+    if name in globals():
+        return globals()[name]
+    return __getattr__(name)
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_loaders.keys()))
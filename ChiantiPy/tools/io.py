@@ -5,16 +5,48 @@ import os
 from datetime import date
 import fnmatch
 import pickle
+import tempfile
 import configparser
+import logging
 
 import numpy as np
 
 import ChiantiPy.tools.util as util
 import ChiantiPy.tools.constants as const
+import ChiantiPy.tools.cache as chcache
+import ChiantiPy.tools.store as chstore
 import ChiantiPy.Gui as chgui
 from  ChiantiPy.fortranformat import FortranRecordReader
 
 today = date.today()
+
+log = logging.getLogger(__name__)
+
+
+def _dataLength(lines):
+    """
+    Return the number of data lines, the lines before the first one with fewer than two entries.
+    """
+    for ndata, aline in enumerate(lines):
+        if len(aline.split()) < 2:
+            return ndata
+    return len(lines)
+
+
+def _tokenCounts(lines):
+    """
+    Return the number of whitespace separated entries on each line.
+    """
+    text = np.array([aline.rstrip('\r\n') for aline in lines])
+    if not text.size or text.dtype.itemsize == 0:
+        return np.zeros(len(lines), np.int64)
+    chars = text.view('U1').reshape(text.size, -1)
+    blank = np.char.isspace(chars) | (chars == '')
+    previous = np.ones_like(blank)
+    previous[:, 1:] = blank[:, :-1]
+    return (~blank & previous).sum(axis=1)
+
+
 def abundanceRead(abundancename=''):
     """
     Read abundance file `abundancename` and return the abundance values relative to hydrogen
@@ -41,6 +73,9 @@ def abundanceRead(abundancename=''):
 #        # the default abundance file will be used
 #        abundancename=self.Defaults['abundfile']
 #        fname=os.path.join(xuvtop,'abundance',abundancename+'.abund')
+    info = chcache.load('abundanceRead', [abundancefile])
+    if info is not None:
+        return info
     input = open(abundancefile,'r')
     s1 = input.readlines()
     input.close()
@@ -59,7 +94,9 @@ def abundanceRead(abundancename=''):
     abs = 10.**(abundance[gz]-abundance[0])
     abundance.put(gz,abs)
     abundanceRef = s1[nlines+1:]
-    return {'abundancename':abundancename,'abundance':abundance,'abundanceRef':abundanceRef}
+    info = {'abundancename':abundancename,'abundance':abundance,'abundanceRef':abundanceRef}
+    chcache.save('abundanceRead', [abundancefile], info)
+    return info
 
 
 def zion2name(z,ion, dielectronic=False):
@@ -155,49 +192,31 @@ def autoRead(ions, filename=None, total=True, verbose=False):
         fname = util.ion2filename(ions)
         autoname = fname+'.auto'
     #
+    options = {'ions':ions, 'total':total}
+    Auto = chcache.load('autoRead', [autoname], options)
+    if Auto is not None:
+        return Auto
     input = open(autoname,'r')
     s1 = input.readlines()
     input.close()
-    nwvl = 0
-    ndata = 2
-    while ndata > 1:
-        s1a = s1[nwvl]
-        s2 = s1a.split()
-        ndata = len(s2)
-        nwvl += 1
-    nwvl -= 1
-    if verbose:
-        print((' nwvl = %10i ndata = %4i'%(nwvl, ndata)))
-    lvl1 = [0]*nwvl
-    lvl2 = [0]*nwvl
-    avalue = [0.]*nwvl
-    pretty1  =  ['']*nwvl
-    pretty2  =  ['']*nwvl
+    nwvl = _dataLength(s1)
     #
     if verbose:
         print((' nwvl  =  %10i'%(nwvl)))
     #
     wgfaFormat = '(2i7,e12.2,a30,3x,a30)'
-    header_line = FortranRecordReader(wgfaFormat)
-    for ivl in range(nwvl):
-#        inpt=FortranLine(s1[ivl],wgfaFormat)
-        inpt = header_line.read(s1[ivl])
-        lvl1[ivl] = inpt[0]
-        lvl2[ivl] = inpt[1]
-        avalue[ivl] = inpt[2]
-        pretty1[ivl] = inpt[3].strip()
-        pretty2[ivl] = inpt[4].strip()
+    lvl1, lvl2, avalue, pretty1, pretty2 = FortranRecordReader(wgfaFormat).read_many(s1[:nwvl])
+    pretty1 = [one.strip() for one in pretty1.tolist()]
+    pretty2 = [one.strip() for one in pretty2.tolist()]
 
     ref = []
     for i in range(nwvl+1,len(s1)):
         s1a = s1[i]
         ref.append(s1a.strip())
-    Auto = {"lvl1":lvl1, "lvl2":lvl2, "avalue":avalue, "ref":ref, 'ionS':ions, 'filename':autoname, 'pretty1':pretty1, 'pretty2':pretty2}
+    Auto = {"lvl1":lvl1.tolist(), "lvl2":lvl2.tolist(), "avalue":avalue.tolist(), "ref":ref, 'ionS':ions, 'filename':autoname, 'pretty1':pretty1, 'pretty2':pretty2}
     if total:
-        avalueLvl = [0.]*max(lvl2)
-        for iwvl in range(nwvl):
-            avalueLvl[lvl2[iwvl] -1] += avalue[iwvl]
-        Auto['avalueLvl'] = np.asarray(avalueLvl)
+        avalueLvl = np.bincount(lvl2 - 1, weights=avalue, minlength=lvl2.max())
+        Auto['avalueLvl'] = avalueLvl
 
     if verbose:
         pstring1 = '%5s %5s %12s %12s %20s - %20s'
@@ -209,6 +228,7 @@ def autoRead(ions, filename=None, total=True, verbose=False):
             br = avalue/avalueLvl[l2-1]
             print(pstring%(l1, l2, avalue, br, pretty1[ivl], pretty2[ivl]))
     #
+    chcache.save('autoRead', [autoname], Auto, options)
     return Auto
 
 
@@ -295,6 +315,10 @@ def cireclvlRead(ions, filename=None, filetype='cilvl'):
 
     paramname = fname + '.' + filetype
 
+    options = {'ions':ions, 'filetype':filetype}
+    info = chcache.load('cireclvlRead', [paramname], options)
+    if info is not None:
+        return info
     #print('paramname %s'%(paramname))
     if os.path.isfile(paramname):
         with open(paramname,'r') as input:
@@ -313,62 +337,82 @@ def cireclvlRead(ions, filename=None, filetype='cilvl'):
     ndata = iline - 1
     ntrans = ndata//2
     #
+    # each transition is a line of temperatures and a line of rates, both following
+    # 4 integers, not all lines have the same number of temperatures
     #
-    # need to find the maximum number of temperatures, not all lines are the same
-    #
-    ntemp = np.zeros(ntrans, 'int32')
-    iline = 0
-    for jline in range(0, ndata, 2):
-        dummy = lines[jline].replace(os.linesep, '').split()
-        ntemp[iline] = len(dummy[4:])
-        iline += 1
+    tempLines = lines[0:2*ntrans:2]
+    rateLines = lines[1:2*ntrans:2]
+    tempCount = _tokenCounts(tempLines)
+    rateCount = _tokenCounts(rateLines)
+    ntemp = (tempCount - 4).astype('int32')
     maxNtemp = ntemp.max()
-#   print ' maxNtemp = ', maxNtemp
-    temp = np.zeros((ntrans,maxNtemp), np.float64)
-    iline = 0
-    for jline in range(0, ndata, 2):
-        recdat = lines[jline].replace(os.linesep, '').split()
-        shortT = np.asarray(recdat[4:], np.float64)
-        # the result of the next statement is to continue to replicate t
-        t = np.resize(shortT, maxNtemp)
-        if filetype == 'rrlvl':
-            temp[iline] = t
-        else:
-            temp[iline] = 10.**t
-        iline += 1
+    # the np.resize of each short line continues to replicate its values
+    replicate = np.arange(maxNtemp)
     #
-    lvl1 = np.zeros(ntrans, 'int64')
-    lvl2 = np.zeros(ntrans, 'int64')
-    ci = np.zeros((ntrans, maxNtemp), np.float64)
+    allTemp = np.fromstring(''.join(tempLines), sep=' ')
+    if allTemp.size != tempCount.sum():
+        # some entry does not parse, as in the line by line reading
+        allTemp = np.concatenate([np.asarray(aline.split(), np.float64) for aline in tempLines])
+    start = np.cumsum(tempCount) - tempCount + 4
+    t = allTemp[start[:, None] + replicate[None, :] % ntemp[:, None]]
+    if filetype == 'rrlvl':
+        temp = t
+    else:
+        temp = 10.**t
     #
-    idat = 0
-    for jline in range(1, ndata, 2):
-        cidat = lines[jline].replace(os.linesep, '').split()
-        shortCi = np.asarray(cidat[4:], np.float64)
-        lvl1[idat] = int(cidat[2])
-        lvl2[idat] = int(cidat[3])
-        ci[idat] = np.resize(shortCi, maxNtemp)
-        idat += 1
-    return {'temperature':temp, 'ntemp':ntemp,'lvl1':lvl1, 'lvl2':lvl2, 'rate':ci,'ref':lines[ndata+1:], 'ionS':ions}
+    allRate = np.fromstring(''.join(rateLines), sep=' ')
+    if allRate.size != rateCount.sum():
+        allRate = np.concatenate([np.asarray(aline.split(), np.float64) for aline in rateLines])
+    start = np.cumsum(rateCount) - rateCount
+    lvl1 = allRate[start + 2].astype('int64')
+    lvl2 = allRate[start + 3].astype('int64')
+    ci = allRate[start[:, None] + 4 + replicate[None, :] % (rateCount[:, None] - 4)]
+    info = {'temperature':temp, 'ntemp':ntemp,'lvl1':lvl1, 'lvl2':lvl2, 'rate':ci,'ref':lines[ndata+1:], 'ionS':ions}
+    if filetype == 'rrlvl':
+        info['rateSecond'] = rrlvlSecond(info)
+    chcache.save('cireclvlRead', [paramname], info, options)
+    return info
+
+
+def rrlvlSecond(info):
+    """
+    Return the second derivatives of the splines of the log of the rates against the log of
+    the temperatures of a rrlvl file, as used by `ChiantiPy.core.ion.rrlvlDescale`.
+
+    The splines of each transition use all but its last temperature.
+
+    Parameters
+    ----------
+    info : `dict`
+        as returned by `cireclvlRead`
+    """
+    return util.cubicSplineSecondRows(np.log(info['temperature']), np.log(info['rate']), np.asarray(info['ntemp']) - 1)
 
 
 def defaultsRead(verbose=False):
     """
     Read in configuration from .chiantirc file or set defaults if one is not found.
     """
-    initDefaults = {'abundfile': 'sun_photospheric_2015_scott','ioneqfile': 'chianti', 'wavelength': 'angstrom', 'flux': 'energy','gui':False}
+    initDefaults = {'abundfile': 'sun_photospheric_2015_scott','ioneqfile': 'chianti', 'wavelength': 'angstrom', 'flux': 'energy','gui':False,
+        'usecache':True, 'cachedir':os.path.join(os.environ['HOME'], '.chianti', 'cache'), 'cachesize':1000.,
+        'usestore':False, 'storefile':'', 'popmemory':256.}
     rcfile = os.path.join(os.environ['HOME'],'.chianti/chiantirc')
     if os.path.isfile(rcfile):
-        print((' reading chiantirc file'))
+        log.info(' reading chiantirc file')
         config = configparser.RawConfigParser(initDefaults)
         config.read(rcfile)
         defaults = {}
         for anitem in config.items('chianti'):
             defaults[anitem[0]] = anitem[1]
-        if defaults['gui'].lower() in ('t', 'y', 'yes', 'on', 'true', '1', 1, True):
-            defaults['gui'] = True
-        elif defaults['gui'].lower() in ('f', 'n', 'no', 'off', 'false', '0', 0, False):
-            defaults['gui'] = False
+        for akey in ['gui', 'usecache', 'usestore']:
+            if str(defaults[akey]).lower() in ('t', 'y', 'yes', 'on', 'true', '1'):
+                defaults[akey] = True
+            elif str(defaults[akey]).lower() in ('f', 'n', 'no', 'off', 'false', '0'):
+                defaults[akey] = False
+        defaults['cachedir'] = os.path.expanduser(defaults['cachedir'])
+        defaults['cachesize'] = float(defaults['cachesize'])
+        defaults['storefile'] = os.path.expanduser(defaults['storefile'])
+        defaults['popmemory'] = float(defaults['popmemory'])
     else:
         defaults = initDefaults
         if verbose:
@@ -402,6 +446,9 @@ def diRead(ions, filename=None):
         fname = util.ion2filename(ions)
         paramname = fname+'.diparams'
     #
+    DiParams = chcache.load('diRead', [paramname])
+    if DiParams is not None:
+        return DiParams
     input = open(paramname,'r')
     #  need to read first line and see how many elements
     line1 = input.readline()
@@ -445,6 +492,9 @@ def diRead(ions, filename=None):
     if neaev:
         info['eaev'] = eaev
     DiParams = {"info":info,"btf":btf,"ev1":ev1,"xsplom":xsplom,"ysplom":ysplom, 'eaev':eaev,"ref":hdr}
+    # the splines are fitted once, diCross only evaluates them
+    DiParams['ysplomSecond'] = util.cubicSplineSecondRows(xsplom, ysplom, np.full(nfac, nspl))
+    chcache.save('diRead', [paramname], DiParams)
     return DiParams
 
 
@@ -460,6 +510,10 @@ def drRead(ions, filename=None):
     else:
         fname = util.ion2filename(ions)
         paramname = fname+'.drparams'
+    options = {'ions':ions}
+    DrParams = chcache.load('drRead', [paramname], options)
+    if DrParams is not None:
+        return DrParams
     if os.path.isfile(paramname):
         input = open(paramname,'r')
         #  need to read first line and see how many elements
@@ -491,6 +545,7 @@ def drRead(ions, filename=None):
         else:
             DrParams = None
             print((' for ion %5s unknown DR type = %5i' %(ions, drtype)))
+        chcache.save('drRead', [paramname], DrParams, options)
     else:
         DrParams = None
     return DrParams
@@ -518,6 +573,9 @@ def eaRead(ions, filename=None):
         #
         fname = util.ion2filename(ions)
         splupsname = fname+'.easplups'
+    info = chcache.load('eaRead', [splupsname])
+    if info is not None:
+        return info
     if not os.path.exists(splupsname):
         print((' could not find file:  ', splupsname))
         return {"lvl1":-1}
@@ -572,8 +630,31 @@ def eaRead(ions, filename=None):
         for i in range(nsplups+1,len(s1)):
             s1a = s1[i][:-1]
             ref.append(s1a.strip())
-    return {"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"de":de,"cups":cups
+    info = {"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"de":de,"cups":cups
                 ,"nspl":nspl,"splups":splups,"ref":ref}
+    info['splupsSecond'] = eaSecond(info)
+    chcache.save('eaRead', [splupsname], info)
+    return info
+
+
+def eaKnots(info):
+    """
+    Return the (ntrans, 9) knots of the splines of an easplups file, dx*arange(nspl) for each transition.
+    """
+    nspl = np.asarray(info['nspl'], np.float64)
+    return np.arange(9)[np.newaxis]/(nspl[:, np.newaxis] - 1.)
+
+
+def eaSecond(info):
+    """
+    Return the (ntrans, 9) second derivatives of the splines of an easplups file at `eaKnots`.
+
+    Parameters
+    ----------
+    info : `dict`
+        as returned by `eaRead`
+    """
+    return util.cubicSplineSecondRows(eaKnots(info), info['splups'], info['nspl'])
 
 
 def elvlcRead(ions, filename=None, getExtended=False, verbose=False, useTh=True):
@@ -596,8 +677,7 @@ def elvlcRead(ions, filename=None, getExtended=False, verbose=False, useTh=True)
     #
     '%7i%30s%5s%5i%5s%5.1f%15.3f%15.3f \n'
     #
-    header_line = FortranRecordReader('i7,a30,a5,i5,a5,f5.1,2f15.3')
-#    elvlcFormat  = FortranFormat(fstring)
+    elvlcFormat = 'i7,a30,a5,i5,a5,f5.1,2f15.3'
     #
     #
     if filename:
@@ -607,6 +687,10 @@ def elvlcRead(ions, filename=None, getExtended=False, verbose=False, useTh=True)
     else:
         fname = util.ion2filename(ions)
         elvlname = fname+'.elvlc'
+    options = {'ions':ions, 'getExtended':getExtended, 'useTh':useTh}
+    info = chcache.load('elvlcRead', [elvlname], options)
+    if info is not None:
+        return info
     if not os.path.isfile(elvlname):
         print((' elvlc file does not exist:  %s'%(elvlname)))
         return {'status':0}
@@ -614,57 +698,29 @@ def elvlcRead(ions, filename=None, getExtended=False, verbose=False, useTh=True)
     input = open(elvlname,'r')
     s1 = input.readlines()
     input.close()
-    nlvls = 0
-    ndata = 2
-    while ndata > 1:
-        s1a = s1[nlvls][:-1]
-        s2 = s1a.split()
-        ndata = len(s2)
-        nlvls = nlvls+1
-    nlvls -= 1
+    nlvls = _dataLength(s1)
     if verbose:
         print((' nlvls = %i'%(nlvls)))
-    lvl = [0]*nlvls
+    lvl, term, label, spin, spd, j, ecm, ecmth = FortranRecordReader(elvlcFormat).read_many(s1[:nlvls])
     conf  =  [0]*nlvls
-    term = [0]*nlvls
-    label = [0]*nlvls
-    spin = [0]*nlvls
-    spd = [0]*nlvls
-    l = ['']*nlvls
-    j = [0.]*nlvls
-    mult = [0.]*nlvls
-    ecm = [0]*nlvls
-    ecmth = [0]*nlvls
-    pretty = [0]*nlvls
+    term = [one.strip() for one in term.tolist()]
+    spd = [one.strip() for one in spd.tolist()]
+    l = [const.Spd.index(one) for one in spd]
+    mult = 2.*j + 1.
+    if useTh:
+        ecm = np.where(ecm < 0., ecmth, ecm)
+    eryd = np.where(ecm >= 0., ecm*const.invCm2ryd, -1.)
+    erydth = np.where(ecmth >= 0., ecmth*const.invCm2ryd, -1.)
+    lvl, label, spin, j, mult = lvl.tolist(), label.tolist(), spin.tolist(), j.tolist(), mult.tolist()
+    ecm, ecmth, eryd, erydth = ecm.tolist(), ecmth.tolist(), eryd.tolist(), erydth.tolist()
+    pretty = [(term[i] + ' %1i%1s%3.1f'%(spin[i], spd[i], j[i])).strip() for i in range(nlvls)]
     if getExtended:
         extended = [' ']*nlvls
-    for i in range(0,nlvls):
-        if verbose:
-            print((s1[i][0:115]))
-#        inpt = FortranLine(s1[i][0:115],elvlcFormat)
-        inpt = header_line.read(s1[i][0:115])
-        lvl[i] = inpt[0]
-        term[i] = inpt[1].strip()
-        label[i] = inpt[2]
-        spin[i] = inpt[3]
-        spd[i] = inpt[4].strip()
-        l[i] = const.Spd.index(spd[i])
-        j[i] = inpt[5]
-        mult[i] = 2.*inpt[5] + 1.
-        ecm[i] = inpt[6]
-        ecmth[i] = inpt[7]
-        if ecm[i] < 0.:
-            if useTh:
-                ecm[i] = ecmth[i]
-        stuff = term[i].strip() + ' %1i%1s%3.1f'%( spin[i], spd[i], j[i])
-        pretty[i] = stuff.strip()
-        if getExtended:
+        for i in range(0,nlvls):
             cnt = s1[i].count(',')
             if cnt > 0:
                 idx = s1[i].index(',')
                 extended[i] = s1[i][idx+1:]
-    eryd = [ecm[i]*const.invCm2ryd if ecm[i] >= 0. else -1. for i in range(nlvls)]
-    erydth = [ecmth[i]*const.invCm2ryd if ecmth[i] >= 0. else -1. for i in range(nlvls)]
     ref = []
     # this should skip the last '-1' in the file
     for i in range(nlvls+1,len(s1)):
@@ -675,6 +731,7 @@ def elvlcRead(ions, filename=None, getExtended=False, verbose=False, useTh=True)
              "pretty":pretty, 'status':status, 'filename':elvlname}
     if getExtended:
         info['extended'] = extended
+    chcache.save('elvlcRead', [elvlname], info, options)
     return info
 
 
@@ -779,50 +836,31 @@ def fblvlRead(ions, filename=None, verbose=False):
     else:
         fname = util.convertName(ions)['filename']
         fblvlName = fname + '.fblvl'
+    info = chcache.load('fblvlRead', [fblvlName])
+    if info is not None:
+        return info
     if os.path.exists(fblvlName):
         input = open(fblvlName,'r')
         s1 = input.readlines()
         input.close()
-        nlvls = 0
-        ndata = 2
-        while ndata > 1:
-            s1a = s1[nlvls][:-1]
-            s2 = s1a.split()
-            ndata = len(s2)
-            nlvls = nlvls+1
-        nlvls -= 1
+        nlvls = _dataLength(s1)
         if verbose:
             print((' nlvls = %5i'%(nlvls)))
-        lvl = [0]*nlvls
-        conf = [0]*nlvls
-        pqn = [0]*nlvls
-        l = [0]*nlvls
-        spd = [0]*nlvls
-        mult = [0]*nlvls
-        ecm = [0]*nlvls
-        ecmth = [0]*nlvls
-        for i in range(0,nlvls):
-            if verbose:
-                print((s1[i]))
-#            inpt=FortranLine(s1[i],elvlcFormat)
-            inpt = header_line.read(s1[i])
-            lvl[i] = int(inpt[0])
-            conf[i] = inpt[1].strip()
-            pqn[i] = int(inpt[2])
-            l[i] = int(inpt[3])
-            spd[i] = inpt[4].strip()
-            mult[i] = int(inpt[5])
-            if inpt[6] == 0.:
-                ecm[i] = float(inpt[7])
-            else:
-                ecm[i] = float(inpt[6])
-                ecmth[i] = float(inpt[7])
+        lvl, conf, pqn, l, spd, mult, ecmObs, ecmTh = header_line.read_many(s1[:nlvls])
+        conf = [one.strip() for one in conf.tolist()]
+        spd = [one.strip() for one in spd.tolist()]
+        # a zero observed energy is replaced by the theoretical one
+        ecm = np.where(ecmObs == 0., ecmTh, ecmObs).tolist()
+        ecmth = np.where(ecmObs == 0., 0., ecmTh).tolist()
+        lvl, pqn, l, mult = lvl.tolist(), pqn.tolist(), l.tolist(), mult.tolist()
         ref = []
         for i in range(nlvls+1,len(s1)-1):
             s1a = s1[i][:-1]
             ref.append(s1a.strip())
-        return {"lvl":lvl,"conf":conf,'pqn':pqn,"l":l,"spd":spd,"mult":mult,
+        info = {"lvl":lvl,"conf":conf,'pqn':pqn,"l":l,"spd":spd,"mult":mult,
             "ecm":ecm,'ecmth':ecmth, 'filename':fblvlName,  'ref':ref}
+        chcache.save('fblvlRead', [fblvlName], info)
+        return info
     else:
         return {'errorMessage':' fblvl file does not exist %s'%(fblvlName)}
 
@@ -832,6 +870,9 @@ def grndLevelsRead():
     in populate and drPopulate
     '''
     filename = os.path.join(os.environ['XUVTOP'], 'ioneq', 'grndLevels.dat')
+    info = chcache.load('grndLevelsRead', [filename])
+    if info is not None:
+        return info['grndLevels']
     if os.path.isfile(filename):
         with open(filename, 'r') as inpt:
             lines = inpt.readlines()
@@ -845,6 +886,7 @@ def grndLevelsRead():
     grndLevels = []
     for aline in lines[:divider]:
         grndLevels.append(int(aline.split()[1]))
+    chcache.save('grndLevelsRead', [filename], {'grndLevels':grndLevels})
     return grndLevels
 
 def gffRead():
@@ -862,6 +904,9 @@ def gffRead():
     """
     xuvtop = os.environ['XUVTOP']
     fileName = os.path.join(xuvtop, 'continuum','gffgu.dat' )
+    info = chcache.load('gffRead', [fileName])
+    if info is not None:
+        return info
     input = open(fileName)
     lines = input.readlines()
     input.close()
@@ -891,7 +936,9 @@ def gffRead():
             iline += 1
             ivalue += 1
     #
-    return {'g2':g2, 'g21d':g21d,  'u':u, 'u1d':u1d,  'gff':gff,  'gff1d':gff1d}
+    info = {'g2':g2, 'g21d':g21d,  'u':u, 'u1d':u1d,  'gff':gff,  'gff1d':gff1d}
+    chcache.save('gffRead', [fileName], info)
+    return info
 
 
 def gffintRead():
@@ -901,6 +948,9 @@ def gffintRead():
     """
     xuvtop = os.environ['XUVTOP']
     fileName = os.path.join(xuvtop, 'continuum','gffint.dat' )
+    info = chcache.load('gffintRead', [fileName])
+    if info is not None:
+        return info
     input = open(fileName)
     lines = input.readlines()
     input.close()
@@ -923,7 +973,9 @@ def gffintRead():
         s3[ivalue] = float(values[4])
         ivalue += 1
     #
-    return {'g2':g2, 'gffint':gffint, 's1':s1, 's2':s2, 's3':s3}
+    info = {'g2':g2, 'gffint':gffint, 's1':s1, 's2':s2, 's3':s3}
+    chcache.save('gffintRead', [fileName], info)
+    return info
 
 
 def itohRead():
@@ -937,13 +989,18 @@ def itohRead():
     """
     xuvtop = os.environ['XUVTOP']
     itohName = os.path.join(xuvtop, 'continuum', 'itoh.dat')
+    info = chcache.load('itohRead', [itohName])
+    if info is not None:
+        return info
     input = open(itohName)
     lines = input.readlines()
     input.close()
     gff = np.zeros((30, 121), np.float64)
     for iline in range(30):
         gff[iline] = np.asarray(lines[iline].split(), np.float64)
-    return {'itohCoef':gff}
+    info = {'itohCoef':gff}
+    chcache.save('itohRead', [itohName], info)
+    return info
 
 
 def klgfbRead():
@@ -962,6 +1019,9 @@ def klgfbRead():
     """
     xuvtop = os.environ['XUVTOP']
     fname = os.path.join(xuvtop, 'continuum', 'klgfb.dat')
+    info = chcache.load('klgfbRead', [fname])
+    if info is not None:
+        return info
     input = open(fname)
     lines = input.readlines()
     input.close()
@@ -978,7 +1038,9 @@ def klgfbRead():
         n = int(data[0])
         l = int(data[1])
         gfb[n-1, l] = np.array(data[2:], np.float64)
-    return {'pe':pe, 'klgfb':gfb}
+    info = {'pe':pe, 'klgfb':gfb}
+    chcache.save('klgfbRead', [fname], info)
+    return info
 
 
 def ioneqRead(ioneqName='', minIoneq=1.e-20, verbose=False):
@@ -992,7 +1054,14 @@ def ioneqRead(ioneqName='', minIoneq=1.e-20, verbose=False):
     """
     dir = os.environ["XUVTOP"]
     ioneqdir = os.path.join(dir,'ioneq')
-    ioneqNames = util.listRootNames(ioneqdir)
+    ioneqFile = os.path.join(ioneqdir, ioneqName+'.ioneq')
+    if ioneqName and chstore.getStore() is not None and chstore.isfile(ioneqFile):
+        # the file is in the store, no need to list the directory
+        ioneqNames = [ioneqName]
+        filelist = [ioneqFile]
+    else:
+        ioneqNames = util.listRootNames(ioneqdir)
+        filelist = None
     if ioneqName not in ioneqNames:
         # the user will select an ioneq file
         choice = chgui.gui.chpicker(ioneqdir, label='Select a single ioneq file')
@@ -1009,10 +1078,15 @@ def ioneqRead(ioneqName='', minIoneq=1.e-20, verbose=False):
             ioneqfilename = os.path.basename(fname)
             ioneqname,ext = os.path.splitext(ioneqfilename)
     else:
-        filelist = util.listFiles(ioneqdir)
+        if filelist is None:
+            filelist = util.listFiles(ioneqdir)
         idx = ioneqNames.index(ioneqName)
         fname = filelist[idx]
     #
+    options = {'ioneqName':ioneqName, 'minIoneq':minIoneq}
+    info = chcache.load('ioneqRead', [fname], options)
+    if info is not None:
+        return info
     input = open(fname,'r')
     s1 = input.readlines()
     input.close()
@@ -1035,20 +1109,179 @@ def ioneqRead(ioneqName='', minIoneq=1.e-20, verbose=False):
     nlines -= 1
     #
     #
-    header_lineq = FortranRecordReader('2i3,'+str(nTemperature)+'e10.2')
+    ioneqFormat = '2i3,'+str(nTemperature)+'e10.2'
+    columns = FortranRecordReader(ioneqFormat).read_many(s1[2:nlines])
     #
     ioneqAll = np.zeros((nElement,nElement+1,nTemperature),np.float64)
-    for iline in range(2,nlines):
-        out = header_lineq.read(s1[iline])
-        iz = out[0]
-        ion = out[1]
-        ioneqAll[iz-1,ion-1].put(list(range(nTemperature)),np.asarray(out[2:],np.float64))
+    if nlines > 2:
+        ioneqAll[columns[0] - 1, columns[1] - 1] = np.column_stack(columns[2:]).astype(np.float64)
     ioneqAll = np.where(ioneqAll > minIoneq, ioneqAll, 0.)
     ioneqRef = []
     for one in s1[nlines+1:]:
         ioneqRef.append(one[:-1])  # gets rid of the \n
     del s1
-    return {'ioneqname':ioneqName,'ioneqAll':ioneqAll,'ioneqTemperature':ioneqTemperature,'ioneqRef':ioneqRef}
+    info = {'ioneqname':ioneqName,'ioneqAll':ioneqAll,'ioneqTemperature':ioneqTemperature,'ioneqRef':ioneqRef}
+    info['ioneqSecond'] = ioneqSecond(info)
+    chcache.save('ioneqRead', [fname], info, options)
+    return info
+
+
+def ioneqSecond(info):
+    """
+    Return the second derivatives of the splines of the log of the ionization equilibria
+    against the log of the temperature.
+
+    The spline of each ion runs over the temperatures where its ionization equilibrium is
+    positive.
+
+    Parameters
+    ----------
+    info : `dict`
+        as returned by `ioneqRead`
+
+    Returns
+    -------
+    second : `numpy.ndarray`
+        the second derivatives in the layout of info['ioneqAll'], zero where the ionization
+        equilibrium is zero and for ions with less than 4 positive values
+    """
+    ioneqAll = info['ioneqAll']
+    logT = np.log(info['ioneqTemperature'])
+    flat = ioneqAll.reshape(-1, logT.size)
+    second = np.zeros(flat.shape, np.float64)
+    good = flat > 0.
+    count = good.sum(axis=1)
+    for m in np.unique(count):
+        if m < 4:
+            continue
+        rows = np.flatnonzero(count == m)[:, np.newaxis]
+        # the positions of the positive values of each row, in order
+        position = np.argsort(~good[rows[:, 0]], axis=1, kind='stable')[:, :m]
+        second[rows, position] = util.cubicSplineSecond(logT[position], np.log(flat[rows, position]))
+    return second.reshape(ioneqAll.shape)
+
+
+def ioneqInterp(info, z, stage, temperature):
+    """
+    Return the log of the ionization equilibrium of an ion at `temperature` from the spline of
+    its positive values.
+
+    Parameters
+    ----------
+    info : `dict`
+        as returned by `ioneqRead`
+    z : `int`
+        the atomic number
+    stage : `int`
+        the index of the ion in info['ioneqAll'] plus one, its spectroscopic number
+    temperature : array-like
+        the temperatures, outside of the range of the positive values the spline is extrapolated
+    """
+    thisIoneq = info['ioneqAll'][z-1, stage-1]
+    gioneq = thisIoneq > 0.
+    logT = np.log(info['ioneqTemperature'][gioneq])
+    x = np.log(np.atleast_1d(np.asarray(temperature, np.float64)))
+    if 'ioneqSecond' in info and gioneq.sum() >= 4:
+        second = info['ioneqSecond'][z-1, stage-1][gioneq]
+        return util.cubicSplineEval(logT[np.newaxis], np.log(thisIoneq[gioneq])[np.newaxis], second[np.newaxis], x[np.newaxis])[0]
+    from scipy.interpolate import splrep, splev
+    y2 = splrep(logT, np.log(thisIoneq[gioneq]), s=0)
+    return splev(x, y2)
+
+
+_p2eCurves = {}
+
+
+def p2eRatio(abundanceName, ioneqAll, temperature):
+    """
+    Return the proton density to electron density ratio using Eq. 7 of [1]_.
+
+    The ratio at the temperatures of the ioneq file and the second derivatives of its
+    spline are calculated once per process for each pair of abundance and ioneq files.
+
+    Parameters
+    ----------
+    abundanceName : `str`
+        the abundance file
+    ioneqAll : `dict`
+        the ionization equilibria, as returned by `ioneqRead`
+    temperature : array-like
+        the temperatures, the ratio is zero outside of the temperatures of ioneqAll
+
+    Returns
+    -------
+    ratio : `numpy.ndarray`
+        the ratio at the temperatures
+
+    References
+    ----------
+    .. [1] Young, P. R. et al., 2003, ApJS, `144, 135 <http://adsabs.harvard.edu/abs/2003ApJS..144..135Y>`_
+    """
+    key = (os.environ['XUVTOP'], abundanceName, ioneqAll.get('ioneqname'))
+    curve = _p2eCurves.get(key)
+    # the curve is kept together with the ionization equilibria it was made from
+    if curve is None or curve['ioneqAll'] is not ioneqAll['ioneqAll']:
+        abundance = abundanceRead(abundancename=abundanceName)['abundance']
+        ioneq = ioneqAll['ioneqAll']
+        nele = min(ioneq.shape[0], abundance.size)
+        charge = np.arange(ioneq.shape[1], dtype=np.float64)
+        denominator = np.einsum('i,ijk,j->k', abundance[:nele], ioneq[:nele], charge)
+        ratio = abundance[0]*ioneq[0, 1]/denominator
+        logT = np.log10(ioneqAll['ioneqTemperature'])
+        curve = {'ioneqAll':ioneq, 'logT':logT, 'ratio':ratio,
+            'second':util.cubicSplineSecond(logT[np.newaxis], ratio[np.newaxis])[0]}
+        _p2eCurves[key] = curve
+    temperature = np.asarray(temperature, np.float64)
+    x = np.log10(np.atleast_1d(temperature)).ravel()
+    logT = curve['logT']
+    result = util.cubicSplineEval(logT[np.newaxis], curve['ratio'][np.newaxis], curve['second'][np.newaxis], x[np.newaxis])[0]
+    result[(x < logT[0]) | (x > logT[-1])] = 0.
+    return result.reshape(temperature.shape)
+
+
+def ioneqWrite(info, outfile=None):
+    """
+    Write ionization equilibria to a CHIANTI .ioneq file
+
+    Parameters
+    ----------
+    info : `dict`
+        {'ioneqAll', 'ioneqTemperature', 'ioneqRef'} as returned by `ioneqRead`, ioneqAll has
+        the shape (nele, nele+1, ntemp)
+    outfile : `str`
+        the .ioneq file, to be read by `ioneqRead` it must be in $XUVTOP/ioneq
+
+    Notes
+    -----
+    The file keeps the log of the temperatures with 2 decimals and the ion fractions with
+    3 significant digits.
+    """
+    if outfile:
+        ioneqname = outfile
+    else:
+        print(' output filename not specified, no file will be created')
+        return
+    ioneqAll = np.asarray(info['ioneqAll'], np.float64)
+    nele, nion, ntemp = ioneqAll.shape
+    # 3 digit exponents do not fit the format
+    ioneqAll = np.where(ioneqAll > 1.e-99, ioneqAll, 0.)
+    out = open(ioneqname, 'w')
+    out.write('%3i%3i\n'%(ntemp, nele))
+    out.write(''.join(['%6.2f'%(one) for one in np.log10(info['ioneqTemperature'])]) + '\n')
+    for iz in range(nele):
+        for ion in range(iz + 2):
+            pstring = '%3i%3i'%(iz + 1, ion + 1) + ''.join(['%10.2e'%(one) for one in ioneqAll[iz, ion]])
+            out.write(pstring + '\n')
+    out.write(' -1\n')
+    out.write('%file:  ' + os.path.basename(ioneqname) + '\n')
+    for one in info.get('ioneqRef', []):
+        # the filename and the end of the references that ioneqRead keeps are written again
+        if one.startswith('%file') or one.strip() == '-1':
+            continue
+        out.write(one + '\n')
+    out.write(today.strftime('%Y %B %d') + '\n')
+    out.write(' -1\n')
+    out.close()
 
 
 def ipRead(verbose=False):
@@ -1062,6 +1295,9 @@ def ipRead(verbose=False):
     """
     topdir = os.environ["XUVTOP"]
     ipname = os.path.join(topdir, 'ip','chianti.ip')
+    info = chcache.load('ipRead', [ipname])
+    if info is not None:
+        return info['ip']
     ipfile = open(ipname)
     data = ipfile.readlines()
     ipfile.close()
@@ -1084,7 +1320,9 @@ def ipRead(verbose=False):
         iz = int(s2[0])
         ion = int(s2[1])
         ip[iz-1, ion-1] = float(s2[2])
-    return ip*const.invCm2Ev
+    ip = ip*const.invCm2Ev
+    chcache.save('ipRead', [ipname], {'ip':ip})
+    return ip
 
 
 def masterListRead():
@@ -1098,6 +1336,9 @@ def masterListRead():
     """
     dir = os.environ["XUVTOP"]
     fname = os.path.join(dir,'masterlist','masterlist.ions')
+    info = chcache.load('masterListRead', [fname])
+    if info is not None:
+        return info['masterlist']
     input = open(fname,'r')
     s1 = input.readlines()
     input.close()
@@ -1106,13 +1347,58 @@ def masterListRead():
         s1a = s1[i][:-1]
         s2 = s1a.split(';')
         masterlist.append(s2[0].strip())
+    chcache.save('masterListRead', [fname], {'masterlist':masterlist})
     return masterlist
 
 
-def masterListInfo(force=False, verbose=False):
+def _fileStat(filename):
+    """
+    Return [mtime, size] of `filename`, or None if it can not be found.
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _wvlRange(ions):
+    """
+    Return the ion and the smallest and largest wavelength in its .wgfa file, for `masterListInfo`.
+    """
+    try:
+        wgfa = wgfaRead(ions)
+        wvl = np.abs(np.asarray(wgfa['wvl'], np.float64))
+        # two-photon transitions are denoted by a wavelength of zero (0.)
+        wvl = wvl[wvl > 0.]
+        return ions, float(wvl.min()), float(wvl.max())
+    except (IOError, ValueError) as err:
+        # no usable wgfa file, the ion can not be excluded by its wavelength range
+        print(' could not read the wavelengths of %s: %s'%(ions, err))
+        return ions, 0., 1.e+30
+
+
+def _resetWorker():
+    """
+    Initialize a worker process of `masterListInfo`.
+    """
+    # the store opened by the parent process must not be shared
+    chstore.reset()
+
+
+def masterListInfo(force=False, verbose=False, proc=None):
     """
     Get information about ions in the CHIANTI masterlist.
 
+    Parameters
+    ----------
+    force : `bool`
+        recompute the information of all ions
+    verbose : `bool`
+    proc : `int`
+        the number of processes used to read the wgfa files, they are read in this
+        process if None
+
     Returns
     -------
     masterListInfo : `dict`
@@ -1123,104 +1409,127 @@ def masterListInfo(force=False, verbose=False):
     Notes
     -----
     This function speeds up multi-ion spectral calculations.
-    The information is stored in a pickled file 'masterlist_ions.pkl'
-    If the file is not found, one will be created.
+    The information is stored in a pickled file 'masterlist_ions.pkl' in
+    $XUVTOP/masterlist, or in the cache directory of the chiantirc file if
+    $XUVTOP can not be written.  Next to the information, the file records the
+    database version, the ioneq file and the modification time and size of every
+    wgfa file it was made from.  Only the ions whose wgfa file has changed are read
+    again;  the temperature ranges are recomputed whenever the ioneq file has
+    changed.
     """
     dir = os.environ["XUVTOP"]
     infoPath = os.path.join(dir, 'masterlist')
     infoName = os.path.join(dir,'masterlist','masterlist_ions.pkl')
-    #masterName=os.path.join(dir,'masterlist','masterlist.ions')
+    defaults = defaultsRead()
+    userName = os.path.join(defaults['cachedir'], 'masterlist_ions.pkl')
+    ioneqName = defaults['ioneqfile']
+    masterList = masterListRead()
+    ioneqFile = os.path.join(dir, 'ioneq', ioneqName + '.ioneq')
+    sources = {'format':2, 'version':versionRead(), 'ioneqName':ioneqName,
+        'ioneq':_fileStat(ioneqFile), 'masterlist':masterList, 'wgfa':{}}
+    for one in masterList:
+        sources['wgfa'][one] = _fileStat(util.ion2filename(one) + '.wgfa')
     #
-    makeNew = force == True or not os.path.isfile(infoName)
-#    if os.path.isfile(infoName):
-    if not makeNew:
-#       print ' file exists - ',  infoName
-        pfile = open(infoName, 'rb')
-        masterListInfo = pickle.load(pfile)
-        pfile.close
-    elif os.access(infoPath, os.W_OK):
-        # the file does not exist but we have write access and will create it
-        defaults = defaultsRead()
-        print((' defaults = %s'%(str(defaults))))
-        ioneqName = defaults['ioneqfile']
-        ioneq = ioneqRead(ioneqName = ioneqName)
-        masterList = masterListRead()
-        masterListInfo = {}
-        haveZ = [0]*31
-        haveStage = np.zeros((31, 31), 'Int32')
-        haveDielectronic = np.zeros((31, 31), 'Int32')
-        for one in masterList:
-            if verbose:
-                print((' ion = %s'%(one)))
-            ionInfo = convertName(one)
-            z = ionInfo['Z']
-            stage = ionInfo['Ion']
-            haveZ[z] = 1
-            dielectronic = ionInfo['Dielectronic']
-            if dielectronic:
-                haveDielectronic[z, stage] = 1
-            else:
-                haveStage[z, stage] = 1
-            thisIoneq = ioneq['ioneqAll'][z- 1, stage - 1 + dielectronic]
-            good = thisIoneq > 0.
-            goodTemp = ioneq['ioneqTemperature'][good]
-            tmin = float(goodTemp.min())
-            tmax = float(goodTemp.max())
-            vgood = thisIoneq == thisIoneq.max()
-            vgoodTemp = float(ioneq['ioneqTemperature'][vgood][0])
-            #wgfa = wgfaRead(one)
-            wgfa = hdf5Read(one)
-            nZeros = wgfa['wvl'].count(0.)
-            # two-photon transitions are denoted by a wavelength of zero (0.)
-            while nZeros > 0:
-                wgfa['wvl'].remove(0.)
-                nZeros = wgfa['wvl'].count(0.)
-            # unobserved lines are denoted with a negative wavelength
-            wvl = np.abs(np.asarray(wgfa['wvl'], np.float64))
-            wmin = float(wvl.min())
-            wmax = float(wvl.max())
-            masterListInfo[one] = {'wmin':wmin, 'wmax':wmax, 'tmin':tmin, 'tmax':tmax, 'tIoneqMax':vgoodTemp}
-        masterListInfo['haveZ'] = haveZ
-        masterListInfo['haveStage'] = haveStage
-        masterListInfo['haveDielectronic'] = haveDielectronic
-        #  now do the bare ions from H thru Zn
-        #  these are only involved in the continuum
-        for iz in range(1, 31):
-            ions = zion2name(iz, iz+1)
-            thisIoneq = ioneq['ioneqAll'][iz-1, iz]
-            good = thisIoneq > 0.
-            goodTemp = ioneq['ioneqTemperature'][good]
+    # the index in $XUVTOP is used if it is up to date, otherwise that in the user's cache
+    old = {}
+    for aname in [infoName, userName]:
+        try:
+            with open(aname, 'rb') as pfile:
+                candidate = pickle.load(pfile)
+        except Exception:
+            continue
+        # files of earlier versions of ChiantiPy do not have the sources
+        if not isinstance(candidate, dict) or candidate.get('sources', {}).get('format') != sources['format']:
+            continue
+        if candidate['sources'] == sources and not force:
+            return candidate['info']
+        if not old or candidate['sources']['version'] == sources['version']:
+            old = candidate
+    #
+    masterListInfo = {}
+    stale = []
+    for one in masterList:
+        if force or one not in old.get('info', {}) or old['sources']['version'] != sources['version'] or old['sources']['wgfa'].get(one) != sources['wgfa'][one]:
+            stale.append(one)
+        else:
+            masterListInfo[one] = {'wmin':old['info'][one]['wmin'], 'wmax':old['info'][one]['wmax']}
+    if verbose:
+        print(' reading the wgfa files of %i of %i ions'%(len(stale), len(masterList)))
+    if proc is not None and min([proc, len(stale)]) > 1:
+        import multiprocessing as mp
+        proc = min([proc, len(stale)])
+        with mp.Pool(proc, initializer=_resetWorker) as pool:
+            wvlRanges = pool.map(_wvlRange, stale)
+    else:
+        wvlRanges = [_wvlRange(one) for one in stale]
+    for one, wmin, wmax in wvlRanges:
+        masterListInfo[one] = {'wmin':wmin, 'wmax':wmax}
+    #
+    # the temperature ranges of all ions come from the ioneq file
+    ioneq = ioneqRead(ioneqName = ioneqName)
+    ioneqTemperature = ioneq['ioneqTemperature']
+    haveZ = [0]*31
+    haveStage = np.zeros((31, 31), np.int32)
+    haveDielectronic = np.zeros((31, 31), np.int32)
+    for one in masterList:
+        ionInfo = convertName(one)
+        z = ionInfo['Z']
+        stage = ionInfo['Ion']
+        haveZ[z] = 1
+        dielectronic = ionInfo['Dielectronic']
+        if dielectronic:
+            haveDielectronic[z, stage] = 1
+        else:
+            haveStage[z, stage] = 1
+        thisIoneq = ioneq['ioneqAll'][z- 1, stage - 1 + dielectronic]
+        good = thisIoneq > 0.
+        if good.any():
+            goodTemp = ioneqTemperature[good]
+            masterListInfo[one]['tmin'] = float(goodTemp.min())
+            masterListInfo[one]['tmax'] = float(goodTemp.max())
+            masterListInfo[one]['tIoneqMax'] = float(ioneqTemperature[thisIoneq.argmax()])
+        else:
+            # not abundant at any temperature
+            masterListInfo[one]['tmin'] = 0.
+            masterListInfo[one]['tmax'] = 0.
+            masterListInfo[one]['tIoneqMax'] = 0.
+    masterListInfo['haveZ'] = haveZ
+    masterListInfo['haveStage'] = haveStage
+    masterListInfo['haveDielectronic'] = haveDielectronic
+    #  now do the bare ions from H thru Zn
+    #  these are only involved in the continuum
+    for iz in range(1, 31):
+        ions = zion2name(iz, iz+1)
+        thisIoneq = ioneq['ioneqAll'][iz-1, iz]
+        good = thisIoneq > 0.
+        if good.any():
+            goodTemp = ioneqTemperature[good]
             tmin = float(goodTemp.min())
             tmax = float(goodTemp.max())
-            wmin = 0.
-            wmax = 1.e+30
-            masterListInfo[ions] = {'wmin':wmin, 'wmax':wmax, 'tmin':tmin, 'tmax':tmax}
-        pfile = open(infoName, 'wb')
-        pickle.dump(masterListInfo, pfile)
-        pfile.close
+        else:
+            tmin = 0.
+            tmax = 0.
+        wmin = 0.
+        wmax = 1.e+30
+        masterListInfo[ions] = {'wmin':wmin, 'wmax':wmax, 'tmin':tmin, 'tmax':tmax}
+    #
+    if os.access(infoPath, os.W_OK):
+        outName = infoName
     else:
-        # the file does not exist and we do NOT have write access to creat it
-        # will just make an inefficient, useless version
-        masterListInfo = {}
-        for one in masterList:
-            ionInfo = convertName(one)
-            z = ionInfo['Z']
-            stage = ionInfo['Ion']
-            dielectronic = ionInfo['Dielectronic']
-            wmin = 0.
-            wmax = 1.e+30
-            masterListInfo[one] = {'wmin':wmin, 'wmax':wmax, 'tmin':1.e+4, 'tmax':1.e+9}
-        #  now do the bare ions from H thru Zn
-        #  these are only involved in the continuum
-        for iz in range(1, 31):
-            ions = zion2name(iz, iz+1)
-            wmin = 0.
-            wmax = 1.e+30
-            masterListInfo[ions] = {'wmin':wmin, 'wmax':wmax, 'tmin':1.e+4, 'tmax':1.e+9}
-        pfile = open(infoName, 'wb')
-        pickle.dump(masterListInfo, pfile)
-        pfile.close
-        masterListInfo = {'noInfo':'none'}
+        # the database is read-only, e.g. a shared installation
+        outName = userName
+    try:
+        os.makedirs(os.path.dirname(outName), exist_ok=True)
+        # concurrent processes never see a partially written file
+        fd, tmpName = tempfile.mkstemp(suffix='.pkl', dir=os.path.dirname(outName))
+        with os.fdopen(fd, 'wb') as pfile:
+            pickle.dump({'sources':sources, 'info':masterListInfo}, pfile)
+        os.chmod(tmpName, 0o644)
+        os.replace(tmpName, outName)
+        if verbose:
+            print(' wrote %s'%(outName))
+    except OSError as err:
+        print(' could not save the masterlist information: %s'%(err))
     return masterListInfo
 
 
@@ -1245,6 +1554,9 @@ def photoxRead(ions):
     #
     fname = util.ion2filename(ions)
     paramname = fname+'.photox'
+    info = chcache.load('photoxRead', [paramname])
+    if info is not None:
+        return info
     input = open(paramname,'r')
     lines = input.readlines()
     input.close
@@ -1281,7 +1593,9 @@ def photoxRead(ions):
     ref = lines[icounter+1:-1]
     cross = np.asarray(cross, np.float64)
     energy = np.asarray(energy, np.float64)
-    return {'lvl1':lvl1, 'lvl2':lvl2,'energy':energy, 'cross':cross,  'ref':ref}
+    info = {'lvl1':lvl1, 'lvl2':lvl2,'energy':energy, 'cross':cross,  'ref':ref}
+    chcache.save('photoxRead', [paramname], info)
+    return info
 
 
 def rrRead(ions, filename=None):
@@ -1299,6 +1613,10 @@ def rrRead(ions, filename=None):
     else:
         fname = util.ion2filename(ions)
         paramname = fname+'.rrparams'
+    options = {'ions':ions}
+    RrParams = chcache.load('rrRead', [paramname], options)
+    if RrParams is not None:
+        return RrParams
     if os.path.isfile(paramname):
         input = open(paramname,'r')
         #  need to read first line and see how many elements
@@ -1331,6 +1649,7 @@ def rrRead(ions, filename=None):
         else:
             RrParams = None
             print((' for ion %5s unknown RR type = %5i' %(ions, rrtype)))
+        chcache.save('rrRead', [paramname], RrParams, options)
         return RrParams
     else:
         return {'rrtype':-1}
@@ -1344,6 +1663,9 @@ def rrLossRead():
         <http://adsabs.harvard.edu/abs/2017A%26A...599A..10M>`_
     '''
     filename = os.path.join(os.environ['XUVTOP'], 'continuum', 'rrloss_mao_2017_pars.dat')
+    info = chcache.load('rrLossRead', [filename])
+    if info is not None:
+        return info
     inpt = open(filename, 'r')
     lines = inpt.readlines()
     inpt.close()
@@ -1369,7 +1691,9 @@ def rrLossRead():
         b2.append(float(aline.split()[8]))
         mdp.append(float(aline.split()[9]))
 
-    return {'iso':iso, 'z':z, 'a0':a0, 'b0':b0, 'c0':c0, 'a1':a1, 'b1':b1, 'a2':a2, 'b2':b2, 'mdp':mdp}
+    info = {'iso':iso, 'z':z, 'a0':a0, 'b0':b0, 'c0':c0, 'a1':a1, 'b1':b1, 'a2':a2, 'b2':b2, 'mdp':mdp}
+    chcache.save('rrLossRead', [filename], info)
+    return info
 
 
 def scupsRead(ions, filename=None, verbose=False):
@@ -1384,6 +1708,15 @@ def scupsRead(ions, filename=None, verbose=False):
         Custom filename, will override that specified by `ions`
     verbose : `bool`
 
+    Returns
+    -------
+    {'ions', 'lvl1', 'lvl2', 'de', 'gf', 'lim', 'ttype', 'cups', 'ntemp', 'btemp', 'bscups', 'btempFlat', 'bscupsFlat', 'offsets', 'ntrans', 'ref'} : `dict`
+        btemp[i] and bscups[i] are the slices btempFlat[offsets[i]:offsets[i+1]] and
+        bscupsFlat[offsets[i]:offsets[i+1]]
+
+    See Also
+    --------
+    splineTable : the spline data as contiguous arrays
     '''
     #
     if filename:
@@ -1393,6 +1726,10 @@ def scupsRead(ions, filename=None, verbose=False):
     else:
         fname = util.ion2filename(ions)
         scupsFileName = fname+'.scups'
+    options = {'ions':ions}
+    info = chcache.load('scupsRead', [scupsFileName], options)
+    if info is not None:
+        return info
     if not os.path.isfile(scupsFileName):
         print((' elvlc file does not exist:  %s'%(scupsFileName)))
         return {'status':0}
@@ -1419,45 +1756,100 @@ def scupsRead(ions, filename=None, verbose=False):
             counter += 1
     ntrans = (counter)/3
     #print(' counter %10i ntrans %10i'%(counter, ntrans))
-    lvl1 = []
-    lvl2 = []
-    de = []
-    gf = []
-    lim = []
-    ttype = []
-    cups = []
-    ntemp = []
-    btemp = []
-    bscups = []
-    counter = 0
-    #print(' counter %10i ntrans %10i'%(counter, ntrans))
-    # the int seems to be needed for Python3
-    for itrans in range(int(ntrans)):
-        if verbose:
-            print((lines[counter]))
-            print((lines[counter+1]))
-            print((lines[counter+2]))
-        ll1 = lines[counter].split()
-        lvl1.append(int(ll1[0]))
-        lvl2.append(int(ll1[1]))
-        de.append(float(ll1[2]))
-        gf.append(float(ll1[3]))
-        lim.append(float(ll1[4]))
-        ntemp.append(int(ll1[5]))
-        ttype.append(int(ll1[6]))
-        cups.append(float(ll1[7]))
-        ll2 = lines[counter+1].split()
-        ll3 = lines[counter+2].split()
-#        print ' ll2 = ', ll2
-#        print ' gf = ', ll2[2]
-        btemp.append(np.asarray(ll2, np.float64))
-        bscups.append(np.asarray(ll3, np.float64))
-        counter += 3
-    counter += 1
+    nt = int(ntrans)
+    # each transition is a line of 8 entries followed by the ntemp scaled
+    # temperatures and the ntemp scaled upsilons, each on a line of its own
+    # parse each of the three kinds of lines for the whole file at once
+    header = np.fromstring(''.join(lines[0:3*nt:3]), sep=' ')
+    if header.size == 8*nt:
+        header = header.reshape(nt, 8)
+    else:
+        header = np.asarray([aline.split()[:8] for aline in lines[0:3*nt:3]], np.float64)
+    lvl1 = header[:, 0].astype(np.int64).tolist()
+    lvl2 = header[:, 1].astype(np.int64).tolist()
+    de = header[:, 2].tolist()
+    gf = header[:, 3].tolist()
+    lim = header[:, 4].tolist()
+    ntemp = header[:, 5].astype(np.int64)
+    ttype = header[:, 6].astype(np.int64).tolist()
+    cups = header[:, 7].tolist()
+    # the knots and values of all transitions are kept in two flat arrays, btemp and bscups
+    # are lists of slices of these, offsets[i]:offsets[i+1] are those of transition i
+    btempFlat = np.fromstring(''.join(lines[1:3*nt:3]), sep=' ')
+    bscupsFlat = np.fromstring(''.join(lines[2:3*nt:3]), sep=' ')
+    if btempFlat.size == ntemp.sum() and bscupsFlat.size == ntemp.sum():
+        offsets = np.zeros(nt + 1, np.int64)
+        offsets[1:] = np.cumsum(ntemp)
+    else:
+        # some line does not have ntemp entries
+        btemp = [np.asarray(aline.split(), np.float64) for aline in lines[1:3*nt:3]]
+        bscups = [np.asarray(aline.split(), np.float64) for aline in lines[2:3*nt:3]]
+        offsets = np.zeros(nt + 1, np.int64)
+        offsets[1:] = np.cumsum([one.size for one in btemp])
+        btempFlat = np.concatenate(btemp) if nt else np.zeros(0, np.float64)
+        bscupsFlat = np.concatenate(bscups) if nt else np.zeros(0, np.float64)
+    bounds = offsets.tolist()
+    btemp = [btempFlat[i0:i1] for i0, i1 in zip(bounds[:-1], bounds[1:])]
+    bscups = [bscupsFlat[i0:i1] for i0, i1 in zip(bounds[:-1], bounds[1:])]
+    ntemp = ntemp.tolist()
+    if verbose:
+        for aline in lines[:3*nt]:
+            print(aline)
+    counter = 3*nt + 1
     ref = []
     for aline in lines[counter:-1]:
         ref.append(aline.strip('\n'))
-    return {'ions':ions, 'lvl1':lvl1, 'lvl2':lvl2, 'de':de, 'gf':gf, 'lim':lim, 'ttype':ttype,'cups':cups,'ntemp':ntemp, 'btemp':btemp, 'bscups':bscups, 'ntrans':ntrans, 'ref':ref}
+    info = {'ions':ions, 'lvl1':lvl1, 'lvl2':lvl2, 'de':de, 'gf':gf, 'lim':lim, 'ttype':ttype,'cups':cups,'ntemp':ntemp, 'btemp':btemp, 'bscups':bscups,
+        'btempFlat':btempFlat, 'bscupsFlat':bscupsFlat, 'offsets':offsets, 'ntrans':ntrans, 'ref':ref}
+    # the splines are fitted once, upsilonDescale only evaluates them
+    info['bscupsSecond'] = splineTable(info)['second']
+    chcache.save('scupsRead', [scupsFileName], info, options)
+    return info
+
+
+def splineTable(info):
+    """
+    Return the spline data of a scups, splups or psplups file as contiguous arrays.
+
+    Parameters
+    ----------
+    info : `dict`
+        as returned by `scupsRead` or `splupsRead`
+
+    Returns
+    -------
+    {'lvl1', 'lvl2', 'ttype', 'cups', 'de', 'ntemp', 'offsets', 'knots', 'values', 'second'} : `dict`
+        The knots and values of the spline of transition i are knots[offsets[i]:offsets[i+1]]
+        and values[offsets[i]:offsets[i+1]], ntemp[i] is their number.  The knots of the
+        splups and psplups splines are spaced evenly from 0 to 1.  second holds the second
+        derivatives of the splines at the knots, for `ChiantiPy.tools.util.cubicSplineEval`,
+        they are those stored by the reader or else calculated.
+
+    Notes
+    -----
+    The knots and values of a scups file and the values of a splups file are those of
+    `info` and are not copied, they are memory mapped if `info` comes from the store
+    of `ChiantiPy.tools.store`.
+    """
+    offsets = np.asarray(info['offsets'], np.int64)
+    if 'btempFlat' in info:
+        ntemp = np.asarray(info['ntemp'], np.int64)
+        knots = info['btempFlat']
+        values = info['bscupsFlat']
+        second = info.get('bscupsSecond')
+    else:
+        ntemp = np.asarray(info['nspl'], np.int64)
+        values = info['splupsFlat']
+        # the knots are dx*arange(nspl), as in ion.upsilonDescale
+        dx = 1./np.maximum(ntemp - 1., 1.)
+        position = np.arange(values.size) - np.repeat(offsets[:-1], ntemp)
+        knots = np.repeat(dx, ntemp)*position
+        second = info.get('splupsSecond')
+    if second is None:
+        second = util.cubicSplineSecondFlat(knots, values, offsets)
+    return {'lvl1':np.asarray(info['lvl1'], np.int64), 'lvl2':np.asarray(info['lvl2'], np.int64),
+        'ttype':np.asarray(info['ttype'], np.int64), 'cups':np.asarray(info['cups'], np.float64),
+        'de':np.asarray(info['de'], np.float64), 'ntemp':ntemp, 'offsets':offsets, 'knots':knots, 'values':values, 'second':second}
 
 
 def splomRead(ions, ea=False, filename=None):
@@ -1490,6 +1882,9 @@ def splomRead(ions, ea=False, filename=None):
             splomname = fname+'.splom'
     else:
         splomname = filename
+    splom = chcache.load('splomRead', [splomname])
+    if splom is not None:
+        return splom
     input = open(splomname,'r')
     #  need to read first line and see how many elements
     line1 = input.readline()
@@ -1538,6 +1933,9 @@ def splomRead(ions, ea=False, filename=None):
     # note:  de is in Rydbergs
     splom = {"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"deryd":de,"c":f
         ,"splom":splomout,"ref":hdr}
+    # the second derivatives of the splines, for util.splomDescale
+    splom['splomSecond'] = util.cubicSplineSecond(np.tile(0.25*np.arange(5), (len(lvl1), 1)), splomout.T)
+    chcache.save('splomRead', [splomname], splom)
     return  splom
 
 
@@ -1556,7 +1954,8 @@ def splupsRead(ions, filename=None, filetype='splups'):
 
     Returns
     -------
-    {'lvl1', 'lvl2', 'ttype', 'gf', 'de', 'cups', 'bsplups', 'ref'} : `dict`
+    {'lvl1', 'lvl2', 'ttype', 'gf', 'de', 'cups', 'nspl', 'splups', 'splupsFlat', 'offsets', 'ref'} : `dict`
+        splups[i] is the slice splupsFlat[offsets[i]:offsets[i+1]]
     """
     #
     if filename:
@@ -1564,6 +1963,10 @@ def splupsRead(ions, filename=None, filetype='splups'):
     else:
         fname = util.ion2filename(ions)
         splupsname = fname+'.'+filetype
+    options = {'filetype':filetype}
+    info = chcache.load('splupsRead', [splupsname], options)
+    if info is not None:
+        return info
     if not os.path.exists(splupsname):
         #TODO: raise exception here or just let the open() function do that for us
         return {'file not found':splupsname}
@@ -1572,68 +1975,43 @@ def splupsRead(ions, filename=None, filetype='splups'):
         input = open(splupsname,'r')
         s1 = input.readlines()
         input.close()
-        nsplups = 0
-        ndata = 2
-        while ndata > 1:
-            s1a = s1[nsplups][:]
-            s2 = s1a.split()
-            ndata = len(s2)
-            nsplups = nsplups+1
-        nsplups = nsplups-1
-        lvl1 = [0]*nsplups
-        lvl2 = [0]*nsplups
-        ttype = [0]*nsplups
-        gf = np.zeros(nsplups, np.float64)
-        de = np.zeros(nsplups, np.float64)
-        cups = np.zeros(nsplups, np.float64)
-        nspl = [0]*nsplups
-#        splups=np.zeros((nsplups,9),np.float64)
-        splups = [0.]*nsplups
+        nsplups = _dataLength(s1)
         if filetype == 'psplups':
-#            splupsFormat1 = FortranFormat('3i3,8e10.3')
-#            splupsFormat2 = FortranFormat('3i3,3e10.3')
-            header_line = FortranRecordReader('3i3,3e10.3')
+            skip = 0
+            splupsFormat = '3i3,3e10.3'
         else:
-#            splupsFormat1='(6x,3i3,8e10.3)'
-#            splupsFormat2 = FortranFormat('6x,3i3,3e10.3')
-            header_line = FortranRecordReader('6x,3i3,3e10.3')        #
-        for i in range(0,nsplups):
-#            inpt=FortranLine(s1[i],splupsFormat2)
-            inpt = header_line.read(s1[i])
-            lvl1[i] = inpt[0]
-            lvl2[i] = inpt[1]
-            ttype[i] = inpt[2]
-            gf[i] = inpt[3]
-            de[i] = inpt[4]
-            cups[i] = inpt[5]
-            if filetype == 'psplups':
-                as1 = s1[i][39:].rstrip()
-            else:
-                as1 = s1[i][45:].rstrip()
-            nspl[i] = len(as1)//10
-#            splupsFormat3 = FortranFormat(str(nspl[i])+'E10.2')
-#            splupsFormat3 = '(' + str(nspl[i]) + 'e10.3' + ')'
-            header_line3 = FortranRecordReader(str(nspl[i])+'e10.3' )
-#            inpt = FortranLine(as1, splupsFormat3)
-            inpt = header_line3.read(as1)
-            spl1 = np.asarray(inpt[:], np.float64)
-            splups[i] = spl1
+            skip = 6
+            splupsFormat = '6x,3i3,3e10.3'
+        lvl1, lvl2, ttype, gf, de, cups = FortranRecordReader(splupsFormat).read_many(s1[:nsplups])
+        lvl1, lvl2, ttype = lvl1.tolist(), lvl2.tolist(), ttype.tolist()
+        # the spline values follow the header, their number can differ from line to line
+        # so all lines with the same number of values are parsed together
+        tails = [aline[skip + 39:].rstrip() for aline in s1[:nsplups]]
+        nspl = [len(as1)//10 for as1 in tails]
+        nsplArr = np.asarray(nspl, np.int64)
+        # the values of all transitions are kept in one flat array, splups is a list of
+        # slices of it, offsets[i]:offsets[i+1] are those of transition i
+        offsets = np.zeros(nsplups + 1, np.int64)
+        offsets[1:] = np.cumsum(nsplArr)
+        splupsFlat = np.zeros(offsets[-1], np.float64)
+        for onenspl in np.unique(nsplArr):
+            idx = np.flatnonzero(nsplArr == onenspl)
+            if onenspl:
+                values = FortranRecordReader(str(onenspl)+'e10.3').read_many([tails[i] for i in idx])
+                spl = np.column_stack(values).astype(np.float64)
+                splupsFlat[offsets[idx][:, None] + np.arange(onenspl)] = spl
+        bounds = offsets.tolist()
+        splups = [splupsFlat[i0:i1] for i0, i1 in zip(bounds[:-1], bounds[1:])]
         #
         ref = []
         for i in range(nsplups+1,len(s1)):
             s1a = s1[i][:-1]
             ref.append(s1a.strip())
-        if filetype == 'psplups':
-#            self.Npsplups=nsplups
-#            self.Psplups={"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"de":de,"cups":cups
-#                ,"nspl":nspl,"splups":splups,"ref":ref}
-            return {"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"de":de,"cups":cups
-                ,"nspl":nspl,"splups":splups,"ref":ref, 'filename':splupsname}
-        else:
-#            self.Splups={"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"de":de,"cups":cups
-#                ,"nspl":nspl,"splups":splups,"ref":ref}
-            return {"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"de":de,"cups":cups
-                ,"nspl":nspl,"splups":splups,"ref":ref, 'filename':splupsname}
+        info = {"lvl1":lvl1,"lvl2":lvl2,"ttype":ttype,"gf":gf,"de":de,"cups":cups
+            ,"nspl":nspl,"splups":splups,'splupsFlat':splupsFlat,'offsets':offsets,"ref":ref, 'filename':splupsname}
+        info['splupsSecond'] = splineTable(info)['second']
+        chcache.save('splupsRead', [splupsname], info, options)
+        return info
 
 def trRead(ionS):
     ''' read the files containing total recombination rates .trparams
@@ -1641,6 +2019,9 @@ def trRead(ionS):
     stuff = util.convertName(ionS)
     filename = stuff['filename']
     trname = filename + '.trparams'
+    info = chcache.load('trRead', [trname])
+    if info is not None:
+        return info
     if os.path.exists(trname):
         temperature = []
         rate = []
@@ -1652,7 +2033,9 @@ def trRead(ionS):
             dummy = lines[jline].replace(os.linesep, '').split()
             temperature.append(float(dummy[0]))
             rate.append(float(dummy[1]))
-        return {'temperature':np.asarray(temperature, np.float64), 'rate':np.asarray(rate, np.float64)}
+        info = {'temperature':np.asarray(temperature, np.float64), 'rate':np.asarray(rate, np.float64)}
+        chcache.save('trRead', [trname], info)
+        return info
     else:
         return 'file does not exist'
 
@@ -1668,6 +2051,9 @@ def twophotonHRead():
     """
     xuvtop = os.environ['XUVTOP']
     fName = os.path.join(xuvtop, 'continuum', 'hseq_2photon.dat')
+    info = chcache.load('twophotonHRead', [fName])
+    if info is not None:
+        return info
     dFile = open(fName, 'r')
     a = dFile.readline()
     y0 = np.asarray(a.split())
@@ -1684,7 +2070,9 @@ def twophotonHRead():
         psi = np.asarray(a[3:])
         psi0[iz] = psi
     dFile.close()
-    return {'y0':y0, 'z0':z0, 'avalue':avalue, 'asum':asum, 'psi0':psi0.reshape(30, 17)}
+    info = {'y0':y0, 'z0':z0, 'avalue':avalue, 'asum':asum, 'psi0':psi0.reshape(30, 17)}
+    chcache.save('twophotonHRead', [fName], info)
+    return info
 
 
 def twophotonHeRead():
@@ -1697,6 +2085,9 @@ def twophotonHeRead():
     """
     xuvtop = os.environ['XUVTOP']
     fName = os.path.join(xuvtop, 'continuum', 'heseq_2photon.dat')
+    info = chcache.load('twophotonHeRead', [fName])
+    if info is not None:
+        return info
     dFile = open(fName, 'r')
     a = dFile.readline()
     y0 = np.asarray(a.split())
@@ -1709,7 +2100,9 @@ def twophotonHeRead():
         psi = np.asarray(a[2:])
         psi0[iz] = psi
     dFile.close()
-    return {'y0':y0, 'avalue':avalue, 'psi0':psi0.reshape(30, 41)}
+    info = {'y0':y0, 'avalue':avalue, 'psi0':psi0.reshape(30, 41)}
+    chcache.save('twophotonHeRead', [fName], info)
+    return info
 
 
 def vernerRead():
@@ -1727,6 +2120,9 @@ def vernerRead():
     """
     xuvtop = os.environ['XUVTOP']
     fname = os.path.join(xuvtop, 'continuum', 'verner_short.txt')
+    info = chcache.load('vernerRead', [fname])
+    if info is not None:
+        return info
     input = open(fname)
     lines = input.readlines()
     input.close()
@@ -1750,22 +2146,22 @@ def vernerRead():
     header_line = FortranRecordReader(fstring)
 #    vernerFormat=FortranFormat(fstring)
     #
-    for iline in range(nlines):
-#        out=FortranLine(lines[iline],vernerFormat)
-        out = header_line.read(lines[iline])
-        z = out[0]
-        nel = out[1]
-        stage = z - nel + 1
-        pqn[z,stage] = out[2]
-        l[z,stage] = out[3]
-        eth[z,stage] = out[4]
-        e0[z,stage] = out[5]
-        sig0[z,stage] = out[6]
-        ya[z,stage] = out[7]
-        p[z,stage] = out[8]
-        yw[z,stage] = out[9]
+    out = header_line.read_many(lines[:nlines])
+    z = out[0]
+    nel = out[1]
+    stage = z - nel + 1
+    pqn[z,stage] = out[2]
+    l[z,stage] = out[3]
+    eth[z,stage] = out[4]
+    e0[z,stage] = out[5]
+    sig0[z,stage] = out[6]
+    ya[z,stage] = out[7]
+    p[z,stage] = out[8]
+    yw[z,stage] = out[9]
     #
-    return {'pqn':pqn, 'l':l, 'eth':eth, 'e0':e0, 'sig0':sig0, 'ya':ya, 'p':p, 'yw':yw}
+    info = {'pqn':pqn, 'l':l, 'eth':eth, 'e0':e0, 'sig0':sig0, 'ya':ya, 'p':p, 'yw':yw}
+    chcache.save('vernerRead', [fname], info)
+    return info
 
 def versionRead():
     """
@@ -1780,14 +2176,15 @@ def versionRead():
 
 def hdf5Read(ions, filename=None, elvlcname=0, total=False, verbose=False):
     """
-    Read CHIANTI data from a HDF5 (.h5) file.
+    Read the .wgfa data of an ion from the consolidated HDF5 store of the database.
 
     Parameters
     ----------
     ions : `str`
         Ion, e.g. 'c_5' for C V
     filename : `str`
-        Custom filename, will override that specified by `ions`
+        Custom filename, will override that specified by `ions`.  A .h5 file
+        written for a single ion is read directly.
     elvlcname : `str`
         If specified, the lsj term labels are returned in the 'pretty1' and 'pretty2'
         keys of 'Wgfa' dict
@@ -1801,42 +2198,34 @@ def hdf5Read(ions, filename=None, elvlcname=0, total=False, verbose=False):
         Information read from the .wgfa file. The dictionary structure is
         {"lvl1","lvl2","wvl","gf","avalue","ref","ionS","filename"}
 
+    Notes
+    -----
+    The data are taken from the store written by `ChiantiPy.tools.store.makeStore`
+    if there is one, otherwise the .wgfa file is read with `wgfaRead`.
+
     See Also
     --------
     ChiantiPy.tools.archival.wgfaRead : Read .wgfa file with the old format.
     """
-    import h5py
-    if filename:
-        wgfaname = filename
-        if not elvlcname:
-            elvlcname = os.path.splitext(wgfaname)[0] + '.elvlc'
-            if os.path.isfile(elvlcname):
-                elvlc = elvlcRead('', elvlcname)
-            else:
-                elvlc = 0
-        else:
-            elvlc = elvlcRead('',elvlcname)
-
-    else:
-        fname = util.ion2filename(ions)
-        wgfaname = fname+'.h5'
-        elvlcname = fname + '.elvlc'
-        if os.path.isfile(elvlcname):
-            elvlc = elvlcRead('', elvlcname)
-        else:
-            elvlc = 0
-    if verbose:
-        if elvlc:
-            print(' have elvlc data')
-        else:
-            print(' do not have elvlc data')
-    
-    h = h5py.File(wgfaname, mode='r')
-    b = {}
-    for k in list(h.keys()):
-        b[k] = h[k].value
-    h.close()
-    return b
+    if filename and os.path.splitext(filename)[1] == '.h5':
+        if os.path.isfile(filename):
+            import h5py
+            b = {}
+            with h5py.File(filename, mode='r') as h:
+                for k in list(h.keys()):
+                    value = h[k][()]
+                    if isinstance(value, bytes):
+                        value = value.decode('utf-8')
+                    elif isinstance(value, np.ndarray) and value.ndim == 1 and k != 'avalueLvl':
+                        if value.dtype.kind == 'S':
+                            value = [one.decode('utf-8') for one in value]
+                        else:
+                            value = value.tolist()
+                    b[k] = value
+            return b
+        filename = os.path.splitext(filename)[0] + '.wgfa'
+    with chstore.activeStore():
+        return wgfaRead(ions, filename=filename, elvlcname=elvlcname, total=total, verbose=verbose)
 
 def wgfaRead(ions, filename=None, elvlcname=0, total=False, verbose=False):
     """
@@ -1870,21 +2259,22 @@ def wgfaRead(ions, filename=None, elvlcname=0, total=False, verbose=False):
         wgfaname = filename
         if not elvlcname:
             elvlcname = os.path.splitext(wgfaname)[0] + '.elvlc'
-            if os.path.isfile(elvlcname):
-                elvlc = elvlcRead('', elvlcname)
-            else:
-                elvlc = 0
-        else:
-            elvlc = elvlcRead('',elvlcname)
-
     else:
         fname = util.ion2filename(ions)
         wgfaname = fname+'.wgfa'
         elvlcname = fname + '.elvlc'
-        if os.path.isfile(elvlcname):
-            elvlc = elvlcRead('', elvlcname)
-        else:
-            elvlc = 0
+    # the pretty labels come from the elvlc file so it is part of the cache key
+    cacheFiles = [wgfaname]
+    if chstore.isfile(elvlcname):
+        cacheFiles.append(elvlcname)
+    options = {'ions':ions, 'total':total}
+    Wgfa = chcache.load('wgfaRead', cacheFiles, options)
+    if Wgfa is not None:
+        return Wgfa
+    if elvlcname in cacheFiles:
+        elvlc = elvlcRead('', elvlcname)
+    else:
+        elvlc = 0
     if verbose:
         if elvlc:
             print(' have elvlc data')
@@ -1894,62 +2284,27 @@ def wgfaRead(ions, filename=None, elvlcname=0, total=False, verbose=False):
     input = open(wgfaname,'r')
     s1 = input.readlines()
     input.close()
-    nwvl = 0
-    ndata = 2
-    while ndata > 1:
-        s1a = s1[nwvl]
-        s2 = s1a.split()
-        ndata = len(s2)
-        nwvl += 1
-    nwvl -= 1
-    if verbose:
-        print((' nwvl = %10i ndata = %4i'%(nwvl, ndata)))
-    lvl1 = [0]*nwvl
-    lvl2 = [0]*nwvl
-    wvl = [0.]*nwvl
-    gf = [0.]*nwvl
-    avalue = [0.]*nwvl
-    if elvlc:
-        pretty1  =  ['']*nwvl
-        pretty2  =  ['']*nwvl
-    #
+    nwvl = _dataLength(s1)
     if verbose:
         print((' nwvl  =  %10i'%(nwvl)))
     #
     wgfaFormat = '(2i5,f15.3,2e15.3)'
-    header_line = FortranRecordReader(wgfaFormat)
-    for ivl in range(nwvl):
-        if verbose:
-            print(' index %5i  %s'%(ivl, s1[ivl]))
-#        inpt=FortranLine(s1[ivl],wgfaFormat)
-        inpt = header_line.read(s1[ivl])
-        lvl1[ivl] = inpt[0]
-        lvl2[ivl] = inpt[1]
-        wvl[ivl] = inpt[2]
-        gf[ivl] = inpt[3]
-        avalue[ivl] = inpt[4]
-        if elvlc:
-            idx1 = elvlc['lvl'].index(inpt[0])
-            idx2 = elvlc['lvl'].index(inpt[1])
-            pretty1[ivl] = elvlc['pretty'][idx1]
-            pretty2[ivl] = elvlc['pretty'][idx2]
-
+    lvl1, lvl2, wvl, gf, avalue = FortranRecordReader(wgfaFormat).read_many(s1[:nwvl])
     ref = []
     # should skip the last '-1' in the file
     for i in range(nwvl+1,len(s1)):
         s1a = s1[i]
         ref.append(s1a.strip())
-    Wgfa = {"lvl1":lvl1,"lvl2":lvl2,"wvl":wvl,"gf":gf,"avalue":avalue,"ref":ref, 'ionS':ions, 'filename':wgfaname}
+    Wgfa = {"lvl1":lvl1.tolist(),"lvl2":lvl2.tolist(),"wvl":wvl.tolist(),"gf":gf.tolist(),"avalue":avalue.tolist(),"ref":ref, 'ionS':ions, 'filename':wgfaname}
     if total:
-        avalueLvl = [0.]*max(lvl2)
-        for iwvl in range(nwvl):
-            avalueLvl[lvl2[iwvl] -1] += avalue[iwvl]
-        Wgfa['avalueLvl'] = np.asarray(avalueLvl)
+        Wgfa['avalueLvl'] = np.bincount(lvl2 - 1, weights=avalue, minlength=lvl2.max())
 
     if elvlc:
-        Wgfa['pretty1'] = pretty1
-        Wgfa['pretty2'] = pretty2
+        pretty = dict(zip(elvlc['lvl'], elvlc['pretty']))
+        Wgfa['pretty1'] = [pretty[lvl] for lvl in Wgfa['lvl1']]
+        Wgfa['pretty2'] = [pretty[lvl] for lvl in Wgfa['lvl2']]
     #
+    chcache.save('wgfaRead', cacheFiles, Wgfa, options)
     return Wgfa
 
 
@@ -3,8 +3,9 @@ Functions needed for standard Python multiprocessing module mspectrum
 """
 import numpy as np
 import ChiantiPy
+import ChiantiPy.tools.store as chstore
 
-def doFfQ(inQ, outQ):
+def doFfQ(inQ, outQ, storeName=None):
     """
     Multiprocessing helper for `ChiantiPy.core.continuum.freeFree`
 
@@ -14,7 +15,10 @@ def doFfQ(inQ, outQ):
         Ion free-free emission jobs queued up by multiprocessing module
     outQ : `~multiprocessing.Queue`
         Finished free-free emission jobs
+    storeName : `str`
+        the store of `ChiantiPy.tools.store.sharedStore` to take the atomic data from
     """
+    chstore.useStore(storeName)
     for inputs in iter(inQ.get, 'STOP'):
         ionS = inputs[0]
         temperature = inputs[1]
@@ -27,7 +31,7 @@ def doFfQ(inQ, outQ):
     return
 
 
-def doFbQ(inQ, outQ):
+def doFbQ(inQ, outQ, storeName=None):
     """
     Multiprocessing helper for `ChiantiPy.core.continuum.freeBound`
 
@@ -37,7 +41,10 @@ def doFbQ(inQ, outQ):
         Ion free-bound emission jobs queued up by multiprocessing module
     outQ : `~multiprocessing.Queue`
         Finished free-bound emission jobs
+    storeName : `str`
+        the store of `ChiantiPy.tools.store.sharedStore` to take the atomic data from
     """
+    chstore.useStore(storeName)
     for inputs in iter(inQ.get, 'STOP'):
         ionS = inputs[0]
         temperature = inputs[1]
@@ -54,7 +61,7 @@ def doFbQ(inQ, outQ):
     return
 
 
-def doIonQ(inQueue, outQueue):
+def doIonQ(inQueue, outQueue, storeName=None):
     """
     Multiprocessing helper for `ChiantiPy.core.ion` and `ChiantiPy.core.ion.twoPhoton`
 
@@ -64,7 +71,10 @@ def doIonQ(inQueue, outQueue):
         Jobs queued up by multiprocessing module
     outQueue : `~multiprocessing.Queue`
         Finished jobs
+    storeName : `str`
+        the store of `ChiantiPy.tools.store.sharedStore` to take the atomic data from
     """
+    chstore.useStore(storeName)
     for inpts in iter(inQueue.get, 'STOP'):
         ionS = inpts[0]
         temperature = inpts[1]
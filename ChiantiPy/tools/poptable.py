@@ -0,0 +1,274 @@
+"""
+Precomputed tables of the level populations of an ion.
+
+Density and temperature maps need the level populations of the same ions at
+many nearby conditions.  `makePopTable` solves the populations of an ion once
+over a grid of log temperature and log electron density and writes them into
+a .npy file, with its metadata in a .json file of the same name.  The
+metadata record the CHIANTI and ChiantiPy versions, the abundance and ioneq
+files and the radiation field, radTemperature and rStar, of the table.
+
+`popTable` opens the .npy file as a read-only memory map, so that the
+processes that use a table share its pages, and `popTable.population`
+interpolates the populations bilinearly in log temperature and log density at
+any number of points at once.  An ion takes its populations from a table with
+
+::
+
+  table = makePopTable('fe_13', np.arange(5.8, 6.61, 0.02), np.arange(8., 12.01, 0.05))
+  anIon = ch.ion('fe_13', temperature=temperature, eDensity=eDensity)
+  anIon.populate(popTable=table)
+  anIon.emiss()
+
+The proton densities of the table are the electron densities times the proton
+to electron density ratio of the abundance and ioneq files of the table, so
+an ion with a proton density of its own does not take its populations from a
+table.
+
+By default the tables are kept in the poptables directory of the cachedir of the
+chiantirc file, named by the ion and the settings of the table, so that
+makePopTable returns the table that has been made in an earlier session.
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+from ChiantiPy.version import __version__
+
+# bump this when the layout of the tables changes
+tableFormat = 1
+
+_openTables = {}
+
+
+class popTable(object):
+    """
+    A table of the level populations of an ion on a grid of log temperature and log
+    electron density, see `makePopTable`.
+
+    Parameters
+    ----------
+    tableName : `str`
+        the name of the table, the .npy and .json files are tableName + '.npy' and
+        tableName + '.json'
+
+    Attributes
+    ----------
+    Meta : `dict`
+        the metadata of the table
+    LogTemperature, LogDensity : `numpy.ndarray`
+        the grid of the table
+    Population : `numpy.ndarray`
+        the (ntemp, ndens, nlvls) populations, a read-only memory map
+    """
+    def __init__(self, tableName):
+        self.TableName = tableName
+        with open(tableName + '.json') as inpt:
+            self.Meta = json.load(inpt)
+        if self.Meta['format'] != tableFormat:
+            raise ValueError(' %s has an old format, make the table again'%(tableName))
+        self.IonStr = self.Meta['ionStr']
+        self.LogTemperature = np.asarray(self.Meta['logTemperature'], np.float64)
+        self.LogDensity = np.asarray(self.Meta['logDensity'], np.float64)
+        self.Population = np.load(tableName + '.npy', mmap_mode='r')
+
+    @classmethod
+    def open(cls, tableName):
+        """
+        Return the `popTable` of `tableName`, opened once per process.
+        """
+        tableName = os.path.abspath(tableName)
+        if tableName not in _openTables:
+            _openTables[tableName] = cls(tableName)
+        return _openTables[tableName]
+
+    def check(self, anIon):
+        """
+        Return a list of the settings of `anIon` that differ from those of the table.
+
+        Parameters
+        ----------
+        anIon : `ChiantiPy.core.ion`
+        """
+        import ChiantiPy.tools.io as chio
+        meta = self.Meta
+        differ = []
+        if anIon.IonStr != meta['ionStr']:
+            differ.append('ion %s, not %s'%(anIon.IonStr, meta['ionStr']))
+        version = chio.versionRead()
+        if version != meta['chiantiVersion']:
+            differ.append('CHIANTI version %s, not %s'%(version, meta['chiantiVersion']))
+        if getattr(anIon, 'AbundanceName', meta['abundance']) != meta['abundance']:
+            differ.append('abundance %s, not %s'%(anIon.AbundanceName, meta['abundance']))
+        if anIon.IoneqName != meta['ioneq']:
+            differ.append('ioneq %s, not %s'%(anIon.IoneqName, meta['ioneq']))
+        if _setting(anIon.RadTemperature) != meta['radTemperature'] or _setting(anIon.RStar) != meta['rStar']:
+            differ.append('radTemperature %s and rStar %s, not %s and %s'%(anIon.RadTemperature, anIon.RStar, meta['radTemperature'], meta['rStar']))
+        if getattr(anIon, 'MeanIntensity', None) is not None:
+            differ.append('meanIntensity, the tables are made without one')
+        if not getattr(anIon, 'PDensityDefault', True):
+            differ.append('pDensity, the tables use the default proton to electron density ratio')
+        return differ
+
+    def population(self, temperature, eDensity, logInterp=True):
+        """
+        Interpolate the level populations at the given temperatures and densities.
+
+        Parameters
+        ----------
+        temperature, eDensity : array-like
+            the temperatures and electron densities, either of the same size or one of them with
+            a single value.  They must lie within the grid of the table
+        logInterp : `bool`
+            interpolate the log of the populations, where the populations of all four corners
+            of a cell are positive, or the populations themselves
+
+        Returns
+        -------
+        population : `numpy.ndarray`
+            the (npoints, nlvls) populations
+        """
+        logT = np.log10(np.atleast_1d(np.asarray(temperature, np.float64)))
+        logN = np.log10(np.atleast_1d(np.asarray(eDensity, np.float64)))
+        logT, logN = np.broadcast_arrays(logT, logN)
+        it, wt = _cell(self.LogTemperature, logT, 'temperature')
+        idens, wd = _cell(self.LogDensity, logN, 'density')
+        pop = self.Population
+        corners = [(it, idens, (1. - wt)*(1. - wd)), (it + 1, idens, wt*(1. - wd)),
+            (it, idens + 1, (1. - wt)*wd), (it + 1, idens + 1, wt*wd)]
+        linear = np.zeros((logT.size, pop.shape[2]), np.float64)
+        logPop = np.zeros_like(linear)
+        positive = np.ones(linear.shape, np.bool_)
+        for i1, i2, weight in corners:
+            cornerPop = pop[i1, i2]
+            linear += weight[:, np.newaxis]*cornerPop
+            if logInterp:
+                good = cornerPop > 0.
+                positive &= good
+                logPop += weight[:, np.newaxis]*np.log(np.where(good, cornerPop, 1.))
+        if logInterp:
+            return np.where(positive, np.exp(logPop), linear)
+        return linear
+
+
+def _cell(grid, x, label):
+    """
+    Return the index of the grid cell of each point of `x` and its weight of the upper knot.
+    """
+    # a small tolerance for points on the ends of the grid
+    tol = 1.e-9*(grid[-1] - grid[0])
+    if np.any(x < grid[0] - tol) or np.any(x > grid[-1] + tol):
+        raise ValueError(' the %s is outside of the table, log10 from %10.3f to %10.3f'%(label, grid[0], grid[-1]))
+    index = np.clip(np.searchsorted(grid, x, side='right') - 1, 0, grid.size - 2)
+    weight = (x - grid[index])/(grid[index + 1] - grid[index])
+    return index, np.clip(weight, 0., 1.)
+
+
+def _setting(value):
+    """
+    Return the radiation setting `value` as it is stored in the metadata.
+    """
+    if value is None:
+        return None
+    return float(value)
+
+
+def defaultTableName(ionStr, logTemperature, logDensity, abundance=None, radTemperature=None, rStar=None, tableDir=None):
+    """
+    Return the default name of the table of `makePopTable` for these settings.
+
+    The table is in the poptables directory of the cachedir of the chiantirc file,
+    or in `tableDir`.
+    """
+    import ChiantiPy.tools.io as chio
+    defaults = chio.defaultsRead()
+    if tableDir is None:
+        tableDir = os.path.join(defaults['cachedir'], 'poptables')
+    if abundance is None:
+        abundance = defaults['abundfile']
+    keyStr = json.dumps([tableFormat, __version__, chio.versionRead(), ionStr, abundance, defaults['ioneqfile'],
+        _setting(radTemperature), _setting(rStar), np.asarray(logTemperature, np.float64).tolist(),
+        np.asarray(logDensity, np.float64).tolist()])
+    return os.path.join(tableDir, ionStr + '_' + hashlib.sha1(keyStr.encode('utf-8')).hexdigest()[:16])
+
+
+def makePopTable(ionStr, logTemperature, logDensity, abundance=None, radTemperature=None, rStar=None,
+        tableName=None, solver='auto', overwrite=False, verbose=False):
+    """
+    Solve the level populations of an ion over a grid of temperature and density and write them
+    into a table.
+
+    Parameters
+    ----------
+    ionStr : `str`
+        the ion, e.g. 'fe_13'
+    logTemperature, logDensity : array-like
+        the increasing log10 of the temperatures and electron densities of the grid, at least
+        two of each
+    abundance : `str`
+        the abundance file, the default of the chiantirc file if None
+    radTemperature, rStar : `float`
+        the radiation field, as for `ChiantiPy.core.ion`
+    tableName : `str`
+        the table, without the .npy and .json suffixes.  If None, the table is kept in the
+        cachedir of the chiantirc file under a name made from the ion and the settings
+    solver : `str`
+        the solver of the rate equations, see `ChiantiPy.core.ion.populate`
+    overwrite : `bool`
+        make the table again even if it exists
+
+    Returns
+    -------
+    table : `popTable`
+    """
+    import ChiantiPy.tools.io as chio
+    from ChiantiPy.core import ion
+    logT = np.asarray(logTemperature, np.float64)
+    logN = np.asarray(logDensity, np.float64)
+    if logT.size < 2 or logN.size < 2 or np.any(np.diff(logT) <= 0.) or np.any(np.diff(logN) <= 0.):
+        raise ValueError(' the grid needs at least two increasing values of the temperature and of the density')
+    if tableName is None:
+        tableName = defaultTableName(ionStr, logT, logN, abundance=abundance,
+            radTemperature=radTemperature, rStar=rStar)
+    tableName = os.path.abspath(tableName)
+    if not overwrite and os.path.isfile(tableName + '.json') and os.path.isfile(tableName + '.npy'):
+        return popTable.open(tableName)
+    temperature = 10.**logT
+    eDensity = 10.**logN
+    anIon = ion(ionStr, temperature=temperature, eDensity=eDensity[0], abundance=abundance,
+        radTemperature=radTemperature, rStar=rStar)
+    anIon.populate(solver=solver)
+    operator = anIon.RateOperator
+    meta = {'format':tableFormat, 'ionStr':ionStr, 'chiantiVersion':chio.versionRead(),
+        'chiantipyVersion':__version__, 'abundance':anIon.AbundanceName, 'ioneq':anIon.IoneqName,
+        'radTemperature':_setting(radTemperature), 'rStar':_setting(rStar), 'pDensity':'default',
+        'logTemperature':logT.tolist(), 'logDensity':logN.tolist(), 'nlvls':anIon.Nlvls}
+    tableDir = os.path.dirname(tableName)
+    os.makedirs(tableDir, exist_ok=True)
+    # write to temporary files and rename them so that no process opens a partial table
+    fd, tmpNpy = tempfile.mkstemp(suffix='.npy', dir=tableDir)
+    os.close(fd)
+    pop = np.lib.format.open_memmap(tmpNpy, mode='w+', dtype=np.float64, shape=(logT.size, logN.size, anIon.Nlvls))
+    failed = []
+    for itemp in range(logT.size):
+        population = operator.solve(temperature[itemp], eDensity, solver=solver)
+        pop[itemp] = population['population']
+        if 'errorMessage' in population:
+            failed.append(itemp)
+        if verbose:
+            print(' %s log T = %8.3f done'%(ionStr, logT[itemp]))
+    pop.flush()
+    del pop
+    if failed:
+        meta['failed'] = failed
+        print(' the populations of %s failed at log T = %s'%(ionStr, str(logT[failed])))
+    fd, tmpJson = tempfile.mkstemp(suffix='.json', dir=tableDir)
+    with os.fdopen(fd, 'w') as out:
+        json.dump(meta, out)
+    os.replace(tmpNpy, tableName + '.npy')
+    os.replace(tmpJson, tableName + '.json')
+    _openTables.pop(tableName, None)
+    return popTable.open(tableName)
@@ -0,0 +1,224 @@
+"""
+Tables of the total ionization and recombination rate coefficients of the ions.
+
+`ChiantiPy.core.ion.ionizRate` integrates the ionization cross sections over a
+Maxwellian with a Gauss-Laguerre quadrature and `recombRate` evaluates the fits of
+the radiative and dielectronic recombination rates, for every ion and every set of
+temperatures.  `rateTable` calculates both rates of an ion once on a fine grid of log
+temperature, 10.**np.arange(3., 9.5001, 0.01) by default, and keeps them in the
+atomic-data cache of `ChiantiPy.tools.cache`, keyed on the CHIANTI files they are
+calculated from, together with the second derivatives of the cubic splines of the log
+of the rates.  The spline of the ionization rate is that of its log times
+exp(Ip/kT), which is nearly linear at the low temperatures where the rate itself falls
+over many orders of magnitude.  `rates` interpolates these splines at any number of
+temperatures at once
+
+::
+
+  rates = ratetable.rates('fe_13', temperature)
+  rates['ioniz'], rates['recomb']
+
+Rates that are zero at the low temperatures of the grid, such as the ionization rates,
+are zero below the first temperature from which they are positive.  The rates at
+temperatures outside of the grid are calculated directly.  With the default grid the
+interpolated rates are within about 0.1% of the direct rates, the largest differences
+are near the temperatures where the direct rates have kinks.
+"""
+import os
+
+import numpy as np
+
+import ChiantiPy.tools.util as util
+import ChiantiPy.tools.constants as const
+import ChiantiPy.tools.data as chdata
+import ChiantiPy.tools.cache as chcache
+
+# bump this when the layout of the tables changes
+tableFormat = 1
+
+defaultGrid = (3., 9.5, 0.01)
+
+_tables = {}
+
+
+def rateFiles(ionStr):
+    """
+    Return the CHIANTI files that the ionization and recombination rates of an ion are
+    calculated from.
+
+    Parameters
+    ----------
+    ionStr : `str`
+        the ion, e.g. 'fe_13'
+
+    Returns
+    -------
+    files : `list`
+        the files that exist, the ionization potentials and the .elvlc, .diparams, .easplups,
+        .drparams and .rrparams files of the ion
+    """
+    fileName = util.ion2filename(ionStr)
+    files = [os.path.join(os.environ['XUVTOP'], 'ip', 'chianti.ip')]
+    for ext in ['.elvlc', '.diparams', '.easplups', '.drparams', '.rrparams']:
+        if os.path.isfile(fileName + ext):
+            files.append(fileName + ext)
+    return files
+
+
+def directRates(ionStr, temperature):
+    """
+    Return the ionization and recombination rate coefficients of an ion calculated by
+    `ChiantiPy.core.ion`.
+
+    Parameters
+    ----------
+    ionStr : `str`
+        the ion, e.g. 'fe_13'
+    temperature : array-like
+        the temperatures, in K
+
+    Returns
+    -------
+    rates : `dict`
+        {'temperature', 'ioniz', 'recomb'}
+    """
+    from ChiantiPy.core import ion
+    temperature = np.atleast_1d(np.asarray(temperature, np.float64))
+    atom = ion(ionStr, temperature=temperature, setup=0)
+    atom.setupIonrec()
+    atom.ionizRate()
+    atom.recombRate()
+    return {'temperature':temperature, 'ioniz':np.asarray(atom.IonizRate['rate'], np.float64),
+        'recomb':np.asarray(atom.RecombRate['rate'], np.float64)}
+
+
+def rateTable(ionStr, grid=defaultGrid):
+    """
+    Return the table of the ionization and recombination rate coefficients of an ion.
+
+    The table is made once per process and kept in the atomic-data cache.
+
+    Parameters
+    ----------
+    ionStr : `str`
+        the ion, e.g. 'fe_13'
+    grid : `tuple`
+        the first and last log10 temperature and the step of the grid
+
+    Returns
+    -------
+    table : `dict`
+        {'ionStr', 'logTemperature', 'ioniz', 'recomb', 'ionizSecond', 'recombSecond',
+        'ionizFirst', 'recombFirst', 'ionizEnergy', 'recombEnergy'}, the rates of the grid,
+        the second derivatives of the splines of the natural log of the rates times
+        exp(energy/kT), the index of the first knot of each spline and the energy, in eV
+    """
+    grid = tuple([float(one) for one in grid])
+    tableKey = (os.environ['XUVTOP'], ionStr, grid)
+    if tableKey in _tables:
+        return _tables[tableKey]
+    files = rateFiles(ionStr)
+    options = {'format':tableFormat, 'ionStr':ionStr, 'grid':list(grid)}
+    table = chcache.load('rateTable', files, options)
+    if table is None:
+        logT = grid[0] + grid[2]*np.arange(int(round((grid[1] - grid[0])/grid[2])) + 1)
+        direct = directRates(ionStr, 10.**logT)
+        table = {'ionStr':ionStr, 'logTemperature':logT, 'ioniz':direct['ioniz'],
+            'recomb':direct['recomb'], 'ionizEnergy':_ionizEnergy(ionStr), 'recombEnergy':0.}
+        for akey in ['ioniz', 'recomb']:
+            first, second = _splineSecond(logT, table[akey], table[akey + 'Energy'])
+            table[akey + 'First'] = first
+            table[akey + 'Second'] = second
+        chcache.save('rateTable', files, table, options)
+    _tables[tableKey] = table
+    return table
+
+
+def _ionizEnergy(ionStr):
+    """
+    Return the ionization potential of an ion in eV, 0 for a bare nucleus.
+    """
+    nameDict = util.convertName(ionStr)
+    if nameDict['Ion'] > nameDict['Z']:
+        return 0.
+    return float(chdata.Ip[nameDict['Z'] - 1, nameDict['Ion'] - 1])
+
+
+def _scaledLog(logT, rate, energy):
+    """
+    Return the natural log of `rate` times exp(energy/kT).
+    """
+    return np.log(rate) + energy/(const.boltzmannEv*10.**logT)
+
+
+def _splineSecond(logT, rate, energy):
+    """
+    Return the first knot and the second derivatives of the spline of the scaled log of `rate`.
+
+    The spline runs over the last range of knots where the rate is positive.  If that range
+    has less than 4 knots, the first knot is the size of the grid and the rate is zero.
+    """
+    second = np.zeros_like(rate)
+    zero = np.flatnonzero(rate <= 0.)
+    first = int(zero[-1]) + 1 if zero.size else 0
+    if logT.size - first < 4:
+        return logT.size, second
+    second[first:] = util.cubicSplineSecond(logT[np.newaxis, first:], _scaledLog(logT[first:], rate[first:], energy)[np.newaxis])[0]
+    return first, second
+
+
+def _splineEval(logT, rate, energy, first, second, x):
+    """
+    Evaluate the spline of the scaled log of a rate of a table at the log temperatures `x`
+    within the grid.
+    """
+    result = np.zeros(x.shape, np.float64)
+    if first >= logT.size:
+        return result
+    good = x >= logT[first]
+    xg = x[good]
+    y = util.cubicSplineEval(logT[np.newaxis, first:], _scaledLog(logT[first:], rate[first:], energy)[np.newaxis],
+        second[np.newaxis, first:], xg[np.newaxis])[0]
+    result[good] = np.exp(y - energy/(const.boltzmannEv*10.**xg))
+    return result
+
+
+def rates(ionStr, temperature, grid=defaultGrid):
+    """
+    Interpolate the ionization and recombination rate coefficients of an ion in its table.
+
+    Parameters
+    ----------
+    ionStr : `str`
+        the ion, e.g. 'fe_13'
+    temperature : array-like
+        the temperatures, in K, the rates outside of the grid of the table are calculated
+        directly
+    grid : `tuple`
+        the grid of the table, see `rateTable`
+
+    Returns
+    -------
+    rates : `dict`
+        {'temperature', 'ioniz', 'recomb'}, the rates have the shape of the temperatures
+    """
+    temperature = np.asarray(temperature, np.float64)
+    table = rateTable(ionStr, grid=grid)
+    logTable = table['logTemperature']
+    x = np.log10(temperature).ravel()
+    # a small tolerance for temperatures on the ends of the grid
+    tol = 1.e-9*(logTable[-1] - logTable[0])
+    inside = (x >= logTable[0] - tol) & (x <= logTable[-1] + tol)
+    result = {'temperature':temperature}
+    for akey in ['ioniz', 'recomb']:
+        rate = np.zeros(x.shape, np.float64)
+        rate[inside] = _splineEval(logTable, table[akey], table[akey + 'Energy'], table[akey + 'First'],
+            table[akey + 'Second'], x[inside])
+        result[akey] = rate
+    if not inside.all():
+        direct = directRates(ionStr, temperature.ravel()[~inside])
+        for akey in ['ioniz', 'recomb']:
+            result[akey][~inside] = direct[akey]
+    for akey in ['ioniz', 'recomb']:
+        result[akey] = result[akey].reshape(temperature.shape)
+    return result
@@ -5,6 +5,7 @@ Blackbody temperature calculations
 import numpy as np
 
 import ChiantiPy.tools.constants as const
+import ChiantiPy.tools.util as util
 
 class blackStar:
     """
@@ -51,6 +52,32 @@ class blackStar:
         out = const.pi*(self.Radius/distance)**2*bb['photons']
         self.Incident = bb
 
+    def meanIntensity(self, wvl, distance=None):
+        """
+        Calculate the mean intensity of the diluted blackbody radiation of the star.
+
+        Parameters
+        ----------
+        wvl : `~numpy.ndarray`
+            Wavelength in angstrom
+        distance : `~numpy.float64`
+            Distance from the center of the star in cm.  If not set, the dilution factor is 0.5,
+            as at the surface of the star
+
+        Returns
+        -------
+        intensity : `~numpy.ndarray`
+            Mean intensity in :math:`\mathrm{erg}\,\mathrm{cm}^{-2}\,\mathrm{s}^{-1}\,\mathrm{str}^{-1}\,\mathrm{\mathring{A}}^{-1}`,
+            e.g. for the meanIntensity keyword of `ChiantiPy.core.ion`
+        """
+        if distance is None:
+            dilution = 0.5
+        else:
+            dilution = util.dilute(distance/self.Radius)
+        wvlCm = 1.e-8*np.asarray(wvl, np.float64)
+        planck = 2.*const.planck*const.light**2/wvlCm**5/np.expm1(const.hc/(wvlCm*const.boltzmann*self.Temperature))
+        return 1.e-8*dilution*planck
+
 
 def blackbody(temperature, variable, hnu=1):
     """
@@ -0,0 +1,625 @@
+"""
+A consolidated HDF5 store of the whole CHIANTI database.
+
+A full $XUVTOP tree holds thousands of small ASCII files, and setting up the
+ions of a spectrum opens and parses most of them.  `makeStore` runs every
+reader in `ChiantiPy.tools.io` once over the database and packs the parsed
+results into a single HDF5 file, by default $XUVTOP/chianti.h5, with one
+group per ion, e.g. /fe/fe_14, and one group each for the ioneq, abundance,
+ip, masterlist and continuum directories.  When the store is in use the
+readers take their results from it, so that only that one file is opened.
+
+Every reader call is a subgroup of the group of its file.  The subgroup holds
+the arrays written by `ChiantiPy.tools.cache.encode`, so that the readers
+return exactly what they return when they parse the ASCII files.  Numeric
+datasets are written contiguous and uncompressed, and the arrays that a reader
+returns as arrays, such as the flat spline data of `ChiantiPy.tools.io.scupsRead`,
+are returned by `atomicStore.load` as copy-on-write views into a memory map of
+the store, so that the processes that read them share their pages.
+
+The store is a snapshot of the database: it records the CHIANTI version and
+is not used if the version in $XUVTOP/VERSION differs from it, but edits to
+individual files are not noticed.  Run `makeStore` again after editing the
+database.
+
+`sharedStore` packs the data of the ions of a multiprocessing calculation, of
+their adjacent ionization stages and of the global tables into a temporary
+store that the worker processes of `ChiantiPy.core.mspectrum`,
+`ChiantiPy.core.ipymspectrum` and `ChiantiPy.model.maker.mgofnt` attach to
+with `useStore`.  The parent reads the data once and the workers share the
+pages of the memory map instead of each opening and parsing the ASCII files.
+
+The following keys in the chiantirc file control the store:
+
+- `usestore` : take the readers' results from the store, default False
+- `storefile` : the store, default $XUVTOP/chianti.h5
+"""
+import os
+import posixpath
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+import ChiantiPy.tools.cache as chcache
+from ChiantiPy.version import __version__
+
+# bump this when the layout of the store changes
+storeFormat = 3
+
+# the directories of the database that are not those of an ion and that the
+# calculations of the ions read
+globalDirs = ['abundance', 'continuum', 'ioneq', 'ip', 'masterlist']
+
+
+def _relPath(filename, xuvtop):
+    """
+    Return the path of `filename` relative to `xuvtop`, or None if it is not in the database.
+    """
+    relPath = os.path.relpath(os.path.abspath(filename), xuvtop)
+    if relPath.startswith(os.pardir):
+        return None
+    return relPath.replace(os.sep, '/')
+
+
+def entryName(reader, filenames, options, xuvtop):
+    """
+    Return the name of the group that holds the result of `reader` for `filenames`.
+
+    Returns None if any of `filenames` is not in the database below `xuvtop`.
+    """
+    relPaths = []
+    for fname in filenames:
+        relPath = _relPath(fname, xuvtop)
+        if relPath is None:
+            return None
+        relPaths.append(relPath)
+    if options is None:
+        options = {}
+    keyStr = json.dumps([relPaths, options], sort_keys=True, default=str)
+    key = hashlib.sha1(keyStr.encode('utf-8')).hexdigest()[:16]
+    groupName = os.path.dirname(relPaths[0])
+    if not groupName:
+        groupName = 'top'
+    return groupName + '/' + reader + '-' + key
+
+
+class atomicStore(object):
+    """
+    A consolidated HDF5 store of the CHIANTI database, written by `makeStore`.
+
+    Parameters
+    ----------
+    storeName : `str`
+        the HDF5 file of the store
+    xuvtop : `str`
+        the database directory, $XUVTOP if None
+    """
+    def __init__(self, storeName, xuvtop=None):
+        import h5py
+        if xuvtop is None:
+            xuvtop = os.environ['XUVTOP']
+        self.StoreName = storeName
+        self.Xuvtop = os.path.abspath(xuvtop)
+        self.File = h5py.File(storeName, mode='r')
+        self.Format = int(self.File.attrs['format'])
+        self.Version = str(self.File.attrs['version'])
+        self.Files = set(json.loads(bytes(self.File['files'][()]).decode('utf-8')))
+        # the directories of a store of some ions only, None for the whole database
+        if 'dirs' in self.File:
+            self.Dirs = set(json.loads(bytes(self.File['dirs'][()]).decode('utf-8')))
+        else:
+            self.Dirs = None
+        # HDF5 file handles can not be shared with a forked process
+        self.Pid = os.getpid()
+        self._map = None
+
+    def close(self):
+        """
+        Close the HDF5 file and the memory map.
+        """
+        self._map = None
+        self.File.close()
+
+    def isfile(self, filename):
+        """
+        Return True if `filename` was in the database when the store was written.
+
+        Files outside of the database or of the directories of the store are looked up
+        on disk.
+        """
+        relPath = _relPath(filename, self.Xuvtop)
+        if relPath is None or not self.hasDir(posixpath.dirname(relPath) or os.curdir):
+            return os.path.isfile(filename)
+        return relPath in self.Files
+
+    def listdir(self, dirname):
+        """
+        Return the names of the files that were in the database directory `dirname`.
+
+        Directories outside of the database or of the store are listed on disk.
+        """
+        relPath = _relPath(dirname, self.Xuvtop)
+        if relPath is None or not self.hasDir(relPath):
+            return os.listdir(dirname)
+        if relPath == os.curdir:
+            prefix = ''
+        else:
+            prefix = relPath + '/'
+        names = []
+        for one in self.Files:
+            if one.startswith(prefix) and '/' not in one[len(prefix):]:
+                names.append(one[len(prefix):])
+        return sorted(names)
+
+    def hasDir(self, relPath):
+        """
+        Return True if the database directory `relPath`, relative to $XUVTOP, was packed.
+        """
+        return self.Dirs is None or relPath in self.Dirs
+
+    def group(self, reader, filenames, options=None):
+        """
+        Return the HDF5 group of the result of `reader` for `filenames`, or None.
+        """
+        name = entryName(reader, filenames, options, self.Xuvtop)
+        if name is None or name not in self.File:
+            return None
+        return self.File[name]
+
+    def array(self, dataset):
+        """
+        Return a view of `dataset` into a memory map of the store.
+
+        The memory map is copy-on-write:  the pages of the store are shared by all
+        processes that read them, and writing to the view changes neither the store
+        nor the other processes.  Datasets that are not stored contiguously are read
+        into memory.
+        """
+        value = None
+        offset = dataset.id.get_offset()
+        if offset is not None and dataset.dtype.kind in 'biufS':
+            if self._map is None:
+                self._map = np.memmap(self.StoreName, dtype=np.uint8, mode='c').view(np.ndarray)
+            nbytes = dataset.size*dataset.dtype.itemsize
+            value = self._map[offset:offset + nbytes].view(dataset.dtype).reshape(dataset.shape)
+        if value is None:
+            value = dataset[()]
+        if dataset.attrs.get('unicode', False):
+            value = np.char.decode(value, 'utf-8')
+        return value
+
+    def load(self, reader, filenames, options=None):
+        """
+        Return the result of `reader` for `filenames` as the reader returns it, or None.
+        """
+        group = self.group(reader, filenames, options)
+        if group is None:
+            return None
+        arrays = {'meta':bytes(group['meta'][()]).decode('utf-8')}
+        for akey in group.keys():
+            if akey != 'meta':
+                arrays[akey] = self.array(group[akey])
+        return chcache.decode(arrays)
+
+
+class _storeWriter(object):
+    """
+    Writes the results of the readers into a new store, see `makeStore`.
+    """
+    def __init__(self, h5file, xuvtop):
+        self.File = h5file
+        self.Xuvtop = xuvtop
+        self.Nentries = 0
+
+    def __call__(self, reader, filenames, info, options=None):
+        if not isinstance(info, dict):
+            return
+        name = entryName(reader, filenames, options, self.Xuvtop)
+        if name is None or name in self.File:
+            return
+        arrays = chcache.encode(info)
+        if arrays is None:
+            return
+        group = self.File.create_group(name)
+        for akey, value in arrays.items():
+            if akey == 'meta':
+                # the meta data can be larger than the 64kB limit of an attribute
+                group.create_dataset(akey, data=np.frombuffer(str(value).encode('utf-8'), np.uint8))
+            elif value.dtype.kind == 'U':
+                dataset = group.create_dataset(akey, data=np.char.encode(value, 'utf-8'))
+                dataset.attrs['unicode'] = True
+            else:
+                group.create_dataset(akey, data=value)
+        self.Nentries += 1
+
+
+def _readAll(dirpath, fileNames, verbose=False):
+    """
+    Call the readers for all of the files in one directory of the database.
+    """
+    import ChiantiPy.tools.io as chio
+    ionReaders = {
+        'elvlc':[(chio.elvlcRead, {})],
+        'wgfa':[(chio.wgfaRead, {'total':True}), (chio.wgfaRead, {})],
+        'scups':[(chio.scupsRead, {})],
+        'psplups':[(chio.splupsRead, {'filetype':'psplups'})],
+        'splups':[(chio.splupsRead, {'filetype':'splups'})],
+        'cilvl':[(chio.cireclvlRead, {'filetype':'cilvl'})],
+        'reclvl':[(chio.cireclvlRead, {'filetype':'reclvl'})],
+        'rrlvl':[(chio.cireclvlRead, {'filetype':'rrlvl'})],
+        'auto':[(chio.autoRead, {'total':True})],
+        'drparams':[(chio.drRead, {})],
+        'rrparams':[(chio.rrRead, {})],
+        'diparams':[(chio.diRead, {})],
+        'easplups':[(chio.eaRead, {})],
+        'easplom':[(chio.splomRead, {'ea':True})],
+        'splom':[(chio.splomRead, {})],
+        'fblvl':[(chio.fblvlRead, {})],
+        'trparams':[(chio.trRead, {})],
+        }
+    tableReaders = {
+        'gffgu.dat':chio.gffRead,
+        'gffint.dat':chio.gffintRead,
+        'itoh.dat':chio.itohRead,
+        'klgfb.dat':chio.klgfbRead,
+        'verner_short.txt':chio.vernerRead,
+        'hseq_2photon.dat':chio.twophotonHRead,
+        'heseq_2photon.dat':chio.twophotonHeRead,
+        'rrloss_mao_2017_pars.dat':chio.rrLossRead,
+        'grndLevels.dat':chio.grndLevelsRead,
+        'chianti.ip':chio.ipRead,
+        'masterlist.ions':chio.masterListRead,
+        }
+    dirName = os.path.basename(dirpath)
+    calls = []
+    for fileName in sorted(fileNames):
+        rootName, ext = os.path.splitext(fileName)
+        ext = ext[1:]
+        if fileName in tableReaders:
+            calls.append((tableReaders[fileName], (), {}))
+        elif ext == 'ioneq':
+            calls.append((chio.ioneqRead, (), {'ioneqName':rootName}))
+        elif ext == 'abund':
+            calls.append((chio.abundanceRead, (rootName,), {}))
+        elif rootName == dirName and ext in ionReaders:
+            for reader, kwargs in ionReaders[ext]:
+                calls.append((reader, (rootName,), kwargs))
+            if ext in ('cilvl', 'reclvl'):
+                # as called by ion.setupIonrec
+                calls.append((chio.cireclvlRead, ('',), {'filename':os.path.join(dirpath, rootName), 'filetype':ext}))
+    for reader, args, kwargs in calls:
+        try:
+            reader(*args, **kwargs)
+        except Exception as err:
+            if verbose:
+                print(' %s could not read %s:  %s'%(reader.__name__, os.path.join(dirpath, str(args)), err))
+
+
+def ionDirs(ions):
+    """
+    Return the database directories of `ions` and of their adjacent ionization stages.
+
+    Parameters
+    ----------
+    ions : `list`
+        the ions, e.g. ['fe_14', 'o_6d']
+
+    Returns
+    -------
+    dirs : `list`
+        the directories relative to $XUVTOP, e.g. 'o/o_6', of the ions, of the stages below
+        and above them and of the dielectronic ions of these stages
+    """
+    import ChiantiPy.tools.util as util
+    dirs = set()
+    for one in ions:
+        nameDict = util.convertName(one)
+        z = nameDict['Z']
+        for stage in range(max(nameDict['Ion'] - 1, 1), min(nameDict['Ion'] + 1, z + 1) + 1):
+            for dielectronic in [False, True]:
+                name = util.zion2name(z, stage, dielectronic=dielectronic)
+                dirs.add(name.split('_')[0] + '/' + name)
+    return sorted(dirs)
+
+
+def makeStore(storeName=None, verbose=False, ions=None):
+    """
+    Parse the whole CHIANTI database in $XUVTOP and write it into a single HDF5 store.
+
+    Parameters
+    ----------
+    storeName : `str`
+        the HDF5 file to write, the chiantirc `storefile` if None
+    verbose : `bool`
+    ions : `list`
+        if given, only the directories of these ions, e.g. ['fe_14', 'o_6'], and of their
+        adjacent ionization stages, see `ionDirs`, are packed together with the
+        directories of `globalDirs`.  The results of the readers are then taken from the
+        cache where it has them, and the files of the other directories are read from
+        $XUVTOP when the store is in use.
+
+    Returns
+    -------
+    storeName : `str`
+        the name of the store that was written
+    """
+    import h5py
+    import ChiantiPy.tools.io as chio
+    global _theStore
+    xuvtop = os.path.abspath(os.environ['XUVTOP'])
+    if storeName is None:
+        storeName = _defaultName(chio.defaultsRead())
+    tmpName = storeName + '.tmp'
+    if ions is None:
+        tops = [xuvtop]
+    else:
+        tops = [os.path.join(xuvtop, one) for one in globalDirs + ionDirs(ions)]
+    dirs = []
+    files = []
+    for top in tops:
+        for dirpath, dirnames, fileNames in os.walk(top):
+            dirnames.sort()
+            dirs.append((dirpath, fileNames))
+            for fileName in fileNames:
+                relPath = _relPath(os.path.join(dirpath, fileName), xuvtop)
+                files.append(relPath)
+    # parse the ASCII files, not an older store, and unless only some elements are
+    # packed, not the cache
+    savedCache, savedStore = chcache._theCache, _theStore
+    if ions is None:
+        chcache._theCache = False
+    _theStore = False
+    try:
+        with h5py.File(tmpName, mode='w') as h5file:
+            h5file.attrs['format'] = storeFormat
+            h5file.attrs['version'] = chio.versionRead()
+            h5file.attrs['chiantipy'] = __version__
+            h5file.create_dataset('files', data=np.frombuffer(json.dumps(sorted(files)).encode('utf-8'), np.uint8))
+            if ions is not None:
+                packed = sorted([_relPath(dirpath, xuvtop) for dirpath, fileNames in dirs])
+                h5file.create_dataset('dirs', data=np.frombuffer(json.dumps(packed).encode('utf-8'), np.uint8))
+            writer = _storeWriter(h5file, xuvtop)
+            chcache.setRecorder(writer)
+            try:
+                for dirpath, fileNames in dirs:
+                    if verbose:
+                        print(' packing %s'%(dirpath))
+                    _readAll(dirpath, fileNames, verbose=verbose)
+            finally:
+                chcache.setRecorder(None)
+        os.replace(tmpName, storeName)
+    finally:
+        chcache._theCache, _theStore = savedCache, savedStore
+        if os.path.isfile(tmpName):
+            os.remove(tmpName)
+    if verbose:
+        print(' wrote %i entries to %s'%(writer.Nentries, storeName))
+    # a store that is already open for this name is out of date now
+    old = _openStores.pop(storeName, None)
+    if old is not None:
+        if _theStore is old:
+            _theStore = None
+        old.close()
+    return storeName
+
+
+def _defaultName(defaults):
+    """
+    Return the store file named in the chiantirc `defaults`.
+    """
+    if defaults.get('storefile'):
+        return defaults['storefile']
+    return os.path.join(os.environ['XUVTOP'], 'chianti.h5')
+
+
+_theStore = None
+_openStores = {}
+
+
+def openStore(storeName=None):
+    """
+    Return the open `atomicStore` of `storeName`, or None if it can not be used.
+
+    The store is not used if it does not exist, if h5py is not installed, or if it
+    was written from a different version of the CHIANTI database.
+    """
+    import ChiantiPy.tools.io as chio
+    try:
+        if storeName is None:
+            storeName = _defaultName(chio.defaultsRead())
+        if storeName in _openStores:
+            if _openStores[storeName].Pid == os.getpid():
+                return _openStores[storeName]
+            # inherited from the parent of a forked process
+            reset()
+        if not os.path.isfile(storeName):
+            return None
+        store = atomicStore(storeName)
+        version = chio.versionRead()
+    except (ImportError, KeyError, IOError, OSError):
+        return None
+    if store.Format != storeFormat or store.Version != version:
+        print(' %s was written from CHIANTI %s, not %s; run makeStore again'%(storeName, store.Version, version))
+        store.close()
+        return None
+    _openStores[storeName] = store
+    return store
+
+
+def getStore():
+    """
+    Return the process-wide `atomicStore`, or None if the store is not used.
+
+    The store is opened on first use if the chiantirc `usestore` is True.
+    """
+    global _theStore
+    if _theStore and _theStore.Pid != os.getpid():
+        reset()
+    if _theStore is None:
+        import ChiantiPy.tools.io as chio
+        try:
+            defaults = chio.defaultsRead()
+        except KeyError:
+            _theStore = False
+            return None
+        if not defaults['usestore']:
+            _theStore = False
+        else:
+            store = openStore()
+            _theStore = store if store is not None else False
+    if _theStore is False:
+        return None
+    return _theStore
+
+
+def setStore(storeName=None, useStore=True):
+    """
+    Replace the process-wide store, e.g. to use a different file or to switch it off.
+
+    Parameters
+    ----------
+    storeName : `str`
+        the HDF5 store, the chiantirc value if None
+    useStore : `bool`
+        if False, the readers do not use a store
+    """
+    global _theStore
+    if not useStore:
+        _theStore = False
+        return
+    store = openStore(storeName)
+    _theStore = store if store is not None else False
+
+
+def reset():
+    """
+    Forget the open stores, so that they are opened again on next use.
+
+    This is called at the start of a process forked by multiprocessing, which
+    must not share the HDF5 file handles of its parent.
+    """
+    global _theStore
+    _theStore = None
+    _openStores.clear()
+
+
+@contextmanager
+def activeStore(storeName=None, active=True):
+    """
+    Use the store for the readers called within a with block.
+
+    Parameters
+    ----------
+    storeName : `str`
+        the HDF5 store, the chiantirc value if None
+    active : `bool`
+        if False, leave the process-wide setting unchanged
+    """
+    global _theStore
+    if not active:
+        yield getStore()
+        return
+    saved = _theStore
+    store = openStore(storeName)
+    if store is not None:
+        _theStore = store
+    try:
+        yield store
+    finally:
+        _theStore = saved
+
+
+@contextmanager
+def sharedStore(ions, verbose=False):
+    """
+    Pack the data needed for `ions` into a temporary store for worker processes.
+
+    The parent process of a multiprocessing calculation reads the data once, the
+    workers call `useStore` with the name of the store and attach to it, so that
+    they share its pages in memory instead of each reading the ASCII files.
+
+    Parameters
+    ----------
+    ions : `list`
+        the ions of the calculation, e.g. ['fe_14', 'o_6'];  their data, those of
+        their adjacent ionization stages and the global tables are packed, see
+        `makeStore`
+    verbose : `bool`
+
+    Yields
+    ------
+    storeName : `str`
+        the name of the store, the store in use if there is one, or None if no
+        store can be written, e.g. if h5py is not installed
+    """
+    import ChiantiPy.tools.io as chio
+    store = getStore()
+    if store is not None:
+        yield store.StoreName
+        return
+    storeName = None
+    try:
+        import h5py
+        cacheDir = chio.defaultsRead()['cachedir']
+        os.makedirs(cacheDir, exist_ok=True)
+        fd, storeName = tempfile.mkstemp(suffix='.h5', prefix='shared-', dir=cacheDir)
+        os.close(fd)
+        makeStore(storeName, verbose=verbose, ions=ions)
+    except Exception as err:
+        # the workers read the ASCII files as they do without a store
+        if verbose:
+            print(' could not write a shared store:  %s'%(err))
+        if storeName is not None and os.path.isfile(storeName):
+            os.remove(storeName)
+        storeName = None
+    try:
+        yield storeName
+    finally:
+        if storeName is not None:
+            old = _openStores.pop(storeName, None)
+            if old is not None:
+                old.close()
+            os.remove(storeName)
+
+
+def useStore(storeName):
+    """
+    Take the data of this process from `storeName`, e.g. in a worker process of `sharedStore`.
+
+    Nothing is changed if `storeName` is None.
+    """
+    if storeName is not None:
+        setStore(storeName)
+
+
+def load(reader, filenames, options=None):
+    """
+    Return the stored result of `reader` for `filenames`, or None.
+    """
+    store = getStore()
+    if store is None:
+        return None
+    return store.load(reader, filenames, options)
+
+
+def isfile(filename):
+    """
+    Like os.path.isfile, but answered from the store when one is in use.
+    """
+    store = getStore()
+    if store is None:
+        return os.path.isfile(filename)
+    return store.isfile(filename)
+
+
+def listdir(dirname):
+    """
+    Like os.listdir, but answered from the store when one is in use.
+    """
+    store = getStore()
+    if store is None:
+        return os.listdir(dirname)
+    return store.listdir(dirname)
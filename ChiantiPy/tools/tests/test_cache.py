@@ -0,0 +1,160 @@
+"""
+Tests for the atomic-data cache of ChiantiPy.tools.cache
+"""
+import os
+
+import numpy as np
+import pytest
+
+import ChiantiPy.tools.io as io
+import ChiantiPy.tools.cache as chcache
+
+test_ion = 'o_6'
+# the readers and the arguments of the files that are cached
+test_reads = [
+    ('elvlcRead', (test_ion,), {}),
+    ('wgfaRead', (test_ion,), {}),
+    ('scupsRead', (test_ion,), {}),
+    ('splupsRead', (test_ion,), {'filetype':'psplups'}),
+    ('autoRead', (test_ion,), {}),
+    ('cireclvlRead', (test_ion,), {'filetype':'rrlvl'}),
+    ('ioneqRead', (), {'ioneqName':'chianti'}),
+    ]
+
+
+def same_data(info, other):
+    """
+    Whether two results of a reader hold the same values in the same types.
+    """
+    if isinstance(info, np.ndarray):
+        return isinstance(other, np.ndarray) and info.dtype == other.dtype and info.shape == other.shape and np.array_equal(info, other, equal_nan=info.dtype.kind in 'fc')
+    if isinstance(info, dict):
+        return isinstance(other, dict) and sorted(info) == sorted(other) and all(same_data(info[akey], other[akey]) for akey in info)
+    if isinstance(info, (list, tuple)):
+        return type(info) is type(other) and len(info) == len(other) and all(same_data(one, two) for one, two in zip(info, other))
+    if isinstance(info, float) and np.isnan(info):
+        return isinstance(other, float) and np.isnan(other)
+    return info == other
+
+
+@pytest.fixture
+def cache(tmpdir, monkeypatch):
+    """
+    An empty cache for the readers, in a temporary directory.
+    """
+    cache = chcache.atomicCache(str(tmpdir.join('cache')), version=io.versionRead())
+    monkeypatch.setattr(chcache, '_theCache', cache)
+    return cache
+
+
+@pytest.fixture
+def data_file(tmpdir):
+    """
+    A file to key the entries of a cache on.
+    """
+    data = tmpdir.join('o_6.test')
+    data.write('1 2 3\n')
+    return str(data)
+
+
+@pytest.mark.parametrize('reader,args,kwargs', test_reads)
+def test_hit_is_the_parse(reader, args, kwargs, cache, monkeypatch):
+    first = getattr(io, reader)(*args, **kwargs)
+    # some readers also read and cache other files
+    assert len(cache.entries()) >= 1
+    hits = []
+    load = cache.load
+
+    def recorded(*largs, **lkwargs):
+        info = load(*largs, **lkwargs)
+        hits.append(info is not None)
+        return info
+    monkeypatch.setattr(cache, 'load', recorded)
+    cached = getattr(io, reader)(*args, **kwargs)
+    assert hits and all(hits)
+    monkeypatch.setattr(chcache, '_theCache', False)
+    parsed = getattr(io, reader)(*args, **kwargs)
+    assert same_data(parsed, first)
+    assert same_data(parsed, cached)
+
+
+def test_changed_file_misses(data_file, tmpdir):
+    cache = chcache.atomicCache(str(tmpdir.join('cache')), version='9.0')
+    info = {'value':np.arange(3.)}
+    cache.save('testRead', [data_file], info)
+    assert same_data(cache.load('testRead', [data_file]), info)
+    st = os.stat(data_file)
+    os.utime(data_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load('testRead', [data_file]) is None
+    cache.save('testRead', [data_file], info)
+    assert cache.load('testRead', [data_file]) is not None
+    # the same modification time and a different size
+    st = os.stat(data_file)
+    with open(data_file, 'a') as out:
+        out.write('4\n')
+    os.utime(data_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert cache.load('testRead', [data_file]) is None
+    # a missing file is never cached
+    os.remove(data_file)
+    cache.save('testRead', [data_file], info)
+    assert cache.load('testRead', [data_file]) is None
+
+
+def test_version_and_options_miss(data_file, tmpdir):
+    cacheDir = str(tmpdir.join('cache'))
+    cache = chcache.atomicCache(cacheDir, version='9.0')
+    info = {'value':[1., 2.]}
+    cache.save('testRead', [data_file], info, {'ions':test_ion, 'useTh':True})
+    assert same_data(cache.load('testRead', [data_file], {'ions':test_ion, 'useTh':True}), info)
+    assert cache.load('testRead', [data_file], {'ions':test_ion, 'useTh':False}) is None
+    assert cache.load('testRead', [data_file]) is None
+    assert cache.load('otherRead', [data_file], {'ions':test_ion, 'useTh':True}) is None
+    other = chcache.atomicCache(cacheDir, version='10.0')
+    assert other.load('testRead', [data_file], {'ions':test_ion, 'useTh':True}) is None
+
+
+def test_evict(tmpdir):
+    cache = chcache.atomicCache(str(tmpdir.join('cache')), maxSize=1000., version='9.0')
+    names = []
+    for i in range(4):
+        data = tmpdir.join('file%i'%(i))
+        data.write('%i\n'%(i))
+        cache.save('testRead', [str(data)], {'value':np.zeros(25000)})
+        entry = cache.entryName(cache.key('testRead', [str(data)]))
+        # the entries were used one after the other
+        os.utime(entry, (1.e+9 + i, 1.e+9 + i))
+        names.append(str(data))
+    entrySize = cache.size()/4.
+    # room for two entries
+    cache.MaxSize = 2.5*entrySize
+    cache.evict()
+    assert cache.size() <= cache.MaxSize
+    assert [cache.load('testRead', [one]) is None for one in names] == [True, True, False, False]
+
+
+def test_save_walks_once(tmpdir, monkeypatch):
+    cache = chcache.atomicCache(str(tmpdir.join('cache')), maxSize=1000., version='9.0')
+    walks = []
+    entries = cache.entries
+
+    def counted():
+        walks.append(1)
+        return entries()
+    monkeypatch.setattr(cache, 'entries', counted)
+    names = []
+    for i in range(5):
+        data = tmpdir.join('file%i'%(i))
+        data.write('%i\n'%(i))
+        cache.save('testRead', [str(data)], {'value':np.zeros(25000)})
+        names.append(str(data))
+    # the size of the cache is found once and kept up to date
+    assert len(walks) == 1
+    assert cache.Size == sum([one[1] for one in entries()])
+    # the entries are only walked again when the cap is passed
+    cache.MaxSize = 2.5*cache.Size/5./1.e+6
+    data = tmpdir.join('file5')
+    data.write('5\n')
+    cache.save('testRead', [str(data)], {'value':np.zeros(25000)})
+    assert len(walks) == 2
+    assert cache.Size <= cache.MaxSize*1.e+6
+    assert cache.Size == sum([one[1] for one in entries()])
@@ -0,0 +1,98 @@
+"""
+Tests of the tables of ChiantiPy.tools.data, which are read on first use
+"""
+import subprocess
+import sys
+
+import pytest
+
+import ChiantiPy.tools.io as io
+import ChiantiPy.tools.data as chdata
+import ChiantiPy.tools.cache as chcache
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """
+    Forget the tables read so far and record the calls of the readers of ChiantiPy.tools.io.
+    """
+    # hasattr would read a table that has not been read yet
+    for name in set(chdata._loaders) & set(vars(chdata)):
+        monkeypatch.delattr(chdata, name)
+    monkeypatch.setattr(chcache, '_theCache', False)
+    calls = []
+    for name in dir(io):
+        reader = getattr(io, name)
+        if callable(reader) and (name.endswith('Read') or name == 'masterListRead'):
+            def recorded(*args, _name=name, _reader=reader, **kwargs):
+                calls.append((_name, args, kwargs))
+                return _reader(*args, **kwargs)
+            monkeypatch.setattr(io, name, recorded)
+    return calls
+
+
+def test_import_reads_nothing():
+    code = '\n'.join([
+        'import builtins, os, sys',
+        'xuvtop = os.path.abspath(os.environ["XUVTOP"])',
+        'opened = []',
+        'builtinOpen = builtins.open',
+        'def recordOpen(file, *args, **kwargs):',
+        '    if isinstance(file, str) and os.path.abspath(file).startswith(xuvtop):',
+        '        opened.append(file)',
+        '    return builtinOpen(file, *args, **kwargs)',
+        'builtins.open = recordOpen',
+        'import ChiantiPy.tools.data as chdata',
+        'assert not set(chdata._loaders) & set(vars(chdata)), set(chdata._loaders) & set(vars(chdata))',
+        'print(opened)',
+        ])
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    assert out.stdout.strip() == '[]'
+
+
+@pytest.mark.parametrize('name', sorted(chdata._loaders))
+def test_table_is_memoized(name, reads):
+    try:
+        value = getattr(chdata, name)
+    except AttributeError as err:
+        pytest.skip('%s is not in the test database: %s'%(name, err))
+    nread = len(reads)
+    assert name in vars(chdata)
+    assert getattr(chdata, name) is value
+    assert len(reads) == nread
+
+
+@pytest.mark.parametrize('error', [KeyError, IOError])
+def test_failed_read(error, tmpdir, monkeypatch):
+    def failed():
+        raise error('no table')
+    if 'Ip' in vars(chdata):
+        monkeypatch.delattr(chdata, 'Ip')
+    monkeypatch.setitem(chdata._loaders, 'Ip', failed)
+    if error is KeyError:
+        monkeypatch.delenv('XUVTOP', raising=False)
+    else:
+        monkeypatch.setenv('XUVTOP', str(tmpdir))
+    # the warnings of the missing database are kept
+    with pytest.warns(UserWarning):
+        assert not hasattr(chdata, 'Ip')
+    assert getattr(chdata, 'Ip', None) is None
+    with pytest.raises(AttributeError) as info:
+        chdata.Ip
+    assert isinstance(info.value.__cause__, error)
+
+
+def test_abundance_reads_one_file(reads):
+    abundance = chdata.Abundance
+    names = sorted(chdata.AbundanceList)
+    assert len(names) > 1
+    assert sorted(abundance) == names
+    assert len(abundance) == len(names)
+    # listing the names reads none of the files
+    assert [one for one in reads if one[0] == 'abundanceRead'] == []
+    info = abundance[names[-1]]
+    assert [one[2] for one in reads if one[0] == 'abundanceRead'] == [{'abundancename':names[-1]}]
+    assert abundance[names[-1]] is info
+    assert len([one for one in reads if one[0] == 'abundanceRead']) == 1
+    with pytest.raises(KeyError):
+        abundance['no_such_file']
@@ -0,0 +1,95 @@
+"""
+Tests of FortranRecordReader.read_many with the formats of the readers of ChiantiPy.tools.io
+"""
+import numpy as np
+import pytest
+
+from ChiantiPy.fortranformat import FortranRecordReader
+
+wgfa_format = '(2i5,f15.3,2e15.3)'
+wgfa_records = ['%5i%5i%15.3f%15.3e%15.3e'%(one) for one in [(1, 2, 1031.912, 0.132, 4.16e+8),
+    (1, 3, -1037.613, 0.065, 4.09e+8), (2, 3, 0., 0., 1.e-3)]]
+
+test_formats = [
+    (wgfa_format, wgfa_records),
+    ('i7,a30,a5,i5,a5,f5.1,2f15.3', ['%7i%30s%5s%5i%5s%5.1f%15.3f%15.3f'%(one) for one in [
+        (1, '1s2.2s', '2S', 2, 'S', 0.5, 0., 0.),
+        (2, '1s2.2p', '2P', 2, 'P', 0.5, 96375., 96390.123),
+        (3, '1s2.2p', '2P', 2, 'P', 1.5, 96907.5, -1.)]]),
+    ('(2i7,e12.2,a30,3x,a30)', ['%7i%7i%12.2e%30s - %30s'%(one) for one in [
+        (1, 12, 1.23e+12, '1s2.2s 2S0.5', '1s2.3d 2D1.5'),
+        (2, 12, 4.56e+10, '1s2.2p 2P0.5', '1s2.4f 2F2.5')]]),
+    ('2i3,5e10.2', ['%3i%3i'%(8, stage) + 5*'%10.2e'%values for stage, values in [
+        (6, (1.e-5, 2.3e-3, 0.1, 0.5, 0.02)), (7, (0., 0., 1.e-20, 3.e-3, 0.97))]]),
+    ('3i3,3e10.3', ['%3i%3i%3i%10.3e%10.3e%10.3e'%(one) for one in [
+        (1, 2, 1, 0.1234, 9.82, 1.5), (1, 3, 2, 0.05, 9.99, 2.)]]),
+    ('6x,3i3,3e10.3', ['%3i%3i%3i%3i%3i%10.3e%10.3e%10.3e'%(one) for one in [
+        (8, 6, 1, 2, 1, 0.1234, 9.82, 1.5), (8, 6, 1, 3, 2, 0.05, 9.99, 2.)]]),
+    ('5e10.3', [5*'%10.3e'%(one) for one in [(1., 2., 3., 4., 5.), (0.15, -0.025, 30., 0., 7.25)]]),
+    ]
+
+# records that the compiled reader can not slice and that are read one at a time
+irregular_records = [
+    # a blank record
+    '',
+    # a short record, the missing fields are blank
+    wgfa_records[0][:25],
+    # implied decimal points of an F field and of an E field
+    '%5i%5i%15s%15.3e%15s'%(1, 2, '1031912', 0.132, '4160'),
+    # a D exponent
+    wgfa_records[0].replace('e', 'D'),
+    # blanks inside an integer
+    '%5s%5i%15.3f%15.3e%15.3e'%('1  2', 2, 1031.912, 0.132, 4.16e+8),
+    ]
+
+
+def same_value(value, other):
+    """
+    Whether a value of read_many is the value of read.
+    """
+    if other is None:
+        return value is None
+    if isinstance(other, float):
+        return isinstance(value, float) and (value == other or (np.isnan(value) and np.isnan(other)))
+    return type(value) is type(other) and value == other
+
+
+def check_read_many(fmt, records):
+    reader = FortranRecordReader(fmt)
+    columns = reader.read_many(records)
+    rows = [FortranRecordReader(fmt).read(one) for one in records]
+    assert len(columns) == len(rows[0])
+    for column in columns:
+        assert len(column) == len(records)
+    for irow, row in enumerate(rows):
+        for icol, value in enumerate(row):
+            # the values of the arrays are numpy scalars or strings
+            many = columns[icol][irow]
+            if isinstance(many, np.generic):
+                many = many.item()
+            assert same_value(many, value), (fmt, records[irow], icol, many, value)
+    return columns
+
+
+@pytest.mark.parametrize('fmt,records', test_formats)
+def test_read_many(fmt, records):
+    columns = check_read_many(fmt, records)
+    # the regular records are compiled into arrays of numbers and strings
+    for column in columns:
+        assert column.dtype.kind in 'iufU'
+
+
+@pytest.mark.parametrize('record', irregular_records)
+def test_read_many_irregular(record):
+    check_read_many(wgfa_format, wgfa_records + [record])
+
+
+def test_read_many_trailing_newlines():
+    columns = FortranRecordReader(wgfa_format).read_many([one + '\r\n' for one in wgfa_records])
+    assert np.array_equal(columns[2], [1031.912, -1037.613, 0.])
+
+
+def test_read_many_empty():
+    columns = FortranRecordReader(wgfa_format).read_many([])
+    assert len(columns) == 5
+    assert all(len(column) == 0 for column in columns)
@@ -0,0 +1,146 @@
+"""
+Tests for the readers and writers of ChiantiPy.tools.io
+"""
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import ChiantiPy.tools.io as io
+import ChiantiPy.tools.util as util
+import ChiantiPy.tools.cache as chcache
+
+test_ions = ['o_5', 'o_6']
+
+
+def same_info(info, other):
+    """
+    Whether two dicts of masterListInfo are the same.
+    """
+    if sorted(info) != sorted(other):
+        return False
+    return all(np.array_equal(info[akey], other[akey]) if isinstance(info[akey], np.ndarray) else info[akey] == other[akey] for akey in info)
+
+
+@pytest.fixture
+def small_database(tmpdir, monkeypatch):
+    """
+    A copy of the parts of the database that masterListInfo reads, for two ions.
+    """
+    xuvtop = os.environ['XUVTOP']
+    new = tmpdir.mkdir('xuvtop')
+    shutil.copy(os.path.join(xuvtop, 'VERSION'), str(new))
+    new.mkdir('ioneq')
+    shutil.copy(os.path.join(xuvtop, 'ioneq', 'chianti.ioneq'), str(new.join('ioneq')))
+    new.mkdir('masterlist').join('masterlist.ions').write(''.join(['%-10s; test\n'%(one) for one in test_ions]))
+    for one in test_ions:
+        wgfa = util.ion2filename(one) + '.wgfa'
+        target = new.join(os.path.relpath(os.path.dirname(wgfa), xuvtop))
+        target.ensure(dir=True)
+        shutil.copy(wgfa, str(target))
+    monkeypatch.setenv('XUVTOP', str(new))
+    monkeypatch.setenv('HOME', str(tmpdir.mkdir('home')))
+    # the readers parse the files of the copy
+    monkeypatch.setattr(chcache, '_theCache', False)
+    return new
+
+
+@pytest.fixture
+def wvl_reads(monkeypatch):
+    """
+    Record the ions whose wgfa files masterListInfo reads.
+    """
+    reads = []
+    wvlRange = io._wvlRange
+
+    def recorded(ions):
+        reads.append(ions)
+        return wvlRange(ions)
+    monkeypatch.setattr(io, '_wvlRange', recorded)
+    return reads
+
+
+def test_masterlist_info(small_database, wvl_reads, monkeypatch):
+    # without proc the wgfa files are read in this process
+    import multiprocessing
+
+    def noPool(*args, **kwargs):
+        raise AssertionError('a pool was started')
+    monkeypatch.setattr(multiprocessing, 'Pool', noPool)
+    info = io.masterListInfo()
+    assert sorted(wvl_reads) == test_ions
+    assert 'sources' not in info
+    for one in test_ions:
+        wvl = np.abs(np.asarray(io.wgfaRead(one)['wvl']))
+        wvl = wvl[wvl > 0.]
+        assert info[one]['wmin'] == wvl.min()
+        assert info[one]['wmax'] == wvl.max()
+        assert info[one]['tmax'] >= info[one]['tmin'] > 0.
+    assert small_database.join('masterlist', 'masterlist_ions.pkl').check()
+    # an up to date index is not made again
+    del wvl_reads[:]
+    assert same_info(io.masterListInfo(), info)
+    assert wvl_reads == []
+
+
+def test_masterlist_info_reads_changed_wgfa(small_database, wvl_reads):
+    info = io.masterListInfo()
+    del wvl_reads[:]
+    wgfa = util.ion2filename(test_ions[1]) + '.wgfa'
+    st = os.stat(wgfa)
+    os.utime(wgfa, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    newInfo = io.masterListInfo()
+    assert wvl_reads == [test_ions[1]]
+    assert same_info(newInfo, info)
+
+
+def test_masterlist_info_read_only(small_database, wvl_reads, monkeypatch):
+    access = os.access
+    infoPath = str(small_database.join('masterlist'))
+
+    def readOnly(path, mode, **kwargs):
+        if path == infoPath:
+            return False
+        return access(path, mode, **kwargs)
+    monkeypatch.setattr(os, 'access', readOnly)
+    info = io.masterListInfo()
+    userName = os.path.join(io.defaultsRead()['cachedir'], 'masterlist_ions.pkl')
+    assert os.path.isfile(userName)
+    assert not small_database.join('masterlist', 'masterlist_ions.pkl').check()
+    # the index in the cachedir is used
+    del wvl_reads[:]
+    assert same_info(io.masterListInfo(), info)
+    assert wvl_reads == []
+
+
+def test_wvl_range_without_wgfa(small_database, capsys):
+    os.remove(util.ion2filename(test_ions[0]) + '.wgfa')
+    assert io._wvlRange(test_ions[0]) == (test_ions[0], 0., 1.e+30)
+    assert test_ions[0] in capsys.readouterr().out
+
+
+def test_cireclvl_unparsed_entry(tmpdir, monkeypatch):
+    monkeypatch.setattr(chcache, '_theCache', False)
+    rrlvl = tmpdir.join('c_5.rrlvl')
+    rrlvl.write(''.join([
+        '    6    5    1    2 1.00e+03 1.00e+04 1.00e+05\n',
+        '    6    5    1    2 3.00e-12 2.00e-12 1.00e-12\n',
+        '    6    5    1    3 1.00e+03 1.00e+04\n',
+        '    6    5    1    3 5.00e-13 4.00e-13\n',
+        ' -1\n',
+        'a reference\n',
+        ' -1\n']))
+    info = io.cireclvlRead('c_5', filename=str(tmpdir.join('c_5')), filetype='rrlvl')
+    assert np.array_equal(info['lvl2'], [2, 3])
+    assert np.array_equal(info['temperature'][1], [1.e+3, 1.e+4, 1.e+3])
+    assert np.array_equal(info['rate'][1], [5.e-13, 4.e-13, 5.e-13])
+    # an entry that does not parse as part of the whole file is parsed line by line
+    fromstring = np.fromstring
+
+    def stopped(text, *args, **kwargs):
+        return fromstring(text, *args, **kwargs)[:-1]
+    monkeypatch.setattr(io.np, 'fromstring', stopped)
+    other = io.cireclvlRead('c_5', filename=str(tmpdir.join('c_5')), filetype='rrlvl')
+    for akey in ['temperature', 'ntemp', 'lvl1', 'lvl2', 'rate', 'rateSecond']:
+        assert np.array_equal(other[akey], info[akey]), akey
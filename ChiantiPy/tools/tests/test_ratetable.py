@@ -0,0 +1,71 @@
+"""
+Tests for the rate tables of ChiantiPy.tools.ratetable
+"""
+import numpy as np
+import pytest
+
+import ChiantiPy.tools.io as io
+import ChiantiPy.tools.cache as chcache
+import ChiantiPy.tools.ratetable as ratetable
+from ChiantiPy.core import ion
+
+test_ion = 'o_6'
+temperature = np.logspace(5, 8, 20)
+# a coarse grid keeps the tables of the cache tests short
+test_grid = (4., 7., 0.05)
+
+
+@pytest.fixture
+def cache(tmpdir, monkeypatch):
+    """
+    An empty cache and no tables made in this process.
+    """
+    cache = chcache.atomicCache(str(tmpdir.join('cache')), version=io.versionRead())
+    monkeypatch.setattr(chcache, '_theCache', cache)
+    monkeypatch.setattr(ratetable, '_tables', {})
+    return cache
+
+
+def test_rate_table():
+    table = ratetable.rateTable(test_ion)
+    # at the knots of the table the rates are those of the ion
+    knots = 10.**table['logTemperature'][200:260:7]
+    rates = ratetable.rates(test_ion, knots)
+    _tmp_ion = ion(test_ion, temperature=knots, setup=False)
+    _tmp_ion.ionizRate()
+    _tmp_ion.recombRate()
+    assert np.allclose(rates['ioniz'], _tmp_ion.IonizRate['rate'], rtol=1.e-10, atol=0.)
+    assert np.allclose(rates['recomb'], _tmp_ion.RecombRate['rate'], rtol=1.e-10, atol=0.)
+    # between them the rates are interpolated, outside of the table they are calculated
+    outside = np.append(temperature, 10.**(table['logTemperature'][-1] + 0.5))
+    rates = ratetable.rates(test_ion, outside)
+    _tmp_ion = ion(test_ion, temperature=outside, setup=False)
+    _tmp_ion.ionizRate()
+    _tmp_ion.recombRate()
+    assert np.allclose(rates['ioniz'], _tmp_ion.IonizRate['rate'], rtol=1.e-3, atol=0.)
+    assert np.allclose(rates['recomb'], _tmp_ion.RecombRate['rate'], rtol=1.e-3, atol=0.)
+    assert rates['ioniz'][-1] == _tmp_ion.IonizRate['rate'][-1]
+
+
+def test_cached_table(cache, monkeypatch):
+    inside = temperature[temperature < 10.**test_grid[1]]
+    built = ratetable.rateTable(test_ion, grid=test_grid)
+    fromMemory = ratetable.rates(test_ion, inside, grid=test_grid)
+    assert len(cache.entries()) >= 1
+    # a new process finds the table in the cache instead of calculating the rates
+    monkeypatch.setattr(ratetable, '_tables', {})
+
+    def calculated(*args, **kwargs):
+        raise AssertionError(' the rates were calculated again')
+    monkeypatch.setattr(ratetable, 'directRates', calculated)
+    cached = ratetable.rateTable(test_ion, grid=test_grid)
+    assert cached is not built
+    assert sorted(cached) == sorted(built)
+    for akey in built:
+        if isinstance(built[akey], np.ndarray):
+            assert np.array_equal(cached[akey], built[akey])
+        else:
+            assert cached[akey] == built[akey]
+    fromCache = ratetable.rates(test_ion, inside, grid=test_grid)
+    for akey in ['ioniz', 'recomb']:
+        assert np.array_equal(fromCache[akey], fromMemory[akey])
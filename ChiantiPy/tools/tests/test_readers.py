@@ -0,0 +1,277 @@
+"""
+Tests of the whole-file readers of ChiantiPy.tools.io against line by line parsing.
+
+The references parse the files one line at a time with FortranRecordReader.read and
+build the dicts that the readers of ChiantiPy 0.9.5 returned.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import ChiantiPy.tools.io as io
+import ChiantiPy.tools.util as util
+import ChiantiPy.tools.constants as const
+import ChiantiPy.tools.cache as chcache
+from ChiantiPy.fortranformat import FortranRecordReader
+
+from .test_cache import same_data
+
+
+def data_files(ext):
+    """
+    Return the ions that have a file of type `ext` in the test database.
+    """
+    ions = []
+    for dirpath, dirnames, fileNames in os.walk(os.environ['XUVTOP']):
+        for fileName in fileNames:
+            rootName, fileExt = os.path.splitext(fileName)
+            if fileExt == '.' + ext and rootName == os.path.basename(dirpath):
+                ions.append(rootName)
+    return sorted(ions)
+
+
+def data_length(lines):
+    """
+    Return the number of lines before the first line with fewer than two entries.
+    """
+    ndata = 0
+    while len(lines[ndata].split()) > 1:
+        ndata += 1
+    return ndata
+
+
+def read_lines(fname):
+    with open(fname) as inpt:
+        return inpt.readlines()
+
+
+def line_elvlc(ions, useTh=True):
+    fname = util.ion2filename(ions) + '.elvlc'
+    lines = read_lines(fname)
+    nlvls = data_length(lines)
+    reader = FortranRecordReader('i7,a30,a5,i5,a5,f5.1,2f15.3')
+    info = {akey:[] for akey in ['lvl', 'term', 'label', 'spin', 'spd', 'l', 'j', 'mult', 'ecm', 'ecmth', 'pretty']}
+    for aline in lines[:nlvls]:
+        lvl, term, label, spin, spd, j, ecm, ecmth = reader.read(aline[0:115])
+        if ecm < 0. and useTh:
+            ecm = ecmth
+        for akey, value in zip(['lvl', 'term', 'label', 'spin', 'spd', 'l', 'j', 'mult', 'ecm', 'ecmth'],
+                [lvl, term.strip(), label, spin, spd.strip(), const.Spd.index(spd.strip()), j, 2.*j + 1., ecm, ecmth]):
+            info[akey].append(value)
+        info['pretty'].append((term.strip() + ' %1i%1s%3.1f'%(spin, spd.strip(), j)).strip())
+    info['conf'] = [0]*nlvls
+    info['eryd'] = [one*const.invCm2ryd if one >= 0. else -1. for one in info['ecm']]
+    info['erydth'] = [one*const.invCm2ryd if one >= 0. else -1. for one in info['ecmth']]
+    info['ref'] = [aline.strip() for aline in lines[nlvls+1:]]
+    info['status'] = 1
+    info['filename'] = fname
+    return info
+
+
+def line_wgfa(ions, total=False):
+    fname = util.ion2filename(ions) + '.wgfa'
+    lines = read_lines(fname)
+    nwvl = data_length(lines)
+    reader = FortranRecordReader('(2i5,f15.3,2e15.3)')
+    rows = [reader.read(aline) for aline in lines[:nwvl]]
+    info = {akey:[row[i] for row in rows] for i, akey in enumerate(['lvl1', 'lvl2', 'wvl', 'gf', 'avalue'])}
+    info['ref'] = [aline.strip() for aline in lines[nwvl+1:]]
+    info['ionS'] = ions
+    info['filename'] = fname
+    if total:
+        avalueLvl = [0.]*max(info['lvl2'])
+        for lvl2, avalue in zip(info['lvl2'], info['avalue']):
+            avalueLvl[lvl2 - 1] += avalue
+        info['avalueLvl'] = np.asarray(avalueLvl)
+    if os.path.isfile(util.ion2filename(ions) + '.elvlc'):
+        elvlc = line_elvlc(ions)
+        info['pretty1'] = [elvlc['pretty'][elvlc['lvl'].index(one)] for one in info['lvl1']]
+        info['pretty2'] = [elvlc['pretty'][elvlc['lvl'].index(one)] for one in info['lvl2']]
+    return info
+
+
+def line_auto(ions, total=True):
+    fname = util.ion2filename(ions) + '.auto'
+    lines = read_lines(fname)
+    nauto = data_length(lines)
+    reader = FortranRecordReader('(2i7,e12.2,a30,3x,a30)')
+    rows = [reader.read(aline) for aline in lines[:nauto]]
+    info = {akey:[row[i] for row in rows] for i, akey in enumerate(['lvl1', 'lvl2', 'avalue'])}
+    info['pretty1'] = [row[3].strip() for row in rows]
+    info['pretty2'] = [row[4].strip() for row in rows]
+    info['ref'] = [aline.strip() for aline in lines[nauto+1:]]
+    info['ionS'] = ions
+    info['filename'] = fname
+    if total:
+        avalueLvl = [0.]*max(info['lvl2'])
+        for lvl2, avalue in zip(info['lvl2'], info['avalue']):
+            avalueLvl[lvl2 - 1] += avalue
+        info['avalueLvl'] = np.asarray(avalueLvl)
+    return info
+
+
+def line_scups(ions):
+    lines = read_lines(util.ion2filename(ions) + '.scups')
+    counter = 0
+    while '-1' not in lines[counter][:4]:
+        counter += 1
+    info = {akey:[] for akey in ['lvl1', 'lvl2', 'de', 'gf', 'lim', 'ntemp', 'ttype', 'cups', 'btemp', 'bscups']}
+    for itrans in range(counter//3):
+        ll1 = lines[3*itrans].split()
+        for akey, value in zip(['lvl1', 'lvl2', 'de', 'gf', 'lim', 'ntemp', 'ttype', 'cups'],
+                [int(ll1[0]), int(ll1[1]), float(ll1[2]), float(ll1[3]), float(ll1[4]), int(ll1[5]), int(ll1[6]), float(ll1[7])]):
+            info[akey].append(value)
+        info['btemp'].append(np.asarray(lines[3*itrans+1].split(), np.float64))
+        info['bscups'].append(np.asarray(lines[3*itrans+2].split(), np.float64))
+    info['ions'] = ions
+    info['ntrans'] = counter/3
+    info['ref'] = [aline.strip('\n') for aline in lines[counter+1:-1]]
+    return info
+
+
+def line_psplups(ions):
+    fname = util.ion2filename(ions) + '.psplups'
+    lines = read_lines(fname)
+    nsplups = data_length(lines)
+    reader = FortranRecordReader('3i3,3e10.3')
+    rows = [reader.read(aline) for aline in lines[:nsplups]]
+    info = {akey:[row[i] for row in rows] for i, akey in enumerate(['lvl1', 'lvl2', 'ttype'])}
+    for i, akey in enumerate(['gf', 'de', 'cups']):
+        info[akey] = np.asarray([row[3 + i] for row in rows], np.float64)
+    info['nspl'] = []
+    info['splups'] = []
+    for aline in lines[:nsplups]:
+        tail = aline[39:].rstrip()
+        info['nspl'].append(len(tail)//10)
+        info['splups'].append(np.asarray(FortranRecordReader(str(len(tail)//10) + 'e10.3').read(tail), np.float64))
+    info['ref'] = [aline[:-1].strip() for aline in lines[nsplups+1:]]
+    info['filename'] = fname
+    return info
+
+
+def line_cireclvl(ions, filetype):
+    lines = read_lines(util.ion2filename(ions) + '.' + filetype)
+    ndata = 0
+    while lines[ndata][0:5].find('-1') < 0:
+        ndata += 1
+    ntrans = ndata//2
+    tRows = [np.asarray(lines[i].split()[4:], np.float64) for i in range(0, ndata, 2)]
+    rateRows = [lines[i].split() for i in range(1, ndata, 2)]
+    ntemp = np.asarray([row.size for row in tRows], 'int32')
+    maxNtemp = ntemp.max()
+    temperature = np.asarray([np.resize(row, maxNtemp) for row in tRows])
+    if filetype != 'rrlvl':
+        temperature = 10.**temperature
+    return {'temperature':temperature, 'ntemp':ntemp,
+        'lvl1':np.asarray([int(row[2]) for row in rateRows], 'int64'),
+        'lvl2':np.asarray([int(row[3]) for row in rateRows], 'int64'),
+        'rate':np.asarray([np.resize(np.asarray(row[4:], np.float64), maxNtemp) for row in rateRows]).reshape(ntrans, maxNtemp),
+        'ref':lines[ndata+1:], 'ionS':ions}
+
+
+def line_ioneq(ioneqName, minIoneq=1.e-20):
+    lines = read_lines(os.path.join(os.environ['XUVTOP'], 'ioneq', ioneqName + '.ioneq'))
+    nTemperature, nElement = [int(one) for one in lines[0].split()]
+    ioneqTemperature = 10.**np.asarray(FortranRecordReader(str(nTemperature) + 'f6.2').read(lines[1]), np.float64)
+    nlines = 0
+    while lines[nlines][0:5].find('-1') < 0:
+        nlines += 1
+    reader = FortranRecordReader('2i3,' + str(nTemperature) + 'e10.2')
+    ioneqAll = np.zeros((nElement, nElement + 1, nTemperature), np.float64)
+    for aline in lines[2:nlines]:
+        out = reader.read(aline)
+        ioneqAll[out[0] - 1, out[1] - 1] = np.asarray(out[2:], np.float64)
+    ioneqAll = np.where(ioneqAll > minIoneq, ioneqAll, 0.)
+    return {'ioneqname':ioneqName, 'ioneqAll':ioneqAll, 'ioneqTemperature':ioneqTemperature,
+        'ioneqRef':[aline[:-1] for aline in lines[nlines+1:]]}
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    """
+    Parse the files instead of taking them from the cache.
+    """
+    monkeypatch.setattr(chcache, '_theCache', False)
+
+
+def check_same(info, line):
+    """
+    Check that the values of a reader are those of the line by line reference.
+
+    The readers may return more keys than the readers of 0.9.5, e.g. the flat arrays
+    and the second derivatives of the splines.
+    """
+    for akey in line:
+        assert akey in info, akey
+        assert same_data(info[akey], line[akey]), akey
+
+
+@pytest.mark.parametrize('ions', data_files('elvlc'))
+@pytest.mark.parametrize('useTh', [True, False])
+def test_elvlc(ions, useTh):
+    check_same(io.elvlcRead(ions, useTh=useTh), line_elvlc(ions, useTh=useTh))
+
+
+@pytest.mark.parametrize('ions', data_files('wgfa'))
+@pytest.mark.parametrize('total', [False, True])
+def test_wgfa(ions, total):
+    check_same(io.wgfaRead(ions, total=total), line_wgfa(ions, total=total))
+
+
+@pytest.mark.parametrize('ions', data_files('auto'))
+@pytest.mark.parametrize('total', [False, True])
+def test_auto(ions, total):
+    check_same(io.autoRead(ions, total=total), line_auto(ions, total=total))
+
+
+@pytest.mark.parametrize('ions', data_files('scups'))
+def test_scups(ions):
+    check_same(io.scupsRead(ions), line_scups(ions))
+
+
+@pytest.mark.parametrize('ions', data_files('psplups'))
+def test_psplups(ions):
+    check_same(io.splupsRead(ions, filetype='psplups'), line_psplups(ions))
+
+
+@pytest.mark.parametrize('ions,filetype', [(one, ext) for ext in ['cilvl', 'reclvl', 'rrlvl'] for one in data_files(ext)])
+def test_cireclvl(ions, filetype):
+    check_same(io.cireclvlRead(ions, filetype=filetype), line_cireclvl(ions, filetype))
+
+
+@pytest.mark.parametrize('ioneqName', ['chianti'])
+def test_ioneq(ioneqName):
+    check_same(io.ioneqRead(ioneqName=ioneqName), line_ioneq(ioneqName))
+
+
+@pytest.mark.parametrize('ions,filetype', [(one, 'scups') for one in data_files('scups')] + [(one, 'psplups') for one in data_files('psplups')])
+def test_spline_table(ions, filetype):
+    if filetype == 'scups':
+        info = io.scupsRead(ions)
+        line = line_scups(ions)
+        lineKnots = line['btemp']
+        lineValues = line['bscups']
+        slices = [(info['btemp'], info['btempFlat']), (info['bscups'], info['bscupsFlat'])]
+    else:
+        info = io.splupsRead(ions, filetype=filetype)
+        line = line_psplups(ions)
+        lineValues = line['splups']
+        lineKnots = [np.linspace(0., 1., one.size) if one.size > 1 else np.zeros(1) for one in lineValues]
+        slices = [(info['splups'], info['splupsFlat'])]
+    table = io.splineTable(info)
+    offsets = table['offsets']
+    assert offsets[0] == 0 and offsets[-1] == table['values'].size == table['knots'].size
+    assert np.array_equal(np.diff(offsets), [one.size for one in lineValues])
+    assert np.array_equal(table['ntemp'], np.diff(offsets))
+    for i in range(len(lineValues)):
+        assert np.array_equal(table['values'][offsets[i]:offsets[i+1]], lineValues[i])
+        assert np.allclose(table['knots'][offsets[i]:offsets[i+1]], lineKnots[i], rtol=1.e-14, atol=1.e-15)
+    # the lists of the reader are the slices of its flat arrays
+    for sliced, flat in slices:
+        for i, one in enumerate(sliced):
+            assert one.base is flat or one.base is flat.base
+            assert np.array_equal(one, flat[offsets[i]:offsets[i+1]])
+    # the second derivatives kept by the reader are those of the splines of the table
+    second = util.cubicSplineSecondFlat(table['knots'], table['values'], offsets)
+    assert np.allclose(table['second'], second, rtol=1.e-12, atol=1.e-12*np.abs(second).max())
@@ -0,0 +1,140 @@
+"""
+Tests for the HDF5 store of ChiantiPy.tools.store
+"""
+import os
+import queue
+
+import numpy as np
+import pytest
+
+pytest.importorskip('h5py')
+
+from ChiantiPy.core import ion
+import ChiantiPy.tools.io as io
+import ChiantiPy.tools.util as util
+import ChiantiPy.tools.cache as chcache
+import ChiantiPy.tools.store as chstore
+
+from .test_cache import same_data
+
+test_ion = 'o_6'
+temperature = np.logspace(5, 6.5, 5)
+density = 1.e+9
+
+
+@pytest.fixture
+def no_store(monkeypatch):
+    """
+    Read the ASCII files, without a cache or a store, and forget the stores opened by a test.
+    """
+    monkeypatch.setattr(chcache, '_theCache', False)
+    monkeypatch.setattr(chstore, '_theStore', False)
+    monkeypatch.setattr(chstore, '_openStores', {})
+    yield
+    for store in chstore._openStores.values():
+        store.close()
+
+
+@pytest.fixture
+def store_name(tmpdir, no_store):
+    """
+    A store of the test database.
+    """
+    return chstore.makeStore(str(tmpdir.join('chianti.h5')))
+
+
+def use_store(store_name, monkeypatch):
+    """
+    Use the store and return the list of the readers whose results were not in it.
+    """
+    chstore.setStore(store_name)
+    store = chstore.getStore()
+    assert store is not None and store.StoreName == store_name
+    missed = []
+    load = store.load
+
+    def recorded(reader, filenames, options=None):
+        info = load(reader, filenames, options)
+        if info is None:
+            missed.append(reader)
+        return info
+    monkeypatch.setattr(store, 'load', recorded)
+    return missed
+
+
+def test_store_readers(store_name, monkeypatch):
+    parsed = [io.wgfaRead(test_ion), io.scupsRead(test_ion), io.elvlcRead(test_ion)]
+    missed = use_store(store_name, monkeypatch)
+    stored = [io.wgfaRead(test_ion), io.scupsRead(test_ion), io.elvlcRead(test_ion)]
+    assert missed == []
+    for one, two in zip(parsed, stored):
+        assert same_data(one, two)
+    # the arrays of the readers are views of the memory map of the store
+    assert isinstance(stored[1]['btempFlat'], np.ndarray)
+    assert not stored[1]['btempFlat'].flags.owndata
+
+def test_store_populations(store_name, monkeypatch):
+    parsed = ion(test_ion, temperature=temperature, eDensity=density)
+    parsed.populate()
+    missed = use_store(store_name, monkeypatch)
+    stored = ion(test_ion, temperature=temperature, eDensity=density)
+    stored.populate()
+    assert missed == []
+    assert np.array_equal(parsed.Population['population'], stored.Population['population'])
+
+
+def test_store_version(store_name, monkeypatch, capsys):
+    assert chstore.openStore(store_name) is not None
+    chstore.reset()
+    monkeypatch.setattr(io, 'versionRead', lambda: '0.0')
+    assert chstore.openStore(store_name) is None
+    assert 'run makeStore again' in capsys.readouterr().out
+    chstore.setStore(store_name)
+    assert chstore.getStore() is None
+
+
+def test_shared_store_dirs(tmpdir, no_store, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    with chstore.sharedStore([test_ion]) as storeName:
+        store = chstore.openStore(storeName)
+        # only the ion, its adjacent stages and the global tables are packed
+        assert sorted(store.File['o'].keys()) == ['o_5', 'o_6', 'o_7']
+        assert 'o_3' not in store.File['o']
+        # the files of the other directories are looked up on disk
+        fileName = util.ion2filename('o_3') + '.diparams'
+        assert store.isfile(fileName)
+        assert store.listdir(os.path.dirname(fileName)) == os.listdir(os.path.dirname(fileName))
+    assert not os.path.isfile(storeName)
+
+
+def test_shared_store_worker(tmpdir, no_store, monkeypatch):
+    from ChiantiPy.tools import mputil
+    from ChiantiPy.tools import filters
+    monkeypatch.setenv('HOME', str(tmpdir))
+    wavelength = np.linspace(1000., 1100., 201)
+    job = (test_ion, temperature, np.full(temperature.size, density), wavelength, (filters.gaussianR, 1000.), 1, None, None, 0)
+
+    def runWorker(storeName):
+        inQueue = queue.Queue()
+        outQueue = queue.Queue()
+        inQueue.put(job)
+        inQueue.put('STOP')
+        mputil.doIonQ(inQueue, outQueue, storeName)
+        return outQueue.get()[1]
+    parsed = runWorker(None)
+    missed = []
+    load = chstore.atomicStore.load
+
+    def recorded(self, reader, filenames, options=None):
+        info = load(self, reader, filenames, options)
+        if info is None:
+            missed.append(reader)
+        return info
+    monkeypatch.setattr(chstore.atomicStore, 'load', recorded)
+    with chstore.sharedStore([test_ion]) as storeName:
+        assert storeName is not None
+        stored = runWorker(storeName)
+    assert missed == []
+    assert np.array_equal(parsed.Population['population'], stored.Population['population'])
+    assert np.array_equal(parsed.Intensity['intensity'], stored.Intensity['intensity'])
+    assert np.array_equal(parsed.Spectrum['intensity'], stored.Spectrum['intensity'])
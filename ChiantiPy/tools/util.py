@@ -8,7 +8,6 @@ some functions using os.walk can be replaced by os.path
 """
 import os
 import numpy as np
-from scipy import interpolate
 from scipy.special import expn
 
 import ChiantiPy.tools.constants as const
@@ -376,73 +375,52 @@ def splomDescale(splom, energy):
     Parameters
     ----------
     energy : array-like
-        In eV
+        In eV, of any shape
     splom : `dict`
         Structure returned by `ChiantiPy.tools.io.splomRead`
 
     Returns
     -------
     omega : array-like
-        Collision strength
+        Collision strength, (nsplom,) + the shape of energy, or (nsplom,) for a single energy
+
+    Notes
+    -----
+    All of the transitions are descaled at all of the energies at once.  The second derivatives
+    of the splines are kept by splomRead as splomSecond.
     """
-    #
-    #
+    energy = np.asarray(energy, np.float64)
     nenergy = energy.size
     nsplom = len(splom['deryd'])
     # for these files, there are 5 spline points
     nspl = 5
-    if nenergy > 1:
-        omega = np.zeros((nsplom,nenergy),np.float64)
-    else:
-        omega = np.zeros(nsplom,np.float64)
-    #
     dx = 1./(float(nspl)-1.)
     sxint = dx*np.arange(nspl)  # IDL sx
-    for isplom in range(0,nsplom):
-        #
-        sx1 = energy/(splom['deryd'][isplom]*const.ryd2Ev)  # IDL x_int
-        good = sx1 >= 1.
-        # make sure there are some valid energies above the threshold
-        if good.sum():
-            nbad = nenergy - good.sum()
-            c_curr = splom['c'][isplom]
-            #
-            if splom['ttype'][isplom] == 1:
-                sx = 1. - np.log(c_curr)/np.log(sx1[good] - 1. + c_curr)  # IDL sx_int
-                y2 = interpolate.splrep(sxint,splom['splom'][:, isplom],s=0)  #allow smoothing,s=0)
-                som = interpolate.splev(sx,y2,der=0)
-                omega[isplom, nbad:] = som*np.log(sx1[good] -1. + np.exp(1.))
-            #
-            elif splom['ttype'][isplom] == 2:
-                sx =(sx1[good] - 1.)/(sx1[good] -1. + c_curr)
-                y2 = interpolate.splrep(sxint,splom['splom'][:, isplom],s=0)  #allow smoothing,s=0)
-                som = interpolate.splev(sx,y2,der=0)
-                omega[isplom, nbad:] = som
-            #
-            elif splom['ttype'][isplom] == 3:
-                sx = (sx1[good] - 1.)/(sx1[good] -1. + c_curr)
-                y2 = interpolate.splrep(sxint,splom['splom'][:, isplom],s=0)  #allow smoothing,s=0)
-                som = interpolate.splev(sx,y2,der=0)
-                omega[isplom, nbad:] = som/sx1[good]**2
-            #
-            elif splom['ttype'][isplom] == 4:
-                sx = 1. - np.log(c_curr)/np.log(sx1[good] -1. + c_curr)
-                y2 = interpolate.splrep(sxint,splom['splom'][:, isplom],s=0)  #allow smoothing,s=0)
-                som = interpolate.splev(sx,y2,der=0)
-                omega[isplom, nbad:] = som*np.log(sx1[good] -1. + c_curr)
-            #
-            #
-            #
-            elif splom['ttype'] > 4:
-                print((' splom t_type ne 1,2,3,4 = %4i %4i %4i'%(splom['ttype'],splom['l1'],splom['l2'])))
-        else:
-            # there are no energies above the threshold
-            pass
-    #
-    #
-    omega = np.where(omega > 0.,omega,0.)
-    #
-    return omega
+    knots = np.tile(sxint, (nsplom, 1))
+    values = np.asarray(splom['splom'], np.float64).T
+    if 'splomSecond' in splom:
+        second = splom['splomSecond']
+    else:
+        second = cubicSplineSecond(knots, values)
+    ttype = np.asarray(splom['ttype'], np.int64)
+    for isplom in np.nonzero(ttype > 4)[0]:
+        print((' splom t_type ne 1,2,3,4 = %4i %4i %4i'%(ttype[isplom], splom['lvl1'][isplom], splom['lvl2'][isplom])))
+    ttype = ttype[:, np.newaxis]
+    c_curr = np.asarray(splom['c'], np.float64)[:, np.newaxis]
+    # the (nsplom, nenergy) energies in threshold units
+    sx1 = energy.ravel()[np.newaxis]/(np.asarray(splom['deryd'], np.float64)[:, np.newaxis]*const.ryd2Ev)  # IDL x_int
+    # only the energies above the threshold
+    good = sx1 >= 1.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sx = np.where((ttype == 1) | (ttype == 4), 1. - np.log(c_curr)/np.log(sx1 - 1. + c_curr),
+            (sx1 - 1.)/(sx1 - 1. + c_curr))  # IDL sx_int
+        som = cubicSplineEval(knots, values, second, np.where(good, sx, 0.5))
+        omega = np.select([ttype == 1, ttype == 2, ttype == 3, ttype == 4],
+            [som*np.log(sx1 - 1. + np.exp(1.)), som, som/sx1**2, som*np.log(sx1 - 1. + c_curr)], 0.)
+    omega = np.where(good & (omega > 0.), omega, 0.)
+    if nenergy > 1:
+        return omega.reshape((nsplom,) + energy.shape)
+    return omega[:, 0]
 
 
 def dilute(radius):
@@ -744,3 +722,405 @@ def scale_classical(inDict, ip):
     else:
         print(' input dict does not have the correct keys')
     return
+
+
+def popSolve(rad, rows, cols, values, norm, maxMemory=256.):
+    """
+    Solve the rate equations of the level populations at many temperatures and densities.
+
+    The matrices of as many points as fit into `maxMemory` are built as one stacked array
+    and solved with a single call of np.linalg.solve.
+
+    Parameters
+    ----------
+    rad : `numpy.ndarray`
+        the (nmat, nmat) rate matrix of the terms that do not depend on temperature and density
+    rows, cols : `numpy.ndarray`
+        the row and column of each of the other terms
+    values : `numpy.ndarray`
+        the (nterms, npoints) values of these terms at each point
+    norm : `numpy.ndarray`
+        the last row of the matrix, normalizing the populations
+    maxMemory : `float`
+        the largest size of the stacked matrices, in megabytes
+
+    Returns
+    -------
+    fullPop : `numpy.ndarray`
+        the (npoints, nmat) populations, zero where the matrix is singular
+    failed : `list`
+        the indices of the points where the matrix is singular
+    popmat : `numpy.ndarray`
+        the matrix of the last point
+
+    Notes
+    -----
+    If the matrix of some point in a chunk is singular, the points of that chunk are
+    solved one at a time.
+    """
+    nmat = rad.shape[0]
+    npoints = values.shape[1]
+    size = nmat*nmat
+    chunk = int(max(1, min(npoints, maxMemory*1.e+6//(2*8*size))))
+    b = np.zeros(nmat, np.float64)
+    b[nmat-1] = 1.
+    fullPop = np.zeros((npoints, nmat), np.float64)
+    failed = []
+    # the position of each term in the flattened matrix
+    flat = rows*nmat + cols
+    for start in range(0, npoints, chunk):
+        stop = min(npoints, start + chunk)
+        popmat = np.tile(rad.ravel(), stop - start)
+        if len(flat):
+            # the terms are added in the same order at each point
+            offset = np.arange(stop - start)*size
+            np.add.at(popmat, (offset[:, np.newaxis] + flat).ravel(), values[:, start:stop].T.ravel())
+        popmat = popmat.reshape(stop - start, nmat, nmat)
+        popmat[:, nmat-1] = norm
+        try:
+            fullPop[start:stop] = np.linalg.solve(popmat, np.tile(b, (stop - start, 1))[..., np.newaxis])[..., 0]
+        except np.linalg.LinAlgError:
+            for i in range(stop - start):
+                try:
+                    fullPop[start + i] = np.linalg.solve(popmat[i], b)
+                except np.linalg.LinAlgError:
+                    failed.append(start + i)
+    return fullPop, failed, popmat[-1]
+
+
+# popSolver chooses the sparse solver for at least this many levels and at most this fraction of nonzero terms
+sparseLevels = 1000
+sparseFill = 0.05
+
+
+def popSolver(nmat, rows, cols):
+    """
+    Choose the solver of the rate equations, 'sparse' for large and sparse matrices, 'dense' otherwise.
+
+    Parameters
+    ----------
+    nmat : `int`
+        the size of the rate matrix
+    rows, cols : `numpy.ndarray`
+        the row and column of each term of the matrix
+    """
+    if nmat < sparseLevels:
+        return 'dense'
+    nonzero = np.unique(rows*nmat + cols).size + nmat
+    if nonzero > sparseFill*nmat**2:
+        return 'dense'
+    return 'sparse'
+
+
+def popSolveSparse(radRows, radCols, radValues, rows, cols, values, norm, iterative=False, rtol=1.e-10, atol=1.e-16, maxiter=20):
+    """
+    Solve the rate equations of the level populations with sparse matrices.
+
+    Parameters
+    ----------
+    radRows, radCols, radValues : `numpy.ndarray`
+        the row, column and value of the terms that do not depend on temperature and density
+    rows, cols : `numpy.ndarray`
+        the row and column of each of the other terms
+    values : `numpy.ndarray`
+        the (nterms, npoints) values of these terms at each point
+    norm : `numpy.ndarray`
+        the last row of the matrix, normalizing the populations
+    iterative : `bool`
+        if True, the solution of each point is refined from that of the previous point with
+        the LU factorization of an earlier point, which is only renewed when the refinement
+        does not converge, otherwise each point is factorized
+    rtol, atol : `float`
+        the refinement stops when the change of each population is less than
+        rtol times the population plus atol
+    maxiter : `int`
+        the largest number of refinement steps
+
+    Returns
+    -------
+    fullPop : `numpy.ndarray`
+        the (npoints, nmat) populations, zero where the matrix is singular
+    failed : `list`
+        the indices of the points where the matrix is singular
+    popmat : `scipy.sparse.csc_matrix`
+        the matrix of the last point
+    """
+    from scipy import sparse
+    from scipy.sparse.linalg import splu
+    nmat = norm.size
+    npoints = values.shape[1]
+    # the last row is replaced by the normalization
+    keepRad = radRows != nmat - 1
+    keep = rows != nmat - 1
+    normCols = np.arange(nmat)
+    allRows = np.concatenate([radRows[keepRad], rows[keep], np.full(nmat, nmat - 1)])
+    allCols = np.concatenate([radCols[keepRad], cols[keep], normCols])
+    # the position of each term among the nonzero elements, in column major order
+    position, inverse = np.unique(allCols*nmat + allRows, return_inverse=True)
+    indices = position % nmat
+    indptr = np.searchsorted(position//nmat, np.arange(nmat + 1))
+    constant = np.bincount(inverse[:keepRad.sum()], weights=radValues[keepRad], minlength=position.size)
+    constant += np.bincount(inverse[allRows.size - nmat:], weights=norm, minlength=position.size)
+    varying = inverse[keepRad.sum():allRows.size - nmat]
+    values = values[keep]
+    b = np.zeros(nmat, np.float64)
+    b[nmat-1] = 1.
+    fullPop = np.zeros((npoints, nmat), np.float64)
+    failed = []
+    lu = None
+    thispop = None
+    for itemp in range(npoints):
+        data = constant + np.bincount(varying, weights=values[:, itemp], minlength=position.size)
+        popmat = sparse.csc_matrix((data, indices, indptr), shape=(nmat, nmat))
+        if iterative and lu is not None and thispop is not None:
+            x = thispop
+            for iteration in range(maxiter):
+                dx = lu.solve(b - popmat.dot(x))
+                x = x + dx
+                if np.all(np.abs(dx) <= rtol*np.abs(x) + atol):
+                    fullPop[itemp] = x
+                    break
+            else:
+                x = None
+            if x is not None:
+                thispop = x
+                continue
+        try:
+            lu = splu(popmat)
+        except RuntimeError:
+            # exactly singular
+            failed.append(itemp)
+            continue
+        thispop = lu.solve(b)
+        fullPop[itemp] = thispop
+    return fullPop, failed, popmat
+
+
+def cubicSplineSecond(knots, values):
+    """
+    Return the second derivatives at the knots of many interpolating cubic splines.
+
+    The splines are the same as those of scipy.interpolate.splrep with s=0, which have the
+    not-a-knot end conditions.
+
+    Parameters
+    ----------
+    knots, values : `numpy.ndarray`
+        the (nspline, m) data points of the splines, m must be at least 4
+
+    Returns
+    -------
+    second : `numpy.ndarray`
+        the (nspline, m) second derivatives, for `cubicSplineEval`
+    """
+    knots = np.asarray(knots, np.float64)
+    values = np.asarray(values, np.float64)
+    nspline, m = knots.shape
+    h = np.diff(knots, axis=1)
+    slope = np.diff(values, axis=1)/h
+    # solved for a chunk of the splines at a time
+    second = np.zeros((nspline, m), np.float64)
+    inner = np.arange(1, m - 1)
+    chunk = max(1, 4000000//(m*m))
+    for start in range(0, nspline, chunk):
+        hc = h[start:start + chunk]
+        lhs = np.zeros((hc.shape[0], m, m), np.float64)
+        rhs = np.zeros((hc.shape[0], m), np.float64)
+        lhs[:, inner, inner - 1] = hc[:, :-1]
+        lhs[:, inner, inner] = 2.*(hc[:, :-1] + hc[:, 1:])
+        lhs[:, inner, inner + 1] = hc[:, 1:]
+        rhs[:, 1:-1] = 6.*np.diff(slope[start:start + chunk], axis=1)
+        # not-a-knot, the third derivative is continuous at the second and the second last knot
+        lhs[:, 0, 0] = hc[:, 1]
+        lhs[:, 0, 1] = -(hc[:, 0] + hc[:, 1])
+        lhs[:, 0, 2] = hc[:, 0]
+        lhs[:, -1, -3] = hc[:, -1]
+        lhs[:, -1, -2] = -(hc[:, -2] + hc[:, -1])
+        lhs[:, -1, -1] = hc[:, -2]
+        second[start:start + chunk] = np.linalg.solve(lhs, rhs[..., np.newaxis])[..., 0]
+    return second
+
+
+def cubicSplineEval(knots, values, second, x):
+    """
+    Evaluate many cubic splines given by their second derivatives at the knots.
+
+    Points outside of the knots are extrapolated with the end polynomials, as by splev.
+
+    Parameters
+    ----------
+    knots, values, second : `numpy.ndarray`
+        the (nspline, m) data points of the splines and the second derivatives
+        returned by `cubicSplineSecond`
+    x : `numpy.ndarray`
+        the (nspline, nx) points at which to evaluate each spline
+
+    Returns
+    -------
+    y : `numpy.ndarray`
+        the (nspline, nx) values of the splines
+    """
+    knots = np.asarray(knots, np.float64)
+    values = np.asarray(values, np.float64)
+    m = knots.shape[1]
+    h = np.diff(knots, axis=1)
+    # the interval of each point, the end intervals are extended
+    if knots.shape[0] == 1:
+        interval = np.searchsorted(knots[0, 1:m-1], x, side='right')
+    else:
+        interval = np.zeros(x.shape, np.int64)
+        for j in range(1, m - 1):
+            interval += knots[:, j:j+1] <= x
+    x0 = np.take_along_axis(knots, interval, axis=1)
+    hi = np.take_along_axis(h, interval, axis=1)
+    m0 = np.take_along_axis(second, interval, axis=1)
+    m1 = np.take_along_axis(second, interval + 1, axis=1)
+    y0 = np.take_along_axis(values, interval, axis=1)
+    y1 = np.take_along_axis(values, interval + 1, axis=1)
+    b = x - x0
+    a = hi - b
+    return (m0*a**3 + m1*b**3)/(6.*hi) + (y0/hi - m0*hi/6.)*a + (y1/hi - m1*hi/6.)*b
+
+
+def cubicSpline(knots, values, x):
+    """
+    Evaluate many interpolating cubic splines at once.
+
+    The splines are the same as those of scipy.interpolate.splrep with s=0 and are
+    evaluated as by splev, see `cubicSplineSecond` and `cubicSplineEval`.
+
+    Parameters
+    ----------
+    knots, values : `numpy.ndarray`
+        the (nspline, m) data points of the splines, m must be at least 4
+    x : `numpy.ndarray`
+        the (nspline, nx) points at which to evaluate each spline
+
+    Returns
+    -------
+    y : `numpy.ndarray`
+        the (nspline, nx) values of the splines
+    """
+    return cubicSplineEval(knots, values, cubicSplineSecond(knots, values), x)
+
+
+def cubicSplineSecondFlat(knots, values, offsets):
+    """
+    Return the second derivatives of splines whose data points are concatenated in flat arrays.
+
+    Parameters
+    ----------
+    knots, values : `numpy.ndarray`
+        the data points of all splines, those of spline i are knots[offsets[i]:offsets[i+1]]
+    offsets : `numpy.ndarray`
+        the offsets of the splines into `knots` and `values`
+
+    Returns
+    -------
+    second : `numpy.ndarray`
+        the second derivatives in the same layout as `values`, zero for splines of
+        less than 4 points
+    """
+    offsets = np.asarray(offsets, np.int64)
+    npoints = np.diff(offsets)
+    second = np.zeros(np.asarray(values).size, np.float64)
+    # the splines with the same number of points are solved together
+    for m in np.unique(npoints):
+        if m < 4:
+            continue
+        position = offsets[:-1][npoints == m][:, np.newaxis] + np.arange(m)
+        second[position] = cubicSplineSecond(knots[position], values[position])
+    return second
+
+
+def cubicSplineSecondRows(knots, values, npoints):
+    """
+    Return the second derivatives of splines whose data points are the rows of 2D arrays.
+
+    Parameters
+    ----------
+    knots, values : `numpy.ndarray`
+        the (nspline, maxm) data points, spline i uses the first npoints[i] of row i
+    npoints : `numpy.ndarray`
+        the number of data points of each spline
+
+    Returns
+    -------
+    second : `numpy.ndarray`
+        the (nspline, maxm) second derivatives, zero beyond the data points and for splines
+        of less than 4 points
+    """
+    knots = np.asarray(knots, np.float64)
+    values = np.asarray(values, np.float64)
+    npoints = np.asarray(npoints, np.int64)
+    second = np.zeros(values.shape, np.float64)
+    for m in np.unique(npoints):
+        if m < 4:
+            continue
+        rows = npoints == m
+        second[rows, :m] = cubicSplineSecond(knots[rows, :m], values[rows, :m])
+    return second
+
+
+def pumpingFactors(wvl, de, mult1, mult2, radTemperature=None, rStar=None, meanIntensity=None):
+    """
+    Return the factors that multiply the A values of radiative transitions for photoexcitation
+    and stimulated emission by a radiation field.
+
+    Parameters
+    ----------
+    wvl : `numpy.ndarray`
+        the wavelengths of the transitions, the transitions with a wavelength of 0, the
+        autoionization lines, are not pumped
+    de : `numpy.ndarray`
+        the energies of the transitions in erg
+    mult1, mult2 : `numpy.ndarray`
+        the statistical weights of the lower and upper levels
+    radTemperature : `float`
+        the temperature of a black-body radiation field
+    rStar : `float`
+        the distance from the center of the star in stellar radii, for the dilution of the
+        black-body field.  If not set, the dilution is 0.5
+    meanIntensity : callable or `dict`
+        a mean intensity J in erg cm^-2 s^-1 str^-1 Angstrom^-1, used instead of radTemperature.
+        Either a function of the wavelength in Angstroms, such as
+        `ChiantiPy.tools.sources.blackStar.meanIntensity`, or a dict with the keys 'wvl' and
+        'intensity' that is interpolated linearly and is zero outside of its wavelengths
+
+    Returns
+    -------
+    phexFactor, stemFactor : `numpy.ndarray`
+        the photoexcitation rates from the lower levels and the stimulated emission rates
+        from the upper levels in units of the A values
+
+    Notes
+    -----
+    The factors are g2/g1 times and once the photon occupation number of the field
+    c^2 J_nu/(2 h nu^3), evaluated once for all transitions at the wavelengths hc/de of their
+    energies.  For the black body the occupation number is dilution/(exp(de/kT) - 1), so that
+    a mean intensity equal to the diluted black body gives the same factors.
+    """
+    good = np.abs(np.asarray(wvl, np.float64)) > 0.
+    mult1 = np.asarray(mult1, np.float64)
+    mult2 = np.asarray(mult2, np.float64)
+    if meanIntensity is not None:
+        # the wavelengths of the energies of the transitions, as for the black body
+        wvl = np.where(good, 1.e+8*const.hc/np.where(good, de, 1.), 0.)
+        if isinstance(meanIntensity, dict):
+            intensity = np.interp(wvl, meanIntensity['wvl'], meanIntensity['intensity'], left=0., right=0.)
+        else:
+            intensity = np.asarray(meanIntensity(np.where(good, wvl, 1.)), np.float64)
+        # J per cm of wavelength times lambda^5/(2 h c^2), lambda in cm
+        wvlCm = 1.e-8*wvl
+        occupation = np.where(good, 1.e+8*intensity*wvlCm**5/(2.*const.planck*const.light**2), 0.)
+        return (mult2/mult1)*occupation, occupation
+    if not rStar:
+        dilution = 0.5
+    else:
+        dilution = dilute(rStar)
+    dekt = np.where(good, np.asarray(de, np.float64)/(const.boltzmann*radTemperature), 1.)
+    # photoexcitation
+    phexFactor = np.where(good, dilution*(mult2/mult1)/(np.exp(dekt) -1.), 0.)
+    # stimulated emission, the occupation number of the field
+    stemFactor = np.where(good, dilution/(np.exp(dekt) -1.), 0.)
+    return phexFactor, stemFactor
@@ -0,0 +1,48 @@
+"""
+Benchmark FortranRecordReader.read_many against FortranRecordReader.read.
+
+The data lines of the largest wgfa, elvlc, scups and ioneq files under $XUVTOP are
+read with a compiled read_many and with read applied to one line at a time.
+
+usage:  python benchmarks/bench_fortranformat.py [repeat]
+"""
+import os
+import sys
+import timeit
+
+from ChiantiPy.fortranformat import FortranRecordReader
+
+from bench_readers import largest, dataLength
+
+
+def ioneqFormat(lines):
+    ntemp = int(lines[0].split()[0])
+    return '2i3,'+str(ntemp)+'e10.2'
+
+
+def main(repeat=3):
+    xuvtop = os.environ['XUVTOP']
+    cases = [
+        ('wgfa', lambda lines: '(2i5,f15.3,2e15.3)', lambda lines: lines[:dataLength(lines)]),
+        ('elvlc', lambda lines: 'i7,a30,a5,i5,a5,f5.1,2f15.3', lambda lines: lines[:dataLength(lines)]),
+        ('scups', lambda lines: '2i7,3e12.3,2i5,e12.3', lambda lines: lines[0:3*(dataLength(lines)//3):3]),
+        ('ioneq', ioneqFormat, lambda lines: lines[2:dataLength(lines)]),
+        ]
+    print(' %-8s %8s %12s %15s %8s  %s'%('type', 'lines', 'read (ms)', 'read_many (ms)', 'speedup', 'file'))
+    for ext, getFormat, getLines in cases:
+        fname = largest(xuvtop, ext)
+        if fname is None:
+            print(' %-8s  no files found'%(ext))
+            continue
+        lines = open(fname).readlines()
+        fmt = getFormat(lines)
+        records = getLines(lines)
+        reader = FortranRecordReader(fmt)
+        tread = min(timeit.repeat(lambda: [reader.read(arec) for arec in records], number=1, repeat=repeat))
+        tmany = min(timeit.repeat(lambda: reader.read_many(records), number=1, repeat=repeat))
+        print(' %-8s %8i %12.2f %15.2f %8.1f  %s'%(ext, len(records), 1.e+3*tread, 1.e+3*tmany,
+            tread/tmany, os.path.relpath(fname, xuvtop)))
+
+
+if __name__ == '__main__':
+    main(*[int(one) for one in sys.argv[1:2]])
@@ -0,0 +1,69 @@
+"""
+Benchmark the import of ChiantiPy and ChiantiPy.core with python -X importtime.
+
+Each module is imported in a fresh interpreter several times.  The best
+cumulative import time is printed, together with the largest imports it
+contains.  The import fails the benchmark, and the script exits with status 1,
+if it pulls in one of the packages that are only needed for plots, dialogs or
+ipyparallel, or if it prints anything, or if it is slower than the optional
+limit in milliseconds.
+
+usage:  python benchmarks/bench_import.py [repeat] [limit]
+"""
+import os
+import subprocess
+import sys
+
+# packages that must only be imported when a plot, a dialog or ipymspectrum is used
+deferred = ['matplotlib', 'PyQt5', 'ipyparallel', 'ChiantiPy.Gui.gui_cl', 'ChiantiPy.Gui.gui_qt5']
+
+
+def importTimes(module):
+    """
+    Import `module` in a new interpreter and return its output and {module: (self, cumulative)} in microseconds.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, env=os.environ.copy())
+    if proc.returncode:
+        raise RuntimeError(proc.stderr)
+    times = {}
+    for aline in proc.stderr.splitlines():
+        if not aline.startswith('import time:') or 'cumulative' in aline:
+            continue
+        selfTime, cumulative, name = aline[len('import time:'):].split('|')
+        times[name.strip()] = (int(selfTime), int(cumulative))
+    return proc.stdout, times
+
+
+def main(repeat=5, limit=None):
+    failed = False
+    for module in ['ChiantiPy', 'ChiantiPy.core']:
+        best = None
+        for i in range(repeat):
+            output, times = importTimes(module)
+            if best is None or times[module][1] < best[1][module][1]:
+                best = (output, times)
+        output, times = best
+        total = 1.e-3*times[module][1]
+        print(' import %-16s %8.1f ms'%(module, total))
+        top = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[1:8]
+        for name, (selfTime, cumulative) in top:
+            print('     %-40s %8.1f ms'%(name, 1.e-3*cumulative))
+        found = [name for name in times if name.split('.')[0] in deferred or name in deferred]
+        if found:
+            print(' FAIL: %s imports %s'%(module, ', '.join(sorted(found))))
+            failed = True
+        if output.strip():
+            print(' FAIL: %s prints %r'%(module, output))
+            failed = True
+        if limit is not None and total > limit:
+            print(' FAIL: %s takes more than %.1f ms'%(module, limit))
+            failed = True
+    return failed
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:3]
+    repeat = int(args[0]) if args else 5
+    limit = float(args[1]) if len(args) > 1 else None
+    sys.exit(1 if main(repeat, limit) else 0)
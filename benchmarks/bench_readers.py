@@ -0,0 +1,133 @@
+"""
+Benchmark the whole-file readers in ChiantiPy.tools.io against line by line parsing.
+
+For each type of CHIANTI file the largest file under $XUVTOP is read with the
+reader in ChiantiPy.tools.io and with a reference that parses one line at a time
+with FortranRecordReader.read, as the readers in ChiantiPy 0.9.5 did.  The
+on-disk cache is switched off so that both always parse the file.  The two
+results are compared and the best of several timings is printed.
+
+usage:  python benchmarks/bench_readers.py [repeat]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+import ChiantiPy.tools.io as io
+import ChiantiPy.tools.cache as chcache
+from ChiantiPy.fortranformat import FortranRecordReader
+
+
+def dataLength(lines):
+    ndata = 0
+    while len(lines[ndata].split()) > 1:
+        ndata += 1
+    return ndata
+
+
+def lineWgfa(fname):
+    lines = open(fname).readlines()
+    reader = FortranRecordReader('(2i5,f15.3,2e15.3)')
+    return [reader.read(aline) for aline in lines[:dataLength(lines)]]
+
+
+def lineElvlc(fname):
+    lines = open(fname).readlines()
+    reader = FortranRecordReader('i7,a30,a5,i5,a5,f5.1,2f15.3')
+    return [reader.read(aline[0:115]) for aline in lines[:dataLength(lines)]]
+
+
+def lineAuto(fname):
+    lines = open(fname).readlines()
+    reader = FortranRecordReader('(2i7,e12.2,a30,3x,a30)')
+    return [reader.read(aline) for aline in lines[:dataLength(lines)]]
+
+
+def lineScups(fname):
+    lines = open(fname).readlines()
+    counter = 0
+    while '-1' not in lines[counter][:4]:
+        counter += 1
+    out = []
+    for itrans in range(counter//3):
+        ll1 = lines[3*itrans].split()
+        out.append([int(ll1[0]), int(ll1[1]), float(ll1[2]), float(ll1[3]), float(ll1[4]),
+            int(ll1[5]), int(ll1[6]), float(ll1[7]), np.asarray(lines[3*itrans+1].split(), np.float64),
+            np.asarray(lines[3*itrans+2].split(), np.float64)])
+    return out
+
+
+def linePsplups(fname):
+    lines = open(fname).readlines()
+    reader = FortranRecordReader('3i3,3e10.3')
+    out = []
+    for aline in lines[:dataLength(lines)]:
+        as1 = aline[39:].rstrip()
+        spl = FortranRecordReader(str(len(as1)//10)+'e10.3').read(as1)
+        out.append(reader.read(aline) + [np.asarray(spl, np.float64)])
+    return out
+
+
+def lineCireclvl(fname):
+    lines = open(fname).readlines()
+    ndata = 0
+    while lines[ndata][0:5].find('-1') < 0:
+        ndata += 1
+    out = []
+    for jline in range(0, ndata - 1, 2):
+        out.append([np.asarray(lines[jline].split()[4:], np.float64),
+            np.asarray(lines[jline+1].split()[4:], np.float64)])
+    return out
+
+
+def lineIoneq(fname):
+    lines = open(fname).readlines()
+    ntemp, nele = [int(one) for one in lines[0].split()]
+    nlines = 0
+    while lines[nlines][0:5].find('-1') < 0:
+        nlines += 1
+    reader = FortranRecordReader('2i3,'+str(ntemp)+'e10.2')
+    return [reader.read(aline) for aline in lines[2:nlines]]
+
+
+def largest(xuvtop, ext):
+    """Return the largest file with extension ext and its ion name."""
+    best = (-1, None)
+    for dirpath, dirnames, filenames in os.walk(xuvtop):
+        for fname in filenames:
+            if fname.endswith('.' + ext):
+                full = os.path.join(dirpath, fname)
+                best = max(best, (os.path.getsize(full), full))
+    return best[1]
+
+
+def main(repeat=3):
+    xuvtop = os.environ['XUVTOP']
+    chcache.setCache(useCache=False)
+    cases = [
+        ('wgfa', lineWgfa, lambda f: io.wgfaRead('', filename=f, elvlcname='none')),
+        ('elvlc', lineElvlc, lambda f: io.elvlcRead('', filename=f)),
+        ('scups', lineScups, lambda f: io.scupsRead('', filename=f)),
+        ('psplups', linePsplups, lambda f: io.splupsRead('', filename=f, filetype='psplups')),
+        ('rrlvl', lineCireclvl, lambda f: io.cireclvlRead('', filename=os.path.splitext(f)[0], filetype='rrlvl')),
+        ('cilvl', lineCireclvl, lambda f: io.cireclvlRead('', filename=os.path.splitext(f)[0], filetype='cilvl')),
+        ('reclvl', lineCireclvl, lambda f: io.cireclvlRead('', filename=os.path.splitext(f)[0], filetype='reclvl')),
+        ('auto', lineAuto, lambda f: io.autoRead('', filename=f)),
+        ('ioneq', lineIoneq, lambda f: io.ioneqRead(ioneqName=os.path.splitext(os.path.basename(f))[0])),
+        ]
+    print(' %-8s %10s %12s %12s %8s  %s'%('type', 'size (kB)', 'line (ms)', 'column (ms)', 'speedup', 'file'))
+    for ext, lineReader, columnReader in cases:
+        fname = largest(xuvtop, ext)
+        if fname is None:
+            print(' %-8s  no files found'%(ext))
+            continue
+        tline = min(timeit.repeat(lambda: lineReader(fname), number=1, repeat=repeat))
+        tcolumn = min(timeit.repeat(lambda: columnReader(fname), number=1, repeat=repeat))
+        print(' %-8s %10.1f %12.2f %12.2f %8.1f  %s'%(ext, os.path.getsize(fname)/1.e+3, 1.e+3*tline,
+            1.e+3*tcolumn, tline/tcolumn, os.path.relpath(fname, xuvtop)))
+
+
+if __name__ == '__main__':
+    main(*[int(one) for one in sys.argv[1:2]])